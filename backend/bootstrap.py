@@ -80,7 +80,9 @@ def run(as_daemon=True, log_level="INFO"):
 	log.load_webhook(config)
 
 	# load 4CAT modules and cache the results
-	modules = ModuleCollector(config=config, write_cache=True)
+	# workers are imported only once they are needed if the module manifest
+	# is up to date; else everything is imported and the manifest rebuilt
+	modules = ModuleCollector(config=config, write_cache=True, lazy=True)
 
 	# make it happen
 	# this is blocking until the back-end is shut down
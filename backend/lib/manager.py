@@ -6,14 +6,16 @@ import signal
 import time
 
 from collections.abc import Generator
+from collections import Counter
 
 from backend.lib.proxied_requests import DelegatedRequestHandler
 from backend.lib.worker import BasicWorker
 from common.lib.exceptions import JobClaimedException
+from common.lib.job import Job
 
-# for now, this is hardcoded - could be dynamic or depending on the queue ID in
-# the future
-MAX_JOBS_PER_QUEUE = 1
+# the manager is woken up by notifications when the job queue changes; if none
+# arrive, it checks for claimable jobs after this many seconds anyway
+MAX_DELEGATE_WAIT = 5
 
 class WorkerManager:
 	"""
@@ -69,6 +71,10 @@ class WorkerManager:
 				if job_params:
 					self.queue.add_job(worker_or_type=worker, **job_params)
 
+		# changes to the job queue are announced via notifications, so we
+		# only need to check for claimable jobs when one arrives
+		self.db.listen(Job.NOTIFY_CHANNEL)
+
 		self.ident = threading.get_ident()
 		self.log.info("4CAT Started")
 
@@ -87,10 +93,15 @@ class WorkerManager:
 		Delegate work
 
 		Checks for open jobs, and then passes those to dedicated workers, if
-		slots are available for those workers.
+		slots are available for those workers. Only the first jobs of queues
+		with free slots are retrieved. Afterwards, waits until the job queue
+		changes (see `wait_for_jobs()`).
+
+		How many jobs can run per queue is determined by `get_queue_limit()`,
+		and the total amount of workers by the `workers.max_workers` setting.
+		If not all claimable jobs can be started, jobs of users with the
+		fewest running workers go first.
 		"""
-		jobs = self.queue.get_all_jobs()
-
 		num_active = len(list(self.iterate_active_workers()))
 		self.log.debug2(f"Running {num_active} active workers")
 
@@ -99,43 +110,114 @@ class WorkerManager:
 		# the dictionary while iterating through it
 		for queue_id in self.worker_pool:
 			all_workers = self.worker_pool[queue_id]
-			for worker in all_workers:
-				if not worker.is_alive():
+			for worker in all_workers.copy():
+				if not worker.is_alive() or worker.is_done:
 					self.log.debug(f"Terminating worker {worker.job.data['jobtype']}/{worker.job.data['remote_id']}")
 					worker.join()
 					self.worker_pool[queue_id].remove(worker)
 
 			del all_workers
 
-		# check if workers are available for unclaimed jobs
+		queue_limits = self.modules.config.get("workers.concurrency", {}) or {}
+		max_workers = self.modules.config.get("workers.max_workers", 0) or 0
+		free_slots = max_workers - len(list(self.iterate_active_workers())) if max_workers else None
+		if free_slots is not None and free_slots <= 0:
+			self.wait_for_jobs()
+			return
+
+		full_queues = [queue_id for queue_id, workers in self.worker_pool.items() if
+					   workers and len(workers) >= self.get_queue_limit(queue_id, workers[0].type, queue_limits)]
+		max_per_queue = max([1, *[worker.max_workers for worker in self.modules.workers.values()],
+							 *[int(limit) for limit in queue_limits.values()]])
+		jobs = self.queue.get_claimable_jobs(per_queue=max_per_queue, exclude_queues=full_queues)
+
+		# only consider as many jobs per queue as it has free slots
+		# jobs come in queue order, so these are the ones next in line
+		candidates = []
+		queue_slots = {}
 		for job in jobs:
 			queue_id = job.data["queue_id"]
 			jobtype = job.data["jobtype"]
 
-			if jobtype in self.modules.workers:
-				worker_class = self.modules.workers[jobtype]
-				if queue_id not in self.worker_pool:
-					self.worker_pool[queue_id] = []
-
-				# if a job is of a known type, and that job type has open
-				# worker slots, start a new worker to run it
-				if len(self.worker_pool[queue_id]) < MAX_JOBS_PER_QUEUE:
-					try:
-						job.claim()
-						worker = worker_class(logger=self.log, manager=self, job=job, modules=self.modules)
-						worker.start()
-						log_level = self.log.levels["DEBUG"] if job.data["interval"] else self.log.levels["INFO"]
-						self.log.log(f"Starting new worker for job {job.data['jobtype']}/{job.data['remote_id']}", log_level)
-						self.worker_pool[queue_id].append(worker)
-					except JobClaimedException:
-						# it's fine
-						pass
-			else:
+			if jobtype not in self.modules.workers:
 				if jobtype not in self.unknown_jobs:
 					self.log.error(f"Unknown job type: {jobtype}")
 					self.unknown_jobs.add(jobtype)
+				continue
 
-		time.sleep(1)
+			if queue_id not in queue_slots:
+				queue_slots[queue_id] = self.get_queue_limit(queue_id, jobtype, queue_limits) - len(self.worker_pool.get(queue_id, []))
+
+			if queue_slots[queue_id] > 0:
+				queue_slots[queue_id] -= 1
+				candidates.append(job)
+
+		# start workers for the jobs of whoever has the fewest running, so a
+		# user with many queued jobs cannot take up all worker slots
+		owner_workers = Counter(worker.job.data.get("owner", "") for queue_id, worker in self.iterate_active_workers())
+		while candidates and (free_slots is None or free_slots > 0):
+			job = min(candidates, key=lambda candidate: owner_workers[candidate.data["owner"]])
+			candidates.remove(job)
+
+			queue_id = job.data["queue_id"]
+			worker_class = self.modules.workers[job.data["jobtype"]]
+			if queue_id not in self.worker_pool:
+				self.worker_pool[queue_id] = []
+
+			try:
+				job.claim()
+				worker = worker_class(logger=self.log, manager=self, job=job, modules=self.modules)
+				worker.start()
+				log_level = self.log.levels["DEBUG"] if job.data["interval"] else self.log.levels["INFO"]
+				self.log.log(f"Starting new worker for job {job.data['jobtype']}/{job.data['remote_id']}", log_level)
+				self.worker_pool[queue_id].append(worker)
+				owner_workers[job.data["owner"]] += 1
+				if free_slots is not None:
+					free_slots -= 1
+			except JobClaimedException:
+				# it's fine
+				pass
+
+		self.wait_for_jobs()
+
+	def get_queue_limit(self, queue_id, jobtype, queue_limits):
+		"""
+		Get the number of jobs in a queue that can run at the same time
+
+		This can be configured per queue ID or per job type via the
+		`workers.concurrency` setting; if neither is configured, the
+		`max_workers` attribute of the worker class is used.
+
+		:param str queue_id:  Queue ID
+		:param str jobtype:  Type of the jobs in the queue
+		:param dict queue_limits:  Value of the `workers.concurrency` setting
+		:return int:  Maximum number of concurrent jobs
+		"""
+		if queue_id in queue_limits:
+			return int(queue_limits[queue_id])
+		elif jobtype in queue_limits:
+			return int(queue_limits[jobtype])
+		elif jobtype in self.modules.workers:
+			return self.modules.workers[jobtype].max_workers
+		else:
+			return 1
+
+	def wait_for_jobs(self):
+		"""
+		Wait until there may be new work to delegate
+
+		Jobs being queued, released or finished are announced via a
+		notification on the job queue channel, so that is waited for. Jobs that
+		are queued to be claimed later or at an interval become claimable
+		without a notification, so the wait ends at the moment the first of
+		those becomes claimable, or after `MAX_DELEGATE_WAIT` seconds at most.
+		"""
+		timeout = MAX_DELEGATE_WAIT
+		next_claimable = self.queue.get_next_claimable_time()
+		if next_claimable:
+			timeout = min(timeout, max(0, next_claimable - time.time()))
+
+		self.db.wait_for_notifications(timeout=timeout)
 
 	def loop(self):
 		"""
@@ -219,8 +301,9 @@ class WorkerManager:
 		while self.queue.get_all_jobs("cancel-pg-query", restrict_claimable=False):
 			time.sleep(0.25)
 
-		# now stop looping (i.e. accepting new jobs)
+		# now stop looping (i.e. accepting new jobs), and wake up the loop
 		self.looping = False
+		self.db.notify(Job.NOTIFY_CHANNEL)
 
 	def request_interrupt(self, interrupt_level, job):
 		"""
@@ -1,8 +1,11 @@
 """
 Basic post-processor worker - should be inherited by workers to post-process results
 """
+import multiprocessing.connection
+import multiprocessing
 import traceback
 import inspect as py_inspect
+import threading
 import zipfile
 import typing
 import shutil
@@ -17,8 +20,10 @@ from pathlib import PurePath, Path
 
 from backend.lib.worker import BasicWorker
 from common.lib.dataset import DataSet, StatusType
+from common.lib.database import Database
 from common.lib.compatibility import Compatibility
 from common.lib.fourcat_module import FourcatModule
+from common.lib.module_loader import ModuleCollector
 from common.lib.helpers import get_software_commit, remove_nuls, send_email, hash_to_md5
 from common.lib.exceptions import (WorkerInterruptedException, ProcessorInterruptedException, ProcessorException,
                                    DataSetException, MapItemException, AnnotationException)
@@ -114,6 +119,19 @@ class BasicProcessor(FourcatModule, BasicWorker, metaclass=abc.ABCMeta):
     #: evaluated from it.
     compatibility = None
 
+    #: Run `process()` in a separate OS process instead of in the worker's
+    #: thread. All workers run in the same Python process and so share one
+    #: interpreter lock; CPU-bound processors can enable this to run on their
+    #: own core. The process is forked from the worker, so `process()` can be
+    #: written as usual, but it cannot use proxied requests (which are handled
+    #: by a thread in the main process), and changes it makes to attributes of
+    #: the processor are not visible after it returns.
+    run_in_process = False
+
+    #: Interrupt level shared with the process `process()` runs in, if
+    #: `run_in_process` is enabled
+    process_interrupt = None
+
     def work(self):
         """
         Process a dataset
@@ -177,7 +195,7 @@ class BasicProcessor(FourcatModule, BasicWorker, metaclass=abc.ABCMeta):
                 return
 
             self.source_file = self.source_dataset.get_results_path()
-            if not self.source_file.exists():
+            if not self.source_file.exists() and not self.source_dataset.is_view():
                 self.dataset.update_status("Finished, no input data found.")
 
         self.log.info("Running processor %s on dataset %s" % (self.type, self.job.data["remote_id"]))
@@ -221,7 +239,11 @@ class BasicProcessor(FourcatModule, BasicWorker, metaclass=abc.ABCMeta):
 
         if not self.dataset.is_finished():
             try:
-                self.process()
+                if self.run_in_process:
+                    self.process_in_subprocess()
+                else:
+                    self.process()
+
                 self.after_process()
                 
                 # processors should usually finish their jobs by themselves, but if
@@ -236,7 +258,7 @@ class BasicProcessor(FourcatModule, BasicWorker, metaclass=abc.ABCMeta):
             except Exception as e:
                 self.dataset.log("Processor crashed: %s" % str(e))
                 self.dataset.update_status("Processor error, trying again later", status_type=StatusType.QUEUED)
-                stack = traceback.extract_tb(e.__traceback__)
+                stack = getattr(e, "process_stack", None) or traceback.extract_tb(e.__traceback__)
                 frames = [frame.filename.split("/").pop() + ":" + str(frame.lineno) for frame in stack[1:]]
                 location = "->".join(frames)
 
@@ -265,6 +287,121 @@ class BasicProcessor(FourcatModule, BasicWorker, metaclass=abc.ABCMeta):
             self.job.data["jobtype"], self.job.data["remote_id"]))
             self.job.finish()
 
+    def process_in_subprocess(self):
+        """
+        Run `process()` in a separate OS process
+
+        The process is forked from this worker's thread, which then waits for
+        it to end. Interrupt requests are passed on to it, and job status
+        changes and exceptions are passed back, so that the rest of the job
+        lifecycle proceeds as if `process()` ran in this thread.
+
+        Exceptions raised in the process get a `process_stack` attribute with
+        the traceback from that process, since it cannot be passed along with
+        the exception itself.
+        """
+        context = multiprocessing.get_context("fork")
+        self.process_interrupt = context.Value("i", self.interrupted or self.INTERRUPT_NONE)
+        receiver, sender = context.Pipe(duplex=False)
+
+        process = context.Process(target=self._run_forked_process, args=(sender,), name=f"4cat-{self.type}")
+        process.start()
+        sender.close()
+
+        result = None
+        multiprocessing.connection.wait([receiver, process.sentinel])
+        try:
+            if receiver.poll():
+                result = receiver.recv()
+        except EOFError:
+            pass
+
+        process.join()
+        receiver.close()
+
+        if result is None:
+            raise ProcessorException(f"Process for processor {self.type} ended unexpectedly with exit code "
+                                     f"{process.exitcode}")
+
+        # the process may have finished or released the job, and will usually
+        # have updated the dataset
+        self.job.data, self.job.is_finished, self.job.is_claimed, self.job.is_parked = result["job"]
+        try:
+            self.dataset = DataSet(key=self.dataset.key, db=self.db, modules=self.modules)
+        except DataSetException:
+            # deleted while processing; keep the old object so things can
+            # wrap up as they would otherwise
+            pass
+
+        if result["exception"]:
+            raise result["exception"]
+
+    def _run_forked_process(self, sender):
+        """
+        Run `process()` in a forked process
+
+        Counterpart to `process_in_subprocess()`, running in the new process.
+        Database connections and the memcache client are inherited from the
+        parent process but cannot be shared with it, so new ones are set up.
+        The old connections are kept around rather than closed, since closing
+        them would also end the parent's sessions.
+
+        :param sender:  Connection to send the result to the parent with
+        """
+        inherited = [self.db.connection, self.modules.config.db]
+        self.db.reconnect()
+        self.job.db = self.db
+        self.modules.config.with_db(Database(logger=self.log, appname=f"{self.db.appname}-config", dbname=self.config.DB_NAME,
+                                             user=self.config.DB_USER, password=self.config.DB_PASSWORD,
+                                             host=self.config.DB_HOST, port=self.config.DB_PORT))
+        inherited.append(self.modules.config._memcache_tls.__dict__.pop("client", None))
+
+        def follow_interrupts():
+            while not self.interrupted:
+                self.interrupted = self.process_interrupt.value
+                time.sleep(0.25)
+
+        threading.Thread(target=follow_interrupts, daemon=True).start()
+
+        exception = None
+        try:
+            self.process()
+        except Exception as e:
+            e.process_stack = traceback.extract_tb(e.__traceback__)
+            exception = e
+        finally:
+            # files marked for clean-up in the process are only known here
+            for item in self.for_cleanup:
+                if type(item) is DataSet:
+                    item.remove_disposable_files()
+                elif item.exists():
+                    shutil.rmtree(item, ignore_errors=True)
+
+        job = (self.job.data, self.job.is_finished, self.job.is_claimed, self.job.is_parked)
+        try:
+            sender.send({"job": job, "exception": exception})
+        except Exception:
+            # exceptions are not always picklable
+            fallback = ProcessorException(f"{exception.__class__.__name__}: {exception}")
+            fallback.process_stack = exception.process_stack
+            sender.send({"job": job, "exception": fallback})
+
+        sender.close()
+
+    def request_interrupt(self, level=1):
+        """
+        Set the 'abort requested' flag
+
+        Also passes the interrupt on to the process `process()` runs in, if
+        `run_in_process` is enabled.
+
+        :param int level:  Retry or cancel? Either `self.INTERRUPT_RETRY` or
+          `self.INTERRUPT_CANCEL`.
+        """
+        super().request_interrupt(level)
+        if self.process_interrupt is not None:
+            self.process_interrupt.value = level
+
     def after_process(self):
         """
         Run after processing the dataset
@@ -488,9 +625,9 @@ class BasicProcessor(FourcatModule, BasicWorker, metaclass=abc.ABCMeta):
 
         delegator.refresh_settings(self.config)
 
-        # 50 is an arbitrary batch size - but we top up every 0.05s, so
-        # that should be sufficient
-        batch_size = 50
+        # keep enough URLs queued that all proxy slots can be used, with some
+        # to spare so a slot that frees up can be filled straight away
+        batch_size = max(50, 2 * delegator.get_capacity())
 
         # we need an iterable, so we can use next() and StopIteration
         urls = iter(urls)
@@ -508,7 +645,7 @@ class BasicProcessor(FourcatModule, BasicWorker, metaclass=abc.ABCMeta):
 
                 delegator.add_urls(batch, queue_name, **kwargs)
 
-            time.sleep(0.05)  # arbitrary...
+            delegator.wait_for_results(queue_name, preserve_order=preserve_order)
             for url, result in delegator.get_results(queue_name, preserve_order=preserve_order):
                 # result may also be a FailedProxiedRequest!
                 # up to the processor to decide how to deal with it
@@ -778,7 +915,11 @@ class BasicProcessor(FourcatModule, BasicWorker, metaclass=abc.ABCMeta):
         # we don't need this file anymore - it has been copied to the new
         # standalone dataset, and this one is not accessible via the interface
         # except as a link to the copied standalone dataset
-        os.unlink(self.dataset.get_results_path())
+        if self.dataset.is_view():
+            self.dataset.get_row_selection().delete()
+            self.dataset.delete_parameter("view_of")
+        else:
+            os.unlink(self.dataset.get_results_path())
 
         # Copy the log
         shutil.copy(self.dataset.get_log_path(), standalone.get_log_path())
@@ -919,7 +1060,9 @@ class BasicProcessor(FourcatModule, BasicWorker, metaclass=abc.ABCMeta):
             tb_frames = traceback.extract_tb(e.__traceback__)
             chosen_frame = tb_frames[-1] if tb_frames else None
             try:
-                map_item_file = Path(py_inspect.getfile(cls)).resolve()
+                # workers loaded from the module manifest are stand-ins that
+                # cannot be inspected; use the class they stand in for
+                map_item_file = Path(py_inspect.getfile(ModuleCollector.get_worker_class(cls))).resolve()
             except (TypeError, OSError):
                 map_item_file = None
             if map_item_file is not None:
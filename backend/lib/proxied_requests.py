@@ -1,14 +1,16 @@
 from requests_futures.sessions import FuturesSession
 from concurrent.futures import ThreadPoolExecutor
 import threading
-from functools import wraps
+from functools import wraps, partial
 
+import itertools
+import heapq
 import time
 import urllib3
 import ural
 import requests
 
-from collections import namedtuple
+from collections import namedtuple, deque
 from asyncio import CancelledError as asyncioCancelledError
 from concurrent.futures import CancelledError as futureCancelledError
 
@@ -169,7 +171,7 @@ class SophisticatedFuturesProxy:
         their slot.
         """
         for hostname, metadata in self.hostnames.copy().items():
-            for request in metadata.running:
+            for request in metadata.running.copy():
                 if (
                     request.status == ProxyStatus.COOLING_OFF
                     and request.timestamp_finished < time.time() - self.COOLOFF
@@ -184,6 +186,25 @@ class SophisticatedFuturesProxy:
                     if len(self.hostnames[hostname].running) == 0:
                         del self.hostnames[hostname]
 
+    def has_free_slot(self):
+        """
+        Check if this proxy can start another request for any host name
+
+        :return bool:  `True` if the overall concurrency limit is not reached
+        """
+        self.release_cooled_off()
+        return sum([len(m.running) for m in self.hostnames.values()]) < self.MAX_CONCURRENT_OVERALL
+
+    def get_release_time(self):
+        """
+        Get the time at which the next slot will have cooled off
+
+        :return float|None:  Timestamp, or `None` if no slots are cooling off
+        """
+        release_times = [request.timestamp_finished + self.COOLOFF for metadata in self.hostnames.values()
+                         for request in metadata.running if request.status == ProxyStatus.COOLING_OFF]
+        return min(release_times) if release_times else None
+
     def claim_for(self, url):
         """
         Try claiming a slot in this proxy for the given URL
@@ -262,14 +283,134 @@ class SophisticatedFuturesProxy:
         raise ValueError(f"No proxy is currently running a request for URL {url}!")
 
 
+class ProxiedRequest:
+    """
+    A request made for a URL via a proxy
+
+    The `result` is the `requests` response once the request has finished, or
+    a `FailedProxiedRequest` if it did not finish successfully.
+    """
+
+    def __init__(self, request, proxy, url, index):
+        self.request = request
+        self.proxy = proxy
+        self.url = url
+        self.index = index
+        self.created = time.time()
+        self.result = None
+
+
+class QueuedUrl:
+    """
+    A URL in a DelegatedRequestHandler queue
+
+    `index` is the position of the URL in the order URLs were added to the
+    queue; results are returned in that order if the order is preserved.
+    """
+
+    def __init__(self, url, index, kwargs):
+        self.url = url
+        self.index = index
+        self.kwargs = kwargs
+        self.hostname = ural.get_hostname(url).lower()
+        self.status = DelegatedRequestHandler.REQUEST_STATUS_QUEUED
+        self.proxied = None
+
+
+class DelegatedRequestQueue:
+    """
+    The URLs in one of the queues of a DelegatedRequestHandler
+
+    URLs wait in `waiting` until a proxy is available to request them, are
+    then kept in `running` until their request finishes, and are then pushed
+    to the `ready` heap until their result is returned. The heap is keyed by
+    the URL's index, so results can be returned in the order the URLs were
+    added without looking at URLs that have not finished yet; `passed` keeps
+    track of URLs that left the queue out of that order.
+    """
+
+    def __init__(self):
+        self.waiting = deque()
+        self.running = {}
+        self.ready = []
+        self.passed = []
+        self.next_index = 0
+        self.next_result = 0
+
+    def __len__(self):
+        """
+        :return int:  Number of URLs in the queue, regardless of status
+        """
+        return len(self.waiting) + len(self.running) + len(self.ready)
+
+    def has_results(self, preserve_order=True):
+        """
+        Check if there are results that can be returned
+
+        :param bool preserve_order:  Only count results that can be returned
+        without skipping URLs that have not finished yet
+        :return bool:
+        """
+        self._skip_passed()
+        return bool(self.ready) and (not preserve_order or self.ready[0][0] == self.next_result)
+
+    def pop_results(self, preserve_order=True):
+        """
+        Take finished URLs from the queue
+
+        :param bool preserve_order:  Stop at the first URL, in the order they
+        were added, that has not finished yet
+        :return list:  `QueuedUrl`s with a finished request
+        """
+        results = []
+        while self.has_results(preserve_order):
+            index, queued_url = heapq.heappop(self.ready)
+            if index == self.next_result:
+                self.next_result += 1
+            else:
+                heapq.heappush(self.passed, index)
+
+            results.append(queued_url)
+
+        return results
+
+    def discard(self):
+        """
+        Remove all URLs that are not being requested
+
+        Their indexes are remembered, so that results for later URLs can still
+        be returned in order.
+        """
+        for queued_url in itertools.chain(self.waiting, (queued_url for index, queued_url in self.ready)):
+            heapq.heappush(self.passed, queued_url.index)
+
+        self.waiting.clear()
+        self.ready = []
+
+    def _skip_passed(self):
+        """
+        Move past URLs that have left the queue out of order
+
+        These are URLs that were discarded, or whose result was returned
+        without preserving the order.
+        """
+        while self.passed and self.passed[0] <= self.next_result:
+            if heapq.heappop(self.passed) == self.next_result:
+                self.next_result += 1
+
+
 class DelegatedRequestHandler:
-    queue = {}
+    """
+    Make requests for queued URLs in parallel, divided over proxies
+
+    Requests are started as soon as a proxy has a free slot for them, and each
+    finished request is handled by a callback, which moves its result to the
+    queue's results and starts requests for waiting URLs in the freed slot.
+    Consumers can block on `wait_for_results()` until results are available,
+    and then collect them with `get_results()`.
+    """
     session = None
-    proxy_pool = {}
-    proxy_settings = {}
-    halted = set()
     log = None
-    index = 0
 
     # some magic values
     REQUEST_STATUS_QUEUED = 0
@@ -277,12 +418,29 @@ class DelegatedRequestHandler:
     REQUEST_STATUS_WAITING_FOR_YIELD = 2
     PROXY_LOCALHOST = "__localhost__"
 
+    # `wait_for_results()` checks for results at least this often (seconds)
+    MAX_WAIT = 1
+
     def __init__(self, log, config):
-        pool = ThreadPoolExecutor()
-        self.session = FuturesSession(executor=pool)
         self.log = log
         self.lock = threading.RLock()
-        
+        self.results_available = threading.Condition(self.lock)
+
+        self.queue = {}
+        self.halted = set()
+        self.proxy_pool = {}
+        self.proxy_settings = {}
+
+        # requests run in this thread pool, which grows with the number of
+        # proxy slots (see `_update_session()`)
+        self.executor = None
+
+        # finished requests start new ones; this keeps them from doing so
+        # while requests are already being started
+        self.starting_requests = False
+        self.start_more_requests = False
+        self.next_queue = 0
+
         # Proxy health tracking
         self.proxy_health = {}
         self.proxy_warnings_logged = set()
@@ -355,6 +513,8 @@ class DelegatedRequestHandler:
             # Settings changed - update pool
             self._update_proxy_pool()
 
+        self._update_session()
+
 
     def add_urls(self, urls, queue_name="_", position=-1, **kwargs):
         """
@@ -362,7 +522,9 @@ class DelegatedRequestHandler:
 
         :param urls:  An iterable of URLs.
         :param queue_name:  Queue name to add to.
-        :param position:  Where in queue to insert; -1 adds to end of queue
+        :param position:  Where in queue to insert; -1 adds to end of queue.
+        This determines when the URL is requested; if results are returned in
+        order, they are still returned in the order the URLs were added.
         :param kwargs: Other keyword arguments will be passed on to
         `requests.get()`
         """
@@ -372,19 +534,12 @@ class DelegatedRequestHandler:
                 return
 
             if queue_name not in self.queue:
-                self.queue[queue_name] = []
+                self.queue[queue_name] = DelegatedRequestQueue()
 
+            queue = self.queue[queue_name]
             for i, url in enumerate(urls):
-                url_metadata = namedtuple(
-                    "UrlForDelegatedRequest", ("url", "args", "status", "proxied")
-                )
-                url_metadata.url = url
                 # Make a per-URL copy of kwargs to avoid shared mutation across entries
                 per_kwargs = {**kwargs} if kwargs else {}
-                url_metadata.index = self.index
-                url_metadata.proxied = None
-                url_metadata.status = self.REQUEST_STATUS_QUEUED
-                self.index += 1
 
                 # If a response hook is provided, wrap it to inject the original URL
                 try:
@@ -413,15 +568,15 @@ class DelegatedRequestHandler:
                     # If wrapping fails for any reason, proceed without modification
                     pass
 
-                # Assign the isolated kwargs to this metadata entry
-                url_metadata.kwargs = per_kwargs
+                queued_url = QueuedUrl(url, queue.next_index, per_kwargs)
+                queue.next_index += 1
 
                 if position == -1:
-                    self.queue[queue_name].append(url_metadata)
+                    queue.waiting.append(queued_url)
                 else:
-                    self.queue[queue_name].insert(position + i, url_metadata)
+                    queue.waiting.insert(position + i, queued_url)
 
-        self.manage_requests()
+            self.manage_requests()
 
     @synchronized_method
     def get_queue_length(self, queue_name="_"):
@@ -434,10 +589,45 @@ class DelegatedRequestHandler:
         queue_length = 0
         for queue in list(self.queue.keys()):
             if queue == queue_name or queue_name == "_":
-                queue_length += len(self.queue.get(queue, []))
+                queue_length += len(self.queue[queue])
 
         return queue_length
 
+    @synchronized_method
+    def get_capacity(self):
+        """
+        Get the number of requests that can run at the same time
+
+        This is the sum of the overall concurrency limits of the proxies in
+        the pool, and can be used to decide how many URLs to queue at a time.
+
+        :return int:
+        """
+        return sum([self.proxy_pool[proxy_url].proxy.MAX_CONCURRENT_OVERALL for proxy_url in self.proxy_pool
+                    if proxy_url not in self.proxies_pending_removal])
+
+    @synchronized_method
+    def _update_session(self):
+        """
+        Make sure there are enough threads to run requests in
+
+        Requests are run in a thread pool; if it has fewer threads than there
+        are proxy slots, requests would wait for a thread rather than a proxy.
+        If more are needed, a new, larger pool is created; requests that are
+        running in the old one finish there.
+        """
+        # 32 is the most threads a ThreadPoolExecutor uses by default
+        max_workers = max(32, self.get_capacity())
+        if self.executor and self.executor._max_workers >= max_workers:
+            return
+
+        previous_executor = self.executor
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.session = FuturesSession(executor=self.executor)
+
+        if previous_executor:
+            previous_executor.shutdown(wait=False)
+
     @synchronized_method
     def _update_proxy_pool(self):
         """
@@ -594,190 +784,310 @@ class DelegatedRequestHandler:
     @synchronized_method
     def manage_requests(self):
         """
-        Manage requests asynchronously
+        Start requests for queued URLs, as far as proxies are available
 
-        First, make sure proxy status is up to date; then go through the list
-        of queued URLs and see if they have been requested, and release the
-        proxy accordingly. If the URL is not being requested, and a proxy is
-        available, start the request.
+        This is called whenever URLs are added and whenever a request
+        finishes, so requests are started as soon as a proxy slot frees up.
+        Queues take turns to start requests first, so one queue cannot keep
+        all proxies to itself.
 
         Note that this method does *not* return any requested data. This is
-        done in a separate function, which calls this one before returning any
-        finished requests in the original queue order (`get_results()`).
+        done in a separate function (`get_results()`).
         """
-        # go through queue and look at the status of each URL
-        for queue_name in list(self.queue.keys()):
-            if queue_name not in self.queue:
+        if self.starting_requests:
+            # called from the callback of a request that finished while
+            # starting requests; start more when that is done
+            self.start_more_requests = True
+            return
+
+        self.starting_requests = True
+        try:
+            self.start_more_requests = True
+            while self.start_more_requests:
+                self.start_more_requests = False
+                queue_names = list(self.queue.keys())
+                if not queue_names or "_" in self.halted:
+                    break
+
+                self.next_queue = (self.next_queue + 1) % len(queue_names)
+                for queue_name in queue_names[self.next_queue:] + queue_names[:self.next_queue]:
+                    if queue_name in self.halted:
+                        continue
+
+                    if not self._start_requests(queue_name):
+                        # no proxy has a free slot
+                        break
+        finally:
+            self.starting_requests = False
+
+    def _start_requests(self, queue_name):
+        """
+        Start requests for waiting URLs in a queue
+
+        URLs are started in queue order, skipping URLs for host names that no
+        proxy has a free slot for.
+
+        :param str queue_name:  Queue to start requests for
+        :return bool:  `False` if no proxy has a free slot left, `True` if it
+        may be worth trying to start requests for other queues
+        """
+        queue = self.queue[queue_name]
+        skipped = deque()
+        busy_hostnames = set()
+        have_slots = True
+
+        while queue.waiting:
+            if not self._has_free_slot():
+                have_slots = False
+                break
+
+            queued_url = queue.waiting.popleft()
+            if queued_url.hostname in busy_hostnames:
+                skipped.append(queued_url)
                 continue
 
-            for i, url_metadata in enumerate(self.queue[queue_name]):
-                url = url_metadata.url
-
-                if url_metadata.status == self.REQUEST_STATUS_WAITING_FOR_YIELD:
-                    # waiting to be flushed or passed by `get_result()`
-                    continue
-
-                if url_metadata.proxied and url_metadata.proxied.request.done():
-                    # collect result and buffer it for yielding
-                    # done() here doesn't necessarily mean the request finished
-                    # successfully, just that it has returned - a timed out
-                    # request will also be done()!
-                    self.log.debug(f"Request for {url} finished, collecting result")
-                    url_metadata.proxied.proxy.mark_request_finished(url)
-                    
-                    # Clean up proxies pending removal if they have no more active requests
-                    proxy_url = url_metadata.proxied.proxy.proxy_url
-                    if proxy_url in self.proxies_pending_removal and proxy_url in self.proxy_pool:
-                        proxy_obj = self.proxy_pool[proxy_url].proxy
-                        # Check if proxy has truly active requests (not just cooling off)
-                        if not proxy_obj.has_active_requests():
-                            del self.proxy_pool[proxy_url]
-                            if proxy_url in self.proxy_health:
-                                del self.proxy_health[proxy_url]
-                            self.proxies_pending_removal.discard(proxy_url)
-                            self.log.info(f"Removed proxy {proxy_url} (completed all active requests)")
-                    try:
-                        response = url_metadata.proxied.request.result()
-                        # annotate the response so processors can see which
-                        # proxy (if any) handled the request
-                        setattr(
-                            response,
-                            "_4cat_proxy",
-                            url_metadata.proxied.proxy.proxy_url,
-                        )
-                        url_metadata.proxied.result = response
-
-                    except requests.exceptions.ProxyError as e:
-                        # Proxy connection issue - validate proxy with health probe first
-                        proxy_url = url_metadata.proxied.proxy.proxy_url
-
-                        probe_succeeded = url_metadata.proxied.proxy.probe()
-                        if probe_succeeded:
-                            self.log.debug(
-                                f"Proxy {proxy_url} returned a proxy error for {url}, "
-                                f"but health probe to {url_metadata.proxied.proxy.healthcheck_url} succeeded; "
-                                f"passing original error back to requester"
-                            )
-                            url_metadata.proxied.result = FailedProxiedRequest(
-                                e, proxy_url
-                            )
-                        else:
-                            self.proxy_health[proxy_url] = False
-
-                            if proxy_url not in self.proxy_warnings_logged:
-                                self.proxy_warnings_logged.add(proxy_url)
-                                self.log.warning(
-                                    f"Proxy {proxy_url} marked as unhealthy due to connection failure and failed health probe "
-                                    f"({url_metadata.proxied.proxy.healthcheck_url}): {str(e)}"
-                                )
-
-                            # Retry with a different proxy
-                            url_metadata.status = self.REQUEST_STATUS_QUEUED
-                            url_metadata.proxied = None
-                    
-                    except (
-                        ConnectionError,
-                        asyncioCancelledError,
-                        futureCancelledError,
-                        requests.exceptions.RequestException,
-                        urllib3.exceptions.HTTPError,
-                    ) as e:
-                        # this is where timeouts, etc, go
-                        url_metadata.proxied.result = FailedProxiedRequest(
-                            e, url_metadata.proxied.proxy.proxy_url
-                        )
-
-                    finally:
-                        # success or fail, we can pass it on
-                        # Only set to waiting if not requeued by ProxyError handler
-                        if url_metadata.status != self.REQUEST_STATUS_QUEUED:
-                            url_metadata.status = self.REQUEST_STATUS_WAITING_FOR_YIELD
+            try:
+                proxy = self.claim_proxy(queued_url.url)
+            except NoProxiesAvailableError as e:
+                # All proxies failed and fallback disabled - fail this request
+                queued_url.proxied = ProxiedRequest(None, None, queued_url.url, queued_url.index)
+                queued_url.proxied.result = FailedProxiedRequest(e, None)
+                queued_url.status = self.REQUEST_STATUS_WAITING_FOR_YIELD
+                heapq.heappush(queue.ready, (queued_url.index, queued_url))
+                self.results_available.notify_all()
+                continue
 
-                else:
-                    # running - ignore for now
-                    # could do some health checks here...
-                    # logging.debug(f"Request for {url} running...")
-                    pass
+            if proxy is None:
+                # No proxy available for this host name; try again when a
+                # request finishes or a proxy has cooled off
+                busy_hostnames.add(queued_url.hostname)
+                skipped.append(queued_url)
+                continue
 
-                if not url_metadata.proxied and not (
-                    queue_name in self.halted or "_" in self.halted
-                ):
-                    # no request running for this URL yet, try to start one
-                    try:
-                        proxy = self.claim_proxy(url)
-                    except NoProxiesAvailableError as e:
-                        # All proxies failed and fallback disabled - fail this request
-                        url_metadata.proxied = namedtuple(
-                            "DelegatedRequest",
-                            ("request", "created", "result", "proxy", "url", "index"),
-                        )
-                        url_metadata.proxied.request = None
-                        url_metadata.proxied.created = time.time()
-                        url_metadata.proxied.result = FailedProxiedRequest(e, None)
-                        url_metadata.proxied.proxy = None
-                        url_metadata.proxied.url = url
-                        url_metadata.proxied.index = url_metadata.index
-                        url_metadata.status = self.REQUEST_STATUS_WAITING_FOR_YIELD
-                        self.queue[queue_name][i] = url_metadata
-                        continue
-                    
-                    if proxy is None:
-                        # No proxy available (all busy)
-                        # Try again next loop iteration
-                        continue
+            self._start_request(queue_name, queued_url, proxy)
 
-                    proxy_url = proxy.proxy_url
-                    proxy_definition = (
-                        {"http": proxy_url, "https": proxy_url}
-                        if proxy_url != self.PROXY_LOCALHOST
-                        else None
-                    )
+        # put back skipped URLs, in their original order
+        skipped.extend(queue.waiting)
+        queue.waiting = skipped
 
-                    # start request for URL
-                    self.log.debug(f"Request for {url} started")
-                    request = namedtuple(
-                        "DelegatedRequest",
-                        (
-                            "request",
-                            "created",
-                            "result",
-                            "proxy",
-                            "url",
-                            "index",
-                        ),
-                    )
-                    request.created = time.time()
-                    request.request = self.session.get(
-                        **{
-                            "url": url,
-                            "timeout": 30,
-                            "proxies": proxy_definition,
-                            **url_metadata.kwargs
-                        }
+        return have_slots
+
+    def _has_free_slot(self):
+        """
+        Check if any usable proxy can start another request
+
+        :return bool:  Also `True` if no proxies are usable, so that claiming
+        one falls back to localhost or fails, as configured
+        """
+        usable_proxies = [self.proxy_pool[proxy_url].proxy for proxy_url in self.proxy_pool
+                          if self.proxy_health.get(proxy_url, True) and proxy_url not in self.proxies_pending_removal]
+
+        return not usable_proxies or any([proxy.has_free_slot() for proxy in usable_proxies])
+
+    def _start_request(self, queue_name, queued_url, proxy):
+        """
+        Start the request for a URL with a claimed proxy
+
+        :param str queue_name:  Queue the URL is in
+        :param QueuedUrl queued_url:  URL to request
+        :param SophisticatedFuturesProxy proxy:  Proxy claimed for the URL
+        """
+        url = queued_url.url
+        proxy_url = proxy.proxy_url
+        proxy_definition = (
+            {"http": proxy_url, "https": proxy_url}
+            if proxy_url != self.PROXY_LOCALHOST
+            else None
+        )
+
+        # start request for URL
+        self.log.debug(f"Request for {url} started")
+        request = self.session.get(
+            **{
+                "url": url,
+                "timeout": 30,
+                "proxies": proxy_definition,
+                **queued_url.kwargs
+            }
+        )
+
+        # the index allows for multiple requests for the same URL
+        queued_url.proxied = ProxiedRequest(request, proxy, url, queued_url.index)
+        queued_url.status = self.REQUEST_STATUS_STARTED
+        self.queue[queue_name].running[queued_url.index] = queued_url
+        proxy.mark_request_started(url)
+
+        request.add_done_callback(partial(self._request_finished, queue_name, queued_url))
+
+    def _request_finished(self, queue_name, queued_url, request):
+        """
+        Handle a finished request
+
+        Called in the thread that ran the request (or the thread that
+        cancelled it). Releases the proxy, stores the result for the URL, and
+        starts requests for waiting URLs.
+
+        :param str queue_name:  Queue the URL is in
+        :param QueuedUrl queued_url:  URL that was requested
+        :param Future request:  The finished request
+        """
+        url = queued_url.url
+        proxy = queued_url.proxied.proxy
+        proxy_url = proxy.proxy_url
+        retry = False
+
+        # finished doesn't necessarily mean the request finished successfully,
+        # just that it has returned - a timed out request will also be done!
+        # this is handled before locking, since probing a proxy takes a while
+        try:
+            result = request.result()
+            # annotate the response so processors can see which proxy (if
+            # any) handled the request
+            setattr(result, "_4cat_proxy", proxy_url)
+
+        except requests.exceptions.ProxyError as e:
+            # Proxy connection issue - validate proxy with health probe first
+            if proxy.probe():
+                self.log.debug(
+                    f"Proxy {proxy_url} returned a proxy error for {url}, "
+                    f"but health probe to {proxy.healthcheck_url} succeeded; "
+                    f"passing original error back to requester"
+                )
+                result = FailedProxiedRequest(e, proxy_url)
+            else:
+                result = e
+                retry = True
+
+        except (
+            ConnectionError,
+            asyncioCancelledError,
+            futureCancelledError,
+            requests.exceptions.RequestException,
+            urllib3.exceptions.HTTPError,
+        ) as e:
+            # this is where timeouts, etc, go
+            result = FailedProxiedRequest(e, proxy_url)
+
+        except Exception as e:
+            # e.g. an exception in a response hook; pass it on rather than
+            # losing track of the request
+            self.log.warning(f"Request for {url} via proxy {proxy_url} raised {e.__class__.__name__}: {e}")
+            result = FailedProxiedRequest(e, proxy_url)
+
+        with self.lock:
+            self.log.debug(f"Request for {url} finished, collecting result")
+            proxy.mark_request_finished(url)
+
+            # Clean up proxies pending removal if they have no more active requests
+            if proxy_url in self.proxies_pending_removal and proxy_url in self.proxy_pool:
+                # Check if proxy has truly active requests (not just cooling off)
+                if not proxy.has_active_requests():
+                    del self.proxy_pool[proxy_url]
+                    if proxy_url in self.proxy_health:
+                        del self.proxy_health[proxy_url]
+                    self.proxies_pending_removal.discard(proxy_url)
+                    self.log.info(f"Removed proxy {proxy_url} (completed all active requests)")
+
+            queue = self.queue.get(queue_name)
+            if queue is not None:
+                queue.running.pop(queued_url.index, None)
+
+            if retry:
+                self.proxy_health[proxy_url] = False
+                if proxy_url not in self.proxy_warnings_logged:
+                    self.proxy_warnings_logged.add(proxy_url)
+                    self.log.warning(
+                        f"Proxy {proxy_url} marked as unhealthy due to connection failure and failed health probe "
+                        f"({proxy.healthcheck_url}): {str(result)}"
                     )
 
-                    request.proxy = proxy
-                    request.url = url
-                    request.index = (
-                        url_metadata.index
-                    )  # this is to allow for multiple requests for the same URL
+                # Retry with a different proxy, unless the queue is gone
+                queued_url.status = self.REQUEST_STATUS_QUEUED
+                queued_url.proxied = None
+                if queue is not None and not (queue_name in self.halted or "_" in self.halted):
+                    queue.waiting.appendleft(queued_url)
+
+            else:
+                # success or fail, we can pass it on
+                queued_url.proxied.result = result
+                queued_url.status = self.REQUEST_STATUS_WAITING_FOR_YIELD
+                if queue is not None:
+                    heapq.heappush(queue.ready, (queued_url.index, queued_url))
+
+            self.manage_requests()
+            self.results_available.notify_all()
+
+    def wait_for_results(self, queue_name="_", preserve_order=True, timeout=None):
+        """
+        Wait until results are available
+
+        Blocks until `get_results()` has results to return for the queue, the
+        queue is empty, or the timeout has passed. While waiting, requests are
+        started for waiting URLs whenever a proxy has cooled off.
+
+        :param str queue_name:  Queue name to wait for results for
+        :param bool preserve_order:  Only count results that can be returned
+        in order (see `get_results()`)
+        :param float timeout:  Time to wait at most, in seconds; defaults to
+        `MAX_WAIT`
+        :return bool:  Whether results are available
+        """
+        deadline = time.time() + (timeout if timeout is not None else self.MAX_WAIT)
+
+        with self.results_available:
+            while True:
+                queue = self.queue.get(queue_name)
+                if queue is None or not len(queue):
+                    return False
+
+                if queue.has_results(preserve_order):
+                    return True
+
+                now = time.time()
+                if now >= deadline:
+                    return False
+
+                wait = deadline - now
+                release_time = self._get_release_time()
+                if release_time is not None:
+                    wait = min(wait, max(0, release_time - now))
 
-                    url_metadata.status = self.REQUEST_STATUS_STARTED
-                    url_metadata.proxied = request
+                self.results_available.wait(wait)
+                self.manage_requests()
 
-                    proxy.mark_request_started(url)
+    def _get_release_time(self):
+        """
+        Get the time at which the next proxy slot will have cooled off
+
+        Only relevant if URLs are waiting for a slot, since finished requests
+        start new ones by themselves.
+
+        :return float|None:  Timestamp, or `None` if there is no need to wait
+        for a slot to cool off
+        """
+        if not any([queue.waiting for queue in self.queue.values()]):
+            return None
+
+        release_times = []
+        for proxy_entry in self.proxy_pool.values():
+            proxy_entry.proxy.release_cooled_off()
+            release_time = proxy_entry.proxy.get_release_time()
+            if release_time is not None:
+                release_times.append(release_time)
 
-                self.queue[queue_name][i] = url_metadata
+        return min(release_times) if release_times else None
 
     def get_results(self, queue_name="_", preserve_order=True):
         """
         Return available results, without skipping
 
-        Loops through the queue, returning values (and updating the queue) for
-        requests that have been finished. If a request is not finished yet,
-        stop returning. This ensures that in the end, values are only ever
-        returned in the original queue order, at the cost of potential
-        buffering.
+        Returns values (and updates the queue) for requests that have been
+        finished. If results are returned in order and a request is not
+        finished yet, stop returning. This ensures that in the end, values are
+        only ever returned in the original queue order, at the cost of
+        potential buffering.
+
+        Use `wait_for_results()` to wait until there are results to return.
 
         :param str queue_name:  Queue name to get results from
         :param bool preserve_order:  Return results in the order they were
@@ -788,29 +1098,22 @@ class DelegatedRequestHandler:
         requests are already finished, the queue will nevertheless remain
         'full'.
 
-        :return:
+        :return:  A generator yielding tuples of a URL and a `requests`
+        response or `FailedProxiedRequest`
         """
-        self.manage_requests()
-
         with self.lock:
+            self.manage_requests()
+
             # no results, no return
             if queue_name not in self.queue:
                 return
 
-            # use list comprehensions here to avoid having to modify the
-            # lists while iterating through them
-            for url_metadata in [u for u in self.queue[queue_name]]:
-                # for each URL in the queue...
-                if url_metadata.status == self.REQUEST_STATUS_WAITING_FOR_YIELD:
-                    # see if a finished request is available...
-                    self.queue[queue_name].remove(url_metadata)
-                    yield url_metadata.url, url_metadata.proxied.result
-
-                elif preserve_order:
-                    # ...but as soon as a URL has no finished result, return
-                    # unless we don't care about the order, then continue and yield
-                    # as much as possible
-                    return
+            results = self.queue[queue_name].pop_results(preserve_order)
+
+        # yield without holding the lock, so requests can finish (and new
+        # ones start) while the results are being processed
+        for queued_url in results:
+            yield queued_url.url, queued_url.proxied.result
 
     @synchronized_method
     def _halt(self, queue_name="_"):
@@ -832,13 +1135,9 @@ class DelegatedRequestHandler:
 
         for queue in list(self.queue.keys()):
             if queue_name == "_" or queue_name == queue:
-                # use a list comprehension here to avoid having to modify the
-                # list while iterating through it
-                for url_metadata in [u for u in self.queue.get(queue, [])]:
-                    if url_metadata.status != self.REQUEST_STATUS_STARTED:
-                        self.queue[queue].remove(url_metadata)
-                    else:
-                        url_metadata.proxied.request.cancel()
+                self.queue[queue].discard()
+                for queued_url in list(self.queue[queue].running.values()):
+                    queued_url.proxied.request.cancel()
 
         self.halted.remove(queue_name)
 
@@ -854,8 +1153,13 @@ class DelegatedRequestHandler:
         self._halt(queue_name)
         while self.get_queue_length(queue_name) > 0:
             # exhaust generator without doing something w/ results
-            all(self.get_results(queue_name, preserve_order=False))
+            for queue in list(self.queue.keys()):
+                if queue_name == "_" or queue_name == queue:
+                    self.wait_for_results(queue, preserve_order=False)
+                    all(self.get_results(queue, preserve_order=False))
 
         with self.lock:
             if queue_name in self.queue:
                 del self.queue[queue_name]
+            elif queue_name == "_":
+                self.queue.clear()
@@ -2,6 +2,8 @@
 Basic scraper worker - should be inherited by workers to scrape specific types of content
 """
 import collections
+import traceback
+import threading
 import requests
 import random
 import json
@@ -9,6 +11,65 @@ import abc
 
 from pathlib import Path
 from backend.lib.worker import BasicWorker
+from backend.lib.proxied_requests import FailedProxiedRequest
+from common.lib.exceptions import JobClaimedException, WorkerInterruptedException
+
+class ScrapeStateCache:
+	"""
+	Bounded, thread-safe store for state kept between scrapes
+
+	Scraper workers are instantiated anew for every job, but run as threads
+	of the same process, so state that should survive from one scrape of a
+	resource to the next can be kept in a (class-level) instance of this. The
+	least recently used items are dropped once the cache is full.
+	"""
+	def __init__(self, max_size):
+		"""
+		Constructor
+
+		:param int max_size:  Maximum number of items to keep
+		"""
+		self.max_size = max_size
+		self.items = collections.OrderedDict()
+		self.lock = threading.Lock()
+
+	def get(self, key, default=None):
+		"""
+		Get a cached item
+
+		:param key:  Item key
+		:param default:  Value to return if there is no such item
+		:return:  Cached item, or `default`
+		"""
+		with self.lock:
+			if key not in self.items:
+				return default
+
+			self.items.move_to_end(key)
+			return self.items[key]
+
+	def set(self, key, value):
+		"""
+		Store an item, dropping the least recently used item if needed
+
+		:param key:  Item key
+		:param value:  Item to store
+		"""
+		with self.lock:
+			self.items[key] = value
+			self.items.move_to_end(key)
+			while len(self.items) > self.max_size:
+				self.items.popitem(last=False)
+
+	def delete(self, key):
+		"""
+		Remove an item, if it is cached
+
+		:param key:  Item key
+		"""
+		with self.lock:
+			self.items.pop(key, None)
+
 
 class BasicHTTPScraper(BasicWorker, metaclass=abc.ABCMeta):
 	"""
@@ -17,12 +78,24 @@ class BasicHTTPScraper(BasicWorker, metaclass=abc.ABCMeta):
 	The job queue is continually checked for jobs of this scraper's type. If any are found,
 	the URL for that job is scraped and the result is parsed as JSON. The parsed JSON is
 	then passed to a processor method for further handling.
+
+	The `ETag` and `Last-Modified` headers of processed responses are
+	remembered per URL, and sent back with the next request for that URL; if
+	the server then indicates the resource has not been modified, it is not
+	parsed or processed again.
 	"""
 
 	log_level = "warning"
 	_logger_method = None
 	category = "Collector"
 
+	#: Validators (ETag and Last-Modified headers) of the last processed
+	#: response for each URL, shared by all scrapers in the process
+	validators = ScrapeStateCache(max_size=50000)
+
+	#: Maximum number of queued jobs of this type to scrape at once
+	batch_size = 1
+
 	def __init__(self, job, logger=None, manager=None, modules=None):
 		"""
 		Set up database connection - we need one to store the thread data
@@ -50,10 +123,13 @@ class BasicHTTPScraper(BasicWorker, metaclass=abc.ABCMeta):
 		local file or from a URL. The job is then either finished or released
 		depending on whether that was successful, and the data is processed
 		further if available.
+
+		If the scraper has a `batch_size` larger than 1, other queued jobs of
+		the same type are claimed and scraped along with this one; see
+		`scrape_batch()`.
 		"""
 		if "file" in self.job.details:
 			# if the file is available locally, use that file
-			id = self.job.details["file"]
 			local_path = Path(self.job.details["file"])
 			if not local_path.exists():
 				self.job.finish()
@@ -67,36 +143,190 @@ class BasicHTTPScraper(BasicWorker, metaclass=abc.ABCMeta):
 				}
 
 				data = collections.namedtuple("object", datafields.keys())(*datafields.values())
-		else:
-			# if not, see what URL we need to request data from
-			url = self.get_url()
+
+			self.handle_response(data)
+			return
+
+		batch = self.claim_batch()
+		if batch:
+			self.scrape_batch([self.job, *batch])
+			return
+
+		# if not, see what URL we need to request data from
+		url = self.get_url()
+		try:
+			# do the request!
+			data = requests.get(url, timeout=self.config.get('SCRAPE_TIMEOUT', 60), proxies=self.get_scrape_proxies(url), headers=self.get_request_headers(url))
+		except (requests.exceptions.RequestException, ConnectionRefusedError) as e:
+			self.request_failed(url, e)
+			return
+
+		self.handle_response(data, url)
+
+	def claim_batch(self):
+		"""
+		Claim other queued jobs to scrape along with the current one
+
+		Batches are requested via the worker manager's proxy delegator, which
+		does not know about `SCRAPE_PROXIES`. If a proxy is configured there
+		for the current job's URL, no batch is claimed, so that each job is
+		requested on its own, through that proxy.
+
+		:return list:  Claimed jobs, if any
+		"""
+		if self.batch_size <= 1 or not self.manager or not self.manager.proxy_delegator:
+			return []
+
+		if self.get_scrape_proxies(self.get_url()):
+			return []
+
+		batch = []
+		for job in self.queue.get_all_jobs(jobtype=self.type, queue_id=self.job.data["queue_id"], limit=self.batch_size - 1):
+			if "file" in job.details:
+				continue
+
 			try:
-				# see if any proxies were configured that would work for this URL
-				protocol = url.split(":")[0]
-				if protocol in self.config.get('SCRAPE_PROXIES', []) and self.config.get('SCRAPE_PROXIES')[protocol]:
-					proxies = {protocol: random.choice(self.config.get('SCRAPE_PROXIES')[protocol])}
-				else:
-					proxies = None
+				job.claim()
+				batch.append(job)
+			except JobClaimedException:
+				# another worker got there first
+				pass
 
-				# do the request!
-				data = requests.get(url, timeout=self.config.get('SCRAPE_TIMEOUT', 60), proxies=proxies, headers={"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_4) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/12.1 Safari/605.1.15"})
-			except (requests.exceptions.RequestException, ConnectionRefusedError) as e:
-				if self.job.data["attempts"] > 2:
-					self.job.finish()
-					self.log.error("Could not finish request for %s (%s), cancelling job" % (url, e))
-				else:
-					self.job.release(delay=random.randint(45,60))
-					self.log.info("Could not finish request for %s (%s), releasing job" % (url, e))
-				return
+		return batch
+
+	def scrape_batch(self, jobs):
+		"""
+		Scrape the URLs for a number of jobs at once
+
+		Requests are made in parallel via the worker manager's
+		`DelegatedRequestHandler`, which limits the number of concurrent
+		requests per host (and proxy, if configured) according to the proxy
+		settings. Each response is then handled as it comes in, exactly as for
+		a single job, with `self.job` set to the job the response is for.
+
+		:param list jobs:  Claimed jobs to scrape, including the current job
+		"""
+		delegator = self.manager.proxy_delegator
+		delegator.refresh_settings(self.config)
+		queue_name = "%s-%s" % (self.type, self.job.data["id"])
+		current_job = self.job
+
+		pending = {}
+		for job in jobs:
+			self.job = job
+			url = self.get_url()
+			if url in pending:
+				# same resource as another job; nothing more to do
+				job.finish()
+				continue
+
+			pending[url] = job
+			delegator.add_urls([url], queue_name, timeout=self.config.get('SCRAPE_TIMEOUT', 60), headers=self.get_request_headers(url))
+
+		try:
+			while delegator.get_queue_length(queue_name) > 0:
+				if self.interrupted:
+					raise WorkerInterruptedException("Interrupted while scraping %s" % self.type)
+
+				delegator.wait_for_results(queue_name, preserve_order=False)
+				for url, response in delegator.get_results(queue_name, preserve_order=False):
+					self.job = pending.pop(url)
+					try:
+						if isinstance(response, FailedProxiedRequest):
+							self.request_failed(url, response.context)
+						else:
+							self.handle_response(response, url)
+					except Exception as e:
+						# one bad response should not take the rest of the
+						# batch down with it
+						stack = traceback.extract_tb(e.__traceback__)
+						location = "->".join([frame.filename.split("/").pop() + ":" + str(frame.lineno) for frame in stack])
+						self.log.error("Scraper %s raised exception %s for %s and will skip it: %s at %s" % (self.type, e.__class__.__name__, url, str(e), location), frame=stack)
+						self.mark_job_after_crash()
+		finally:
+			delegator.halt_and_wait(queue_name)
+			for job in pending.values():
+				if job is not current_job:
+					job.release(increment_attempts=False)
+
+			self.job = current_job
+
+	def get_scrape_proxies(self, url):
+		"""
+		Get the proxy to request a URL through, if any
+
+		Proxies are configured per protocol in the `SCRAPE_PROXIES` setting;
+		if there are several for a protocol, one is picked at random.
+
+		:param str url:  URL to request
+		:return dict|None:  Proxies to pass to `requests`, or `None` if no
+		proxy is configured for the URL's protocol
+		"""
+		protocol = url.split(":")[0]
+		scrape_proxies = self.config.get('SCRAPE_PROXIES') or {}
+		if scrape_proxies.get(protocol):
+			return {protocol: random.choice(scrape_proxies[protocol])}
+
+		return None
+
+	def get_request_headers(self, url):
+		"""
+		Get headers to send with the request for a URL
 
-			if "board" in self.job.details:
-				id = self.job.details["board"] + "/" + self.job.data["remote_id"]
-			else:
-				id = self.job.data["remote_id"]
+		If the URL was processed before, the validators of that response are
+		included, so that the server only sends data if it has changed since.
 
-		if data.status_code == 404 or data.status_code == 403:
+		:param str url:  URL to request
+		:return dict:  Headers
+		"""
+		headers = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_4) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/12.1 Safari/605.1.15"}
+		validators = self.validators.get(url, {})
+		if validators.get("etag"):
+			headers["If-None-Match"] = validators["etag"]
+		if validators.get("last_modified"):
+			headers["If-Modified-Since"] = validators["last_modified"]
+
+		return headers
+
+	def request_failed(self, url, error):
+		"""
+		Release or cancel the job after the request for it failed
+
+		:param str url:  URL that was requested
+		:param error:  Exception, or other reason the request failed
+		"""
+		if self.job.data["attempts"] > 2:
+			self.job.finish()
+			self.log.error("Could not finish request for %s (%s), cancelling job" % (url, error))
+		else:
+			self.job.release(delay=random.randint(45,60))
+			self.log.info("Could not finish request for %s (%s), releasing job" % (url, error))
+
+	def handle_response(self, data, url=None):
+		"""
+		Handle the response for the current job
+
+		:param data:  Response object, with at least a `status_code` and
+		`content`, and `headers` if a `url` is given
+		:param str url:  URL that was requested; `None` if the data was read
+		from a local file
+		"""
+		if "board" in self.job.details:
+			id = self.job.details["board"] + "/" + self.job.data["remote_id"]
+		else:
+			id = self.job.data["remote_id"]
+
+		if url is None:
+			id = self.job.details["file"]
+
+		if data.status_code == 304:
+			# nothing changed since the last time we processed this
+			self.not_modified()
+		elif data.status_code == 404 or data.status_code == 403:
 			# this should be handled differently from an actually erroneous response
 			# because it may indicate that the resource has been deleted
+			if url:
+				self.validators.delete(url)
 			self.not_found()
 		else:
 			parsed_data = self.parse(data.content)
@@ -111,7 +341,16 @@ class BasicHTTPScraper(BasicWorker, metaclass=abc.ABCMeta):
 				return
 
 			# finally, pass it on
-			self.process(parsed_data)
+			result = self.process(parsed_data)
+
+			# remember validators only once the data has been processed
+			# successfully, since we will not see the same data again
+			if url:
+				if result is not False and (data.headers.get("ETag") or data.headers.get("Last-Modified")):
+					self.validators.set(url, {"etag": data.headers.get("ETag"), "last_modified": data.headers.get("Last-Modified")})
+				else:
+					self.validators.delete(url)
+
 			self.after_process()
 
 	def after_process(self):
@@ -120,6 +359,14 @@ class BasicHTTPScraper(BasicWorker, metaclass=abc.ABCMeta):
 		"""
 		self.job.finish()
 
+	def not_modified(self):
+		"""
+		Called if the resource has not changed since it was last processed,
+		i.e. the request returned a 304 response. Nothing needs to be done.
+		"""
+		self.log.debug("%s for %s not modified since last scrape" % (self.type, self.job.data["remote_id"]))
+		self.after_process()
+
 	def not_found(self):
 		"""
 		Called if the job could not be completed because the request returned
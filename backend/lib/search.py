@@ -1,3 +1,7 @@
+import concurrent.futures
+import multiprocessing
+import collections
+import itertools
 import hashlib
 import zipfile
 import secrets
@@ -15,6 +19,75 @@ from common.lib.helpers import strip_tags, dict_search_and_update, remove_nuls,
 from common.lib.exceptions import WorkerInterruptedException, ProcessorInterruptedException, MapItemException
 
 
+def import_lines(search_class, lines, first_line, check_map_item):
+	"""
+	Parse, format and validate a number of lines from an imported NDJSON file
+
+	This is a module-level function so it can be run in a separate process
+	(see `Search.import_from_file()`). It does not use the database or any
+	other shared resources; its results are passed back to the search worker,
+	which handles logging.
+
+	:param search_class:  Class of the search worker importing the file
+	:param list lines:  Lines to import
+	:param int first_line:  Number of the first line in the file (zero-based)
+	:param bool check_map_item:  Whether to check if items can be mapped
+	:return tuple:  A list of imported items, a dictionary with the number of
+	items per warning, the number of items with a mapping warning, and a list
+	of `(line number, error message)` tuples for items that could not be
+	mapped
+	"""
+	items = []
+	warnings = {}
+	num_warned_items = 0
+	errors = []
+
+	for i, line in enumerate(lines, start=first_line):
+		try:
+			# remove NUL bytes here because they trip up a lot of other
+			# things
+			# also include import metadata in item
+			item = json.loads(line.replace("\0", ""))
+		except json.JSONDecodeError:
+			warning = (f"An item on line {i:,} of the imported file could not be parsed as JSON - this may "
+					   f"indicate that the file you uploaded was incomplete and you need to try uploading it "
+					   f"again. The item will be ignored.")
+
+			if warning not in warnings:
+				warnings[warning] = 0
+			warnings[warning] += 1
+			continue
+
+		new_item = format_import_item(item)
+
+		# Check map item here!
+		if check_map_item:
+			try:
+				mapped_item = search_class.get_mapped_item(new_item)
+
+				# keep track of items that raised a warning
+				# this means the item could be mapped, but there is
+				# some information the user should take note of
+				warning = mapped_item.get_message()
+				if not warning and mapped_item.get_missing_fields():
+					# usually this would have an explicit warning, but
+					# if not it's still useful to know
+					warning = f"The following fields are missing for this item and will be replaced with a default value: {', '.join(mapped_item.get_missing_fields())}"
+
+				if warning:
+					if warning not in warnings:
+						warnings[warning] = 0
+					warnings[warning] += 1
+					num_warned_items += 1
+
+			except MapItemException as e:
+				errors.append((i, str(e)))
+
+		items.append(new_item)
+
+	return items, warnings, num_warned_items, errors
+
+
 class Search(BasicProcessor, ABC):
 	"""
 	Process search queries from the front-end
@@ -50,6 +123,13 @@ class Search(BasicProcessor, ABC):
 	import_error_count = 0
 	import_warning_count = 0
 
+	#: Lines of an imported file that are parsed and validated at a time
+	import_chunk_size = 500
+
+	#: Files smaller than this (in bytes) are always imported in a single
+	#: process, since starting more processes would take longer than it saves
+	parallel_import_threshold = 16 * 1024 * 1024
+
 	def process(self):
 		"""
 		Create 4CAT dataset from a data source
@@ -147,6 +227,11 @@ class Search(BasicProcessor, ABC):
 		redefined in descending classes to account for nuances in incoming data
 		for a given data source.
 
+		Lines are parsed and validated in chunks. For large files, chunks are
+		processed in parallel by a pool of processes (see the
+		`workers.import_processes` setting); items are still yielded in the
+		order in which they appear in the file.
+
 		The file is considered disposable and deleted after importing.
 
 		:param str path:  Path to read from
@@ -165,56 +250,46 @@ class Search(BasicProcessor, ABC):
 			self.log.warning(
 				f"Processor {self.type} importing item without map_item method for Dataset {self.dataset.type} - {self.dataset.key}")
 
-		with path.open(encoding="utf-8") as infile:
-			for i, line in enumerate(infile):
-				if self.interrupted:
-					raise WorkerInterruptedException()
-
-				try:
-					# remove NUL bytes here because they trip up a lot of other
-					# things
-					# also include import metadata in item
-					item = json.loads(line.replace("\0", ""))
-				except json.JSONDecodeError:
-					warning = (f"An item on line {i:,} of the imported file could not be parsed as JSON - this may "
-							   f"indicate that the file you uploaded was incomplete and you need to try uploading it "
-							   f"again. The item will be ignored.")
-
-					if warning not in import_warnings:
-						import_warnings[warning] = 0
-					import_warnings[warning] += 1
-					continue
+		# decoding and mapping items is CPU-bound, so for large files, chunks
+		# of lines are processed in parallel in a number of processes
+		# there is no point in using more processes than there are cores
+		num_processes = min(self.config.get("workers.import_processes", 1), os.cpu_count() or 1)
+		if path.stat().st_size < self.parallel_import_threshold:
+			num_processes = 1
 
+		with path.open(encoding="utf-8") as infile:
+			chunks = self.get_import_chunks(infile)
+			if num_processes <= 1:
+				for first_line, lines in chunks:
+					if self.interrupted:
+						raise WorkerInterruptedException()
 
-				new_item = format_import_item(item)
+					chunk = import_lines(type(self), lines, first_line, check_map_item)
+					yield from self.collect_imported_chunk(chunk, import_warnings)
 
-				# Check map item here!
-				if check_map_item:
-					try:
-						mapped_item = self.get_mapped_item(new_item)
+			else:
+				# chunks are collected in the order in which they were read,
+				# with a few chunks in progress at a time
+				pool = concurrent.futures.ProcessPoolExecutor(
+					max_workers=num_processes, mp_context=multiprocessing.get_context("fork"))
+				pending = collections.deque()
+				try:
+					for first_line, lines in chunks:
+						if self.interrupted:
+							raise WorkerInterruptedException()
 
-						# keep track of items that raised a warning
-						# this means the item could be mapped, but there is
-						# some information the user should take note of
-						warning = mapped_item.get_message()
-						if not warning and mapped_item.get_missing_fields():
-							# usually this would have an explicit warning, but
-							# if not it's still useful to know
-							warning = f"The following fields are missing for this item and will be replaced with a default value: {', '.join(mapped_item.get_missing_fields())}"
+						pending.append(pool.submit(import_lines, type(self), lines, first_line, check_map_item))
+						if len(pending) >= num_processes * 2:
+							yield from self.collect_imported_chunk(pending.popleft().result(), import_warnings)
 
-						if warning:
-							if warning not in import_warnings:
-								import_warnings[warning] = 0
-							import_warnings[warning] += 1
-							self.import_warning_count += 1
+					while pending:
+						if self.interrupted:
+							raise WorkerInterruptedException()
 
-					except MapItemException as e:
-						# NOTE: we still yield the unmappable item; perhaps we need to update a processor's map_item method to account for this new item
-						self.import_error_count += 1
-						# Per-item user-facing log entry.
-						self.dataset.warn_unmappable_item(item_count=i, processor=self, error_message=e)
+						yield from self.collect_imported_chunk(pending.popleft().result(), import_warnings)
 
-				yield new_item
+				finally:
+					pool.shutdown(cancel_futures=True)
 
 		# warnings were raised about some items
 		# log these, with the number of items each warning applied to
@@ -226,6 +301,51 @@ class Search(BasicProcessor, ABC):
 		path.unlink()
 		self.dataset.delete_parameter("file")
 
+	def get_import_chunks(self, infile):
+		"""
+		Split an imported file into chunks of lines
+
+		:param infile:  File to read from
+		:return Generator:  Yields a tuple with the (zero-based) number of the
+		first line in the chunk, and a list of lines, per chunk
+		"""
+		first_line = 0
+		while True:
+			lines = list(itertools.islice(infile, self.import_chunk_size))
+			if not lines:
+				break
+
+			yield first_line, lines
+			first_line += len(lines)
+
+	def collect_imported_chunk(self, chunk, import_warnings):
+		"""
+		Process the result of importing a chunk of lines
+
+		Warnings are added to the running tally in `import_warnings`, and
+		items that could not be mapped are logged to the dataset log.
+
+		:param tuple chunk:  Return value of `import_lines()`
+		:param dict import_warnings:  Number of items per warning so far
+		:return list:  Imported items
+		"""
+		items, warnings, num_warned_items, errors = chunk
+
+		for warning, num_items in warnings.items():
+			if warning not in import_warnings:
+				import_warnings[warning] = 0
+			import_warnings[warning] += num_items
+
+		self.import_warning_count += num_warned_items
+
+		for line, error in errors:
+			# NOTE: the unmappable item is still imported; perhaps we need to update a processor's map_item method to account for this new item
+			self.import_error_count += 1
+			# Per-item user-facing log entry.
+			self.dataset.warn_unmappable_item(item_count=line, processor=self, error_message=error)
+
+		return items
+
 	def items_to_csv(self, results, filepath):
 		"""
 		Takes a dictionary of results, converts it to a csv, and writes it to the
@@ -410,6 +530,11 @@ class SearchWithScope(Search, ABC):
 		on the search query. Additionally, extra items are added to the results
 		if a wider search scope is requested.
 
+		Items are passed on as an iterable, so that items streamed from the
+		database (see `Database.iterate_interruptable()`) can be written to
+		the result file without holding all of them in memory, unless the
+		search scope requires otherwise.
+
 		:param dict query:  Query parameters
 		:return:  Matching items, as iterable, or None if no items match.
 		"""
@@ -420,17 +545,35 @@ class SearchWithScope(Search, ABC):
 		else:
 			items = self.get_items_complex(query)
 
-		if not items:
+		if items is None:
 			return None
 
+		# items may be streamed from the database, in which case we can only
+		# know if there are any by trying to get the first one
+		items = iter(items)
+		first_item = next(items, None)
+		if first_item is None:
+			return None
+
+		items = itertools.chain([first_item], items)
+
 		# handle the various search scope options after retrieving initial item
 		# list
 		if query.get("search_scope", None) == "dense-threads":
 			# dense threads - all items in all threads in which the requested
 			# proportion of items matches
-			# first, get amount of items for all threads in which matching
-			# items occur and that are long enough
-			thread_ids = tuple([item["thread_id"] for item in items])
+			# first, determine how many matching items occur per thread in the
+			# initial data set
+			items_per_thread = {}
+			for item in items:
+				if item["thread_id"] not in items_per_thread:
+					items_per_thread[item["thread_id"]] = 0
+
+				items_per_thread[item["thread_id"]] += 1
+
+			# then get amount of items for all threads in which matching items
+			# occur and that are long enough
+			thread_ids = tuple(items_per_thread)
 			self.dataset.update_status("Retrieving thread metadata for %i threads" % len(thread_ids))
 			try:
 				min_length = int(query.get("scope_length", 30))
@@ -439,15 +582,6 @@ class SearchWithScope(Search, ABC):
 
 			thread_sizes = self.get_thread_sizes(thread_ids, min_length)
 
-			# determine how many matching items occur per thread in the initial
-			# data set
-			items_per_thread = {}
-			for item in items:
-				if item["thread_id"] not in items_per_thread:
-					items_per_thread[item["thread_id"]] = 0
-
-				items_per_thread[item["thread_id"]] += 1
-
 			# keep all thread IDs where that amount is more than the requested
 			# density
 			qualifying_thread_ids = set()
@@ -68,6 +68,10 @@ class BasicWorker(threading.Thread, metaclass=abc.ABCMeta):
     #: Unix timestamp at which this worker was started
     init_time = 0
 
+    #: Whether the worker has finished running, i.e. `run()` is about to
+    #: return and the worker no longer occupies a slot
+    is_done = False
+
     def __init__(self, logger, job, queue=None, manager=None, modules=None):
         """
         Worker init
@@ -171,6 +175,14 @@ class BasicWorker(threading.Thread, metaclass=abc.ABCMeta):
             except Exception:
                 pass
 
+            # let the manager know our slot is free, so it can start the next
+            # job without waiting
+            self.is_done = True
+            try:
+                self.job.notify()
+            except Exception:
+                pass
+
     def mark_job_after_crash(self):
         """
         Decide what happens to the job after an unhandled crash
@@ -1,5 +1,6 @@
 import itertools
 import threading
+import hashlib
 import pickle
 import time
 import json
@@ -40,7 +41,22 @@ class ConfigManager(BaseConfigReader):
     # Prevents creating a new TCP connection per request in threaded/gunicorn contexts.
     _memcache_tls = threading.local()
 
+    # In-process cache of setting values, per set of active tags, and of user
+    # tags. These are valid as long as the version number stored in memcache
+    # does not change; `set()` et al. increase the version number.
+    resolved_cache = None
+    user_tags_cache = None
+    cache_version = None
+    cache_version_checked = 0
+
+    #: Seconds between checks of the cache version. Settings changed by
+    #: another process (e.g. the front-end) take at most this long to apply.
+    cache_version_interval = 1
+
     def __init__(self, db=None):
+        self.resolved_cache = {}
+        self.user_tags_cache = {}
+
         # ensure core settings (including database config) are loaded
         self.load_core_settings()
         self.load_user_settings()
@@ -371,60 +387,21 @@ class ConfigManager(BaseConfigReader):
         if not memcache:
             memcache = self.get_memcache()
 
-        # first check if we have all the values in memcache, in which case we
-        # do not need a database query
-        if memcache:
-            if threading.get_ident() != memcache.init_thread_id:
-                raise RuntimeError("Thread-unsafe use of memcache! Please make sure you are using a configuration "
-                                   "wrapper to read with a thread-local memcache connection.")
-
-            cached_values = {tag: memcache.get(self._get_memcache_id(attribute_name, tag), default=CacheMiss) for tag in tags}
-
-        else:
-            cached_values = {t: CacheMiss for t in tags}
+        if memcache and threading.get_ident() != memcache.init_thread_id:
+            raise RuntimeError("Thread-unsafe use of memcache! Please make sure you are using a configuration "
+                               "wrapper to read with a thread-local memcache connection.")
 
-        # for the tags we could not get from memcache, run a database query
-        # (and save to cache if possible)
-        missing_tags = [t for t in cached_values if cached_values[t] is CacheMiss]
-        if missing_tags:
-            # query database for any values within the required tags
+        # values for all settings with these tags are fetched at once and
+        # kept in memory; without memcache there is no way to know when
+        # another process changes a setting, so then query the database for
+        # this setting each time instead
+        resolved_settings = self._get_resolved_settings(tags, memcache)
+        if resolved_settings is None:
             query = "SELECT * FROM settings WHERE name = %s AND tag IN %s"
-            replacements = (attribute_name, tuple(missing_tags))
-            queried_settings = {setting["tag"]: setting["value"] for setting in self.db.fetchall(query, replacements)}
-
-            if memcache:
-                for tag, value in queried_settings.items():
-                    memcache.set(self._get_memcache_id(attribute_name, tag), value)
-
-            cached_values.update(queried_settings)
-
-        # there may be some tags for which we still do not have a value at
-        # this point. these simply do not have a tag-specific value but that in
-        # itself is worth caching, otherwise we're going to query for a
-        # non-existent value each time.
-        # so: cache a magic value for such setting/tag combinations, and
-        # replace the magic value with a CacheMiss in the dict that will be
-        # parsed
-        unconfigured_magic = "__unconfigured__"
-        if memcache:
-            for tag in [t for t in cached_values if cached_values[t] is CacheMiss]:
-                # should this be more magic?
-                memcache.set(self._get_memcache_id(attribute_name, tag), unconfigured_magic)
-
-            for tag in [t for t in cached_values if cached_values[t] == unconfigured_magic]:
-                cached_values[tag] = CacheMiss
-
-        # now we may still have some CacheMisses in the values dict, if there
-        # was no setting in the database with that tag. So, find the first
-        # value that is not a CacheMiss. If nothing matches, try the global tag
-        # and if even that does not match (no setting saved at all) return the
-        # default
-        for tag in tags:
-            if tag in cached_values and cached_values.get(tag) is not CacheMiss:
-                value = cached_values[tag]
-                break
-        else:
-            value = None
+            replacements = (attribute_name, tuple(tags))
+            resolved_settings = self._resolve_settings(tags, self.db.fetchall(query, replacements))
+
+        value = resolved_settings.get(attribute_name)
 
         # parse some values...
         if not is_json and value is not None:
@@ -471,14 +448,13 @@ class ConfigManager(BaseConfigReader):
             if not memcache:
                 memcache = self.get_memcache()
                 
-            if memcache:
-                memcache_id = f"_usertags-{user}"
-                user_tags = memcache.get(memcache_id, default=CacheMiss)
+            if memcache and self._check_cache_version(memcache):
+                user_tags = self.user_tags_cache.get(user, CacheMiss)
 
             if user_tags is CacheMiss:
                 user_tags = self.db.fetchone("SELECT tags FROM users WHERE name = %s", (user,))
                 if user_tags and memcache:
-                    memcache.set(memcache_id, user_tags)
+                    self.user_tags_cache[user] = user_tags
 
             if user_tags:
                 try:
@@ -535,10 +511,8 @@ class ConfigManager(BaseConfigReader):
         if not memcache:
             memcache = self.get_memcache()
 
-        if memcache:
-            # invalidate any cached value for this setting
-            memcache_id = self._get_memcache_id(attribute_name, tag)
-            memcache.delete(memcache_id)
+        # invalidate cached values
+        self._bump_cache_version(memcache)
 
         return updated_rows
 
@@ -552,9 +526,7 @@ class ConfigManager(BaseConfigReader):
         """
         self.db.delete("settings", where={"name": attribute_name, "tag": tag})
         updated_rows = self.db.cursor.rowcount
-        client = self.get_memcache()
-        if client:
-            client.delete(self._get_memcache_id(attribute_name, tag))
+        self._bump_cache_version()
         return updated_rows
 
     def clear_cache(self):
@@ -563,6 +535,10 @@ class ConfigManager(BaseConfigReader):
 
         Called when the backend restarts - helps start with a blank slate.
         """
+        self.resolved_cache = {}
+        self.user_tags_cache = {}
+        self.cache_version = None
+
         client = self.get_memcache()
         if not client:
             return
@@ -578,11 +554,11 @@ class ConfigManager(BaseConfigReader):
 
         :param list users:  List of users, as usernames or User objects
         """
-        client = self.get_memcache()
-        if client:
-            for user in users:
-                user = self._normalise_user(user)
-                client.delete(f"_usertags-{user}")
+        for user in users:
+            self.user_tags_cache.pop(self._normalise_user(user), None)
+
+        # other processes need to forget them too
+        self._bump_cache_version()
 
     def _normalise_user(self, user):
         """
@@ -612,29 +588,116 @@ class ConfigManager(BaseConfigReader):
 
         return user
 
-    def _get_memcache_id(self, attribute_name, tags=None):
+    def _check_cache_version(self, memcache):
         """
-        Generate a memcache key for a config setting request
+        Make sure values cached in this process are still valid
 
-        This includes the relevant user name/tags because the value may be
-        different depending on the value of these parameters.
+        Compares the cache version in memcache to the one the cached values
+        are for, at most once every `cache_version_interval` seconds, and
+        forgets the cached values if it has changed.
 
-        :param str attribute_name:
-        :param str|list tags:
-        :return str:
+        :param MemcacheClient memcache:  Memcache client
+        :return bool:  `False` if the cache version could not be determined,
+        in which case cached values should not be used
         """
-        if tags and isinstance(tags, str):
-            tags = [tags]
+        if self.cache_version is not None and time.monotonic() - self.cache_version_checked < self.cache_version_interval:
+            return True
 
-        tag_bit = []
-        if tags:
-            tag_bit.append("|".join(tags))
+        try:
+            version = memcache.get("_version")
+            if version is None:
+                # first use, or memcache was flushed; start at a version
+                # that cannot have been used before
+                memcache.add("_version", time.time_ns())
+                version = memcache.get("_version")
+        except (MemcacheError, ConnectionError, OSError):
+            version = None
+
+        if version is None:
+            self.cache_version = None
+            return False
+
+        if version != self.cache_version:
+            self.resolved_cache = {}
+            self.user_tags_cache = {}
+            self.cache_version = version
+
+        self.cache_version_checked = time.monotonic()
+        return True
+
+    def _bump_cache_version(self, memcache=None):
+        """
+        Invalidate cached values, in this and other processes
+
+        :param MemcacheClient memcache:  Memcache client. If `None`, a thread-local client will be used.
+        """
+        self.resolved_cache = {}
+        self.user_tags_cache = {}
+        self.cache_version = None
+
+        if not memcache:
+            memcache = self.get_memcache()
+
+        if memcache:
+            try:
+                if memcache.incr("_version", 1) is None:
+                    memcache.add("_version", time.time_ns())
+            except (MemcacheError, ConnectionError, OSError):
+                pass
+
+    def _get_resolved_settings(self, tags, memcache):
+        """
+        Get values of all settings for a list of tags
+
+        Values are kept in memory, and in memcache so that other processes can
+        use them too; if neither has them, they are read from the database
+        with a single query.
+
+        :param list tags:  Tags, in order of precedence
+        :param MemcacheClient memcache:  Memcache client
+        :return dict|None:  Setting values, as stored, with the setting name
+        as key, or `None` if values cannot be cached
+        """
+        if not memcache or not self._check_cache_version(memcache):
+            return None
+
+        tags = tuple(tags)
+        version = self.cache_version
+        if tags in self.resolved_cache:
+            return self.resolved_cache[tags]
+
+        memcache_id = f"_resolved-{version}-{hashlib.md5(chr(0).join(tags).encode('utf-8')).hexdigest()}"
+        resolved_settings = memcache.get(memcache_id)
+        if resolved_settings is None:
+            rows = self.db.fetchall("SELECT * FROM settings WHERE tag IN %s", (tags,))
+            resolved_settings = self._resolve_settings(tags, rows)
+            memcache.set(memcache_id, resolved_settings)
+
+        if self.cache_version == version:
+            self.resolved_cache[tags] = resolved_settings
+
+        return resolved_settings
+
+    def _resolve_settings(self, tags, rows):
+        """
+        Pick the value for each setting from the first matching tag
+
+        :param list tags:  Tags, in order of precedence
+        :param list rows:  Rows from the settings table
+        :return dict:  Setting values, as stored, with the setting name as key
+        """
+        precedence = {}
+        for i, tag in enumerate(tags):
+            precedence.setdefault(tag, i)
 
-        memcache_id = attribute_name
-        if tag_bit:
-            memcache_id += f"-{'-'.join(tag_bit)}"
+        resolved_settings = {}
+        resolved_precedence = {}
+        for row in rows:
+            if row["name"] not in resolved_settings or precedence[row["tag"]] < resolved_precedence[row["name"]]:
+                resolved_settings[row["name"]] = row["value"]
+                resolved_precedence[row["name"]] = precedence[row["tag"]]
 
-        return memcache_id.encode("ascii")
+        return resolved_settings
 
     def __getattr__(self, attr):
         """
@@ -40,6 +40,8 @@ class Annotation:
     from_dataset = None       # Processor-made dataset key this annotation was generated as part of
     metadata = None           # Misc metadata
 
+    save_batch_size = 10000   # Number of annotations written per query by `save_many()`
+
     def __init__(self, data=None, annotation_id=None, db=None):
         """
         Instantiate annotation object.
@@ -264,6 +266,135 @@ class Annotation:
 
         return [Annotation(data=d, db=db) for d in data]
 
+    @staticmethod
+    def save_many(db: Database, annotations: list) -> int:
+        """
+        Save many annotations at once.
+
+        The set-based counterpart of creating an `Annotation` per record:
+        rather than reading and writing each annotation separately, all
+        annotations are written with one `INSERT ... ON CONFLICT` per chunk
+        of `save_batch_size` annotations (see `Database.insert_bulk()`).
+
+        As when saving a single annotation, new annotations get defaults for
+        the fields that are not given, and existing annotations (with the same
+        dataset, item ID and field ID) only have the given fields updated, and
+        only if any of these changed. Unknown fields are stored in `metadata`.
+        Given `metadata` and unknown fields are merged into the metadata of
+        existing annotations, rather than replacing it. If the list contains
+        the same annotation more than once, later entries update earlier ones.
+
+        Nothing is saved if any of the annotations is invalid.
+
+        :param db:                  Database object.
+        :param list annotations:    List of dictionaries with annotation data.
+                                    Each must have a `dataset`, `item_id`,
+                                    `field_id` and `label`.
+
+        :return int:  The number of annotations saved.
+        """
+        timestamp = int(time.time())
+        known_fields = ("dataset", "item_id", "field_id", "timestamp", "timestamp_created", "label", "type", "options",
+                        "value", "author", "author_original", "by_processor", "from_dataset", "metadata")
+
+        # combine annotations for the same item and field, so each is only
+        # written once
+        merged = {}
+        for data in annotations:
+            if not isinstance(data, dict):
+                raise AnnotationException("Annotation data must be a dictionary, got %s" % repr(data))
+
+            for required_field in ("field_id", "item_id", "dataset", "label"):
+                if not data.get(required_field):
+                    raise AnnotationException("Annotation() requires a %s field" % required_field)
+
+            if not isinstance(data["label"], str):
+                raise AnnotationException("Annotation label must be a string, got %s" % repr(data["label"]))
+
+            key = (data["dataset"], str(data["item_id"]), data["field_id"])
+            if key in merged:
+                merged[key].update(data)
+            else:
+                merged[key] = dict(data)
+
+            merged[key].pop("id", None)
+
+        # metadata is merged into that of existing annotations, so get it
+        # for the annotations that have any
+        existing_metadata = {}
+        with_metadata = [key for key, data in merged.items()
+                         if "metadata" in data or any(field not in known_fields for field in data)]
+        for offset in range(0, len(with_metadata), Annotation.save_batch_size):
+            keys = with_metadata[offset:offset + Annotation.save_batch_size]
+            existing = db.fetchall("SELECT dataset, item_id, field_id, metadata FROM annotations "
+                                   "WHERE (dataset, item_id, field_id) IN (SELECT * FROM unnest(%s::text[], %s::text[], %s::text[]))",
+                                   ([key[0] for key in keys], [key[1] for key in keys], [key[2] for key in keys]))
+            for annotation in existing:
+                existing_metadata[(annotation["dataset"], annotation["item_id"], annotation["field_id"])] = \
+                    Annotation.parse_metadata(annotation["metadata"])
+
+        # annotations that give the same fields can be saved together
+        batches = {}
+        for key, data in merged.items():
+            metadata = Annotation.parse_metadata(data.get("metadata", {}))
+
+            unknown_fields = {field: value for field, value in data.items() if field not in known_fields}
+            if "metadata" in data or unknown_fields:
+                metadata = {**existing_metadata.get(key, {}), **metadata, **unknown_fields}
+                data["metadata"] = metadata
+
+            value = data.get("value", "")
+            if isinstance(value, (list, tuple)):
+                value = ",".join(value)
+
+            try:
+                row = {
+                    "dataset": data["dataset"],
+                    "item_id": str(data["item_id"]),
+                    "field_id": data["field_id"],
+                    "timestamp": timestamp,
+                    "timestamp_created": int(data.get("timestamp_created", timestamp)),
+                    "label": data.get("label"),
+                    "type": data.get("type", "text"),
+                    "options": data.get("options", ""),
+                    "value": value,
+                    "author": data.get("author", ""),
+                    "author_original": data.get("author", ""),
+                    "by_processor": bool(data.get("by_processor", False)),
+                    "from_dataset": data.get("from_dataset", ""),
+                    "metadata": json.dumps(metadata),
+                }
+            except ValueError as e:
+                raise AnnotationException("Annotation fields are not of the right type (%s)" % e)
+
+            given_fields = tuple(field for field in known_fields if field in data and field != "timestamp")
+            batches.setdefault(given_fields, []).append(row)
+
+        for given_fields, rows in batches.items():
+            for offset in range(0, len(rows), Annotation.save_batch_size):
+                db.insert_bulk("annotations", rows[offset:offset + Annotation.save_batch_size], upsert=True,
+                               constraints=("dataset", "item_id", "field_id"), update_columns=("timestamp", *given_fields),
+                               changed_columns=given_fields, commit=False)
+
+        db.commit()
+        return len(merged)
+
+    @staticmethod
+    def parse_metadata(metadata) -> dict:
+        """
+        Read annotation metadata as stored in the database
+
+        :param metadata:  Metadata, as a dictionary or a JSON-encoded one
+        :return dict:  Metadata; empty if it could not be parsed
+        """
+        if isinstance(metadata, str):
+            try:
+                metadata = json.loads(metadata)
+            except json.JSONDecodeError:
+                return {}
+
+        return metadata if isinstance(metadata, dict) else {}
+
     @staticmethod
     def delete_many(db: Database, dataset_key=None, annotation_id=None, field_id=None):
         """
@@ -268,6 +268,90 @@ config_definition = {
         "tooltip": "Sphinx is used for full-text search for collected datasources (e.g., 4chan, 8kun, 8chan) and requires additional setup (see 4CAT wiki on GitHub).",
         "global": True
     },
+    "4cat.columnar_storage": {
+        "type": UserInput.OPTION_TOGGLE,
+        "default": False,
+        "help": "Store results in columns",
+        "tooltip": "Also store CSV dataset results in a columnar (Parquet) file next to the CSV file. Processors that "
+                   "only need a few columns can read those much faster, at the cost of extra disk space and some time "
+                   "when a dataset finishes.",
+        "global": True
+    },
+    "4cat.mapped_item_cache": {
+        "type": UserInput.OPTION_TOGGLE,
+        "default": False,
+        "help": "Cache mapped items",
+        "tooltip": "When all items of an NDJSON dataset (e.g. imported via Zeeschuimer) are read, store the mapped "
+                   "version of each item next to the dataset file. Later reads use those instead of mapping each "
+                   "item again, at the cost of extra disk space.",
+        "global": True
+    },
+    "4cat.filter_views": {
+        "type": UserInput.OPTION_TOGGLE,
+        "default": False,
+        "help": "Store filtered datasets as views",
+        "tooltip": "Instead of copying the matching items of a CSV or NDJSON dataset to a new file, filters store "
+                   "which rows of the original dataset matched, and read those from the original file. This saves "
+                   "disk space and time when filtering large datasets. The filtered items are written to a file of "
+                   "their own when the dataset is downloaded or the original dataset is deleted.",
+        "global": True
+    },
+    "4cat.media_cache": {
+        "type": UserInput.OPTION_TOGGLE,
+        "default": False,
+        "help": "Cache downloaded media",
+        "tooltip": "Keep images and videos downloaded by processors in a cache shared by all datasets. When a file is "
+                   "requested again, e.g. for another dataset from the same accounts, it is taken from the cache "
+                   "instead of downloaded again.",
+        "global": True
+    },
+    "4cat.media_cache_max_size": {
+        "type": UserInput.OPTION_TEXT,
+        "coerce_type": float,
+        "default": 10,
+        "min": 0,
+        "help": "Media cache size",
+        "tooltip": "Maximum size of the media cache, in GB. When the cache grows larger, the files that were used "
+                   "least recently are deleted. 0 for no limit.",
+        "global": True
+    },
+    # job scheduling
+    "workers.intro": {
+        "type": UserInput.OPTION_INFO,
+        "help": "These settings determine how many jobs the 4CAT backend runs at the same time. Jobs are divided over "
+                "queues; by default, each processor or data source has its own queue. Within a queue, jobs from "
+                "different users take turns, so one user's batch of jobs does not hold up everyone else's.\n\n"
+                "Changes take effect for jobs that start after saving."
+    },
+    "workers.max_workers": {
+        "type": UserInput.OPTION_TEXT,
+        "coerce_type": int,
+        "default": 0,
+        "min": 0,
+        "help": "Max concurrent workers (overall)",
+        "tooltip": "Total number of jobs that can run at the same time, across all queues. This includes workers that "
+                   "always run, such as the API. 0 for no limit.",
+        "global": True
+    },
+    "workers.concurrency": {
+        "type": UserInput.OPTION_TEXT_JSON,
+        "default": {},
+        "help": "Max concurrent workers (per queue)",
+        "tooltip": "A JSON object with queue IDs or job types as keys, and the number of jobs from that queue or of "
+                   "that type that can run at the same time as values, e.g. {\"count-posts\": 4}. Queues that are not "
+                   "listed use the default of their worker, which for most workers is 1.",
+        "global": True
+    },
+    "workers.import_processes": {
+        "type": UserInput.OPTION_TEXT,
+        "coerce_type": int,
+        "default": 4,
+        "min": 1,
+        "help": "Processes per import",
+        "tooltip": "Number of processes used to read and validate items when importing a large file, e.g. from "
+                   "Zeeschuimer. More processes make imports faster, but each takes up a CPU core while importing.",
+        "global": True
+    },
     # proxy stuff
     "proxies.urls": {
         "type": UserInput.OPTION_TEXT_JSON,
@@ -504,6 +588,16 @@ config_definition = {
         "global": True,
         "tooltip": "Affects approximate number of files that can be uploaded at once"
     },
+    "flask.max_event_streams": {
+        "type": UserInput.OPTION_TEXT,
+        "default": 2,
+        "help": "Max update streams per worker",
+        "coerce_type": int,
+        "global": True,
+        "tooltip": "Number of browser tabs per web server worker process that can receive dataset status updates "
+                   "as they happen. Each occupies a thread of the worker, so this should be lower than the number "
+                   "of threads per worker. Other tabs poll for updates instead. Requires a restart."
+    },
     "flask.tag_order": {
         "type": UserInput.OPTION_TEXT_JSON,
         "default": ["admin"],
@@ -636,6 +730,16 @@ config_definition = {
                 "help": "Authentication Key",
                 "tooltip": "The API key to access the LLM server, if required.",
             },
+            "concurrency": {
+                "type": UserInput.OPTION_TEXT,
+                "coerce_type": int,
+                "default": 1,
+                "min": 1,
+                "help": "Max concurrent requests",
+                "tooltip": "Number of prompts a processor can send to the server at the same time. Self-hosted servers "
+                           "(e.g. Ollama or vLLM) can often handle many requests in parallel; third-party APIs may "
+                           "rate-limit you if this is set too high.",
+            },
         }
     },
     "llm.available_models": {
@@ -654,6 +758,15 @@ config_definition = {
         "indirect": True,
         "global": True
     },
+    "llm.response_cache": {
+        "type": UserInput.OPTION_TOGGLE,
+        "default": True,
+        "help": "Cache LLM responses",
+        "tooltip": "Store responses to prompts, so that when the same prompt is sent to the same model with the same "
+                   "settings again, e.g. when a processor is run again, the stored response is used instead. Users "
+                   "can choose to get new responses instead when running a processor.",
+        "global": True
+    },
     "llm.access": {
         "type": UserInput.OPTION_TOGGLE,
         "help": "Local LLM Access",
@@ -767,6 +880,7 @@ categories = {
     "dmi-service-manager": "DMI Service Manager",
     "ui": "User interface",
     "proxies": "Proxied HTTP requests",
+    "workers": "Job scheduling",
     "image-visuals": "Image visualization",
     "extensions": "Extensions",
     "llm": "LLM servers"
@@ -2,9 +2,12 @@
 Database wrapper
 """
 import itertools
+import uuid
+import io
 import psycopg2.extras
 import psycopg2
 import logging
+import select
 import time
 
 from psycopg2 import sql
@@ -24,6 +27,9 @@ class Database:
 	log = None
 	appname=""
 
+	listener = None
+	listener_channels = None
+
 	interrupted = False
 	interruptable_timeout = 86400  # if a query takes this long, it should be cancelled. see also fetchall_interruptable()
 	interruptable_job = None
@@ -300,6 +306,112 @@ class Database:
 		rowcount = self.execute(query, replacements=replacements, commit=commit)
 		return rowcount
 
+	def insert_bulk(self, table, rows, safe=False, constraints=None, upsert=False, return_fields=None, commit=True,
+					update_columns=None, changed_columns=None):
+		"""
+		Create many database records at once
+
+		Rather than inserting rows one by one, the rows are streamed into a
+		temporary staging table with `COPY`, and then moved into the target
+		table with a single `INSERT ... SELECT`. This is much faster than
+		`insert()` for more than a handful of rows, and conflicts are resolved
+		for all rows at once rather than by catching an error per row.
+
+		All rows should have the same columns, which are taken from the first
+		row. Values are passed to `COPY` as text; `None` becomes `NULL`.
+
+		:param string table:  Table to insert records into
+		:param list rows:  Data to insert, a list of dictionaries
+		:param bool safe:  If set to `True`, rows that violate a unique index
+		or other constraint are skipped rather than raising an error, as with
+		`insert()`
+		:param tuple constraints:  Columns to use as the conflict target, e.g.
+		ON CONFLICT (name, lastname) DO NOTHING. Required if `upsert` is set.
+		:param bool upsert:  If set to `True`, conflicting records are updated
+		with the new data instead, as with `upsert()`. The rows should then
+		not contain duplicates of each other.
+		:param list update_columns:  Columns to overwrite when upserting a
+		conflicting record; defaults to all columns of the rows, but can be
+		used to e.g. keep a creation timestamp when a record already exists
+		:param list changed_columns:  If given, conflicting records are only
+		updated if they differ from the new data in any of these columns;
+		other conflicting records are left as they are, and not counted as
+		affected
+		:param list return_fields:  If not empty, return these fields of the
+		inserted (or updated) records instead of the number of affected rows
+		:param bool commit:  Whether to commit after executing the query
+		:return:  Number of affected rows, or a list of dictionaries with the
+		`return_fields` of the affected rows
+		"""
+		if not rows:
+			return [] if return_fields else 0
+
+		if upsert and not constraints:
+			raise ValueError("insert_bulk() needs constraints to upsert")
+
+		columns = list(rows[0].keys())
+		column_list = sql.SQL(", ").join([sql.Identifier(column) for column in columns])
+		staging = sql.Identifier("staging_" + uuid.uuid4().hex)
+
+		# the staging table only copies the column types, not the constraints
+		# or defaults, so that e.g. a serial primary key can be left out
+		self.execute(sql.SQL("CREATE TEMPORARY TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA").format(
+			staging, column_list, sql.Identifier(table)), commit=False)
+
+		buffer = io.StringIO()
+		for row in rows:
+			buffer.write("\t".join([self._get_copy_value(row[column]) for column in columns]) + "\n")
+		buffer.seek(0)
+
+		cursor = self.get_cursor()
+		cursor.copy_expert(sql.SQL("COPY {} ({}) FROM STDIN").format(staging, column_list).as_string(cursor), buffer)
+
+		# construct ON CONFLICT bit of query
+		query = sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {}").format(
+			sql.Identifier(table), column_list, column_list, staging)
+		if safe or upsert:
+			query += sql.SQL(" ON CONFLICT")
+			if constraints:
+				query += sql.SQL(" ({})").format(sql.SQL(", ").join([sql.Identifier(column) for column in constraints]))
+
+			if upsert:
+				query += sql.SQL(" DO UPDATE SET ") + sql.SQL(", ").join(
+					[sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(column), sql.Identifier(column)) for column in (update_columns or columns)])
+				if changed_columns:
+					query += sql.SQL(" WHERE ROW({}) IS DISTINCT FROM ROW({})").format(
+						sql.SQL(", ").join([sql.SQL("{}.{}").format(sql.Identifier(table), sql.Identifier(column)) for column in changed_columns]),
+						sql.SQL(", ").join([sql.SQL("EXCLUDED.{}").format(sql.Identifier(column)) for column in changed_columns]))
+			else:
+				query += sql.SQL(" DO NOTHING")
+
+		if return_fields:
+			query += sql.SQL(" RETURNING {}").format(sql.SQL(", ").join([sql.Identifier(field) for field in return_fields]))
+
+		cursor.execute(query)
+		result = cursor.fetchall() if return_fields else cursor.rowcount
+		cursor.execute(sql.SQL("DROP TABLE {}").format(staging))
+		cursor.close()
+
+		if commit:
+			self.commit()
+
+		return result
+
+	@staticmethod
+	def _get_copy_value(value):
+		"""
+		Format a value for use in a text-format `COPY`
+
+		:param value:  Value to format
+		:return str:  Escaped value
+		"""
+		if value is None:
+			return "\\N"
+		elif type(value) is bool:
+			return "t" if value else "f"
+
+		return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
 	def fetchall(self, query, *args):
 		"""
 		Fetch all rows for a query
@@ -329,6 +441,59 @@ class Database:
 
 		return result
 
+	def iterate_interruptable(self, queue, query, *args, itersize=10000):
+		"""
+		Iterate through the rows for a query, allowing for interruption
+
+		Like `fetchall_interruptable()`, but rather than fetching all rows at
+		once, rows are fetched in batches of `itersize` rows via a server-side
+		cursor while they are iterated through. This keeps memory use constant
+		regardless of the amount of rows, so that e.g. search workers can
+		write rows to a file as they arrive.
+
+		The query runs on a separate connection, because committing a
+		transaction (e.g. when updating a dataset's status while iterating)
+		would close the server-side cursor. That connection has the same
+		application name, so the query is cancelled in the same way as with
+		`fetchall_interruptable()`, in which case a
+		DatabaseQueryInterruptedException is raised while iterating.
+
+		:param JobQueue queue:  A job queue object, required to schedule the
+		query cancellation job
+		:param str query:  SQL query
+		:param list args:  Replacement variables
+		:param int itersize:  Rows to fetch from the database at a time
+		:return Generator:  Yields rows, as dictionaries
+		"""
+		# schedule a job that will cancel the query we're about to make
+		interruptable_job = queue.add_job("cancel-pg-query", details={}, remote_id=self.appname, claim_after=time.time() + self.interruptable_timeout)
+
+		connection = psycopg2.connect(dbname=self.connection.info.dbname,
+									  user=self.connection.info.user,
+									  password=self.connection.info.password,
+									  host=self.connection.info.host,
+									  port=self.connection.info.port,
+									  application_name=self.appname)
+
+		try:
+			cursor = connection.cursor(name="4cat-stream", cursor_factory=psycopg2.extras.RealDictCursor)
+			cursor.itersize = itersize
+
+			self.log.debug2("Executing query %s" % cursor.mogrify(query, *args))
+			cursor.execute(query, *args)
+			yield from cursor
+
+		except psycopg2.extensions.QueryCanceledError:
+			# interrupted with cancellation worker (or manually)
+			self.log.debug2("Query in connection %s was interrupted..." % self.appname)
+			raise DatabaseQueryInterruptedException("Interrupted while querying database")
+
+		finally:
+			# closing the connection also closes the cursor and ends the
+			# transaction
+			connection.close()
+			interruptable_job.finish()
+
 	def fetchone(self, query, *args):
 		"""
 		Fetch one result row
@@ -409,6 +574,76 @@ class Database:
 		return result
 
 
+	def notify(self, channel, payload="", commit=True):
+		"""
+		Send a notification to listeners on a channel
+
+		Notifications are only delivered once the transaction is committed.
+
+		:param str channel:  Channel to notify
+		:param str payload:  Notification payload
+		:param bool commit:  Commit transaction after query?
+		"""
+		self.execute("SELECT pg_notify(%s, %s)", replacements=(channel, payload), commit=commit)
+
+	def listen(self, *channels):
+		"""
+		Start listening for notifications on one or more channels
+
+		A separate connection is used for listening, so that waiting for
+		notifications does not interfere with other queries made via this
+		object. Use `wait_for_notifications()` to receive them.
+
+		:param str channels:  Channels to listen on
+		"""
+		if self.listener_channels is None:
+			self.listener_channels = set()
+
+		if not self.listener:
+			info = self.connection.info
+			self.listener = psycopg2.connect(dbname=info.dbname, user=info.user, password=info.password,
+											 host=info.host, port=info.port, application_name=self.appname + "-listener")
+			self.listener.set_session(autocommit=True)
+
+		with self.listener.cursor() as cursor:
+			for channel in channels:
+				cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+				self.listener_channels.add(channel)
+
+	def wait_for_notifications(self, timeout=1):
+		"""
+		Wait for notifications on channels listened to via `listen()`
+
+		Returns as soon as at least one notification has been received, or
+		after the timeout expires.
+
+		:param float timeout:  Maximum time to wait, in seconds
+		:return list:  Received notifications, as `psycopg2.extensions.Notify`
+		objects with `channel` and `payload` attributes
+		"""
+		if not self.listener_channels:
+			raise RuntimeError("Call listen() before waiting for notifications")
+
+		try:
+			if not self.listener:
+				# connection was lost earlier; try to listen again
+				self.listen(*self.listener_channels)
+
+			if not self.listener.notifies and select.select([self.listener], [], [], max(timeout, 0)) != ([], [], []):
+				self.listener.poll()
+
+		except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
+			# without a listener, this simply waits for the timeout, so the
+			# caller falls back to polling until the connection is back
+			self.log.warning(f"Database listener connection lost: {e}")
+			self.listener = None
+			time.sleep(max(timeout, 0))
+			return []
+
+		notifications = list(self.listener.notifies)
+		self.listener.notifies.clear()
+		return notifications
+
 	def commit(self):
 		"""
 		Commit the current transaction
@@ -429,6 +664,9 @@ class Database:
 
 		Running queries after this is probably a bad idea!
 		"""
+		if self.listener:
+			self.listener.close()
+
 		self.connection.close()
 
 	def get_cursor(self):
@@ -1,10 +1,15 @@
 import collections
 import itertools
+import functools
 import datetime
 import zipfile
+import io
 import fnmatch
+import glob
 import random
 import shutil
+import pickle
+import heapq
 import json
 import time
 import csv
@@ -17,12 +22,16 @@ from natsort import natsorted
 
 from common.lib.annotation import Annotation
 from common.lib.job import Job, JobNotFoundException
+from common.lib.dataset_index import DatasetRowIndex, DatasetSortIndex, DatasetRowSelection
+from common.lib.dataset_columns import DatasetColumnStore
+from common.lib.dataset_mapped import DatasetMappedCache, get_mapper_version
 
 from common.lib.helpers import get_software_commit, NullAwareTextIOWrapper, convert_to_int, get_software_version, call_api, hash_to_md5, convert_to_float
 from common.lib.item_mapping import MappedItem, DatasetItem
 from common.lib.fourcat_module import FourcatModule
 from common.lib.exceptions import (ProcessorInterruptedException, DataSetException, DataSetNotFoundException,
-                                   MapItemException, MappedItemIncompleteException, AnnotationException)
+                                   MapItemException, MappedItemIncompleteException, AnnotationException,
+                                   DataSetIndexException)
 
 
 class StatusType(Enum):
@@ -48,6 +57,11 @@ class DataSet(FourcatModule):
     properties.
     """
 
+    #: Postgres notification channel on which changes to a dataset's status
+    #: and progress are announced, so the web interface does not need to poll
+    #: for them. The payload is the dataset key.
+    NOTIFY_CHANNEL = "fourcat_datasets"
+
     # Attributes must be created here to ensure getattr and setattr work properly
     data = None
     key = ""
@@ -309,7 +323,7 @@ class DataSet(FourcatModule):
         with log_path.open("a", encoding="utf-8") as outfile:
             outfile.write("%s: %s\n" % (datetime.datetime.now().strftime("%c"), log))
 
-    def _iterate_items(self, processor=None, offset=0, *args, **kwargs):
+    def _iterate_items(self, processor=None, offset=0, columns=None, position=None, *args, **kwargs):
         """
         A generator that iterates through a CSV or NDJSON file
 
@@ -326,18 +340,80 @@ class DataSet(FourcatModule):
         envision adding a pathway to retrieve items from e.g. a MongoDB
         collection directly instead of from a static file
 
+        If an offset is given and the dataset is finished, the row index (see
+        `get_row_position()`) is used to seek straight to the first requested
+        row instead of reading all rows before it. Alternatively, the byte
+        position at which that row starts may be given directly.
+
+        If a list of columns is given, items only contain those columns (if
+        they exist). For CSV files, the values are then read from the column
+        store if one is available (see `get_column_store()`), and otherwise
+        from rows parsed as lists rather than dictionaries. NDJSON items are
+        still decoded in full, but only the requested columns are kept.
+
         :param BasicProcessor processor:  A reference to the processor
         iterating the dataset.
         :param offset int:  How many items to skip.
+        :param list columns:  Columns to include; `None` to include all
+        :param int position:  Byte position at which row `offset` starts in
+        the result file, if known
         :return generator:  A generator that yields each item as a dictionary
         """
         path = self.get_results_path()
 
+        if columns is not None and path.suffix.lower() == ".csv" and not offset and self.is_finished() \
+                and self.get_own_processor() and self.get_column_store().is_current():
+            column_store = self.get_column_store()
+            stored_columns = [column for column in columns if column in column_store.get_columns()]
+            if stored_columns:
+                for batch in column_store.iterate_batches(stored_columns, processor=processor):
+                    yield from (dict(zip(stored_columns, values)) for values in zip(*batch.values()))
+
+                return
+
+        if position is None and offset:
+            position = self.get_row_position(offset, processor=processor)
+
         # Yield through items one by one
         if path.suffix.lower() == ".csv":
             with path.open("rb") as infile:
+                fieldnames = None
+                if position is not None and self.get_own_processor():
+                    # the header is not read when seeking, so get it separately
+                    row_index = self.get_row_index()
+                    if row_index.is_current():
+                        fieldnames = row_index.get_fieldnames()
+                    else:
+                        fieldnames = next(csv.reader(line.decode("utf-8").replace("\0", "") for line in infile), [])
+                    infile.seek(position)
+                    offset = 0
+
                 wrapped_infile = NullAwareTextIOWrapper(infile, encoding="utf-8")
-                reader = csv.DictReader(wrapped_infile)
+
+                if columns is not None and self.get_own_processor():
+                    # only build dictionaries with the requested columns
+                    reader = csv.reader(wrapped_infile)
+                    if fieldnames is None:
+                        fieldnames = next(reader, [])
+
+                    # like csv.DictReader, use the last of duplicate columns
+                    positions = {field: position for position, field in enumerate(fieldnames)}
+                    positions = {column: positions[column] for column in columns if column in positions}
+
+                    for i, row in enumerate(row for row in reader if row):
+                        if hasattr(processor, "interrupted") and processor.interrupted:
+                            raise ProcessorInterruptedException(
+                                "Processor interrupted while iterating through CSV file"
+                            )
+
+                        if i < offset:
+                            continue
+
+                        yield {column: row[position] if position < len(row) else None for column, position in positions.items()}
+
+                    return
+
+                reader = csv.DictReader(wrapped_infile, fieldnames=fieldnames)
 
                 if not self.get_own_processor():
                     # Processor was deprecated or removed; CSV file is likely readable but some legacy types are not
@@ -363,7 +439,12 @@ class DataSet(FourcatModule):
 
         elif path.suffix.lower() == ".ndjson":
             # In NDJSON format each line in the file is a self-contained JSON
-            with path.open(encoding="utf-8") as infile:
+            with path.open("rb") as binary_infile:
+                if position is not None:
+                    binary_infile.seek(position)
+                    offset = 0
+
+                infile = io.TextIOWrapper(binary_infile, encoding="utf-8")
                 for i, line in enumerate(infile):
                     if hasattr(processor, "interrupted") and processor.interrupted:
                         raise ProcessorInterruptedException(
@@ -373,11 +454,86 @@ class DataSet(FourcatModule):
                     if i < offset:
                         continue
 
-                    yield json.loads(line)
+                    item = json.loads(line)
+                    if columns is not None:
+                        item = {column: item[column] for column in columns if column in item}
+
+                    yield item
 
         else:
             raise NotImplementedError(f"Cannot iterate through {path.suffix} file")
 
+    def _iterate_rows(self, rows, processor=None, columns=None, *args, **kwargs):
+        """
+        A generator that yields specific rows from a CSV or NDJSON file
+
+        This is an internal method and should not be called directly. Rather,
+        call iterate_items() with the `rows` parameter.
+
+        Rows are looked up in the row index, and read by seeking to their
+        position in the result file. The index is built first if needed.
+
+        :param rows:  Row numbers to yield, in order
+        :param BasicProcessor processor:  A reference to the processor
+        iterating the dataset.
+        :param list columns:  Columns to include; `None` to include all
+        :return generator:  A generator that yields each item as a dictionary
+        """
+        path = self.get_results_path()
+        extension = path.suffix.lower()
+        if extension not in (".csv", ".ndjson"):
+            raise NotImplementedError(f"Cannot iterate through rows of {extension} file")
+
+        index = self.get_row_index()
+        if not self.is_finished() or (not index.is_current() and not self.build_row_index(processor=processor)):
+            raise DataSetException(f"No row index available for dataset {self.key}")
+
+        fieldnames = index.get_fieldnames()
+        with path.open("rb") as infile:
+            for start, end in index.get_spans(rows):
+                if hasattr(processor, "interrupted") and processor.interrupted:
+                    raise ProcessorInterruptedException(
+                        "Processor interrupted while iterating through dataset rows"
+                    )
+
+                infile.seek(start)
+                raw_row = infile.read(end - start).decode("utf-8")
+                if not raw_row:
+                    continue
+
+                if extension == ".csv":
+                    # StringIO translates line endings like the regular reader
+                    item = next(csv.DictReader(io.StringIO(raw_row.replace("\0", ""), newline=None), fieldnames=fieldnames))
+                else:
+                    item = json.loads(raw_row)
+
+                if columns is not None:
+                    item = {column: item[column] for column in columns if column in item}
+
+                yield item
+
+    def _iterate_view_items(self, processor=None, offset=0, rows=None, columns=None, *args, **kwargs):
+        """
+        A generator that yields the items of a view
+
+        This is an internal method and should not be called directly. Rather,
+        call iterate_items(), which uses this for views automatically.
+
+        The selected rows are read from the parent's result file via its row
+        index (see `_iterate_rows()`).
+
+        :param BasicProcessor processor:  A reference to the processor
+        iterating the dataset.
+        :param int offset:  How many items to skip
+        :param rows:  Only yield these rows of the view, in the given order
+        :param list columns:  Columns to include; `None` to include all
+        :return generator:  A generator that yields each item as a dictionary
+        """
+        selection = self.get_row_selection()
+        parent_rows = selection.get_parent_rows(rows) if rows is not None else selection.iterate_rows(offset)
+
+        yield from self.get_view_parent()._iterate_rows(parent_rows, processor=processor, columns=columns)
+
     def _iterate_archive_contents(
             self,
             staging_area=None,
@@ -485,7 +641,7 @@ class DataSet(FourcatModule):
 
     def iterate_items(
             self, processor=None, warn_unmappable=True, map_missing="default", get_annotations=True, max_unmappable=None,
-            offset=0, *args, **kwargs
+            offset=0, rows=None, columns=None, *args, **kwargs
     ):
         """
         Generate mapped dataset items
@@ -514,6 +670,9 @@ class DataSet(FourcatModule):
         which produces unstably-structured data captured from social media
         sites.
 
+        Items of views (see `is_view()`) are read from the result file of the
+        dataset the view refers to; this makes no difference to the caller.
+
         :param BasicProcessor processor:  A reference to the processor
         iterating the dataset.
         :param bool warn_unmappable:  If an item is not mappable, skip the item
@@ -536,6 +695,22 @@ class DataSet(FourcatModule):
         :param get_annotations: Whether to also fetch annotations from the database.
           This can be disabled to help speed up iteration.
         :param offset: After how many rows we should yield items.
+        :param int position:  Byte position in the result file at which row
+          `offset` starts, e.g. from `get_row_position()`. This saves looking
+          it up, and allows seeking in result files that are not indexed (yet),
+          such as those of unfinished datasets.
+        :param rows:  Only yield the items at these row numbers, in the given
+          order. Rows are read via the row index; not available for file
+          archives. Each yielded item's `row` property is set to the number of
+          the row it was read from.
+        :param list columns:  Only include these columns in the yielded items.
+          Unrequested fields are then skipped as early as possible: CSV rows
+          are not turned into full dictionaries, mapped items are reduced to
+          the requested fields before missing fields are handled, and the
+          unmapped item is neither copied nor kept (the `original` property of
+          mapped items is `None`). Annotations are only retrieved if an
+          annotation column is requested, in which case the `id` column is
+          included too. Not used for file archives.
         :param bool immediately_delete:  Only used when iterating a file
           archive. Defaults to `True`, if set to `False`, files are not deleted
           from the staging area after the iteration, so they can be re-used.
@@ -548,6 +723,65 @@ class DataSet(FourcatModule):
           not filter.
         :return generator:  A generator that yields DatasetItems
         """
+        for batch in self._iterate_item_batches(
+                processor=processor, warn_unmappable=warn_unmappable, map_missing=map_missing,
+                get_annotations=get_annotations, max_unmappable=max_unmappable, offset=offset, rows=rows,
+                columns=columns, **kwargs
+        ):
+            yield from batch
+
+    def iterate_batches(self, batch_size=None, columnar=False, processor=None, columns=None, **kwargs):
+        """
+        Generate batches of dataset items
+
+        Like `iterate_items()`, but yields many items at once, so that
+        processors that work on many rows at a time do not need to collect
+        them first. Annotations are retrieved once per batch.
+
+        Batches are either lists of `DatasetItem`s, or, if `columnar` is
+        set, dictionaries with a list of values per column (see
+        `iterate_column_batches()`). The latter is the fastest way to read a
+        few columns from a large CSV dataset.
+
+        :param int batch_size:  Maximum number of items per batch. Defaults to
+        500 items, or 10,000 rows for columnar batches. Note that large lists
+        of items make Python's garbage collector work harder, which can
+        outweigh the gains of batching.
+        :param bool columnar:  Yield a list of values per column instead of
+        a list of items
+        :param BasicProcessor processor:  A reference to the processor
+        iterating the dataset.
+        :param list columns:  Only include these columns (see
+        `iterate_items()`). If `columnar` is set and this is `None`, all
+        columns are included.
+        :param kwargs:  Passed to `iterate_items()`
+        :return generator:  A generator that yields batches of items
+        """
+        if columnar:
+            yield from self.iterate_column_batches(
+                processor=processor, columns=columns, batch_size=batch_size or 10000, **kwargs
+            )
+        else:
+            yield from self._iterate_item_batches(batch_size or 500, processor=processor, columns=columns, **kwargs)
+
+    def _iterate_item_batches(
+            self, batch_size=None, processor=None, warn_unmappable=True, map_missing="default", get_annotations=True,
+            max_unmappable=None, offset=0, rows=None, columns=None, **kwargs
+    ):
+        """
+        Generate lists of mapped dataset items
+
+        This is an internal method; call `iterate_items()` or
+        `iterate_batches()` instead, which also document the parameters.
+
+        Items are collected in batches so that annotations can be retrieved
+        for all items in a batch with a single query.
+
+        :param int batch_size:  Maximum number of items per batch. If `None`,
+        batches are as small as possible: 500 items if annotations need to be
+        retrieved, single items otherwise.
+        :return generator:  A generator that yields lists of DatasetItems
+        """
         unmapped_items = 0
 
         # Collect item_mapper for use with filter
@@ -561,8 +795,6 @@ class DataSet(FourcatModule):
         get_annotations = True if self.annotation_fields and get_annotations else False
         if get_annotations:
             annotation_fields = self.annotation_fields.copy()
-            item_batch_size = 500
-            dataset_item_cache = []
             annotations_before = int(time.time())
 
             # Append a number to annotation labels if there's duplicate ones
@@ -575,6 +807,17 @@ class DataSet(FourcatModule):
                     unique_label = f"{annotation_field_items['label']}_{counter}"
                 annotation_labels[annotation_field_id] = unique_label
 
+            if columns is not None:
+                annotation_labels = {field_id: label for field_id, label in annotation_labels.items() if label in columns}
+                get_annotations = bool(annotation_labels)
+
+        if batch_size is None:
+            batch_size = 500 if get_annotations else 1
+
+        if columns is not None:
+            # annotations are matched to items via their ID
+            columns = list(dict.fromkeys([*columns, "id"] if get_annotations else columns))
+
         # missing field strategy can be for all fields at once, or per field
         # if it is per field, it is a dictionary with field names and their strategy
         # if it is for all fields, it may be a callback, 'abort', or 'default'
@@ -586,117 +829,266 @@ class DataSet(FourcatModule):
         iterator = self._iterate_items if self.get_extension() != "zip" else self._iterate_archive_contents
 
         # Loop through items
-        for i, item in enumerate(iterator(processor=processor, offset=offset, *args, **kwargs)):
-            # Save original to yield
-            original_item = item.copy()
-
-            # Map item
-            if item_mapper:
+        if rows is not None:
+            rows = list(rows)
+            iterator = self._iterate_rows
+            kwargs["rows"] = rows
+
+        if self.is_view():
+            # views are read from the result file of their parent
+            iterator = self._iterate_view_items
+
+        # without a mapper, the file is read with only the requested columns
+        if columns is not None and not item_mapper and self.get_extension() != "zip":
+            kwargs["columns"] = columns
+
+        # when reading all items, mapped items can be read from (or stored
+        # in) the mapped item cache, instead of mapping them again
+        items = None
+        cache_writer = None
+        if item_mapper and self.get_extension() == "ndjson" and rows is None and not offset and self.is_finished() \
+                and not self.is_view():
+            mapped_cache = self.get_mapped_cache()
+            row_index = self.get_row_index()
+            if mapped_cache.is_current() and (row_index.is_current() or self.build_row_index(processor)):
+                # the original item is only read from the result file if it
+                # is accessed
+                items = (
+                    (functools.partial(self._get_original_item, *span), mapped_item)
+                    for span, mapped_item in zip(
+                        row_index.get_spans(range(row_index.get_num_rows())), mapped_cache.iterate(processor=processor)
+                    )
+                )
+            elif self.modules.config.get("4cat.mapped_item_cache"):
                 try:
-                    mapped_item = own_processor.get_mapped_item(item)
-                except MapItemException as e:
-                    if warn_unmappable:
-                        # Update dataset log for unmappable items.
-                        self.warn_unmappable_item(i, processor, e)
-
-                    unmapped_items += 1
-                    if max_unmappable and unmapped_items > max_unmappable:
-                        break
-                    else:
-                        continue
+                    cache_writer = mapped_cache.get_writer()
+                except OSError as e:
+                    self.db.log.warning(f"Could not cache mapped items for dataset {self.key}: {e}")
 
-                # check if fields have been marked as 'missing' in the
-                # underlying data, and treat according to the chosen strategy
-                if mapped_item.get_missing_fields():
-                    for missing_field in mapped_item.get_missing_fields():
-                        strategy = map_missing.get(missing_field, default_strategy)
+        if items is None:
+            items = ((item, None) for item in iterator(processor=processor, offset=offset, **kwargs))
 
-                        if callable(strategy):
-                            # delegate handling to a callback
-                            mapped_item.data[missing_field] = strategy(
-                                mapped_item.data, missing_field
-                            )
-                        elif strategy == "keep":
-                            # leave the MissingMappedField in place so the
-                            # caller can distinguish missing from present
-                            continue
-                        elif strategy == "abort":
-                            # raise an exception to be handled at the processor level
-                            raise MappedItemIncompleteException(
-                                f"Cannot process item, field {missing_field} missing in source data."
-                            )
-                        elif strategy == "default":
-                            # use whatever was passed to the object constructor
-                            mapped_item.data[missing_field] = mapped_item.data[
-                                missing_field
-                            ].value
+        batch = []
+        try:
+            for i, (item, mapped_item) in enumerate(items):
+                # Save original to yield; only the mapper could change the item
+                # before it is copied into the DatasetItem
+                original_item = item.copy() if columns is None and item_mapper and mapped_item is None else item
+
+                # Map item
+                if item_mapper:
+                    try:
+                        if type(mapped_item) is MapItemException:
+                            raise mapped_item
+                        elif mapped_item is None:
+                            mapped_item = own_processor.get_mapped_item(item)
+                            if cache_writer:
+                                try:
+                                    cache_writer.add(mapped_item)
+                                except DataSetIndexException as e:
+                                    self.db.log.warning(f"Could not cache mapped items for dataset {self.key}: {e}")
+                                    cache_writer.discard()
+                                    cache_writer = None
+
+                    except MapItemException as e:
+                        if cache_writer:
+                            cache_writer.add_error(e)
+
+                        if warn_unmappable:
+                            # Update dataset log for unmappable items.
+                            self.warn_unmappable_item(i, processor, e)
+
+                        unmapped_items += 1
+                        if max_unmappable and unmapped_items > max_unmappable:
+                            break
                         else:
-                            raise ValueError(
-                                "map_missing must be 'abort', 'default', 'keep', or a callback."
-                            )
-            else:
-                mapped_item = original_item
-
-            # yield a DatasetItem, which is a dict with some special properties
-            dataset_item = DatasetItem(
-                mapper=item_mapper,
-                original=original_item,
-                mapped_object=mapped_item,
-                data_file=original_item["path"] if "path" in original_item and issubclass(type(original_item["path"]), os.PathLike) else None,
-                **(
-                    mapped_item.get_item_data()
-                    if type(mapped_item) is MappedItem
-                    else mapped_item
-                ),
-            )
+                            continue
 
-            # If we're getting annotations, yield in items batches so we don't need to get annotations per item.
-            if get_annotations:
-                dataset_item_cache.append(dataset_item)
-
-                # When we reach the batch limit or the end of the dataset,
-                # get the annotations for cached items and yield the entire thing.
-                if len(dataset_item_cache) >= item_batch_size or i == (self.num_rows - 1):
-
-                    item_ids = [dataset_item.get("id") for dataset_item in dataset_item_cache]
-
-                    # Dict with item ids for fast lookup
-                    annotations_dict = collections.defaultdict(dict)
-                    annotations = self.get_annotations_for_item(item_ids, before=annotations_before)
-                    for item_annotation in annotations:
-                        item_id = item_annotation.item_id
-                        if item_annotation:
-                            annotations_dict[item_id][item_annotation.field_id] = item_annotation.value
-
-                    # Process each dataset item
-                    for dataset_item in dataset_item_cache:
-                        item_id = dataset_item.get("id")
-                        item_annotations = annotations_dict.get(item_id, {})
-
-                        for annotation_field_id, annotation_field_items in annotation_fields.items():
-                            # Get annotation value
-                            value = item_annotations.get(annotation_field_id, "")
-
-                            # Convert list to string if needed
-                            if isinstance(value, list):
-                                value = ",".join(value)
-                            elif value != "":
-                                value = str(value)  # Ensure string type
+                    if columns is not None:
+                        mapped_item = MappedItem({
+                            column: mapped_item.data[column] for column in columns if column in mapped_item.data
+                        }, message=mapped_item.message)
+
+                    # check if fields have been marked as 'missing' in the
+                    # underlying data, and treat according to the chosen strategy
+                    if mapped_item.get_missing_fields():
+                        for missing_field in mapped_item.get_missing_fields():
+                            strategy = map_missing.get(missing_field, default_strategy)
+
+                            if callable(strategy):
+                                # delegate handling to a callback
+                                mapped_item.data[missing_field] = strategy(
+                                    mapped_item.data, missing_field
+                                )
+                            elif strategy == "keep":
+                                # leave the MissingMappedField in place so the
+                                # caller can distinguish missing from present
+                                continue
+                            elif strategy == "abort":
+                                # raise an exception to be handled at the processor level
+                                raise MappedItemIncompleteException(
+                                    f"Cannot process item, field {missing_field} missing in source data."
+                                )
+                            elif strategy == "default":
+                                # use whatever was passed to the object constructor
+                                mapped_item.data[missing_field] = mapped_item.data[
+                                    missing_field
+                                ].value
                             else:
-                                value = ""
+                                raise ValueError(
+                                    "map_missing must be 'abort', 'default', 'keep', or a callback."
+                                )
+                else:
+                    mapped_item = original_item
+
+                # yield a DatasetItem, which is a dict with some special properties
+                dataset_item = DatasetItem(
+                    mapper=item_mapper,
+                    original=original_item if columns is None or not item_mapper else None,
+                    mapped_object=mapped_item,
+                    data_file=original_item["path"] if isinstance(original_item, dict) and "path" in original_item and issubclass(type(original_item["path"]), os.PathLike) else None,
+                    **(
+                        mapped_item.get_item_data()
+                        if type(mapped_item) is MappedItem
+                        else mapped_item
+                    ),
+                )
+
+                dataset_item.row = rows[i] if rows is not None else offset + i
 
-                            dataset_item[annotation_labels[annotation_field_id]] = value
+                batch.append(dataset_item)
 
-                        yield dataset_item
+                # When we reach the batch limit, get the annotations for the
+                # batched items and yield the entire thing.
+                if len(batch) >= batch_size:
+                    if get_annotations:
+                        self._add_annotations_to_items(batch, annotation_labels, annotations_before)
 
-                    dataset_item_cache = []
+                    yield batch
+                    batch = []
 
             else:
-                yield dataset_item
+                # all items have been mapped, so the cache is complete
+                if cache_writer:
+                    cache_writer.commit()
+
+            # the last batch is usually smaller than the batch size
+            if batch:
+                if get_annotations:
+                    self._add_annotations_to_items(batch, annotation_labels, annotations_before)
+
+                yield batch
+
+        finally:
+            # discard partially written caches, e.g. when the caller stopped
+            # iterating early
+            if cache_writer:
+                cache_writer.discard()
+
+    def _add_annotations_to_items(self, dataset_items, annotation_labels, annotations_before):
+        """
+        Add annotation values to a batch of dataset items
+
+        Annotations for all items are retrieved with a single query.
+
+        :param list dataset_items:  DatasetItems to add annotations to
+        :param dict annotation_labels:  Column label to use per annotation
+        field ID
+        :param int annotations_before:  Only include annotations last edited
+        before this timestamp
+        :return list:  The same items, with annotation values added
+        """
+        item_ids = [dataset_item.get("id") for dataset_item in dataset_items]
+
+        # Dict with item ids for fast lookup
+        annotations_dict = collections.defaultdict(dict)
+        annotations = self.get_annotations_for_item(item_ids, before=annotations_before)
+        for item_annotation in annotations:
+            item_id = item_annotation.item_id
+            if item_annotation:
+                annotations_dict[item_id][item_annotation.field_id] = item_annotation.value
+
+        # Process each dataset item
+        for dataset_item in dataset_items:
+            item_id = dataset_item.get("id")
+            item_annotations = annotations_dict.get(item_id, {})
+
+            for annotation_field_id in annotation_labels:
+                # Get annotation value
+                value = item_annotations.get(annotation_field_id, "")
+
+                # Convert list to string if needed
+                if isinstance(value, list):
+                    value = ",".join(value)
+                elif value != "":
+                    value = str(value)  # Ensure string type
+                else:
+                    value = ""
+
+                dataset_item[annotation_labels[annotation_field_id]] = value
+
+        return dataset_items
+
+    def iterate_column_batches(self, processor=None, columns=None, batch_size=10000, **kwargs):
+        """
+        Generate batches of values for a number of columns
+
+        Instead of one item at a time, this yields many rows at once, with the
+        values for each column in a separate list. Values are the same as
+        those of the items yielded by `iterate_items()`.
+
+        If the dataset is a CSV file that does not need to be mapped, and a
+        column store (see `get_column_store()`) is available, only the
+        requested columns are read from it, which is much faster than parsing
+        the full CSV file. Otherwise, the items are read with
+        `iterate_items()` and the requested columns are taken from those.
+
+        :param BasicProcessor processor:  A reference to the processor
+        iterating the dataset.
+        :param list columns:  Columns to get values for. If `None`, use all
+        columns (see `get_columns()`).
+        :param int batch_size:  Maximum number of rows per batch
+        :param kwargs:  Passed to `iterate_items()` if the column store cannot
+        be used
+        :return generator:  Yields a dictionary per batch, with a list of
+        values for each requested column
+        """
+        if columns is None:
+            columns = self.get_columns()
+
+        own_processor = self.get_own_processor()
+        column_store = self.get_column_store()
+        if (
+                self.get_extension() == "csv"
+                and not (own_processor and own_processor.map_item_method_available(dataset=self))
+                and self.is_finished()
+                and self.get_results_path().exists()
+                and (column_store.is_current() or (
+                    self.modules.config.get("4cat.columnar_storage") and self.build_column_store(processor=processor)
+                ))
+                and (not self.annotation_fields or set(columns) <= set(column_store.get_columns()))
+        ):
+            yield from column_store.iterate_batches(columns, batch_size=batch_size, processor=processor)
+            return
 
+        # items are read in smaller batches, since only the values are kept
+        batch = {column: [] for column in columns}
+        batch_length = 0
+        for items in self._iterate_item_batches(min(batch_size, 500), processor=processor, columns=columns, **kwargs):
+            for column in columns:
+                batch[column].extend(item.get(column) for item in items)
+
+            batch_length += len(items)
+            if batch_length >= batch_size:
+                yield batch
+                batch = {column: [] for column in columns}
+                batch_length = 0
+
+        if batch_length:
+            yield batch
 
     def sort_and_iterate_items(
-            self, sort="", reverse=False, chunk_size=50000, **kwargs
+            self, sort="", reverse=False, chunk_size=50000, offset=0, **kwargs
     ) -> dict:
         """
         Loop through items in a dataset, sorted by a given key.
@@ -704,6 +1096,181 @@ class DataSet(FourcatModule):
         This is a wrapper function for `iterate_items()` with the
         added functionality of sorting a dataset.
 
+        For finished CSV and NDJSON datasets, the sort order is stored (see
+        `get_sort_index()`) and re-used on subsequent calls, so that e.g. each
+        page of sorted items in the Explorer only requires reading the items
+        on that page.
+
+        :param sort:				The item key that determines the sort order.
+        :param reverse:				Whether to sort by largest values first.
+        :param chunk_size:          How many items to write
+        :param offset:              How many sorted items to skip
+
+        :returns dict:				Yields iterated post
+        """
+        if not sort or (sort == "dataset-order" and not reverse):
+            yield from self.iterate_items(offset=offset, **kwargs)
+            return
+
+        sort_index = self.get_sort_index(sort, reverse, chunk_size=chunk_size, **kwargs)
+        if sort_index:
+            # read rows in batches, so the generator can be abandoned cheaply
+            batch_size = 1000
+            for batch_start in range(offset, sort_index.get_num_rows(), batch_size):
+                yield from self.iterate_items(rows=sort_index.get_rows(batch_start, batch_size), **kwargs)
+            return
+
+        yield from itertools.islice(self._sort_and_iterate_items_unindexed(sort, reverse, chunk_size, **kwargs), offset, None)
+
+    def get_sort_index(self, sort, reverse=False, chunk_size=50000, **kwargs):
+        """
+        Get the stored sort order of this dataset for a given key
+
+        If it has not been stored yet or is out of date, all items are read
+        and sorted first. Values are sorted as numbers if possible, else as
+        strings, like `sort_and_iterate_items()` does. The sort order is
+        invalidated when the result file changes or, when sorting by an
+        annotation field, when annotations are added, edited or deleted.
+
+        :param str sort:  The item key that determines the sort order
+        :param bool reverse:  Whether to sort by largest values first
+        :param int chunk_size:  How many values to sort in memory at a time
+        :param kwargs:  Passed to `iterate_items()` when sorting
+        :return DatasetSortIndex|None:  Sort order, or `None` if the dataset
+        cannot be indexed (e.g. because it is unfinished)
+        """
+        if not self.is_finished() or self.get_extension() not in ("csv", "ndjson"):
+            return None
+
+        row_index = self.get_row_index()
+        if not row_index.is_current() and not self.build_row_index(processor=kwargs.get("processor")):
+            return None
+
+        sort_index = DatasetSortIndex(self.get_results_path(), sort, reverse)
+        state = self.get_sort_state(sort)
+        if sort_index.is_current(state):
+            return sort_index
+
+        fingerprint = row_index.get_fingerprint()
+        staging_area = None
+        if sort == "dataset-order":
+            sorted_rows = range(row_index.get_num_rows() - 1, -1, -1)
+        else:
+            kwargs["get_annotations"] = sort in self.get_annotation_field_labels()
+            staging_area = self.get_staging_area()
+            sorted_rows = self._sort_rows_in_chunks(sort, reverse, chunk_size, staging_area, **kwargs)
+
+        try:
+            sort_index.write(sorted_rows, state=state, fingerprint=fingerprint)
+        except OSError as e:
+            self.db.log.warning(f"Could not store sort order for dataset {self.key}: {e}")
+            return None
+        finally:
+            if staging_area and staging_area.is_dir():
+                shutil.rmtree(staging_area)
+
+        return sort_index
+
+    def _sort_rows_in_chunks(self, sort, reverse, chunk_size, staging_area, **kwargs):
+        """
+        Get the row numbers of this dataset, sorted by a given key
+
+        Values are sorted in chunks of at most `chunk_size` items, which are
+        written to temporary files and then merged, so memory use does not
+        depend on the size of the dataset. Values are sorted as numbers if
+        possible, else as strings.
+
+        :param str sort:  The item key that determines the sort order
+        :param bool reverse:  Whether to sort by largest values first
+        :param int chunk_size:  How many values to sort in memory at a time
+        :param Path staging_area:  Folder to store sorted chunks in
+        :param kwargs:  Passed to `iterate_items()`
+        :return:  Generator yielding row numbers in sorted order
+        """
+        def float_key(value):
+            return convert_to_float(value[0], force=True)
+
+        def string_key(value):
+            return value[0]
+
+        def write_chunk(chunk_path, values):
+            with chunk_path.open("wb") as outfile:
+                for batch_start in range(0, len(values), 1000):
+                    pickle.dump(values[batch_start:batch_start + 1000], outfile)
+
+        def read_chunk(chunk_path):
+            with chunk_path.open("rb") as infile:
+                while True:
+                    try:
+                        yield from pickle.load(infile)
+                    except EOFError:
+                        break
+
+        # First try to force-sort float values. If this doesn't work, it'll be alphabetical.
+        sort_key = float_key
+        chunk_paths = []
+        values = []
+        items = self.iterate_items(**kwargs)
+        while True:
+            values.clear()
+            values.extend([(item.get(sort, ""), item.row) for item in itertools.islice(items, chunk_size)])
+            if not values:
+                break
+
+            try:
+                values.sort(key=sort_key, reverse=reverse)
+            except (TypeError, ValueError):
+                sort_key = string_key
+                values.sort(key=sort_key, reverse=reverse)
+
+                # chunks sorted as numbers need to be sorted as strings too
+                for chunk_path in chunk_paths:
+                    write_chunk(chunk_path, sorted(read_chunk(chunk_path), key=sort_key, reverse=reverse))
+
+            chunk_paths.append(staging_area.joinpath(f"sort-{len(chunk_paths)}.pickle"))
+            write_chunk(chunk_paths[-1], values)
+
+        values.clear()
+
+        # chunks are in dataset order, so the merge keeps equal values in
+        # dataset order too, like a stable sort would
+        for value in heapq.merge(*[read_chunk(chunk_path) for chunk_path in chunk_paths], key=sort_key, reverse=reverse):
+            yield value[1]
+
+    def get_sort_state(self, sort):
+        """
+        Get the state of data outside the result file a sort order depends on
+
+        Only relevant when sorting by an annotation field; the state then
+        reflects the annotation fields and the number and last edit time of
+        this dataset's annotations.
+
+        :param str sort:  The item key that determines the sort order
+        :return dict:  State; empty if the sort order only depends on the
+        result file
+        """
+        if sort not in self.get_annotation_field_labels():
+            return {}
+
+        annotations = self.db.fetchone(
+            "SELECT COUNT(*) AS num_annotations, COALESCE(MAX(timestamp), 0) AS last_edited FROM annotations WHERE dataset = %s",
+            (self.key,)
+        )
+
+        return {
+            "annotation_fields": self.annotation_fields,
+            "num_annotations": annotations["num_annotations"],
+            "last_edited": annotations["last_edited"],
+        }
+
+    def _sort_and_iterate_items_unindexed(self, sort="", reverse=False, chunk_size=50000, **kwargs):
+        """
+        Loop through items in a dataset, sorted by a given key, without a
+        stored sort order.
+
+        Small datasets are sorted in memory; larger datasets are sorted in
+        chunks that are merged via a temporary file.
+
         :param sort:				The item key that determines the sort order.
         :param reverse:				Whether to sort by largest values first.
         :param chunk_size:          How many items to write
@@ -884,6 +1451,294 @@ class DataSet(FourcatModule):
             if staging_area.is_dir():
                 shutil.rmtree(staging_area)
 
+    def get_row_index(self):
+        """
+        Get the row index for this dataset's result file
+
+        The index is stored in sidecar files next to the result file. The
+        returned object may refer to an index that has not been built yet or
+        is out of date; use its `is_current()` method to check.
+
+        :return DatasetRowIndex:
+        """
+        return DatasetRowIndex(self.get_results_path())
+
+    def get_index_paths(self):
+        """
+        Get paths of all index files stored for this dataset's result file
+
+        This includes the row index, any stored sort orders, the column store
+        and the mapped item cache.
+
+        :return list:  List of paths
+        """
+        if not self.data.get("result_file"):
+            return []
+
+        results_path = self.get_results_path()
+        return list(results_path.parent.glob(glob.escape(results_path.name) + ".*"))
+
+    def build_row_index(self, processor=None):
+        """
+        (Re)build the row index for this dataset's result file
+
+        Only CSV and NDJSON files can be indexed. Failure to build the index
+        is logged but otherwise not fatal, since items can always be read
+        sequentially instead.
+
+        :param BasicProcessor processor:  Processor building the index; if
+        given, its `interrupted` flag is checked while building
+        :return bool:  Whether the index was built
+        """
+        if self.get_extension() not in ("csv", "ndjson") or self.is_view():
+            return False
+
+        try:
+            self.get_row_index().build(processor=processor)
+            return True
+        except (OSError, UnicodeDecodeError, csv.Error, DataSetIndexException) as e:
+            self.db.log.warning(f"Could not build row index for dataset {self.key}: {e}")
+            return False
+
+    def get_row_position(self, row, processor=None, start=None):
+        """
+        Get the byte position at which a row starts in the result file
+
+        Uses the row index, which is built if it does not exist yet or is out
+        of date. Only finished datasets are indexed, since the result file of
+        an unfinished dataset may still change.
+
+        If there is no index, the position can be found by reading the result
+        file from an earlier row whose position is known, e.g. from a previous
+        call. This also works for unfinished datasets, since their result
+        files are only appended to.
+
+        :param int row:  Row number, zero-based
+        :param BasicProcessor processor:  Processor that needs the position;
+        passed on when the index needs to be built
+        :param tuple start:  `(row, position)` of a row at or before `row`
+        whose position is known; position `None` stands for the first row
+        :return int|None:  Byte position, or `None` if it cannot be determined
+        """
+        index = self.get_row_index()
+        if self.is_finished() and (index.is_current() or self.build_row_index(processor=processor)):
+            try:
+                return index.get_offset(row)
+            except (OSError, DataSetIndexException):
+                pass
+
+        if start is None or start[0] > row or self.get_extension() not in ("csv", "ndjson"):
+            return None
+
+        try:
+            return index.find_offset(row - start[0], start=start[1])
+        except (OSError, UnicodeDecodeError, csv.Error, DataSetIndexException):
+            return None
+
+    def is_view(self):
+        """
+        Check if this dataset is a view on another dataset
+
+        Views have no result file of their own; they store which rows of
+        their parent's result file they contain instead (see
+        `get_row_selection()`). Their items can be read with
+        `iterate_items()` like those of any other dataset; use
+        `materialise_view()` if a result file is needed.
+
+        :return bool:
+        """
+        return bool(self.parameters and self.parameters.get("view_of"))
+
+    def get_row_selection(self):
+        """
+        Get the rows of the parent's result file this view consists of
+
+        :return DatasetRowSelection:
+        """
+        return DatasetRowSelection(self.get_results_path())
+
+    def get_view_parent(self):
+        """
+        Get the dataset whose result file this view reads from
+
+        This need not be the dataset's parent in the dataset hierarchy;
+        filtered datasets are usually made standalone.
+
+        :return DataSet:  Dataset, or `None` if this is not a view
+        """
+        if not self.is_view():
+            return None
+
+        return DataSet(key=self.parameters["view_of"], db=self.db, modules=self.modules)
+
+    def materialise_view(self):
+        """
+        Write the items of a view to a result file of its own
+
+        The selected rows are copied from the parent's result file as-is, and
+        the dataset is a regular dataset afterwards. This is done when the
+        dataset is downloaded or the parent is deleted.
+
+        :return bool:  Whether a result file was written; `False` if the
+        dataset is not a view
+        """
+        if not self.is_view():
+            return False
+
+        parent = self.get_view_parent()
+        index = parent.get_row_index()
+        if not index.is_current() and not parent.build_row_index():
+            raise DataSetException(f"No row index available for dataset {parent.key}")
+
+        selection = self.get_row_selection()
+        results_path = self.get_results_path()
+        temp_path = results_path.with_name(f"{results_path.name}-{os.getpid()}.tmp")
+        with parent.get_results_path().open("rb") as infile, temp_path.open("wb") as outfile:
+            if parent.get_extension() == "csv":
+                # everything before the first row is the header
+                outfile.write(infile.read(index.get_offset(0)))
+
+            for start, end in index.get_spans(selection.iterate_rows()):
+                infile.seek(start)
+                outfile.write(infile.read(end - start))
+
+        os.replace(temp_path, results_path)
+        self.delete_parameter("view_of")
+        selection.delete()
+
+        if self.is_finished():
+            self.build_row_index()
+
+        return True
+
+    def get_column_store(self):
+        """
+        Get the column store for this dataset's result file
+
+        The column store is a Parquet copy of a CSV result file, stored next
+        to it, from which individual columns can be read efficiently. It is
+        only built if the `4cat.columnar_storage` setting is enabled. The
+        returned object may refer to a store that has not been built yet or
+        is out of date; use its `is_current()` method to check.
+
+        :return DatasetColumnStore:
+        """
+        return DatasetColumnStore(self.get_results_path())
+
+    def build_column_store(self, processor=None):
+        """
+        (Re)build the column store for this dataset's result file
+
+        Only CSV files can be stored in columns. Failure to build the store is
+        logged but otherwise not fatal, since items can always be read from
+        the CSV file instead.
+
+        :param BasicProcessor processor:  Processor building the store; if
+        given, its `interrupted` flag is checked while building
+        :return bool:  Whether the store was built
+        """
+        if self.get_extension() != "csv" or self.is_view():
+            return False
+
+        try:
+            self.get_column_store().build(processor=processor)
+            return True
+        except (OSError, UnicodeDecodeError, csv.Error, DataSetIndexException) as e:
+            self.db.log.warning(f"Could not build column store for dataset {self.key}: {e}")
+            return False
+
+    def get_mapped_cache(self):
+        """
+        Get the mapped item cache for this dataset's result file
+
+        The cache stores the output of the data source's `map_item()` for
+        each item of an NDJSON dataset, next to the result file, so that
+        `iterate_items()` does not need to map the items again. It is built
+        while iterating through all items of a finished dataset, if the
+        `4cat.mapped_item_cache` setting is enabled. The returned object may
+        refer to a cache that has not been built yet or is out of date; use
+        its `is_current()` method to check.
+
+        :return DatasetMappedCache:
+        """
+        return DatasetMappedCache(self.get_results_path(), get_mapper_version(self.get_own_processor()))
+
+    def _get_original_item(self, start, end):
+        """
+        Read an unmapped item from the NDJSON result file
+
+        Used for items read from the mapped item cache, whose original is
+        only read when it is accessed.
+
+        :param int start:  Byte position at which the item starts
+        :param int end:  Byte position at which the item ends
+        :return dict:  Item
+        """
+        with self.get_results_path().open("rb") as infile:
+            infile.seek(start)
+            return json.loads(infile.read(end - start))
+
+    def get_item(self, item_id, **kwargs):
+        """
+        Get a single item from the dataset by its ID
+
+        Item IDs are looked up in an index that maps them to rows in the
+        result file, so the item can be read without iterating through the
+        items before it. The index is built on first use; for datasets with a
+        `map_item` method this means the dataset is mapped once in full.
+
+        :param item_id:  ID of the item to get
+        :param kwargs:  Passed to `iterate_items()`; annotations are not
+        included unless `get_annotations=True` is passed
+        :return DatasetItem|None:  The item, or `None` if no item with the
+        given ID exists
+        """
+        if self.get_extension() not in ("csv", "ndjson"):
+            raise NotImplementedError(f"Cannot look up items by ID in a {self.get_extension()} file")
+
+        kwargs.setdefault("get_annotations", False)
+        kwargs.setdefault("warn_unmappable", False)
+
+        if self.is_view():
+            # views have no file of their own to index
+            return next((item for item in self.iterate_items(**kwargs) if str(item.get("id")) == str(item_id)), None)
+
+        index = self.get_row_index()
+        if not index.is_id_index_current():
+            index.build_id_index(self._iterate_item_ids(processor=kwargs.get("processor")), processor=kwargs.get("processor"))
+
+        for row in index.get_rows_for_id(item_id):
+            # hashed IDs may collide, so check if this is the right item
+            item = next(self.iterate_items(offset=row, **kwargs), None)
+            if item is not None and str(item.get("id")) == str(item_id):
+                return item
+
+        return None
+
+    def _iterate_item_ids(self, processor=None):
+        """
+        Iterate through the IDs of all rows in the result file
+
+        Mapped items are used to determine the ID if the dataset has a mapper;
+        unmappable items have no ID.
+
+        :param BasicProcessor processor:  A reference to the processor
+        iterating the dataset.
+        :return generator:  Yields an ID (or `None`) for every row
+        """
+        own_processor = self.get_own_processor()
+        item_mapper = own_processor and own_processor.map_item_method_available(dataset=self)
+
+        for item in self._iterate_items(processor=processor):
+            if not item_mapper:
+                yield item.get("id")
+                continue
+
+            try:
+                yield own_processor.get_mapped_item(item).get_item_data().get("id")
+            except MapItemException:
+                yield None
+
     def get_staging_area(self):
         """
         Get path to a temporary folder in which files can be stored before
@@ -993,6 +1848,8 @@ class DataSet(FourcatModule):
         elif not isinstance(status_type, StatusType):
             raise ValueError("status_type must be a StatusType enum value")
 
+        # delivered when the update below is committed
+        self.db.notify(self.NOTIFY_CHANNEL, self.key, commit=False)
         self.db.update(
             "datasets",
             where={"key": self.data["key"]},
@@ -1008,6 +1865,15 @@ class DataSet(FourcatModule):
         self.data["num_rows"] = num_rows
         self.data["status_type"] = status_type.value
 
+        # index the result file so it can be read from arbitrary rows later
+        if num_rows > 0 and not self.get_row_index().is_current():
+            self.build_row_index()
+
+        # and store it in columns, if enabled, so individual columns can be
+        # read without parsing the full file
+        if num_rows > 0 and self.modules.config.get("4cat.columnar_storage") and not self.get_column_store().is_current():
+            self.build_column_store()
+
     def copy(self, shallow=True):
         """
         Copies the dataset, making a new version with a unique key
@@ -1044,6 +1910,9 @@ class DataSet(FourcatModule):
         if shallow:
             # use the same result file
             copy.result_file = self.result_file
+        elif self.is_view():
+            # copy the selection, which refers to the same parent
+            shutil.copy(self.get_row_selection().selection_path, copy.get_row_selection().selection_path)
         else:
             # copy to new file with new key
             shutil.copy(self.get_results_path(), copy.get_results_path())
@@ -1080,6 +1949,18 @@ class DataSet(FourcatModule):
                 # dataset already deleted - race condition?
                 pass
 
+        # views on this dataset read from its result file, so they need a
+        # file of their own before it is deleted
+        views = self.db.fetchall("SELECT key FROM datasets WHERE parameters::json->>'view_of' = %s", (self.key,))
+        for view in views:
+            try:
+                DataSet(key=view["key"], db=self.db, modules=self.modules).materialise_view()
+            except DataSetException:
+                # view already deleted
+                pass
+            except (OSError, DataSetIndexException) as e:
+                self.db.log.error(f"Could not write view {view['key']} of dataset {self.key} to a file: {e}")
+
         # delete any queued jobs for this dataset
         try:
             job = Job.get_by_remote_ID(self.key, self.db, self.type)
@@ -1123,7 +2004,7 @@ class DataSet(FourcatModule):
         self.db.delete("users_favourites", where={"key": self.key}, commit=commit)
 
         # delete from drive
-        files_to_delete = [self.get_results_path()] + ([self.get_results_path().with_suffix(".log")] if delete_log else [])
+        files_to_delete = [self.get_results_path(), *self.get_index_paths()] + ([self.get_results_path().with_suffix(".log")] if delete_log else [])
         for path in files_to_delete:
             try:
                 if path.exists():
@@ -1182,9 +2063,17 @@ class DataSet(FourcatModule):
 
         :return bool:  Whether the dataset is rankable or not
         """
+        results_path = self.get_results_path()
+        if self.is_view():
+            # views have the columns of the result file they read from
+            try:
+                results_path = self.get_view_parent().get_results_path()
+            except DataSetException:
+                return False
+
         if (
                 self.get_results_path().suffix != ".csv"
-                or not self.get_results_path().exists()
+                or not results_path.exists()
         ):
             return False
 
@@ -1192,7 +2081,7 @@ class DataSet(FourcatModule):
         if multiple_items:
             column_options.add("word_1")
 
-        with self.get_results_path().open(encoding="utf-8") as infile:
+        with results_path.open(encoding="utf-8") as infile:
             reader = csv.DictReader(infile)
             try:
                 return len(set(reader.fieldnames) & column_options) >= 3
@@ -1437,7 +2326,7 @@ class DataSet(FourcatModule):
 
         :return list:  List of dataset columns; empty list if unable to parse
         """
-        if not self.get_results_path().exists():
+        if not self.get_results_path().exists() and not self.is_view():
             # no file to get columns from
             return []
 
@@ -1728,6 +2617,7 @@ class DataSet(FourcatModule):
             self.data["status_type"] = status_type.value
             status_data["status_type"] = status_type.value
         self.data["status"] = status
+        self.db.notify(self.NOTIFY_CHANNEL, self.key, commit=False)
         updated = self.db.update(
             "datasets", where={"key": self.data["key"]}, data=status_data
         )
@@ -1754,6 +2644,7 @@ class DataSet(FourcatModule):
             progress = float(progress)
 
         self.data["progress"] = progress
+        self.db.notify(self.NOTIFY_CHANNEL, self.key, commit=False)
         updated = self.db.update(
             "datasets", where={"key": self.data["key"]}, data={"progress": progress}
         )
@@ -2342,7 +3233,7 @@ class DataSet(FourcatModule):
 
         :return str extension:  Extension, e.g. `csv`
         """
-        if self.get_results_path().exists():
+        if self.get_results_path().exists() or self.is_view():
             return self.get_results_path().suffix[1:]
 
         return False
@@ -2656,8 +3547,8 @@ class DataSet(FourcatModule):
         if not annotations:
             return 0
 
-        count = 0
         annotation_fields = self.annotation_fields
+        default_author = None
 
         # Add some dataset data to annotations, if not present
         for annotation_data in annotations:
@@ -2687,13 +3578,14 @@ class DataSet(FourcatModule):
             # Set default author to this dataset owner
             # If this annotation is made by a processor, it will have the processor name
             if not annotation_data.get("author"):
-                annotation_data["author"] = self.get_owners()[0]
-
-            # Create Annotation object, which also saves it to the database
-            # If this dataset/item_id/field_id combination already exists, this retrieves the
-            # existing data and updates it with new values.
-            Annotation(data=annotation_data, db=self.db)
-            count += 1
+                if default_author is None:
+                    default_author = self.get_owners()[0]
+                annotation_data["author"] = default_author
+
+        # Save all annotations at once
+        # If a dataset/item_id/field_id combination already exists, the
+        # existing annotation is updated with the new values.
+        count = Annotation.save_many(self.db, annotations)
 
         # Save annotation fields if things changed
         if annotation_fields != self.annotation_fields:
@@ -0,0 +1,204 @@
+"""
+Columnar copies of dataset result files
+"""
+import json
+import csv
+import os
+
+from pathlib import Path
+
+from common.lib.helpers import NullAwareTextIOWrapper
+from common.lib.exceptions import DataSetIndexException, ProcessorInterruptedException
+
+
+class DatasetColumnStore:
+    """
+    Parquet copy of a CSV dataset result file
+
+    Reading a single column from a CSV file still means parsing every value
+    of every row. This stores the same data column by column, so that readers
+    that need only a few columns can read just those, many rows at a time.
+
+    The CSV file remains the canonical version of the data; the column store
+    is a sidecar file next to it, like the row index (see
+    `common.lib.dataset_index`). It records the size and modification time of
+    the file it was built from, and is ignored as stale as soon as the result
+    file changes. All values are stored as strings (or null, for missing
+    values), i.e. exactly as `csv.DictReader` would return them.
+
+    pyarrow is only imported once a store is built or read, so that processes
+    that never use one do not pay for loading it.
+    """
+    METADATA_KEY = b"4cat"
+
+    # rows per row group; also the amount of rows held in memory while
+    # building the store
+    row_group_size = 10000
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        :param Path path:  Path to the CSV result file
+        """
+        self.path = Path(path)
+        self.store_path = self.path.with_name(self.path.name + ".parquet")
+
+    def get_fingerprint(self):
+        """
+        Get a fingerprint of the current state of the result file
+
+        :return dict:  File size and modification time (in nanoseconds)
+        """
+        stat = self.path.stat()
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    def is_current(self):
+        """
+        Check if the column store exists and matches the current result file
+
+        :return bool:
+        """
+        # checked first so that pyarrow is not loaded if there is no store,
+        # e.g. because columnar storage is not enabled
+        if not self.store_path.exists():
+            return False
+
+        import pyarrow
+
+        try:
+            return self._read_metadata().get("fingerprint") == self.get_fingerprint()
+        except (OSError, ValueError, pyarrow.ArrowException):
+            return False
+
+    def build(self, processor=None):
+        """
+        Build the column store from the CSV file
+
+        The file is read with `csv.DictReader` in the same way as
+        `DataSet.iterate_items()` does, and written in row groups of
+        `row_group_size` rows, so the whole file is never held in memory.
+
+        :param BasicProcessor processor:  Processor building the store; if
+        given, its `interrupted` flag is checked while building
+        :return int:  Number of rows stored
+        """
+        import pyarrow.parquet
+
+        if self.path.suffix.lower() != ".csv":
+            raise DataSetIndexException(f"Cannot build column store for {self.path.name}: not a CSV file")
+
+        fingerprint = self.get_fingerprint()
+        temp_path = self.store_path.with_name(self.store_path.name + ".tmp")
+        num_rows = 0
+
+        try:
+            with self.path.open("rb") as infile:
+                reader = csv.DictReader(NullAwareTextIOWrapper(infile, encoding="utf-8"))
+                fieldnames = list(dict.fromkeys(reader.fieldnames or []))
+                schema = pyarrow.schema([(field, pyarrow.string()) for field in fieldnames], metadata={
+                    self.METADATA_KEY: json.dumps({"fingerprint": fingerprint})
+                })
+
+                with pyarrow.parquet.ParquetWriter(temp_path, schema) as writer:
+                    batch = []
+                    for row in reader:
+                        batch.append(row)
+                        if len(batch) >= self.row_group_size:
+                            if processor and processor.interrupted:
+                                raise ProcessorInterruptedException("Interrupted while building column store")
+
+                            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                            num_rows += len(batch)
+                            batch = []
+
+                    # always write the last batch, so that the file has the
+                    # right schema even if there are no rows
+                    writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                    num_rows += len(batch)
+
+            os.replace(temp_path, self.store_path)
+
+        except pyarrow.ArrowException as e:
+            raise DataSetIndexException(f"Cannot build column store for {self.path.name}: {e}")
+
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+        return num_rows
+
+    def get_columns(self):
+        """
+        Get the names of the stored columns
+
+        :return list:  Column names, in the order they appear in the CSV file
+        """
+        import pyarrow.parquet
+
+        return pyarrow.parquet.read_schema(self.store_path).names
+
+    def get_num_rows(self):
+        """
+        Get the number of stored rows
+
+        :return int:
+        """
+        import pyarrow.parquet
+
+        return pyarrow.parquet.ParquetFile(self.store_path).metadata.num_rows
+
+    def iterate_batches(self, columns=None, batch_size=10000, processor=None):
+        """
+        Read batches of rows from the column store
+
+        Only the requested columns are read from disk. Columns that do not
+        exist in the store are returned as lists of `None`, like a missing key
+        would be by `dict.get()`.
+
+        :param list columns:  Columns to read; `None` to read all columns
+        :param int batch_size:  Maximum number of rows per batch
+        :param BasicProcessor processor:  Processor reading the store; if
+        given, its `interrupted` flag is checked for each batch
+        :return generator:  Yields a dictionary per batch, with a list of
+        values for each requested column
+        """
+        import pyarrow.parquet
+
+        stored_columns = self.get_columns()
+        if columns is None:
+            columns = stored_columns
+
+        read_columns = [column for column in dict.fromkeys(columns) if column in stored_columns]
+        parquet_file = pyarrow.parquet.ParquetFile(self.store_path)
+
+        if not read_columns:
+            # nothing to read, but the number of rows still matters
+            num_rows = parquet_file.metadata.num_rows
+            for start in range(0, num_rows, batch_size):
+                size = min(batch_size, num_rows - start)
+                yield {column: [None] * size for column in columns}
+            return
+
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=read_columns):
+            if processor and processor.interrupted:
+                raise ProcessorInterruptedException("Interrupted while reading column store")
+
+            values = batch.to_pydict()
+            yield {column: values[column] if column in values else [None] * batch.num_rows for column in columns}
+
+    def delete(self):
+        """
+        Delete the column store, if it exists
+        """
+        self.store_path.unlink(missing_ok=True)
+
+    def _read_metadata(self):
+        """
+        Read the 4CAT metadata stored in the column store
+
+        :return dict:  Metadata
+        """
+        import pyarrow.parquet
+
+        metadata = pyarrow.parquet.read_schema(self.store_path).metadata or {}
+        return json.loads(metadata.get(self.METADATA_KEY, b"{}"))
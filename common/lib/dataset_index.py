@@ -0,0 +1,745 @@
+"""
+Sidecar indexes for random access into dataset result files
+"""
+import itertools
+import tempfile
+import hashlib
+import bisect
+import shutil
+import array
+import json
+import zlib
+import sys
+import csv
+import os
+
+from pathlib import Path
+
+from common.lib.exceptions import DataSetIndexException, ProcessorInterruptedException
+
+
+class DatasetRowIndex:
+    """
+    Byte-offset index for a CSV or NDJSON dataset result file
+
+    Result files can only be read sequentially, so skipping to e.g. row
+    100.000 normally means parsing every row before it. This index stores the
+    byte position at which each row starts, so a reader can seek to it
+    directly. A second, optional, index maps item IDs to row numbers.
+
+    Indexes are stored as sidecar files next to the result file. They record
+    the size and modification time of the file they were built from, and are
+    ignored as stale as soon as the result file changes.
+
+    Both index files consist of a magic string, a length-prefixed JSON header
+    and one or more arrays of little-endian unsigned 64-bit integers. Single
+    values are read by seeking, so the index never needs to be loaded into
+    memory as a whole.
+    """
+    ROW_MAGIC = b"4CATRIX1"
+    ID_MAGIC = b"4CATIIX1"
+
+    # how often to check for interruptions while building the index
+    interrupt_check_interval = 10000
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        :param Path path:  Path to the result file to index
+        """
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".rowindex")
+        self.id_index_path = self.path.with_name(self.path.name + ".idindex")
+
+    def get_fingerprint(self):
+        """
+        Get a fingerprint of the current state of the indexed file
+
+        :return dict:  File size and modification time (in nanoseconds)
+        """
+        stat = self.path.stat()
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    def is_current(self):
+        """
+        Check if the row index exists and matches the current result file
+
+        :return bool:
+        """
+        return self._is_current(self.index_path, self.ROW_MAGIC)
+
+    def is_id_index_current(self):
+        """
+        Check if the item ID index exists and matches the current result file
+
+        :return bool:
+        """
+        return self._is_current(self.id_index_path, self.ID_MAGIC)
+
+    def build(self, processor=None):
+        """
+        Build the row index
+
+        CSV files are parsed with the `csv` module while keeping track of the
+        byte position, so that quoted values containing line breaks are not
+        mistaken for the start of a new row. Empty rows are skipped, as
+        `csv.DictReader` does.
+
+        :param BasicProcessor processor:  Processor building the index; if
+        given, its `interrupted` flag is checked while building
+        :return int:  Number of indexed rows
+        """
+        fingerprint = self.get_fingerprint()
+        suffix = self.path.suffix.lower()
+        offsets = array.array("Q")
+        fieldnames = None
+
+        with self.path.open("rb") as infile:
+            if suffix == ".csv":
+                rows = self._iterate_csv_rows(infile)
+                fieldnames = next(rows, (0, None))[1]
+                for row_start, row in rows:
+                    if not row:
+                        continue
+
+                    offsets.append(row_start)
+                    self._check_interrupted(processor, len(offsets))
+
+            elif suffix == ".ndjson":
+                position = 0
+                for line in infile:
+                    offsets.append(position)
+                    self._check_interrupted(processor, len(offsets))
+                    position += len(line)
+
+            else:
+                raise DataSetIndexException(f"Cannot index {suffix} file")
+
+        self._write(self.index_path, self.ROW_MAGIC, {
+            **fingerprint,
+            "num_rows": len(offsets),
+            "fieldnames": fieldnames
+        }, offsets)
+
+        return len(offsets)
+
+    def find_offset(self, row, start=None):
+        """
+        Find the byte position at which a row starts by reading the file
+
+        Reading starts at a row whose position is already known, e.g. from an
+        earlier lookup, so only the rows in between are parsed. Unlike the
+        index, this also works for files that are still being appended to.
+
+        :param int row:  Row number, counted from the starting row
+        :param int|None start:  Byte position at which the starting row
+        begins, or `None` to start at the first row of the file
+        :return int:  Byte position of the row. Rows past the end of the file
+        resolve to the file size.
+        """
+        suffix = self.path.suffix.lower()
+        if row < 0:
+            raise ValueError("Row number must be non-negative")
+
+        with self.path.open("rb") as infile:
+            if start is not None:
+                infile.seek(start)
+
+            if suffix == ".csv":
+                rows = self._iterate_csv_rows(infile, start or 0)
+                if start is None:
+                    # skip header
+                    next(rows, None)
+
+                for row_start, values in rows:
+                    if not values:
+                        continue
+                    elif row == 0:
+                        return row_start
+
+                    row -= 1
+
+            elif suffix == ".ndjson":
+                position = start or 0
+                for line in infile:
+                    if row == 0:
+                        return position
+
+                    row -= 1
+                    position += len(line)
+
+            else:
+                raise DataSetIndexException(f"Cannot index {suffix} file")
+
+            return infile.tell()
+
+    def build_id_index(self, item_ids, processor=None):
+        """
+        Build the item ID index
+
+        Item IDs are not necessarily part of the raw data (e.g. for NDJSON
+        files they are only known after mapping), so the IDs are passed by
+        the caller, one per row in the same order as the row index.
+
+        IDs are stored as 64-bit hashes, sorted so they can be looked up with
+        a binary search. Hashes may collide, so callers should check that the
+        item at a returned row actually has the requested ID.
+
+        :param item_ids:  Iterable with the ID of each row, or `None` for rows
+        without an ID
+        :param BasicProcessor processor:  Processor building the index; if
+        given, its `interrupted` flag is checked while building
+        :return int:  Number of indexed IDs
+        """
+        fingerprint = self.get_fingerprint()
+        hashes = array.array("Q")
+        rows = array.array("Q")
+
+        for row, item_id in enumerate(item_ids):
+            self._check_interrupted(processor, row)
+            if item_id is None:
+                continue
+
+            hashes.append(self.hash_id(item_id))
+            rows.append(row)
+
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        sorted_values = array.array("Q", (hashes[i] for i in order))
+        sorted_values.extend(rows[i] for i in order)
+
+        self._write(self.id_index_path, self.ID_MAGIC, {
+            **fingerprint,
+            "num_ids": len(hashes)
+        }, sorted_values)
+
+        return len(hashes)
+
+    def get_num_rows(self):
+        """
+        Get the number of rows in the indexed file
+
+        :return int:
+        """
+        header, _ = self._read_header(self.index_path, self.ROW_MAGIC)
+        return header["num_rows"]
+
+    def get_fieldnames(self):
+        """
+        Get the CSV header as recorded when building the index
+
+        :return list|None:  Field names, or `None` for NDJSON files
+        """
+        header, _ = self._read_header(self.index_path, self.ROW_MAGIC)
+        return header["fieldnames"]
+
+    def get_offset(self, row):
+        """
+        Get the byte position at which a row starts
+
+        Rows past the end of the file resolve to the file size, so that
+        reading from the returned position yields nothing.
+
+        :param int row:  Row number, zero-based, not counting the CSV header
+        :return int:  Byte position in the result file
+        """
+        header, data_start = self._read_header(self.index_path, self.ROW_MAGIC)
+        if row < 0:
+            raise ValueError("Row number must be non-negative")
+        elif row >= header["num_rows"]:
+            return header["size"]
+
+        with self.index_path.open("rb") as infile:
+            return self._read_value(infile, data_start, row)
+
+    def get_spans(self, rows):
+        """
+        Get the byte range of each of the given rows
+
+        Rows past the end of the file resolve to an empty range.
+
+        :param rows:  Iterable of row numbers
+        :return generator:  Yields a `(start, end)` tuple for each row
+        """
+        header, data_start = self._read_header(self.index_path, self.ROW_MAGIC)
+        num_rows = header["num_rows"]
+
+        with self.index_path.open("rb") as infile:
+            for row in rows:
+                if row < 0:
+                    raise ValueError("Row number must be non-negative")
+                elif row >= num_rows:
+                    yield header["size"], header["size"]
+                    continue
+
+                start = self._read_value(infile, data_start, row)
+                end = self._read_value(infile, data_start, row + 1) if row + 1 < num_rows else header["size"]
+                yield start, end
+
+    def get_rows_for_id(self, item_id):
+        """
+        Get the row numbers of items that may have the given ID
+
+        :param item_id:  Item ID to look up
+        :return list:  Row numbers, in file order
+        """
+        header, data_start = self._read_header(self.id_index_path, self.ID_MAGIC)
+        num_ids = header["num_ids"]
+        target = self.hash_id(item_id)
+        rows = []
+
+        with self.id_index_path.open("rb") as infile:
+            low, high = 0, num_ids
+            while low < high:
+                middle = (low + high) // 2
+                if self._read_value(infile, data_start, middle) < target:
+                    low = middle + 1
+                else:
+                    high = middle
+
+            while low < num_ids and self._read_value(infile, data_start, low) == target:
+                rows.append(self._read_value(infile, data_start, num_ids + low))
+                low += 1
+
+        return sorted(rows)
+
+    def delete(self):
+        """
+        Remove the index files, if they exist
+        """
+        for path in (self.index_path, self.id_index_path):
+            path.unlink(missing_ok=True)
+
+    @staticmethod
+    def hash_id(item_id):
+        """
+        Hash an item ID to a 64-bit integer
+
+        :param item_id:  Item ID; compared as a string
+        :return int:
+        """
+        return int.from_bytes(hashlib.blake2b(str(item_id).encode("utf-8"), digest_size=8).digest(), "little")
+
+    def _is_current(self, index_path, magic):
+        """
+        Check if an index file exists and matches the current result file
+
+        :param Path index_path:  Index file to check
+        :param bytes magic:  Expected magic string
+        :return bool:
+        """
+        try:
+            header, _ = self._read_header(index_path, magic)
+            fingerprint = self.get_fingerprint()
+        except (DataSetIndexException, OSError):
+            return False
+
+        return all(header.get(key) == value for key, value in fingerprint.items())
+
+    @staticmethod
+    def _iterate_csv_rows(infile, position=0):
+        """
+        Parse a CSV file while keeping track of the byte position
+
+        :param infile:  File opened in binary mode, at the start of a row
+        :param int position:  Current position in the file
+        :return generator:  Yields a `(position, row)` tuple per row, with
+        the byte position at which the row starts
+        """
+        def read_lines():
+            nonlocal position
+            for line in infile:
+                position += len(line)
+                yield line.decode("utf-8").replace("\0", "")
+
+        reader = csv.reader(read_lines())
+        while True:
+            row_start = position
+            row = next(reader, None)
+            if row is None:
+                return
+
+            yield row_start, row
+
+    def _check_interrupted(self, processor, iteration):
+        """
+        Raise if the processor building the index was interrupted
+
+        :param BasicProcessor processor:  Processor, or `None`
+        :param int iteration:  Current iteration; only checked periodically
+        """
+        if iteration % self.interrupt_check_interval == 0 and hasattr(processor, "interrupted") and processor.interrupted:
+            raise ProcessorInterruptedException("Processor interrupted while indexing dataset file")
+
+    @staticmethod
+    def _read_value(infile, data_start, position):
+        """
+        Read a single integer from an index file
+
+        :param infile:  Opened index file (binary mode)
+        :param int data_start:  Position at which the index data starts
+        :param int position:  Index of the value to read
+        :return int:
+        """
+        infile.seek(data_start + (position * 8))
+        return int.from_bytes(infile.read(8), "little")
+
+    @staticmethod
+    def _read_header(index_path, magic):
+        """
+        Read the header of an index file
+
+        :param Path index_path:  Index file to read
+        :param bytes magic:  Expected magic string
+        :return tuple:  Header (as a dict) and the position at which the
+        index data starts
+        """
+        try:
+            with index_path.open("rb") as infile:
+                if infile.read(len(magic)) != magic:
+                    raise DataSetIndexException(f"{index_path.name} is not a valid index file")
+
+                header_length = int.from_bytes(infile.read(4), "little")
+                header = json.loads(infile.read(header_length))
+        except (FileNotFoundError, ValueError) as e:
+            raise DataSetIndexException(f"Cannot read index file {index_path.name}: {e}")
+
+        return header, len(magic) + 4 + header_length
+
+    @staticmethod
+    def _write(index_path, magic, header, values):
+        """
+        Write an index file
+
+        The file is written to a temporary file first and then moved in place,
+        so concurrent readers never see a half-written index.
+
+        :param Path index_path:  Path to write the index to
+        :param bytes magic:  Magic string identifying the index type
+        :param dict header:  Header data
+        :param array.array values:  Index data, or a binary file object
+        positioned at the start of index data that is already little-endian
+        """
+        if isinstance(values, array.array) and sys.byteorder != "little":
+            values.byteswap()
+
+        header = json.dumps(header).encode("utf-8")
+        temp_path = index_path.with_name(f"{index_path.name}-{os.getpid()}.tmp")
+        with temp_path.open("wb") as outfile:
+            outfile.write(magic)
+            outfile.write(len(header).to_bytes(4, "little"))
+            outfile.write(header)
+            if isinstance(values, array.array):
+                values.tofile(outfile)
+            else:
+                shutil.copyfileobj(values, outfile)
+
+        os.replace(temp_path, index_path)
+
+
+class DatasetSortIndex:
+    """
+    Persisted sort order for a dataset result file
+
+    Sorting a dataset requires reading all of it, which is too slow to do for
+    every page of sorted results in e.g. the Explorer. This stores the sorted
+    order, as a list of row numbers, in a sidecar file next to the result
+    file, so subsequent pages can be read via the row index.
+
+    The sort order is valid as long as the result file is unchanged and the
+    `state` it was stored with matches; callers can use the latter to
+    invalidate it when data not in the result file (e.g. annotations) changes.
+    """
+    MAGIC = b"4CATSOX1"
+
+    def __init__(self, path, sort, reverse=False):
+        """
+        Constructor
+
+        :param Path path:  Path to the sorted result file
+        :param str sort:  Column the rows are sorted by
+        :param bool reverse:  Whether the rows are sorted in descending order
+        """
+        self.path = Path(path)
+        self.sort = sort
+        self.reverse = bool(reverse)
+
+        sort_hash = hashlib.blake2b(json.dumps([sort, self.reverse]).encode("utf-8"), digest_size=8).hexdigest()
+        self.index_path = self.path.with_name(f"{self.path.name}.sort-{sort_hash}")
+
+    def is_current(self, state=None):
+        """
+        Check if the stored sort order matches the current result file
+
+        :param dict state:  Additional state the sort order depends on; must
+        be equal to the state passed to `write()`
+        :return bool:
+        """
+        try:
+            header, _ = DatasetRowIndex._read_header(self.index_path, self.MAGIC)
+            stat = self.path.stat()
+        except (DataSetIndexException, OSError):
+            return False
+
+        return header.get("size") == stat.st_size and header.get("mtime") == stat.st_mtime_ns \
+            and header.get("sort") == self.sort and header.get("reverse") == self.reverse \
+            and header.get("state") == (state or {})
+
+    def write(self, rows, state=None, fingerprint=None):
+        """
+        Store a sort order
+
+        :param rows:  Row numbers, in sorted order. This can be a generator,
+        e.g. one that merges sorted chunks of a large dataset; rows are
+        buffered on disk rather than in memory until all have been read.
+        :param dict state:  Additional state the sort order depends on
+        :param dict fingerprint:  Fingerprint of the result file as it was
+        when the rows were sorted (see `DatasetRowIndex.get_fingerprint()`);
+        if omitted, the current state of the file is used
+        """
+        if fingerprint is None:
+            fingerprint = DatasetRowIndex(self.path).get_fingerprint()
+
+        # the number of rows is part of the header, which precedes the rows
+        # themselves, so they need to be counted before writing the index
+        rows = iter(rows)
+        num_rows = 0
+        with tempfile.TemporaryFile(dir=self.index_path.parent) as rows_file:
+            while chunk := array.array("Q", itertools.islice(rows, 65536)):
+                if sys.byteorder != "little":
+                    chunk.byteswap()
+                chunk.tofile(rows_file)
+                num_rows += len(chunk)
+
+            rows_file.seek(0)
+            DatasetRowIndex._write(self.index_path, self.MAGIC, {
+                **fingerprint,
+                "sort": self.sort,
+                "reverse": self.reverse,
+                "state": state or {},
+                "num_rows": num_rows
+            }, rows_file)
+
+    def get_num_rows(self):
+        """
+        Get the number of sorted rows
+
+        :return int:
+        """
+        header, _ = DatasetRowIndex._read_header(self.index_path, self.MAGIC)
+        return header["num_rows"]
+
+    def get_rows(self, offset=0, limit=None):
+        """
+        Get a slice of the sorted row numbers
+
+        :param int offset:  Position in the sorted order to start at
+        :param int limit:  Number of rows to return; `None` for all
+        :return array.array:  Row numbers
+        """
+        header, data_start = DatasetRowIndex._read_header(self.index_path, self.MAGIC)
+        offset = min(max(offset, 0), header["num_rows"])
+        limit = header["num_rows"] - offset if limit is None else min(limit, header["num_rows"] - offset)
+
+        rows = array.array("Q")
+        with self.index_path.open("rb") as infile:
+            infile.seek(data_start + (offset * 8))
+            rows.frombytes(infile.read(limit * 8))
+
+        if sys.byteorder != "little":
+            rows.byteswap()
+
+        return rows
+
+    def delete(self):
+        """
+        Remove the stored sort order, if it exists
+        """
+        self.index_path.unlink(missing_ok=True)
+
+
+class DatasetRowSelection:
+    """
+    Selection of rows from another dataset's result file
+
+    Filtered datasets can be stored as a 'view' on the dataset they were
+    filtered from, rather than as a copy of the matching items. The view then
+    only stores which rows of that dataset's result file it contains, and
+    items are read from there via the row index.
+
+    The selection is stored in a sidecar file next to the (not yet existing)
+    result file of the view, as a zlib-compressed bitmap with one bit per row
+    of the parent file. Rows are thus always selected in file order. A filter
+    that keeps most rows needs about one bit per row, and one that keeps few
+    rows compresses to little more than the selected row numbers.
+    """
+    MAGIC = b"4CATVWX1"
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        :param Path path:  Path to the result file of the view
+        """
+        self.path = Path(path)
+        self.selection_path = self.path.with_name(self.path.name + ".rows")
+
+        self._words = None
+        self._counts = None
+
+    def exists(self):
+        """
+        Check if a selection has been stored
+
+        :return bool:
+        """
+        return self.selection_path.exists()
+
+    def write(self, rows, parent, num_parent_rows):
+        """
+        Store a selection
+
+        :param rows:  Iterable of selected row numbers in the parent file
+        :param str parent:  Key of the dataset the rows are selected from
+        :param int num_parent_rows:  Number of rows in the parent file
+        :return int:  Number of selected rows
+        """
+        # pad to whole 64-bit words, so the bitmap can be read as such
+        bitmap = bytearray(((num_parent_rows + 63) // 64) * 8)
+        num_rows = 0
+        for row in rows:
+            if row < 0 or row >= num_parent_rows:
+                raise DataSetIndexException(f"Row {row} is not part of the parent dataset")
+
+            if not bitmap[row >> 3] & (1 << (row & 7)):
+                bitmap[row >> 3] |= 1 << (row & 7)
+                num_rows += 1
+
+        header = json.dumps({
+            "parent": parent,
+            "num_rows": num_rows,
+            "num_parent_rows": num_parent_rows
+        }).encode("utf-8")
+
+        temp_path = self.selection_path.with_name(f"{self.selection_path.name}-{os.getpid()}.tmp")
+        with temp_path.open("wb") as outfile:
+            outfile.write(self.MAGIC)
+            outfile.write(len(header).to_bytes(4, "little"))
+            outfile.write(header)
+            outfile.write(zlib.compress(bitmap))
+
+        os.replace(temp_path, self.selection_path)
+        self._words = None
+        self._counts = None
+
+        return num_rows
+
+    def get_parent(self):
+        """
+        Get the key of the dataset the rows are selected from
+
+        :return str:
+        """
+        header, _ = DatasetRowIndex._read_header(self.selection_path, self.MAGIC)
+        return header["parent"]
+
+    def get_num_rows(self):
+        """
+        Get the number of selected rows
+
+        :return int:
+        """
+        header, _ = DatasetRowIndex._read_header(self.selection_path, self.MAGIC)
+        return header["num_rows"]
+
+    def iterate_rows(self, offset=0):
+        """
+        Iterate through the selected rows of the parent file, in order
+
+        :param int offset:  Number of selected rows to skip
+        :return generator:  Yields parent row numbers
+        """
+        words = self._get_words()
+        start = 0
+        if offset > 0:
+            # skip whole words up to the one containing the requested row
+            counts = self._get_counts()
+            start = bisect.bisect_right(counts, offset)
+            if start >= len(words):
+                return
+            offset -= counts[start - 1] if start else 0
+
+        for word_index, word in enumerate(itertools.islice(words, start, None), start=start):
+            while word:
+                lowest = word & -word
+                word ^= lowest
+                if offset:
+                    offset -= 1
+                    continue
+
+                yield (word_index << 6) + lowest.bit_length() - 1
+
+    def get_parent_rows(self, rows):
+        """
+        Get the parent row numbers for rows of the view
+
+        :param rows:  Iterable of row numbers in the view, in any order
+        :return generator:  Yields the corresponding parent row numbers; rows
+        past the end of the view are skipped
+        """
+        words = self._get_words()
+        counts = self._get_counts()
+        num_rows = counts[-1] if counts else 0
+
+        for row in rows:
+            if row < 0:
+                raise ValueError("Row number must be non-negative")
+            elif row >= num_rows:
+                continue
+
+            word_index = bisect.bisect_right(counts, row)
+            word = words[word_index]
+            for _ in range(row - (counts[word_index - 1] if word_index else 0)):
+                word &= word - 1
+
+            yield (word_index << 6) + (word & -word).bit_length() - 1
+
+    def delete(self):
+        """
+        Remove the stored selection, if it exists
+        """
+        self.selection_path.unlink(missing_ok=True)
+        self._words = None
+        self._counts = None
+
+    def _get_words(self):
+        """
+        Read the selection bitmap
+
+        :return array.array:  Bitmap, as 64-bit words
+        """
+        if self._words is None:
+            _, data_start = DatasetRowIndex._read_header(self.selection_path, self.MAGIC)
+            with self.selection_path.open("rb") as infile:
+                infile.seek(data_start)
+                try:
+                    bitmap = zlib.decompress(infile.read())
+                except zlib.error as e:
+                    raise DataSetIndexException(f"Cannot read row selection {self.selection_path.name}: {e}")
+
+            self._words = array.array("Q", bitmap)
+            if sys.byteorder != "little":
+                self._words.byteswap()
+
+        return self._words
+
+    def _get_counts(self):
+        """
+        Get the number of selected rows up to and including each word
+
+        :return array.array:
+        """
+        if self._counts is None:
+            self._counts = array.array("Q", itertools.accumulate(word.bit_count() for word in self._get_words()))
+
+        return self._counts
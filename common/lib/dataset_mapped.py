@@ -0,0 +1,205 @@
+"""
+Cached output of map_item() for dataset result files
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import uuid
+
+from pathlib import Path
+
+from common.lib.helpers import get_software_commit
+from common.lib.module_loader import ModuleCollector
+from common.lib.item_mapping import MappedItem, MissingMappedField
+from common.lib.exceptions import DataSetIndexException, MapItemException, ProcessorInterruptedException
+
+
+@functools.lru_cache(maxsize=None)
+def get_mapper_version(processor):
+    """
+    Get a string identifying the version of a processor's `map_item()`
+
+    This combines the commit 4CAT (or the extension the processor is part
+    of) is at with a hash of the processor's source file, so that the version
+    also changes when the file is edited without committing. Processors are
+    only loaded when 4CAT starts, so the result is cached for the lifetime of
+    the process.
+
+    :param processor:  Processor class
+    :return str:  Version string
+    """
+    commit, repository = get_software_commit(processor)
+    try:
+        source_hash = hashlib.sha1(Path(inspect.getfile(ModuleCollector.get_worker_class(processor))).read_bytes()).hexdigest()
+    except (TypeError, OSError):
+        source_hash = ""
+
+    return f"{commit}:{source_hash}"
+
+
+class DatasetMappedCache:
+    """
+    Stored output of `map_item()` for an NDJSON dataset result file
+
+    Mapping items is often more expensive than reading them, and it is done
+    again every time a dataset is iterated through. This stores the mapped
+    version of each item in a sidecar file next to the result file, from
+    which items can be read without decoding the (usually much larger)
+    original item or mapping it again.
+
+    Each line of the file is a JSON object, with the mapped item data and the
+    names of any missing fields, or the error message if the item could not
+    be mapped, so that the cache has a line for every row of the result file.
+    The first line records the size and modification time of the result file
+    and the version of the mapper (see `get_mapper_version()`); the cache is
+    ignored as stale as soon as either changes.
+    """
+    def __init__(self, path, version):
+        """
+        Constructor
+
+        :param Path path:  Path to the NDJSON result file
+        :param str version:  Version of the mapper the cache is for
+        """
+        self.path = Path(path)
+        self.version = version
+        self.store_path = self.path.with_name(self.path.name + ".mapped")
+
+    def get_header(self):
+        """
+        Get the header describing the current result file and mapper
+
+        :return dict:
+        """
+        stat = self.path.stat()
+        return {"fingerprint": {"size": stat.st_size, "mtime": stat.st_mtime_ns}, "version": self.version}
+
+    def is_current(self):
+        """
+        Check if the cache exists and matches the current file and mapper
+
+        :return bool:
+        """
+        try:
+            with self.store_path.open("rb") as infile:
+                return json.loads(infile.readline()) == self.get_header()
+        except (OSError, ValueError):
+            return False
+
+    def get_writer(self):
+        """
+        Get a writer with which to (re)build the cache
+
+        :return DatasetMappedCacheWriter:
+        """
+        return DatasetMappedCacheWriter(self)
+
+    def iterate(self, processor=None):
+        """
+        Read mapped items from the cache
+
+        Items that could not be mapped when the cache was built are yielded
+        as a `MapItemException`, with the original message, so that callers
+        can handle them as if `map_item()` had just raised it.
+
+        :param BasicProcessor processor:  Processor reading the cache; if
+        given, its `interrupted` flag is checked for each item
+        :return generator:  Yields a `MappedItem` or `MapItemException` for
+        each row of the result file
+        """
+        with self.store_path.open("r", encoding="utf-8") as infile:
+            infile.readline()
+            for line in infile:
+                if hasattr(processor, "interrupted") and processor.interrupted:
+                    raise ProcessorInterruptedException("Processor interrupted while iterating through mapped items")
+
+                cached = json.loads(line)
+                if "error" in cached:
+                    yield MapItemException(cached["error"])
+                    continue
+
+                data = cached["data"]
+                for field in cached.get("missing", []):
+                    data[field] = MissingMappedField(data[field])
+
+                yield MappedItem(data, message=cached.get("message", ""))
+
+    def delete(self):
+        """
+        Delete the cache, if it exists
+        """
+        self.store_path.unlink(missing_ok=True)
+
+
+class DatasetMappedCacheWriter:
+    """
+    Writes mapped items to a mapped item cache
+
+    Items are written to a temporary file, which only replaces the cache when
+    `commit()` is called, i.e. when every row of the result file has been
+    added. Several writers can safely write the same cache at the same time;
+    the last to commit wins.
+    """
+    def __init__(self, cache):
+        """
+        Constructor
+
+        :param DatasetMappedCache cache:  Cache to write
+        """
+        self.cache = cache
+        self.header = cache.get_header()
+        self.temp_path = cache.store_path.with_name(f"{cache.store_path.name}.{uuid.uuid4().hex}.tmp")
+        self.outfile = self.temp_path.open("w", encoding="utf-8")
+        self.outfile.write(json.dumps(self.header) + "\n")
+
+    def add(self, mapped_item):
+        """
+        Add the next mapped item
+
+        This should be called before missing fields are resolved, since the
+        `MissingMappedField`s themselves need to be stored.
+
+        :param MappedItem mapped_item:  Mapped item
+        """
+        data = mapped_item.get_item_data()
+        missing = mapped_item.get_missing_fields()
+        cached = {"data": {field: value.value if field in missing else value for field, value in data.items()}}
+        if missing:
+            cached["missing"] = missing
+        if mapped_item.get_message():
+            cached["message"] = mapped_item.get_message()
+
+        try:
+            self.outfile.write(json.dumps(cached) + "\n")
+        except (TypeError, ValueError) as e:
+            raise DataSetIndexException(f"Cannot cache mapped item: {e}")
+
+    def add_error(self, error):
+        """
+        Add an item that could not be mapped
+
+        :param MapItemException error:  Exception raised while mapping
+        """
+        self.outfile.write(json.dumps({"error": str(error)}) + "\n")
+
+    def commit(self):
+        """
+        Replace the cache with the written items
+
+        If the result file changed while the items were being written, the
+        written items are discarded instead.
+        """
+        self.outfile.close()
+        if self.cache.get_header() == self.header:
+            os.replace(self.temp_path, self.cache.store_path)
+        else:
+            self.discard()
+
+    def discard(self):
+        """
+        Throw away the written items
+        """
+        self.outfile.close()
+        self.temp_path.unlink(missing_ok=True)
@@ -78,6 +78,13 @@ class DataSetNotFoundException(DataSetException):
     pass
 
 
+class DataSetIndexException(DataSetException):
+    """
+    Raise if a dataset index file cannot be read or built
+    """
+    pass
+
+
 class CsvDialectException(FourcatException):
     """
     Raised when there is a problem with the configuration settings.
@@ -0,0 +1,352 @@
+"""
+Find pairs of similar bit hashes
+"""
+import math
+
+import numpy as np
+
+from common.lib.exceptions import ProcessorInterruptedException
+
+
+# number of set bits in each possible byte, for numpy versions without
+# np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """
+    Count the set bits in each row of packed hashes
+
+    :param np.ndarray words:  Array of uint64 words, with the words of a hash
+    along the last axis
+    :return np.ndarray:  Number of set bits per hash
+    """
+    if hasattr(np, "bitwise_count"):
+        counts = np.bitwise_count(words)
+    else:
+        counts = _BYTE_POPCOUNT[words.view(np.uint8)].reshape(*words.shape[:-1], words.shape[-1] * 8)
+
+    return counts.sum(axis=-1, dtype=np.uint32)
+
+
+class HammingIndex:
+    """
+    Packed bit hashes that can be searched for near-duplicates
+
+    Hashes are stored as rows of 64-bit words, so that the Hamming distance
+    between two hashes is the number of set bits in the XOR of their words.
+    `iterate_pairs()` finds all pairs of hashes within a given distance of
+    each other without comparing bits one by one in Python.
+
+    For small distances, pairs are found via multi-index hashing: if the
+    hashes are split into more parts than the maximum distance, two hashes
+    within that distance are identical in at least one part, so only hashes
+    sharing a part need to be compared. Otherwise, or if too many hashes
+    share parts for that to help, all pairs are compared in tiles of hashes
+    at a time.
+    """
+    #: Maximum number of words compared at a time when comparing all pairs;
+    #: this determines how many hashes are compared with each other at once
+    tile_words = 1 << 22
+
+    #: Maximum number of candidate pairs compared at a time when using
+    #: multi-index hashing
+    batch_size = 1 << 20
+
+    def __init__(self, words, bit_length):
+        """
+        Constructor
+
+        Use `from_bits()` or `from_bool_arrays()` to create an index from
+        unpacked hashes.
+
+        :param np.ndarray words:  2D array of uint64 words, one row per hash;
+        bits past `bit_length` must be zero
+        :param int bit_length:  Number of bits per hash
+        """
+        self.words = np.ascontiguousarray(words, dtype=np.uint64)
+        self.bit_length = bit_length
+
+    @classmethod
+    def from_bool_arrays(cls, hashes):
+        """
+        Create an index from hashes given as sequences of bits
+
+        :param hashes:  Iterable of equally long sequences of bits, e.g. bool
+        arrays as stored in `imagehash.ImageHash.hash` (which are flattened)
+        :return HammingIndex:
+        """
+        hashes = [np.asarray(bit_hash, dtype=bool).ravel() for bit_hash in hashes]
+        if not hashes:
+            return cls(np.zeros((0, 1), dtype=np.uint64), 0)
+
+        bit_length = len(hashes[0])
+        if any(len(bit_hash) != bit_length for bit_hash in hashes):
+            raise ValueError("All hashes must be of the same length")
+
+        bits = np.array(hashes, dtype=bool).reshape(len(hashes), bit_length)
+        num_words = max(1, math.ceil(bit_length / 64))
+        padded = np.zeros((len(bits), num_words * 64), dtype=bool)
+        padded[:, :bit_length] = bits
+
+        # most significant bit first within each word
+        packed = np.packbits(padded, axis=1).reshape(len(bits), num_words, 8)
+        words = packed.view(">u8").reshape(len(bits), num_words).astype(np.uint64)
+
+        return cls(words, bit_length)
+
+    @classmethod
+    def from_bits(cls, hashes):
+        """
+        Create an index from hashes given as strings of ones and zeroes
+
+        :param hashes:  Iterable of equally long strings such as `"1011"`
+        :return HammingIndex:
+        """
+        return cls.from_bool_arrays([np.frombuffer(bit_hash.encode("ascii"), dtype=np.uint8) == ord("1") for bit_hash in hashes])
+
+    def __len__(self):
+        """
+        :return int:  Number of hashes in the index
+        """
+        return len(self.words)
+
+    def get_distances(self, left, right):
+        """
+        Get the Hamming distance between pairs of hashes
+
+        :param np.ndarray left:  Indexes of the first hash of each pair
+        :param np.ndarray right:  Indexes of the second hash of each pair
+        :return np.ndarray:  Distance per pair
+        """
+        return popcount(self.words[left] ^ self.words[right])
+
+    def iterate_pairs(self, max_distance, processor=None):
+        """
+        Find all pairs of hashes within a given distance of each other
+
+        Each pair is yielded once, with the lower index first. Pairs are
+        yielded in batches of arbitrary size and order.
+
+        :param int max_distance:  Maximum Hamming distance, inclusive
+        :param BasicProcessor processor:  If given, its `interrupted` flag is
+        checked between batches
+        :return generator:  Yields `(left, right, distance)` tuples of numpy
+        arrays
+        """
+        if len(self) < 2 or max_distance < 0:
+            return
+
+        parts = self._get_parts(max_distance)
+        if parts:
+            yield from self._iterate_pairs_by_parts(parts, max_distance, processor)
+        else:
+            yield from self._iterate_pairs_by_tiles(max_distance, processor)
+
+    def get_groups(self, max_distance, processor=None):
+        """
+        Group hashes that are within a given distance of each other
+
+        Groups are connected components: hashes end up in the same group if
+        they are linked via a chain of pairs within the given distance, even
+        if they are not within that distance themselves.
+
+        :param int max_distance:  Maximum Hamming distance, inclusive
+        :param BasicProcessor processor:  If given, its `interrupted` flag is
+        checked while searching
+        :return np.ndarray:  Group number per hash; groups are numbered in
+        order of their first hash
+        """
+        return connected_components(len(self), (
+            (left, right) for left, right, _ in self.iterate_pairs(max_distance, processor=processor)
+        ))
+
+    def get_num_comparisons(self):
+        """
+        Get the number of pairs of hashes
+
+        :return int:
+        """
+        return math.comb(len(self), 2)
+
+    def _get_parts(self, max_distance):
+        """
+        Decide how to split hashes for multi-index hashing
+
+        Parts need to be long enough that hashes rarely share one by chance,
+        else nearly all pairs end up being compared anyway.
+
+        :param int max_distance:  Maximum Hamming distance
+        :return list:  `(start, end)` bit ranges, or an empty list if
+        multi-index hashing is not worthwhile
+        """
+        num_parts = max(max_distance + 1, math.ceil(self.bit_length / 64))
+        if self.bit_length < num_parts * 16:
+            return []
+
+        bounds = [round(part * self.bit_length / num_parts) for part in range(num_parts + 1)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _get_part_keys(self, start, end):
+        """
+        Get the value of a range of bits of each hash
+
+        :param int start:  First bit, inclusive
+        :param int end:  Last bit, exclusive; at most 64 bits after `start`
+        :return np.ndarray:  uint64 value of the bits per hash
+        """
+        keys = np.zeros(len(self), dtype=np.uint64)
+        bit = start
+        while bit < end:
+            word, offset = divmod(bit, 64)
+            length = min(end - bit, 64 - offset)
+            part = self.words[:, word] >> np.uint64(64 - offset - length)
+            if length < 64:
+                part &= np.uint64((1 << length) - 1)
+                keys <<= np.uint64(length)
+
+            keys |= part
+            bit += length
+
+        return keys
+
+    def _iterate_pairs_by_parts(self, parts, max_distance, processor):
+        """
+        Find pairs via multi-index hashing
+
+        A pair may share several parts; it is only yielded for the first.
+        Falls back to comparing all pairs if the parts are shared too often.
+
+        :param list parts:  Bit ranges, from `_get_parts()`
+        :param int max_distance:  Maximum Hamming distance
+        :param BasicProcessor processor:  Processor to check for interruption
+        :return generator:  Yields `(left, right, distance)` tuples
+        """
+        all_keys = [self._get_part_keys(start, end) for start, end in parts]
+        orders = [np.argsort(keys, kind="stable") for keys in all_keys]
+
+        # count candidate pairs first, so no work is wasted if there are too many
+        num_candidates = 0
+        for keys, order in zip(all_keys, orders):
+            sorted_keys = keys[order]
+            run_starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+            run_lengths = np.diff(np.append(run_starts, len(sorted_keys))).astype(np.int64)
+            num_candidates += int((run_lengths * (run_lengths - 1) // 2).sum())
+
+        if num_candidates > self.get_num_comparisons() // 4:
+            yield from self._iterate_pairs_by_tiles(max_distance, processor)
+            return
+
+        for part, (keys, order) in enumerate(zip(all_keys, orders)):
+            sorted_keys = keys[order]
+
+            # pair each hash with the hashes `distance` places further in the
+            # sorted order, for as long as they share the part; positions
+            # that no longer do cannot match at larger distances either
+            positions = np.arange(len(sorted_keys))
+            distance = 1
+            while len(positions):
+                positions = positions[positions + distance < len(sorted_keys)]
+                positions = positions[sorted_keys[positions] == sorted_keys[positions + distance]]
+
+                for batch_start in range(0, len(positions), self.batch_size):
+                    self._check_interrupted(processor)
+                    batch = positions[batch_start:batch_start + self.batch_size]
+                    left = order[batch]
+                    right = order[batch + distance]
+                    left, right = np.minimum(left, right), np.maximum(left, right)
+
+                    # pairs sharing an earlier part have been found already
+                    new = np.ones(len(left), dtype=bool)
+                    for earlier_keys in all_keys[:part]:
+                        new &= earlier_keys[left] != earlier_keys[right]
+
+                    left, right = left[new], right[new]
+                    distances = self.get_distances(left, right)
+                    within = distances <= max_distance
+                    if within.any():
+                        yield left[within], right[within], distances[within]
+
+                distance += 1
+
+    def _iterate_pairs_by_tiles(self, max_distance, processor):
+        """
+        Find pairs by comparing all hashes with each other
+
+        :param int max_distance:  Maximum Hamming distance
+        :param BasicProcessor processor:  Processor to check for interruption
+        :return generator:  Yields `(left, right, distance)` tuples
+        """
+        num_hashes = len(self)
+        tile_size = max(64, math.isqrt(self.tile_words // self.words.shape[1]))
+        for left_start in range(0, num_hashes, tile_size):
+            left_words = self.words[left_start:left_start + tile_size]
+            for right_start in range(left_start, num_hashes, tile_size):
+                self._check_interrupted(processor)
+                right_words = self.words[right_start:right_start + tile_size]
+                distances = popcount(left_words[:, None, :] ^ right_words[None, :, :])
+
+                within = distances <= max_distance
+                if left_start == right_start:
+                    # only compare each pair once, and not with itself
+                    within &= np.triu(np.ones(within.shape, dtype=bool), k=1)
+
+                left, right = np.nonzero(within)
+                if len(left):
+                    yield left + left_start, right + right_start, distances[left, right]
+
+    @staticmethod
+    def _check_interrupted(processor):
+        """
+        Raise if the processor searching the index was interrupted
+
+        :param BasicProcessor processor:  Processor, or `None`
+        """
+        if hasattr(processor, "interrupted") and processor.interrupted:
+            raise ProcessorInterruptedException("Interrupted while comparing hashes")
+
+
+def connected_components(num_nodes, edges):
+    """
+    Find connected components in a graph
+
+    :param int num_nodes:  Number of nodes, numbered from zero
+    :param edges:  Iterable of `(left, right)` tuples of arrays of node
+    numbers
+    :return np.ndarray:  Component number per node; components are numbered
+    in order of their lowest node
+    """
+    # union-find with path halving; each root is the lowest node of its tree
+    parents = np.arange(num_nodes)
+
+    def find(nodes):
+        roots = parents[nodes]
+        while True:
+            grandparents = parents[roots]
+            if np.array_equal(grandparents, roots):
+                return roots
+            roots = grandparents
+
+    for left, right in edges:
+        left = np.asarray(left)
+        right = np.asarray(right)
+        while len(left):
+            left_roots = find(left)
+            right_roots = find(right)
+            different = left_roots != right_roots
+            if not different.any():
+                break
+
+            low = np.minimum(left_roots, right_roots)[different]
+            high = np.maximum(left_roots, right_roots)[different]
+            # several edges may try to re-link the same root at once; the
+            # lowest wins, and the others are retried
+            np.minimum.at(parents, high, low)
+            left, right = left[different], right[different]
+
+        # flatten, so later lookups are quick
+        parents = find(parents)
+
+    roots = find(np.arange(num_nodes))
+    _, labels = np.unique(roots, return_inverse=True)
+    return labels
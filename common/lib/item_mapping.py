@@ -91,7 +91,8 @@ class DatasetItem(dict):
 
         :param callable mapper:  Mapper for this item. Currently unused, could
           be used for above-mentioned just-in-time mapping.
-        :param dict original:  Original item, e.g. from the csv or ndjson
+        :param dict original:  Original item, e.g. from the csv or ndjson, or
+          a callable that returns it, if it should only be read when accessed
         :param MappedItem mapped_object:  Mapped item, before resolving any
           potential missing data
         :param Path data_file:  Path to the file this item represents, if any,
@@ -103,6 +104,7 @@ class DatasetItem(dict):
         self._original = original
         self._mapped_object = mapped_object
         self._file = data_file
+        self._row = None
 
         if hasattr(mapped_object, "get_missing_fields"):
             self.missing_fields = mapped_object.get_missing_fields()
@@ -117,6 +119,24 @@ class DatasetItem(dict):
         """
         return self._file
 
+    @property
+    def row(self):
+        """
+        Return the number of the row this item was read from, if known
+
+        :return int|None:
+        """
+        return self._row
+
+    @row.setter
+    def row(self, row):
+        """
+        Set the number of the row this item was read from
+
+        :param int row:
+        """
+        self._row = row
+
     @property
     def original(self):
         """
@@ -124,6 +144,9 @@ class DatasetItem(dict):
 
         :return dict:
         """
+        if callable(self._original):
+            self._original = self._original()
+
         return self._original
 
     @property
@@ -21,6 +21,11 @@ class Job:
 	#: claimable again. See `park()` and `queue.release_all()`.
 	STATUS_PARKED = -1
 
+	#: Postgres notification channel on which changes to the job queue are
+	#: announced, so the job dispatcher does not need to poll for them. The
+	#: payload is the ID of the queue that changed.
+	NOTIFY_CHANNEL = "fourcat_jobs"
+
 	is_finished = False
 	is_claimed = False
 	is_parked = False
@@ -132,6 +137,7 @@ class Job:
 						   where={"jobtype": self.data["jobtype"], "remote_id": self.data["remote_id"]})
 
 		self.is_finished = True
+		self.notify()
 
 	def release(self, delay=0, claim_after=0, increment_attempts=True):
 		"""
@@ -160,6 +166,7 @@ class Job:
 		self.db.update("jobs", data=update,
 					   where={"jobtype": self.data["jobtype"], "remote_id": self.data["remote_id"]})
 		self.is_claimed = False
+		self.notify()
 
 	def park(self):
 		"""
@@ -181,6 +188,16 @@ class Job:
 		self.data["attempts"] = self.data["attempts"] + 1
 		self.is_claimed = False
 		self.is_parked = True
+		self.notify()
+
+	def notify(self):
+		"""
+		Announce a change to this job's queue
+
+		Sent when a job is finished, released or parked, since that may free
+		up a worker slot or make the job claimable again.
+		"""
+		self.db.notify(self.NOTIFY_CHANNEL, str(self.data.get("queue_id") or ""))
 
 	@property
 	def is_recurring(self):
@@ -0,0 +1,364 @@
+"""
+Send prompts to an LLM concurrently, with retries and a response cache
+"""
+import concurrent.futures
+import collections
+import threading
+import hashlib
+import sqlite3
+import random
+import json
+import time
+
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Union
+
+import requests
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from common.lib.llm.adapter import LLMAdapter
+
+
+class LLMRequest:
+    """
+    A prompt to send to an LLM, with everything needed to generate a response
+    """
+    def __init__(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            temperature: float = 0.1,
+            files: Optional[List[str]] = None,
+            media_files: Optional[List[Union[str, Path]]] = None,
+            json_schema: Optional[dict] = None,
+            adapter: Optional[LLMAdapter] = None,
+            context=None,
+    ):
+        """
+        :param str prompt:  User prompt
+        :param str system_prompt:  System prompt
+        :param float temperature:  Temperature for generation
+        :param list files:  Media URLs for multimodal input
+        :param list media_files:  Local media files for multimodal input
+        :param dict json_schema:  JSON schema bound to the adapter for
+          structured output, if any. Only used to tell cached responses apart;
+          bind the schema to the adapter with `LLMAdapter.set_structure()`.
+        :param LLMAdapter adapter:  Adapter to use for this request instead
+          of the pool's, e.g. because it has a different schema bound to it
+        :param context:  Anything the caller needs to process the response;
+          returned with it as is
+        """
+        self.prompt = prompt
+        self.system_prompt = system_prompt
+        self.temperature = temperature
+        self.files = files or []
+        self.media_files = media_files or []
+        self.json_schema = json_schema
+        self.adapter = adapter
+        self.context = context
+
+
+class LLMResponseCache:
+    """
+    Persistent store of earlier LLM responses
+
+    Responses are stored in an SQLite database, keyed by a hash of everything
+    that determines the response: the server and model, prompts, JSON
+    schema, generation parameters, and media. This way, running a prompt again with
+    the same settings returns the earlier response without contacting the
+    LLM server.
+    """
+    def __init__(self, path: Union[str, Path]):
+        """
+        :param Path path:  Path to the database file; created if it does not
+          exist yet
+        """
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, created INTEGER)")
+        self.db.commit()
+
+    @staticmethod
+    def get_key(adapter: LLMAdapter, request: LLMRequest) -> str:
+        """
+        Get the cache key for a request
+
+        :param LLMAdapter adapter:  Adapter the request is sent with
+        :param LLMRequest request:  Request
+        :return str:  Cache key
+        """
+        media_hashes = []
+        for media_file in request.media_files:
+            media_hash = hashlib.sha256()
+            with Path(media_file).open("rb") as infile:
+                while chunk := infile.read(1024 * 1024):
+                    media_hash.update(chunk)
+            media_hashes.append(media_hash.hexdigest())
+
+        key = json.dumps({
+            "server": adapter.server.get("_id", adapter.server.get("url")) if adapter.server else None,
+            "model": adapter.model.get("id", adapter.model["local_id"]),
+            "system_prompt": request.system_prompt,
+            "prompt": request.prompt,
+            "json_schema": request.json_schema,
+            "temperature": request.temperature,
+            "max_tokens": adapter.max_tokens,
+            "files": request.files,
+            "media_files": media_hashes,
+        }, sort_keys=True)
+
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Get a cached response
+
+        :param str key:  Cache key
+        :return:  Response, as returned by `LLMAdapter.generate_text()`, or
+          `None` if there is no cached response
+        """
+        with self.lock:
+            row = self.db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+
+        if not row:
+            return None
+
+        response = json.loads(row[0])
+        if "message" in response:
+            return messages_from_dict([response["message"]])[0]
+        else:
+            return response["value"]
+
+    def set(self, key: str, response) -> None:
+        """
+        Store a response
+
+        :param str key:  Cache key
+        :param response:  Response, as returned by
+          `LLMAdapter.generate_text()`: a message, or parsed structured output
+        """
+        if isinstance(response, BaseMessage):
+            response = {"message": messages_to_dict([response])[0]}
+        else:
+            response = {"value": response}
+
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                            (key, json.dumps(response), int(time.time())))
+            self.db.commit()
+
+    def close(self) -> None:
+        """
+        Close the database connection
+        """
+        with self.lock:
+            self.db.close()
+
+
+class LLMRequestPool:
+    """
+    Send requests to an LLM concurrently
+
+    Requests are sent by a bounded number of threads, so that an LLM server
+    that can handle multiple requests at a time is kept busy, while responses
+    are returned in the order the requests were made. Requests that fail
+    because of rate limits, timeouts or server errors are retried with
+    exponential backoff. If a response cache is given, responses are looked up
+    there first, and stored there when they are received.
+
+    Use as a context manager, so that outstanding requests are cancelled if
+    the caller stops iterating over the responses, e.g. because of an error:
+
+        with LLMRequestPool(llm, concurrency=4) as pool:
+            for request, response in pool.map(requests):
+                ...
+    """
+    # HTTP status codes for which it makes sense to try again later
+    RETRY_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+    def __init__(
+            self,
+            adapter: LLMAdapter,
+            concurrency: int = 1,
+            max_retries: int = 3,
+            backoff: float = 2,
+            min_interval: float = 0,
+            cache: Optional[LLMResponseCache] = None,
+    ):
+        """
+        :param LLMAdapter adapter:  Adapter to send requests with
+        :param int concurrency:  Maximum number of requests to send at a time
+        :param int max_retries:  Times to retry a failed request
+        :param float backoff:  Seconds to wait before the first retry; doubled
+          with every retry
+        :param float min_interval:  Seconds to leave between starting
+          requests, for APIs with strict rate limits
+        :param LLMResponseCache cache:  Response cache, if any
+        """
+        self.adapter = adapter
+        self.concurrency = max(1, int(concurrency))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.min_interval = min_interval
+        self.cache = cache
+
+        self.halted = threading.Event()
+        self.interval_lock = threading.Lock()
+        self.last_request = 0
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency,
+                                                              thread_name_prefix="llm-request")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.halt()
+
+    def halt(self) -> None:
+        """
+        Stop sending requests
+
+        Requests that have not been sent yet are cancelled. Requests that are
+        already running are left to finish, but their responses are discarded.
+        """
+        self.halted.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def map(self, llm_requests: Iterable[LLMRequest]) -> Iterator[tuple]:
+        """
+        Send requests and yield their responses in order
+
+        Requests are taken from the iterable as capacity frees up, so it can
+        be a generator that e.g. reads items from a dataset. If a request
+        fails, the exception is yielded instead of the response, and it is up
+        to the caller to decide how to proceed.
+
+        :param llm_requests:  Iterable of `LLMRequest`s
+        :return:  Generator yielding tuples of a request and its response (or
+          exception)
+        """
+        llm_requests = iter(llm_requests)
+        in_flight = collections.deque()
+        have_requests = True
+
+        while have_requests or in_flight:
+            # keep some requests queued beyond the ones that are running, so
+            # the next one can start as soon as a thread is free
+            while have_requests and len(in_flight) < self.concurrency * 2:
+                try:
+                    llm_request = next(llm_requests)
+                except StopIteration:
+                    have_requests = False
+                    break
+
+                in_flight.append((llm_request, self._submit(llm_request)))
+
+            if not in_flight:
+                break
+
+            llm_request, future = in_flight.popleft()
+            try:
+                response = future.result()
+            except Exception as e:
+                response = e
+
+            yield llm_request, response
+
+    def _submit(self, llm_request: LLMRequest) -> concurrent.futures.Future:
+        """
+        Start processing a request
+
+        :param LLMRequest llm_request:  Request
+        :return Future:  Future resolving to the response
+        """
+        adapter = llm_request.adapter or self.adapter
+        cache_key = None
+        if self.cache:
+            cache_key = self.cache.get_key(adapter, llm_request)
+            response = self.cache.get(cache_key)
+            if response is not None:
+                future = concurrent.futures.Future()
+                future.set_result(response)
+                return future
+
+        return self.executor.submit(self._generate, adapter, llm_request, cache_key)
+
+    def _generate(self, adapter: LLMAdapter, llm_request: LLMRequest, cache_key: Optional[str]):
+        """
+        Send a request, retrying if it fails in a way that may be temporary
+
+        Runs in a worker thread.
+
+        :param LLMAdapter adapter:  Adapter to send request with
+        :param LLMRequest llm_request:  Request
+        :param str cache_key:  Key to store the response under in the cache
+        :return:  Response, as returned by `LLMAdapter.generate_text()`
+        """
+        attempt = 0
+        while True:
+            self._wait_for_interval()
+            try:
+                response = adapter.generate_text(
+                    llm_request.prompt,
+                    system_prompt=llm_request.system_prompt,
+                    temperature=llm_request.temperature,
+                    files=llm_request.files,
+                    media_files=llm_request.media_files,
+                )
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or self.halted.is_set() or not self.is_retryable(e):
+                    raise e
+
+                # back off, with some jitter so that requests that failed at
+                # the same time are not all retried at the same time
+                delay = self.backoff * (2 ** attempt) * random.uniform(1, 1.5)
+                attempt += 1
+                if self.halted.wait(delay):
+                    raise e
+
+        if self.cache and cache_key and response:
+            self.cache.set(cache_key, response)
+
+        return response
+
+    def _wait_for_interval(self) -> None:
+        """
+        Wait until the minimum interval since the previous request has passed
+        """
+        if not self.min_interval:
+            return
+
+        with self.interval_lock:
+            wait = self.last_request + self.min_interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self.last_request = time.time()
+
+    @classmethod
+    def is_retryable(cls, exception: Exception) -> bool:
+        """
+        Determine whether a failed request may succeed if it is tried again
+
+        The various LLM SDKs all raise their own exceptions, so this looks at
+        the HTTP status code if the exception has one, and at the name of the
+        exception otherwise.
+
+        :param Exception exception:  Exception raised while sending request
+        :return bool:  Whether to retry
+        """
+        status_code = getattr(exception, "status_code", None)
+        if status_code is None and getattr(exception, "response", None) is not None:
+            status_code = getattr(exception.response, "status_code", None)
+
+        if isinstance(status_code, int):
+            return status_code in cls.RETRY_STATUS_CODES
+
+        if isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                                  ConnectionError, TimeoutError)):
+            return True
+
+        exception_name = type(exception).__name__
+        return any(name in exception_name for name in ("RateLimit", "Timeout", "Connect", "Overloaded",
+                                                       "ServiceUnavailable", "InternalServer"))
@@ -0,0 +1,300 @@
+"""
+Shared on-disk cache for downloaded media files
+"""
+import hashlib
+import shutil
+import json
+import time
+import os
+
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows; files are hard-linked or copied instead
+    fcntl = None
+
+
+class MediaCache:
+    """
+    Media files downloaded earlier, shared between datasets
+
+    Files are stored once per content hash, in `objects/`, and can be looked up
+    by the (normalised) URL they were downloaded from, via a small JSON record
+    per URL in `urls/`. Downloaders can place cached files in their staging
+    area instead of downloading them again; this makes a copy-on-write clone of
+    the file if the file system supports it, or a hard link otherwise, so that
+    a cached file takes up disk space only once however many datasets it is
+    part of. Files are only copied if neither is possible.
+
+    Cached files are made read-only, since a hard-linked file in a staging
+    area is the same file as the one in the cache. Files in a staging area
+    that came from the cache should be replaced rather than changed. Files
+    are added to the cache as a clone or a copy, never as a hard link, so
+    that this does not affect the downloaded file.
+
+    If the cache grows beyond its maximum size, `prune()` deletes the least
+    recently used files. Since files are linked rather than copied, this does
+    not affect datasets that are still being processed.
+    """
+    # copy-on-write clone ioctl, from linux/fs.h
+    FICLONE = 0x40049409
+
+    def __init__(self, path, max_size=0):
+        """
+        Set up cache
+
+        :param Path path:  Folder to store cached files in; created if it does
+        not exist yet
+        :param int max_size:  Maximum size of the cache in bytes, enforced by
+        `prune()`. 0 for no limit.
+        """
+        self.path = Path(path)
+        self.max_size = max_size
+        self.objects_path = self.path.joinpath("objects")
+        self.urls_path = self.path.joinpath("urls")
+
+        self.objects_path.mkdir(parents=True, exist_ok=True)
+        self.urls_path.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Get the media cache configured for this 4CAT instance
+
+        :param config:  Configuration reader
+        :return MediaCache|None:  Cache, or `None` if the cache is disabled
+        """
+        if not config.get("4cat.media_cache"):
+            return None
+
+        max_size = int(float(config.get("4cat.media_cache_max_size", 0)) * 1_000_000_000)
+        return cls(config.get("PATH_DATA").joinpath("media-cache"), max_size=max_size)
+
+    @staticmethod
+    def normalise_url(url, keep_query=True):
+        """
+        Normalise a URL for use as a cache key
+
+        Lower-cases the scheme and host name, removes default ports and drops
+        the fragment, which is never sent to the server anyway.
+
+        :param str url:  URL to normalise
+        :param bool keep_query:  Keep the query string. Set to `False` for
+        hosts that add expiring signatures to otherwise stable media URLs.
+        :return str:  Normalised URL
+        """
+        parsed = urlsplit(url.strip())
+        scheme = parsed.scheme.lower()
+        host = parsed.netloc.lower()
+        if (scheme, host.rsplit(":", 1)[-1]) in (("http", "80"), ("https", "443")):
+            host = host.rsplit(":", 1)[0]
+
+        return urlunsplit((scheme, host, parsed.path or "/", parsed.query if keep_query else "", ""))
+
+    @staticmethod
+    def hash_file(path):
+        """
+        Get the SHA-256 hash of a file's contents
+
+        :param Path path:  File to hash
+        :return str:  Hex digest
+        """
+        digest = hashlib.sha256()
+        with Path(path).open("rb") as infile:
+            while chunk := infile.read(1024 * 1024):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def get(self, url):
+        """
+        Look up a cached file by URL
+
+        Marks the file as recently used, so it is evicted last.
+
+        :param str url:  URL the file was downloaded from
+        :return dict|None:  Record for the file, with the path of the cached
+        file as `path`, or `None` if the URL is not cached
+        """
+        record_path = self._get_record_path(url)
+        try:
+            with record_path.open() as infile:
+                record = json.load(infile)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        record["path"] = self._get_object_path(record["sha256"], record["extension"])
+        try:
+            os.utime(record["path"])
+        except FileNotFoundError:
+            # file was evicted
+            record_path.unlink(missing_ok=True)
+            return None
+
+        return record
+
+    def place(self, record, destination):
+        """
+        Put a cached file in a staging area
+
+        :param dict record:  Record for the file, as returned by `get()`
+        :param Path destination:  Path to put the file at; should not exist yet
+        :return bool:  Whether the file was placed. This fails if the file was
+        evicted after it was looked up, or if the destination exists.
+        """
+        try:
+            self._link(record["path"], destination)
+            return True
+        except (FileNotFoundError, FileExistsError):
+            return False
+
+    def add(self, url, path, **metadata):
+        """
+        Add a downloaded file to the cache
+
+        If a file with the same contents is already cached (e.g. because it
+        was downloaded from a different URL), the URL is mapped to that file
+        and no extra space is used.
+
+        :param str url:  URL the file was downloaded from
+        :param Path path:  Downloaded file; this is left in place
+        :param metadata:  Other details to store with the file, e.g. its
+        content type; returned by `get()`
+        :return dict:  Record for the cached file
+        """
+        path = Path(path)
+        sha256 = self.hash_file(path)
+        object_path = self._get_object_path(sha256, path.suffix.lower())
+
+        if object_path.exists():
+            os.utime(object_path)
+        else:
+            object_path.parent.mkdir(exist_ok=True)
+            temp_path = object_path.with_name(f".{object_path.name}.{os.getpid()}-{time.time_ns()}")
+            self._link(path, temp_path, hard_link=False)
+            temp_path.chmod(0o444)
+            os.replace(temp_path, object_path)
+
+        record = {
+            **metadata,
+            "url": url,
+            "sha256": sha256,
+            "extension": path.suffix.lower(),
+            "size": object_path.stat().st_size,
+            "added": int(time.time())
+        }
+
+        record_path = self._get_record_path(url)
+        record_path.parent.mkdir(exist_ok=True)
+        temp_path = record_path.with_name(f".{record_path.name}.{os.getpid()}-{time.time_ns()}")
+        with temp_path.open("w") as outfile:
+            json.dump(record, outfile)
+        os.replace(temp_path, record_path)
+
+        record["path"] = object_path
+        return record
+
+    def prune(self):
+        """
+        Delete least recently used files until the cache fits its maximum size
+
+        Records for URLs whose file was deleted are deleted as well.
+
+        :return tuple:  Number of deleted files, and number of bytes freed
+        """
+        if not self.max_size:
+            return 0, 0
+
+        objects = []
+        for object_path in self.objects_path.glob("*/*"):
+            if object_path.name.startswith("."):
+                continue
+            try:
+                stat = object_path.stat()
+            except FileNotFoundError:
+                continue
+            objects.append((stat.st_mtime, stat.st_size, object_path))
+
+        total_size = sum([size for mtime, size, object_path in objects])
+        if total_size <= self.max_size:
+            return 0, 0
+
+        deleted = 0
+        freed = 0
+        for mtime, size, object_path in sorted(objects, key=lambda obj: obj[0]):
+            if total_size - freed <= self.max_size:
+                break
+            object_path.unlink(missing_ok=True)
+            deleted += 1
+            freed += size
+
+        for record_path in self.urls_path.glob("*/*.json"):
+            try:
+                with record_path.open() as infile:
+                    record = json.load(infile)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+
+            if not self._get_object_path(record["sha256"], record["extension"]).exists():
+                record_path.unlink(missing_ok=True)
+
+        return deleted, freed
+
+    def _get_record_path(self, url):
+        """
+        Get path of the record for a URL
+
+        :param str url:  URL, normalised or not
+        :return Path:  Path to JSON record
+        """
+        key = hashlib.sha256(self.normalise_url(url).encode("utf-8")).hexdigest()
+        return self.urls_path.joinpath(key[:2], key + ".json")
+
+    def _get_object_path(self, sha256, extension):
+        """
+        Get path of a cached file
+
+        :param str sha256:  Hash of the file's contents
+        :param str extension:  File extension, including the dot
+        :return Path:  Path to cached file
+        """
+        return self.objects_path.joinpath(sha256[:2], sha256 + extension)
+
+    def _link(self, source, destination, hard_link=True):
+        """
+        Make a file available at another path without copying it if possible
+
+        Tries a copy-on-write clone first, then a hard link, and copies the
+        file if both fail (e.g. because the paths are on different file
+        systems).
+
+        :param Path source:  File to link
+        :param Path destination:  New path for the file; should not exist yet
+        :param bool hard_link:  Whether a hard link may be used. Hard links
+        are the same file as the source, so its mode and contents cannot be
+        changed independently.
+        """
+        if fcntl:
+            try:
+                with open(source, "rb") as infile, open(destination, "xb") as outfile:
+                    fcntl.ioctl(outfile.fileno(), self.FICLONE, infile.fileno())
+                return
+            except (FileNotFoundError, FileExistsError):
+                raise
+            except OSError:
+                Path(destination).unlink(missing_ok=True)
+
+        if hard_link:
+            try:
+                os.link(source, destination)
+                return
+            except (FileNotFoundError, FileExistsError):
+                raise
+            except OSError:
+                pass
+
+        with open(source, "rb") as infile, open(destination, "xb") as outfile:
+            shutil.copyfileobj(infile, outfile)
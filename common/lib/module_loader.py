@@ -3,13 +3,79 @@ Load modules and datasources dynamically
 """
 from pathlib import Path
 import importlib
+import hashlib
 import inspect
 import pickle
+import types
 import sys
 import re
 import os
 
 
+class LazyWorker:
+    """
+    Stand-in for a worker class that has not been imported yet
+
+    Built from a module manifest entry (see `ModuleCollector.load_manifest()`).
+    Attributes recorded in the manifest, such as the worker's type, title,
+    category, options, config and compatibility, are available without
+    importing anything. Class methods that the worker inherits unchanged from
+    4CAT's base classes (e.g. `is_compatible_with()` or `get_queue_id()`) are
+    evaluated against those attributes. Anything else imports the worker's
+    module and is read from the actual class, so the stand-in can be used
+    wherever the class itself would be. Calling it instantiates the class.
+    """
+    def __init__(self, collector, metadata):
+        """
+        :param ModuleCollector collector:  Collector the worker belongs to
+        :param dict metadata:  Manifest entry for the worker
+        """
+        self._collector = collector
+        self._metadata = metadata
+        self._class = None
+
+        self.__name__ = metadata["class_name"]
+        self.__module__ = metadata["module"]
+        self.__doc__ = metadata["doc"]
+        self.__dict__.update(metadata["attributes"])
+
+    def load(self):
+        """
+        Get the actual worker class, importing its module if needed
+
+        :return:  Worker class
+        """
+        if self._class is None:
+            worker_class = self._collector.load_worker_class(self._metadata)
+            for attribute in ("filepath", "is_extension", "extension_name"):
+                if attribute in self._metadata["attributes"]:
+                    setattr(worker_class, attribute, self._metadata["attributes"][attribute])
+
+            self._class = worker_class
+
+        return self._class
+
+    def __getattr__(self, name):
+        # only called for attributes that are not in the manifest
+        if name not in self._metadata["members"]:
+            raise AttributeError(f"type object '{self.__name__}' has no attribute '{name}'")
+
+        if name in self._metadata["inherited"] and self._class is None:
+            base_module, base_name = self._metadata["inherited"][name]
+            method = vars(getattr(importlib.import_module(base_module), base_name))[name]
+            value = types.MethodType(method.__func__, self) if type(method) is classmethod else method.__func__
+            self.__dict__[name] = value
+            return value
+
+        return getattr(self.load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<LazyWorker {self.__module__}.{self.__name__}>"
+
+
 class ModuleCollector:
     """
     Collects all modular appendages of 4CAT
@@ -27,6 +93,13 @@ class ModuleCollector:
     missing_modules = {}
     log_buffer = None
     config = None
+    lazy = False
+    manifest = None
+
+    # modules whose objects may be recorded in the manifest as they are; other
+    # objects are only recorded if they are plain built-in values
+    MANIFEST_MODULES = ("common.lib.compatibility",)
+    MANIFEST_VERSION = 1
 
     PROCESSOR = 1
     WORKER = 2
@@ -35,7 +108,7 @@ class ModuleCollector:
     processors = {}
     datasources = {}
 
-    def __init__(self, config, write_cache=False):
+    def __init__(self, config, write_cache=False, lazy=False):
         """
         Load data sources and workers
 
@@ -44,11 +117,20 @@ class ModuleCollector:
 
         :param config:  Configuration manager, shared with the rest of the
         context
-        :param bool write_cache:  Write modules to cache file?
+        :param bool write_cache:  Write modules to cache file? This also
+        writes the module manifest used for lazy loading.
+        :param bool lazy:  Load workers from the module manifest, if it is
+        up to date, instead of importing all of them. Workers are then only
+        imported once they are used; see `LazyWorker`.
         """
         # this can be flushed later once the logger is available
         self.log_buffer = ""
         self.config = config
+        self.lazy = lazy
+        self.manifest = None
+        self.workers = {}
+        self.processors = {}
+        self.datasources = {}
 
         self.load_datasources()
         self.load_modules()
@@ -67,6 +149,9 @@ class ModuleCollector:
             with config.get("PATH_CONFIG").joinpath("module_config.bin").open("wb") as outfile:
                 pickle.dump(module_config, outfile)
 
+            if not self.manifest:
+                self.write_manifest()
+
         # load from cache
         self.config.load_user_settings()
 
@@ -99,20 +184,24 @@ class ModuleCollector:
         are found by importing any python files found in the given locations,
         and looking for relevant classes within those python files, that extend
         `BasicProcessor` or `BasicWorker` and are not abstract.
+
+        When loading lazily and the module manifest is up to date, workers are
+        read from the manifest instead and nothing is imported.
         """
         # look for workers and processors in pre-defined folders and datasources
 
         extension_path = self.config.get('PATH_EXTENSIONS')
         enabled_extensions = [e for e, s in self.config.get("extensions.enabled").items() if s["enabled"]]
 
-        paths = [self.config.get('PATH_ROOT').joinpath("processors"),
-                 self.config.get('PATH_ROOT').joinpath("backend/workers"),
-                 extension_path,
-                 *[self.datasources[datasource]["path"] for datasource in self.datasources]] # extension datasources will be here and the above line...
+        paths = self.get_module_paths()
 
         root_match = re.compile(r"^%s" % re.escape(str(self.config.get('PATH_ROOT'))))
         root_path = self.config.get('PATH_ROOT')
 
+        # if the manifest is up to date, the folders need not be scanned
+        if self.lazy and self.load_manifest():
+            paths = []
+
         for folder in paths:
             # loop through folders, and files in those folders, recursively
             is_extension = extension_path in folder.parents or folder == extension_path
@@ -196,6 +285,198 @@ class ModuleCollector:
 
         self.processors = categorised_processors
 
+    def get_module_paths(self):
+        """
+        Get folders to look for workers and processors in
+
+        :return list:  List of `Path`s
+        """
+        return [self.config.get('PATH_ROOT').joinpath("processors"),
+                self.config.get('PATH_ROOT').joinpath("backend/workers"),
+                self.config.get('PATH_EXTENSIONS'),
+                *[self.datasources[datasource]["path"] for datasource in self.datasources]] # extension datasources will be here and the above line...
+
+    def get_manifest_fingerprint(self):
+        """
+        Get a fingerprint of the code the module manifest was built from
+
+        This combines the path, modification time and size of all Python
+        files in the module folders, `backend/lib` and `common/lib` (which
+        includes this loader), and the enabled extensions. If any of these change, the manifest is no
+        longer up to date.
+
+        :return str:  Fingerprint
+        """
+        fingerprint = hashlib.sha1()
+        enabled_extensions = sorted(e for e, s in self.config.get("extensions.enabled").items() if s["enabled"])
+        fingerprint.update(repr(enabled_extensions).encode("utf-8"))
+
+        for folder in (*self.get_module_paths(), self.config.get('PATH_ROOT').joinpath("backend/lib"),
+                       self.config.get('PATH_ROOT').joinpath("common/lib")):
+            for root, dirs, files in os.walk(folder, followlinks=True):
+                dirs.sort()
+                for filename in sorted(files):
+                    if not filename.endswith(".py"):
+                        continue
+
+                    file = Path(root) / filename
+                    stat = file.stat()
+                    fingerprint.update(f"{file}:{stat.st_mtime_ns}:{stat.st_size}\n".encode("utf-8"))
+
+        return fingerprint.hexdigest()
+
+    def is_manifest_value(self, value):
+        """
+        Determine whether a class attribute can be recorded in the manifest
+
+        Only values that can be unpickled without importing the worker's code
+        are recorded: built-in scalars, types and containers thereof, and
+        objects from `MANIFEST_MODULES` (e.g. `Compatibility` specifications).
+
+        :param value:  Attribute value
+        :return bool:
+        """
+        if value is None or type(value) in (str, int, float, bool, bytes):
+            return True
+
+        if type(value) in (list, tuple, set, frozenset):
+            return all(self.is_manifest_value(item) for item in value)
+
+        if type(value) is dict:
+            return all(self.is_manifest_value(k) and self.is_manifest_value(v) for k, v in value.items())
+
+        if inspect.isclass(value):
+            # e.g. `coerce_type` in config definitions
+            return value.__module__ == "builtins"
+
+        if inspect.isfunction(value):
+            return value.__module__ in self.MANIFEST_MODULES
+
+        if type(value).__module__ in self.MANIFEST_MODULES and hasattr(value, "__dict__"):
+            return self.is_manifest_value(vars(value))
+
+        return False
+
+    def get_manifest_entry(self, worker):
+        """
+        Describe a worker class for the module manifest
+
+        Records the class's attributes that are plain values (see
+        `is_manifest_value()`), the names of all its members (so that it can be
+        determined whether it has a given attribute without importing it), and
+        the class methods it inherits unchanged from 4CAT's base classes.
+
+        :param worker:  Worker class
+        :return dict:  Manifest entry
+        """
+        attributes = {}
+        inherited = {}
+        members = set()
+        for name in dir(worker):
+            if name.startswith("__") and name.endswith("__"):
+                continue
+
+            members.add(name)
+            try:
+                value = getattr(worker, name)
+            except AttributeError:
+                continue
+
+            if not callable(value) and self.is_manifest_value(value):
+                attributes[name] = value
+                continue
+
+            owner = next(base for base in worker.__mro__ if name in vars(base))
+            if owner.__module__ != worker.__module__ and owner.__module__.startswith(("backend.lib.", "common.lib.")) \
+                    and type(vars(owner)[name]) in (classmethod, staticmethod):
+                inherited[name] = (owner.__module__, owner.__qualname__)
+
+        return {
+            "type": worker.type,
+            "module": worker.__module__,
+            "class_name": worker.__name__,
+            "doc": worker.__doc__,
+            "is_processor": self.is_4cat_class(worker, only_processors=True),
+            "attributes": attributes,
+            "members": members,
+            "inherited": inherited
+        }
+
+    def write_manifest(self):
+        """
+        Write module manifest
+
+        The manifest describes all workers that were found, so that a later
+        `ModuleCollector` can list and check them without importing them (see
+        `load_manifest()`). It is written to `module_manifest.bin` in the
+        configuration folder.
+        """
+        manifest = {
+            "version": self.MANIFEST_VERSION,
+            "fingerprint": self.get_manifest_fingerprint(),
+            "workers": {worker_type: self.get_manifest_entry(worker) for worker_type, worker in self.workers.items()},
+            "missing_modules": self.missing_modules,
+            "ignore": self.ignore,
+            "datasources": {datasource_id: {key: datasource.get(key) for key in ("has_worker", "has_options", "importable")}
+                            for datasource_id, datasource in self.datasources.items()}
+        }
+
+        manifest_path = self.config.get("PATH_CONFIG").joinpath("module_manifest.bin")
+        temporary_path = manifest_path.with_suffix(".tmp")
+        try:
+            with temporary_path.open("wb") as outfile:
+                pickle.dump(manifest, outfile)
+            os.replace(temporary_path, manifest_path)
+        except (pickle.PicklingError, TypeError, AttributeError, OSError) as e:
+            self.log_buffer += f"Could not write module manifest: {e}\n"
+            temporary_path.unlink(missing_ok=True)
+
+    def load_manifest(self):
+        """
+        Load workers from the module manifest
+
+        Workers are added as `LazyWorker` objects, which only import the
+        worker's code when it is needed. Nothing is loaded if the manifest
+        does not exist or was built from other code than is currently
+        installed.
+
+        :return bool:  Whether the manifest was loaded
+        """
+        manifest_path = self.config.get("PATH_CONFIG").joinpath("module_manifest.bin")
+        try:
+            with manifest_path.open("rb") as infile:
+                manifest = pickle.load(infile)
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError, ImportError, AttributeError):
+            return False
+
+        if manifest.get("version") != self.MANIFEST_VERSION or manifest["fingerprint"] != self.get_manifest_fingerprint():
+            return False
+
+        for worker_type, metadata in manifest["workers"].items():
+            self.workers[worker_type] = LazyWorker(self, metadata)
+            if metadata["is_processor"]:
+                self.processors[worker_type] = self.workers[worker_type]
+
+        self.missing_modules.update(manifest["missing_modules"])
+        self.ignore.extend(module for module in manifest["ignore"] if module not in self.ignore)
+        self.manifest = manifest
+        return True
+
+    @staticmethod
+    def get_worker_class(worker):
+        """
+        Get the class for a worker
+
+        Workers loaded from the module manifest are `LazyWorker` objects
+        rather than classes; for those, the worker's code is imported and the
+        actual class is returned. Use this where a real class is needed, e.g.
+        for `issubclass()` or `inspect`.
+
+        :param worker:  Worker class or `LazyWorker`
+        :return:  Worker class
+        """
+        return worker.load() if isinstance(worker, LazyWorker) else worker
+
     def load_datasources(self):
         """
         Load datasources
@@ -290,6 +571,12 @@ class ModuleCollector:
         datasource. This function takes care of populating those values.
         """
         for datasource_id in self.datasources:
+            if self.manifest and datasource_id in self.manifest["datasources"]:
+                # determining whether there are options requires importing
+                # the worker, so use the values from when the manifest was built
+                self.datasources[datasource_id].update(self.manifest["datasources"][datasource_id])
+                continue
+
             worker = self.get_datasource_worker(datasource_id)
             self.datasources[datasource_id]["has_worker"] = bool(worker)
             self.datasources[datasource_id]["has_options"] = bool(worker) and \
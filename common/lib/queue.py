@@ -123,6 +123,77 @@ class JobQueue:
 
 		return [Job.get_by_data(job, self.db) for job in jobs if job]
 
+	def get_claimable_jobs(self, per_queue=1, exclude_queues=None):
+		"""
+		Get claimable jobs, at most a given number per queue
+
+		Unlike `get_all_jobs()`, this does not return every queued job, but
+		only the first few in each queue - the ones that would be started
+		first when a worker slot frees up.
+
+		Within a queue, jobs are taken from each user in turn, rather than
+		strictly in the order in which they were queued, so that one user
+		queueing a large batch of jobs does not hold up everyone else's. The
+		user is the creator of the dataset the job is for; this is added to
+		the job data as `owner`, which is empty for jobs not tied to a
+		dataset.
+
+		:param int per_queue:  Maximum number of jobs to return per queue
+		:param exclude_queues:  IDs of queues to skip, e.g. because they have
+		  no free worker slots
+		:return list:  Jobs, ordered by position in their queue and time
+		  queued
+		"""
+		now = int(time.time())
+		replacements = [now, now]
+		query = ("SELECT * FROM ("
+				 "    SELECT *, ROW_NUMBER() OVER (PARTITION BY queue_id ORDER BY owner_position ASC, timestamp ASC) AS queue_position"
+				 "      FROM ("
+				 "        SELECT jobs.*, COALESCE(datasets.creator, '') AS owner,"
+				 "               ROW_NUMBER() OVER (PARTITION BY jobs.queue_id, datasets.creator ORDER BY jobs.timestamp ASC) AS owner_position"
+				 "          FROM jobs"
+				 "          LEFT JOIN datasets ON datasets.key = jobs.remote_id"
+				 "         WHERE jobs.jobtype != ''"
+				 "           AND jobs.timestamp_claimed = 0"
+				 "           AND jobs.timestamp_after < %s"
+				 "           AND (jobs.interval = 0 OR jobs.timestamp_lastclaimed + jobs.interval < %s)")
+
+		if exclude_queues:
+			query += "           AND jobs.queue_id != ALL(%s)"
+			replacements.append(list(exclude_queues))
+
+		query += ") AS claimable) AS queued WHERE queue_position <= %s ORDER BY queue_position ASC, timestamp ASC"
+		replacements.append(per_queue)
+
+		jobs = self.db.fetchall(query, replacements)
+		for job in jobs:
+			del job["queue_position"]
+			del job["owner_position"]
+
+		return [Job.get_by_data(job, self.db) for job in jobs if job]
+
+	def get_next_claimable_time(self):
+		"""
+		Get the time at which the next currently unclaimable job becomes
+		claimable
+
+		Jobs can be queued to be claimed later, or repeat at an interval; no
+		notification is sent when such a job becomes claimable, so the job
+		dispatcher uses this to know when to check again.
+
+		:return int|None:  Unix timestamp, or `None` if no job is waiting
+		"""
+		now = int(time.time())
+		result = self.db.fetchone(
+			"SELECT MIN(GREATEST(timestamp_after, CASE WHEN interval > 0 THEN timestamp_lastclaimed + interval ELSE 0 END) + 1) AS next_claimable"
+			"  FROM jobs"
+			" WHERE timestamp_claimed = 0"
+			"   AND (timestamp_after >= %s OR (interval > 0 AND timestamp_lastclaimed + interval >= %s))",
+			(now, now)
+		)
+
+		return result["next_claimable"] if result else None
+
 	def get_job_count(self, jobtype="*"):
 		"""
 		Get total number of jobs
@@ -193,9 +264,13 @@ class JobQueue:
 			"attempts": 0
 		}
 
-		self.db.insert("jobs", data, safe=True, constraints=("jobtype", "remote_id"))
+		inserted = self.db.insert("jobs", data, safe=True, constraints=("jobtype", "remote_id"))
+		job = Job.get_by_data(data, database=self.db)
+
+		if inserted:
+			job.notify()
 
-		return Job.get_by_data(data, database=self.db)
+		return job
 
 	def release_all(self):
 		"""
@@ -14,6 +14,7 @@ class BoardScraper8chan(BoardScraper4chan):
 	type = "eightchan-board"
 	datasource = "8chan"
 	max_workers = 4
+	thread_id_type = "text"
 
 	def get_url(self):
 		"""
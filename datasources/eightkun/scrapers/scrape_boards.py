@@ -14,6 +14,7 @@ class BoardScraper8kun(BoardScraper4chan):
 	type = "eightkun-board"
 	datasource = "8kun"
 	max_workers = 4
+	thread_id_type = "text"
 	log_level="info"
 
 	def get_url(self):
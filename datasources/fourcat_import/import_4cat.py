@@ -1,7 +1,9 @@
 """
 Import datasets from other 4CATs
 """
+import concurrent.futures
 import requests
+import hashlib
 import json
 import time
 import zipfile
@@ -28,6 +30,7 @@ class SearchImportFromFourcat(BasicProcessor):
     is_static = False  # Whether this datasource is still updated
 
     max_workers = 1  # this cannot be more than 1, else things get VERY messy
+    max_transfers = 4  # datasets to transfer files for at the same time
 
     created_datasets = None
     base = None
@@ -427,106 +430,117 @@ class SearchImportFromFourcat(BasicProcessor):
         # this part!
         keys = [keys[0]]
 
-        while keys:
-            dataset_key = keys.pop(0)
+        # datasets are created here, but their files are transferred in worker
+        # threads, so that the children of a dataset are transferred
+        # concurrently. anything that touches the database stays in this
+        # thread.
+        transfers = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_transfers,
+                                                   thread_name_prefix="4cat-import") as executor:
+            while keys or transfers:
+                while keys:
+                    dataset_key = keys.pop(0)
 
-            self.halt_and_catch_fire()
-            self.dataset.log(f"Importing dataset {dataset_key} from 4CAT server {self.base}.")
-
-            # first, metadata!
-            try:
-                metadata = SearchImportFromFourcat.fetch_from_4cat(self.base, dataset_key, api_key, "metadata")
-                metadata = metadata.json()
-            except FourcatImportException as e:
-                self.dataset.log(f"Error retrieving record for dataset {dataset_key}: {e}")
-                continue
-            except ValueError:
-                self.dataset.log(f"Could not read metadata for dataset {dataset_key}")
-                continue
-
-            # copying empty datasets doesn't really make sense
-            if metadata["num_rows"] == 0:
-                self.dataset.update_status(f"Skipping empty dataset {dataset_key}")
-                failed_imports.append(dataset_key)
-                continue
-
-            metadata = self.process_metadata(metadata)
-            if metadata is None:
-                self.dataset.update_status(f"Metadata for dataset {dataset_key} incomplete, skipping")
-                failed_imports.append(dataset_key)
-                continue
-
-            # create the new dataset
-            new_dataset = self.create_dataset(metadata, dataset_key, primary=True if not imported else False)
-
-            # then, the log
-            self.halt_and_catch_fire()
-            try:
-                self.dataset.update_status(f"Transferring log file for dataset {new_dataset.key}")
-                # TODO: for the primary, this ends up in the middle of the log as we are still adding to it...
-                log = SearchImportFromFourcat.fetch_from_4cat(self.base, dataset_key, api_key, "log")
-                logpath = new_dataset.get_log_path()
-                new_dataset.log("Original dataset log included below:")
-                with logpath.open("a") as outfile:
-                    outfile.write(log.text)
-            except FourcatImportException as e:
-                new_dataset.finish_with_error(f"Error retrieving log for dataset {new_dataset.key}: {e}")
-                failed_imports.append(dataset_key)
-                continue
-            except ValueError:
-                new_dataset.finish_with_error(f"Could not read log for dataset {new_dataset.key}: skipping dataset")
-                failed_imports.append(dataset_key)
-                continue
-
-            # then, the results
-            self.halt_and_catch_fire()
-            try:
-                self.dataset.update_status(f"Transferring data file for dataset {new_dataset.key}")
-                datapath = new_dataset.get_results_path()
-                SearchImportFromFourcat.fetch_from_4cat(self.base, dataset_key, api_key, "data", datapath)
-
-                if not imported:
-                    # first dataset - use num rows as 'overall'
-                    num_rows = metadata["num_rows"]
+                    self.halt_and_catch_fire()
+                    self.dataset.log(f"Importing dataset {dataset_key} from 4CAT server {self.base}.")
+
+                    # first, metadata!
+                    try:
+                        metadata = SearchImportFromFourcat.fetch_from_4cat(self.base, dataset_key, api_key, "metadata")
+                        metadata = metadata.json()
+                    except FourcatImportException as e:
+                        self.dataset.log(f"Error retrieving record for dataset {dataset_key}: {e}")
+                        continue
+                    except ValueError:
+                        self.dataset.log(f"Could not read metadata for dataset {dataset_key}")
+                        continue
+
+                    # copying empty datasets doesn't really make sense
+                    if metadata["num_rows"] == 0:
+                        self.dataset.update_status(f"Skipping empty dataset {dataset_key}")
+                        failed_imports.append(dataset_key)
+                        continue
+
+                    metadata = self.process_metadata(metadata)
+                    if metadata is None:
+                        self.dataset.update_status(f"Metadata for dataset {dataset_key} incomplete, skipping")
+                        failed_imports.append(dataset_key)
+                        continue
+
+                    # create the new dataset
+                    new_dataset = self.create_dataset(metadata, dataset_key, primary=True if not imported else False)
+
+                    # then, the log, results and kids
+                    self.dataset.update_status(f"Transferring log and data files for dataset {new_dataset.key}")
+                    transfer = executor.submit(self.transfer_dataset_files, dataset_key, api_key,
+                                               new_dataset.get_results_path())
+                    transfers[transfer] = (dataset_key, new_dataset, metadata)
+
+                if not transfers:
+                    break
+
+                done, pending = concurrent.futures.wait(transfers, timeout=1,
+                                                        return_when=concurrent.futures.FIRST_COMPLETED)
+                if self.interrupted:
+                    # let running transfers notice the interruption before
+                    # cleaning up the datasets they write to
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    self.halt_and_catch_fire()
 
-            except FourcatImportException as e:
-                self.dataset.log(f"Dataset {new_dataset.key} unable to import: {e}, skipping import")
-                if new_dataset.key != self.dataset.key:
-                    new_dataset.delete()
-                continue
+                for transfer in done:
+                    dataset_key, new_dataset, metadata = transfers.pop(transfer)
+                    result = transfer.result()
+
+                    if "log" in result:
+                        # TODO: for the primary, this ends up in the middle of the log as we are still adding to it...
+                        new_dataset.log("Original dataset log included below:")
+                        with new_dataset.get_log_path().open("a") as outfile:
+                            outfile.write(result["log"])
+
+                    failed = result.get("failed")
+                    e = result.get("error")
+                    if failed == "log":
+                        if isinstance(e, FourcatImportException):
+                            new_dataset.finish_with_error(f"Error retrieving log for dataset {new_dataset.key}: {e}")
+                        else:
+                            new_dataset.finish_with_error(f"Could not read log for dataset {new_dataset.key}: skipping dataset")
+                        failed_imports.append(dataset_key)
+                        continue
+
+                    elif failed == "data":
+                        if isinstance(e, FourcatImportException):
+                            self.dataset.log(f"Dataset {new_dataset.key} unable to import: {e}, skipping import")
+                            if new_dataset.key != self.dataset.key:
+                                new_dataset.delete()
+                        else:
+                            new_dataset.finish_with_error(f"Could not read results for dataset {new_dataset.key}")
+                            failed_imports.append(dataset_key)
+                        continue
 
-            except ValueError:
-                new_dataset.finish_with_error(f"Could not read results for dataset {new_dataset.key}")
-                failed_imports.append(dataset_key)
-                continue
+                    if not imported:
+                        # first dataset - use num rows as 'overall'
+                        num_rows = metadata["num_rows"]
 
-            # finally, the kids
-            self.halt_and_catch_fire()
-            try:
-                self.dataset.update_status(f"Looking for child datasets to transfer for dataset {new_dataset.key}")
-                children = SearchImportFromFourcat.fetch_from_4cat(self.base, dataset_key, api_key, "children")
-                children = children.json()
-            except FourcatImportException as e:
-                self.dataset.update_status(f"Error retrieving children for dataset {new_dataset.key}: {e}")
-                failed_imports.append(dataset_key)
-                continue
-            except ValueError:
-                self.dataset.update_status(f"Could not collect children for dataset {new_dataset.key}")
-                failed_imports.append(dataset_key)
-                continue
+                    if failed == "children":
+                        if isinstance(e, FourcatImportException):
+                            self.dataset.update_status(f"Error retrieving children for dataset {new_dataset.key}: {e}")
+                        else:
+                            self.dataset.update_status(f"Could not collect children for dataset {new_dataset.key}")
+                        failed_imports.append(dataset_key)
+                        continue
 
-            for child in children:
-                keys.append(child)
-                self.dataset.log(f"Adding child dataset {child} to import queue")
+                    for child in result["children"]:
+                        keys.append(child)
+                        self.dataset.log(f"Adding child dataset {child} to import queue")
 
-            # done - remember that we've imported this one
-            imported.append(new_dataset)
-            new_dataset.update_status(metadata["status"])
+                    # done - remember that we've imported this one
+                    imported.append(new_dataset)
+                    new_dataset.update_status(metadata["status"])
 
-            if new_dataset.key != self.dataset.key:
-                # only finish if this is not the 'main' dataset, or the user
-                # will think the whole import is done
-                new_dataset.finish(metadata["num_rows"])
+                    if new_dataset.key != self.dataset.key:
+                        # only finish if this is not the 'main' dataset, or the user
+                        # will think the whole import is done
+                        new_dataset.finish(metadata["num_rows"])
 
         # todo: this part needs updating if/when we support importing multiple datasets!
         if failed_imports:
@@ -564,8 +578,41 @@ class SearchImportFromFourcat(BasicProcessor):
 
             raise ProcessorInterruptedException()
 
+    def transfer_dataset_files(self, dataset_key, api_key, datapath):
+        """
+        Transfer the log, data file and children of a dataset
+
+        Runs in a worker thread, so this does not touch the database; the
+        result is processed by `process_urls()`. Components are transferred in
+        order, and the transfer stops at the first component that fails.
+
+        :param str dataset_key:  Key of dataset to import
+        :param str api_key:  API authentication token
+        :param Path datapath:  Path to write the data file to
+        :return dict:  The log as `log` and a list of child dataset keys as
+          `children`, as far as they were transferred; if a component could
+          not be transferred, its name as `failed` and the exception as `error`
+        """
+        result = {}
+        for component in ("log", "data", "children"):
+            if self.interrupted:
+                raise ProcessorInterruptedException("Interrupted while importing datasets")
+
+            try:
+                if component == "data":
+                    SearchImportFromFourcat.fetch_data_from_4cat(self.base, dataset_key, api_key, datapath,
+                                                                 is_interrupted=lambda: self.interrupted)
+                else:
+                    response = SearchImportFromFourcat.fetch_from_4cat(self.base, dataset_key, api_key, component)
+                    result[component] = response.text if component == "log" else response.json()
+            except (FourcatImportException, ValueError) as e:
+                result.update({"failed": component, "error": e})
+                break
+
+        return result
+
     @staticmethod
-    def fetch_from_4cat(base, dataset_key, api_key, component, datapath=None):
+    def fetch_from_4cat(base, dataset_key, api_key, component, timeout=5, check=True):
         """
         Get dataset component from 4CAT export API
 
@@ -573,26 +620,16 @@ class SearchImportFromFourcat(BasicProcessor):
         :param str dataset_key:  Key of dataset to import
         :param str api_key:  API authentication token
         :param str component:  Component to retrieve
+        :param timeout:  Request timeout, as passed to `requests`
+        :param bool check:  Raise an exception if the server returned an
+          error (see `check_response()`)
         :return:  HTTP response object
         """
         try:
-            if component == "data" and datapath:
-                # Stream data
-                with requests.get(f"{base}/api/export-packed-dataset/{dataset_key}/{component}/", timeout=5, stream=True,
-                                  headers={
-                                            "User-Agent": "4cat/import",
-                                            "Authentication": api_key
-                                        }) as r:
-                    r.raise_for_status()
-                    with datapath.open("wb") as outfile:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            outfile.write(chunk)
-                return r
-            else:
-                response = requests.get(f"{base}/api/export-packed-dataset/{dataset_key}/{component}/", timeout=5, headers={
-                    "User-Agent": "4cat/import",
-                    "Authentication": api_key
-                })
+            response = requests.get(f"{base}/api/export-packed-dataset/{dataset_key}/{component}/", timeout=timeout, headers={
+                "User-Agent": "4cat/import",
+                "Authentication": api_key
+            })
         except requests.Timeout:
             raise FourcatImportException(f"The 4CAT server at {base} took too long to respond. Make sure it is "
                                          f"accessible to external connections and try again.")
@@ -600,6 +637,119 @@ class SearchImportFromFourcat(BasicProcessor):
             raise FourcatImportException(f"Could not connect to the 4CAT server at {base} ({e}). Make sure it is "
                                          f"accessible to external connections and try again.")
 
+        if check:
+            SearchImportFromFourcat.check_response(response, base, dataset_key, component)
+
+        return response
+
+    @staticmethod
+    def fetch_data_from_4cat(base, dataset_key, api_key, datapath, max_attempts=5, is_interrupted=None):
+        """
+        Get dataset data file from 4CAT export API
+
+        Data files can be large, so if the connection drops, the transfer is
+        resumed where it left off with an HTTP range request rather than
+        started over. Complete files are requested gzip-compressed, which the
+        other server honours for text files. Afterwards, the file is checked
+        against the size and SHA-256 hash reported by the other server, and
+        transferred again from scratch if it does not match.
+
+        Servers running older versions of 4CAT do not report a size and hash.
+        Files from these are always transferred from scratch, and not
+        verified.
+
+        :param str base:  Server URL base to import from
+        :param str dataset_key:  Key of dataset to import
+        :param str api_key:  API authentication token
+        :param Path datapath:  Path to write the data file to. If part of the
+          file is there already, the transfer continues from its end.
+        :param int max_attempts:  Times to try the transfer before giving up
+        :param callable is_interrupted:  Called between chunks; the transfer
+          is halted if it returns `True`
+        """
+        # the hash is calculated on the fly on the other end, which can take a
+        # while for large files
+        response = SearchImportFromFourcat.fetch_from_4cat(base, dataset_key, api_key, "checksum",
+                                                           timeout=(5, 600), check=False)
+        if response.status_code in (404, 406):
+            # older servers do not know the component; if the dataset does
+            # not exist either, requesting the data file will say so
+            checksum = None
+        else:
+            SearchImportFromFourcat.check_response(response, base, dataset_key, "checksum")
+            checksum = response.json()
+
+        error = None
+        for attempt in range(max_attempts):
+            if attempt:
+                time.sleep(min(2 ** attempt, 30))
+
+            offset = datapath.stat().st_size if datapath.exists() else 0
+            if offset and (not checksum or offset > checksum["size"]):
+                # without a checksum, a partial file cannot be told apart
+                # from a complete one
+                datapath.unlink()
+                offset = 0
+
+            if not checksum or offset < checksum["size"] or not datapath.exists():
+                headers = {
+                    "User-Agent": "4cat/import",
+                    "Authentication": api_key
+                }
+                if offset:
+                    # ranges refer to the uncompressed file
+                    headers.update({"Range": f"bytes={offset}-", "Accept-Encoding": "identity"})
+                else:
+                    headers["Accept-Encoding"] = "gzip"
+
+                try:
+                    with requests.get(f"{base}/api/export-packed-dataset/{dataset_key}/data/", timeout=(5, 60),
+                                      stream=True, headers=headers) as response:
+                        if response.status_code >= 500:
+                            error = f"HTTP {response.status_code}"
+                            continue
+
+                        SearchImportFromFourcat.check_response(response, base, dataset_key, "data")
+
+                        # a 200 rather than 206 response means the whole file
+                        # is sent after all
+                        with datapath.open("ab" if response.status_code == 206 else "wb") as outfile:
+                            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                                if is_interrupted and is_interrupted():
+                                    raise ProcessorInterruptedException("Interrupted while transferring data file")
+                                outfile.write(chunk)
+
+                except requests.RequestException as e:
+                    error = e
+                    continue
+
+            if not checksum:
+                return
+
+            transferred = hashlib.sha256()
+            with datapath.open("rb") as infile:
+                while chunk := infile.read(1024 * 1024):
+                    transferred.update(chunk)
+
+            if datapath.stat().st_size == checksum["size"] and transferred.hexdigest() == checksum["sha256"]:
+                return
+
+            error = "file does not match checksum"
+            datapath.unlink()
+
+        raise FourcatImportException(f"Could not transfer data file for dataset {dataset_key} from the 4CAT server at "
+                                     f"{base} after {max_attempts} attempts ({error}).")
+
+    @staticmethod
+    def check_response(response, base, dataset_key, component):
+        """
+        Raise an exception if the 4CAT export API returned an error
+
+        :param response:  HTTP response object
+        :param str base:  Server URL base to import from
+        :param str dataset_key:  Key of dataset to import
+        :param str component:  Component that was requested
+        """
         if response.status_code == 404:
             raise FourcatImportException(
                 f"Dataset {dataset_key} not found at server {base} ({response.text}. Make sure all URLs point to "
@@ -608,12 +758,10 @@ class SearchImportFromFourcat(BasicProcessor):
             raise FourcatImportException(
                 f"Dataset {dataset_key} not accessible at server {base}. Make sure you have access to this "
                 f"dataset and are using the correct API key.")
-        elif response.status_code != 200:
+        elif response.status_code not in (200, 206):
             raise FourcatImportException(
                 f"Unexpected error while requesting {component} for dataset {dataset_key} from server {base}: {response.text}")
 
-        return response
-
     @staticmethod
     def validate_query(query, request, config):
         """
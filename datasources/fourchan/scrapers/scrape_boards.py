@@ -21,6 +21,10 @@ class BoardScraper4chan(BasicJSONScraper):
 	required_fields = ["no", "last_modified"]
 	position = 0
 
+	# type of the `id` column of the threads table; 4chan thread IDs are
+	# numbers, other chans have their own table definition
+	thread_id_type = "bigint"
+
 	def process(self, data):
 		"""
 		Process scraped board data
@@ -30,13 +34,13 @@ class BoardScraper4chan(BasicJSONScraper):
 		:param dict data: The board data, parsed JSON data
 		"""
 		self.datasource = self.type.split("-")[0]
-		new_threads = 0
 
 		if not data:
 			self.log.error("No thread data from board scrape of %s/%s/" % (self.datasource, self.job.data["remote_id"]))
 			return False
 
 		index_thread_ids = []
+		threads = []
 
 		for page in data:
 			if page.get('threads') is None:
@@ -46,8 +50,12 @@ class BoardScraper4chan(BasicJSONScraper):
 
 			for thread in page["threads"]:
 				self.position += 1
-				new_threads += self.save_thread(thread)
 				index_thread_ids.append(thread["id"] if "id" in thread else thread["no"])
+				thread_data = self.get_thread_data(thread)
+				if thread_data:
+					threads.append(thread_data)
+
+		new_threads = self.save_threads(threads)
 
 		self.log.info("Board scrape for %s/%s/ yielded %i new threads" % (self.datasource, self.job.data["remote_id"], new_threads))
 
@@ -55,12 +63,13 @@ class BoardScraper4chan(BasicJSONScraper):
 		# These were either archived or deleted by moderators.
 		self.update_unindexed_threads(index_thread_ids)
 
-	def save_thread(self, thread):
+	def get_thread_data(self, thread):
 		"""
-		Save thread
+		Get data to save for a thread in the index
 
-		:param dict thread:  Thread data
-		:return int:  Number of new threads created (so 0 or 1)
+		:param dict thread:  Thread data, as scraped
+		:return dict:  Thread ID, OP post ID, last modification time and index
+		position, or `None` if the thread data is incomplete
 		"""
 
 		# 8kun for some reason doesn't always include last_modified
@@ -72,51 +81,65 @@ class BoardScraper4chan(BasicJSONScraper):
 		missing = set(self.required_fields) - set(thread.keys())
 		if missing != set():
 			self.log.warning("Missing fields %s in scraped thread from %s/%s/, ignoring: got %s" % (repr(missing), self.datasource, self.job.data["remote_id"], repr(thread)))
-			return False
+			return None
+
+		# 8chan supports cyclical threads which have an ID that is *not* the
+		# first post's. The following line accounts for this.
+		return {
+			"id": thread["id"] if "id" in thread else thread["no"],
+			"no": thread["no"],
+			"last_modified": thread.get("last_modified", 0),
+			"position": self.position
+		}
+
+	def save_threads(self, threads):
+		"""
+		Save threads
 
+		Threads not in the database yet are added, and the scrape and
+		modification timestamps of all threads are updated, with one query
+		each rather than per thread.
+
+		:param list threads:  Thread data, as returned by `get_thread_data()`
+		:return int:  Number of new threads created
+		"""
 		board_id = self.job.data["remote_id"].split("/").pop()
-		thread_id = thread["id"] if "id" in thread else thread["no"]
+		jobtype = self.type.replace("-board", "-thread")
 
-		thread_data = {
-			"id": thread_id,
-			"board": board_id,
-			"index_positions": ""
-		}
+		for thread in threads:
+			# schedule a job for scraping the thread's posts
+			try:
+				self.queue.add_job(worker_or_type=jobtype, remote_id=thread["no"], details={"board": board_id})
+			except JobAlreadyExistsException:
+				# this might happen if the workers can't keep up with the queue
+				pass
+
+		if not threads:
+			return 0
+
+		# add database record for threads, if none exists yet
+		new_threads = self.db.insert_bulk("threads_" + self.prefix, [
+			{"id": thread["id"], "board": board_id, "index_positions": ""} for thread in threads
+		], safe=True, constraints=["id", "board"], commit=False)
 
-		# schedule a job for scraping the thread's posts
-		try:
-			jobtype = self.type.replace("-board", "-thread")
-			self.queue.add_job(worker_or_type=jobtype, remote_id=thread["no"], details={"board": board_id})
-		except JobAlreadyExistsException:
-			# this might happen if the workers can't keep up with the queue
-			pass
-
-		# add database record for thread, if none exists yet
-		# 8chan supports cyclical threads which have an ID that is *not* the first post's. The
-		# following line accounts for this.
-		thread_row = self.db.fetchone("SELECT * FROM threads_" + self.prefix + " WHERE id = %s AND board = %s", (str(thread_id), board_id))
-		new_thread = 0
-		if not thread_row:
-			new_thread += 1
-			self.db.insert("threads_" + self.prefix, thread_data)
-
-		replacements = [self.init_time, thread.get("last_modified", 0)]
 		if "fourchan" in self.type:
 			# update timestamps and position, but only for 4chan
 			# other chans have different strategies and often have "infinite"
 			# threads which would rapidly bloat the database with an infinite
 			# stream of thread positions
-			position_update = str(self.init_time) + ":" + str(self.position) + ","
-			positions_bit = ", index_positions = CONCAT(index_positions, %s)"
-			replacements.append(position_update)
+			positions_bit = ", index_positions = CONCAT(thread.index_positions, scraped.position)"
 		else:
 			positions_bit = ""
 
-		replacements.extend([str(thread_id), board_id])
-		self.db.execute("UPDATE threads_" + self.prefix + " SET timestamp_scraped = %s, timestamp_modified = %s" + positions_bit + " WHERE id = %s AND board = %s",
-						replacements)
+		self.db.execute_many("UPDATE threads_" + self.prefix + " AS thread SET timestamp_scraped = scraped.timestamp_scraped, "
+							 "timestamp_modified = scraped.timestamp_modified" + positions_bit + " FROM (VALUES %s) AS "
+							 "scraped (id, board, timestamp_scraped, timestamp_modified, position) "
+							 "WHERE thread.id = scraped.id::" + self.thread_id_type + " AND thread.board = scraped.board", replacements=[
+			(str(thread["id"]), board_id, self.init_time, thread["last_modified"], str(self.init_time) + ":" + str(thread["position"]) + ",")
+			for thread in threads
+		])
 
-		return new_thread
+		return new_threads
 
 	def update_unindexed_threads(self, index_thread_ids):
 		"""
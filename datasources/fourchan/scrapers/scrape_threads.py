@@ -16,18 +16,19 @@ Flow:
    -> create separate sets of new posts and deleted posts
    -> mark deleted posts as deleted
    -> add new posts to database
-      -> save_post(): save post data to database
+      -> save_posts(): save post data to database, in one go
          -> queue_image(): if an image was attached, queue a job to scrape it
    -> update_thread(): update thread data
 """
-import psycopg2
 import hashlib
 import base64
 import json
 import time
 import six
 
-from backend.lib.scraper import BasicJSONScraper
+from psycopg2 import sql
+
+from backend.lib.scraper import BasicJSONScraper, ScrapeStateCache
 from common.lib.exceptions import JobAlreadyExistsException
 
 
@@ -44,6 +45,9 @@ class ThreadScraper4chan(BasicJSONScraper):
 	type = "fourchan-thread"
 	max_workers = 4
 
+	# scrape queued threads in batches, via the proxied request handler
+	batch_size = 100
+
 	# for new posts, any fields not in here will be saved in the "unsorted_data" column for that post as part of a
 	# JSONified dict
 	known_fields = ["no", "resto", "sticky", "closed", "archived", "archived_on", "now", "time", "name", "trip", "id",
@@ -56,6 +60,10 @@ class ThreadScraper4chan(BasicJSONScraper):
 	required_fields = ["no", "resto", "now", "time"]
 	required_fields_op = ["no", "resto", "now", "time", "replies", "images"]
 
+	# IDs and `id_seq`s of posts already in the database, per thread, so
+	# that these need not be queried again each time a thread is scraped
+	known_posts = ScrapeStateCache(max_size=5000)
+
 	def process(self, data):
 		"""
 		Process scraped thread data
@@ -95,16 +103,21 @@ class ThreadScraper4chan(BasicJSONScraper):
 			return True
 
 		if thread["timestamp_deleted"] > 0:
+			# the deletion timestamp is removed in update_thread()
 			self.log.info("Thread %s/%s/%s seems to have been undeleted, removing deletion timestamp %s" % (
 			self.datasource, self.job.details["board"], first_post["no"], thread["timestamp_deleted"]))
-			self.db.update("threads_" + self.prefix, where={"id": thread_db_id}, data={"timestamp_deleted": 0})
 
-		# create a dict mapped as `post id`: `post data` for easier comparisons with existing data
-		known_posts = self.db.fetchall("SELECT id, id_seq FROM posts_" + self.prefix + " WHERE thread_id = %s AND board = %s ORDER BY id ASC",
-										 (thread_db_id, self.job.details["board"]))
+		# get the posts already in the database as `post id`: `id_seq`, from
+		# the previous scrape if possible, and the scraped posts as
+		# `post id`: `post data`, for easier comparisons
+		cache_key = (self.prefix, self.job.details["board"], thread_db_id)
+		post_id_map = self.known_posts.get(cache_key)
+		if post_id_map is None:
+			known_posts = self.db.fetchall("SELECT id, id_seq FROM posts_" + self.prefix + " WHERE thread_id = %s AND board = %s ORDER BY id ASC",
+											 (thread_db_id, self.job.details["board"]))
+			post_id_map = {str(post["id"]): post["id_seq"] for post in known_posts}
+
 		post_dict_scrape = {str(post["no"]): post for post in data["posts"] if "no" in post}
-		post_dict_db = {str(post["id"]): post for post in known_posts}
-		post_id_map = {str(post["id"]): post["id_seq"] for post in known_posts}
 
 		# mark deleted posts as such
 		# (but not for sticky threads; posts in stickies
@@ -112,53 +125,92 @@ class ThreadScraper4chan(BasicJSONScraper):
 		# considers these as organic activity)
 		deleted = set()
 		if not thread["is_sticky"]:
-			deleted = set(post_dict_db.keys()) - set(post_dict_scrape.keys())
-			for post_id in deleted:
-				self.db.upsert("posts_%s_deleted" % self.prefix, data={"id_seq": post_id_map[post_id], "timestamp_deleted": self.init_time}, constraints=["id_seq"], commit=False)
-			self.db.commit()
+			deleted = set(post_id_map.keys()) - set(post_dict_scrape.keys())
+			self.db.insert_bulk("posts_%s_deleted" % self.prefix, [
+				{"id_seq": post_id_map[post_id], "timestamp_deleted": self.init_time} for post_id in deleted
+			], constraints=["id_seq"], upsert=True, commit=False)
 
 		# add new posts
-		new = set(post_dict_scrape.keys()) - set(post_dict_db.keys())
-		new_posts = 0
-		new_ids = set()
-		for post_id in new:
-			added = self.save_post(post_dict_scrape[post_id], thread, first_post)
-			if added:
-				new_posts += 1
-				new_ids.add(added)
-
-		all_ids = set([post_id_map[post_id] for post_id in post_dict_scrape.keys() if post_id in post_id_map]).union(new_ids)
+		new = set(post_dict_scrape.keys()) - set(post_id_map.keys())
+		new_ids = self.save_posts([post_dict_scrape[post_id] for post_id in sorted(new, key=int)], thread)
+		new_posts = len(new_ids)
+
+		all_ids = set([post_id_map[post_id] for post_id in post_dict_scrape.keys() if post_id in post_id_map]).union(new_ids.values())
 		undeleted = 0
 		if all_ids:
-			undeleted = self.db.delete("posts_%s_deleted" % self.prefix, where={"id_seq": list(all_ids)})
+			undeleted = self.db.delete("posts_%s_deleted" % self.prefix, where={"id_seq": list(all_ids)}, commit=False)
 
 		# update thread data
-		self.db.commit()
 		self.update_thread(thread, first_post, last_reply, last_post, thread["num_replies"] + new_posts)
 
 		# save to database
 		self.log.info("Updating %s/%s/%s, new: %s, old: %s, deleted: %s, undeleted: %s" % (
-			self.datasource, self.job.details["board"], first_post["no"], new_posts, len(post_dict_db), len(deleted), undeleted))
+			self.datasource, self.job.details["board"], first_post["no"], new_posts, len(post_id_map), len(deleted), undeleted))
 		self.db.commit()
+		self.known_posts.set(cache_key, {**post_id_map, **new_ids})
 
 		# return the amount of new posts
 		return new_posts
 
-	def save_post(self, post, thread, first_post):
+	def save_posts(self, posts, thread):
 		"""
-		Add post to database
+		Add posts to database
 
-		:param dict post: Post data to add
-		:param dict thread: Data for thread the post belongs to
-		:param dict first_post:  First post in thread
-		:return bool:  Whether the post was inserted
+		All posts are inserted with a single bulk query. Posts that are
+		already in the database (e.g. because they were moved from another
+		thread) are skipped and logged.
+
+		:param list posts:  Post data of posts to add
+		:param dict thread:  Data for thread the posts belong to
+		:return dict:  Post ID => `id_seq` for the posts that were inserted
 		"""
-		# check for data integrity
-		missing = set(self.required_fields) - set(post.keys())
-		if missing != set():
-			self.log.warning("Missing fields %s in scraped post in %s/%s, ignoring" % (repr(missing), self.datasource, self.job.data["remote_id"]))
-			return False
+		post_rows = []
+		posts_by_id = {}
+		for post in posts:
+			# check for data integrity
+			missing = set(self.required_fields) - set(post.keys())
+			if missing != set():
+				self.log.warning("Missing fields %s in scraped post in %s/%s, ignoring" % (repr(missing), self.datasource, self.job.data["remote_id"]))
+				continue
+
+			post_rows.append(self.get_post_data(post, thread))
+			posts_by_id[post["no"]] = post
+
+		inserted = self.db.insert_bulk("posts_" + self.prefix, post_rows, safe=True, return_fields=["id", "id_seq"], commit=False)
+		inserted_ids = {row["id"] for row in inserted}
+
+		dupe_ids = set(posts_by_id.keys()) - inserted_ids
+		if dupe_ids:
+			dupes = self.db.fetchall("SELECT id, thread_id, timestamp FROM posts_" + self.prefix + " WHERE board = %s AND id IN %s",
+									 (self.job.details["board"], tuple(dupe_ids)))
+			dupes = {dupe["id"]: dupe for dupe in dupes}
+			for post_id in sorted(dupe_ids):
+				post = posts_by_id[post_id]
+				if post_id in dupes:
+					dupe = dupes[post_id]
+					self.log.info("Post %s in thread %s/%s/%s (time: %s) scraped twice: first seen as %s in thread %s at %s" % (
+					 post["no"], self.datasource, thread["board"], thread["id"], post["time"], dupe["id"], dupe["thread_id"], dupe["timestamp"]))
+				else:
+					self.log.error("Post %s in thread %s/%s/%s hit database constraint but no dupe was found?" % (
+					post["no"], self.datasource, thread["board"], thread["id"]))
+
+		# Download images (exclude .webm files)
+		if self.config.get("fourchan-search.save_images"):
+			for post_id in sorted(inserted_ids):
+				post = posts_by_id[post_id]
+				if "filename" in post and post["ext"] != ".webm":
+					self.queue_image(post, thread)
 
+		return {str(row["id"]): row["id_seq"] for row in inserted}
+
+	def get_post_data(self, post, thread):
+		"""
+		Get database record for post
+
+		:param dict post:  Post data, as scraped
+		:param dict thread:  Data for thread the post belongs to
+		:return dict:  Post data, as stored in the database
+		"""
 		# save dimensions as a dumpable dict - no need to make it indexable
 		if len({"w", "h", "tn_h", "tn_w"} - set(post.keys())) == 0:
 			dimensions = {"w": post["w"], "h": post["h"], "tw": post["tn_w"], "th": post["tn_h"]}
@@ -189,36 +241,13 @@ class ThreadScraper4chan(BasicJSONScraper):
 				{field: post[field] for field in post.keys() if field not in self.known_fields})
 		}
 
-		# now insert the post into the database
-		return_value = True
-		try:
-			for field in post_data:
-				if not isinstance(post_data[field], six.string_types):
-					continue
-				# apparently, sometimes \0 appears in posts or something; psycopg2 can't cope with this
-				post_data[field] = post_data[field].replace("\0", "")
-
-			return_value = self.db.insert("posts_" + self.prefix, post_data, return_field="id_seq")
-		except psycopg2.IntegrityError as e:
-			self.db.rollback()
-			dupe = self.db.fetchone("SELECT * from posts_" + self.prefix + " WHERE id = %s" % (str(post["no"]),))
-			if dupe:
-				self.log.info("Post %s in thread %s/%s/%s (time: %s) scraped twice: first seen as %s in thread %s at %s" % (
-				 post["no"], self.datasource, thread["board"], thread["id"], post["time"], dupe["id"], dupe["thread_id"], dupe["timestamp"]))
-			else:
-				self.log.error("Post %s in thread %s/%s/%s hit database constraint (%s) but no dupe was found?" % (
-				post["no"], self.datasource, thread["board"], thread["id"], e))
+		for field in post_data:
+			if not isinstance(post_data[field], six.string_types):
+				continue
+			# apparently, sometimes \0 appears in posts or something; psycopg2 can't cope with this
+			post_data[field] = post_data[field].replace("\0", "")
 
-			return False
-		except ValueError as e:
-			self.db.rollback()
-			self.log.error("ValueError (%s) during scrape of thread %s" % (e, post["no"]))
-
-		# Download images (exclude .webm files)
-		if "filename" in post and post["ext"] != ".webm" and self.config.get("fourchan-search.save_images"):
-			self.queue_image(post, thread)
-
-		return return_value
+		return post_data
 
 	def queue_image(self, post, thread):
 		"""
@@ -292,6 +321,7 @@ class ThreadScraper4chan(BasicJSONScraper):
 		"""
 		Update thread info
 
+		:param dict thread:  Thread data, as currently stored
 		:param dict first_post:  Post data for the OP
 		:param int last_reply:  Timestamp of last reply in thread
 		:param int last_post:  ID of last post in thread
@@ -321,7 +351,11 @@ class ThreadScraper4chan(BasicJSONScraper):
 		if "archived" in first_post and first_post["archived"] == 1:
 			thread_update["timestamp_archived"] = first_post["archived_on"]
 
-		self.db.update("threads_" + self.prefix, where={"id": thread_db_id}, data=thread_update)
+		if thread["timestamp_deleted"] > 0:
+			# still there, so not deleted after all
+			thread_update["timestamp_deleted"] = 0
+
+		self.db.update("threads_" + self.prefix, where={"id": thread_db_id}, data=thread_update, commit=False)
 		return {**thread, **thread_update}
 
 	def add_thread(self, first_post, last_reply, last_post):
@@ -341,16 +375,19 @@ class ThreadScraper4chan(BasicJSONScraper):
 		# account for 8chan-style cyclical threads
 		thread_db_id = str(first_post["id"] if "id" in first_post and self.type != "fourchan-thread" else first_post["no"])
 
-		self.db.insert("threads_" + self.prefix, {
+		thread_data = {
 			"id": thread_db_id,
 			"board": self.job.details["board"],
 			"timestamp": first_post["time"],
 			"timestamp_scraped": self.init_time,
 			"timestamp_modified": first_post["time"],
 			"post_last": last_post
-		})
+		}
 
-		return self.db.fetchone("SELECT * FROM threads_" + self.prefix + " WHERE id = %s", (thread_db_id,))
+		# get the full row, with defaults, straight from the insert
+		return self.db.fetchone(sql.SQL("INSERT INTO {} ({}) VALUES %s RETURNING *").format(
+			sql.Identifier("threads_" + self.prefix), sql.SQL(", ").join([sql.Identifier(column) for column in thread_data])
+		), (tuple(thread_data.values()),))
 
 	def not_found(self):
 		"""
@@ -369,6 +406,7 @@ class ThreadScraper4chan(BasicJSONScraper):
 			"Thread %s/%s/%s was deleted, marking as such" % (self.datasource, board, remote_id))
 		self.db.update("threads_" + self.prefix, data={"timestamp_deleted": self.init_time},
 					   where={"id": thread_db_id, "timestamp_deleted": 0})
+		self.known_posts.delete((self.prefix, board, thread_db_id))
 		
 		# We're also adding the OP id to the posts_{datasource}_deleted table.
 		# For this we first need the id_seq of the post.
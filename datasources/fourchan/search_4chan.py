@@ -541,7 +541,7 @@ class Search4Chan(SearchWithScope):
         else:
             sql_query += " ORDER BY timestamp ASC"
 
-        return self.db.fetchall_interruptable(self.queue, sql_query, replacements)
+        return self.db.iterate_interruptable(self.queue, sql_query, replacements)
 
     def get_items_complex(self, query):
         """
@@ -554,7 +554,7 @@ class Search4Chan(SearchWithScope):
         is handled through PostgreSQL queries.
 
         :param dict query:  Query parameters, as part of the DataSet object
-        :return list:  Posts, sorted by thread and post ID, in ascending order
+        :return Iterable:  Posts, sorted by thread and post ID, in ascending order
         """
 
         # first, build the sphinx query
@@ -641,7 +641,9 @@ class Search4Chan(SearchWithScope):
                 where += " AND posts_%s_deleted.id_seq IS NULL" % self.prefix
 
             query = "SELECT " + columns + "FROM posts_" + self.prefix + join + " WHERE " + where + " ORDER BY id ASC"
-            posts = self.db.fetchall_interruptable(self.queue, query, replacements)
+
+            # no further processing needed, so the posts can be streamed
+            return self.db.iterate_interruptable(self.queue, query, replacements)
 
         if posts is None:
             return posts
@@ -650,8 +652,8 @@ class Search4Chan(SearchWithScope):
             self.dataset.update_status("Query finished, but no results were found.")
             return None
 
-        # we don't need to do further processing if we didn't use sphinx or don't have to check for deleted posts
-        if not use_sphinx or query.get("deleted"):
+        # we don't need to do further processing if we don't have to check for deleted posts
+        if query.get("deleted"):
             return posts
 
         # else we query the posts database
@@ -705,7 +707,7 @@ class Search4Chan(SearchWithScope):
         :param join, str: A potential JOIN statement
         :param where, list: A potential WHERE statemement
         :param replacements, list: The values to add in the JOIN and WHERE statements
-        :return list: List of posts, with a dictionary representing the database record for each post
+        :return Iterable: Posts, with a dictionary representing the database record for each post, streamed from the database
         """
         if not where:
             where = []
@@ -723,14 +725,14 @@ class Search4Chan(SearchWithScope):
         query = "SELECT " + columns + " FROM posts_" + self.sphinx_index + " " + join + " WHERE " + " AND ".join(
             where) + " ORDER BY id ASC"
 
-        return self.db.fetchall_interruptable(self.queue, query, replacements)
+        return self.db.iterate_interruptable(self.queue, query, replacements)
 
     def fetch_threads(self, thread_ids):
         """
         Fetch post from database for given threads
 
         :param list thread_ids: List of thread IDs to return post data for
-        :return list: List of posts, with a dictionary representing the database record for each post
+        :return Iterable: Posts, with a dictionary representing the database record for each post, streamed from the database
         """
         columns = ", ".join(self.return_cols)
 
@@ -742,8 +744,8 @@ class Search4Chan(SearchWithScope):
         if self.parameters.get("get_deleted") is False:
             exclude_deleted = "AND posts_" + self.prefix + "_deleted.id_seq IS NULL"
 
-        return self.db.fetchall_interruptable(self.queue,
-                                              "SELECT " + columns + " FROM posts_" + self.prefix + " \
+        return self.db.iterate_interruptable(self.queue,
+                                             "SELECT " + columns + " FROM posts_" + self.prefix + " \
 			LEFT JOIN posts_" + self.prefix + "_deleted ON posts_" + self.prefix + ".id_seq \
 			 = posts_" + self.prefix + "_deleted.id_seq \
 			WHERE thread_id IN %s " + exclude_deleted + " \
@@ -0,0 +1,88 @@
+"""
+Benchmark saving processor-generated annotations
+
+Saves synthetic annotations, as a processor like the tokeniser or LLM
+prompter would, both the way `DataSet.save_annotations()` used to (one
+`Annotation` object per annotation, each reading and then upserting its own
+record) and the way it does now (`Annotation.save_many()`, which upserts
+annotations in bulk, see `Database.insert_bulk()`). Reports annotations per
+second for each, for new annotations, for re-saving them with changed values,
+and for re-saving them unchanged (e.g. when a processor is run again).
+
+The old approach is only run for a sample of the annotations, since it takes
+a long time for large numbers of annotations. Annotations are saved for a
+made-up dataset key and deleted afterwards.
+
+Usage:
+    python helper-scripts/benchmarks/annotation_upsert.py -n 1000000
+"""
+import argparse
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/../..")
+from common.lib.annotation import Annotation
+from common.lib.database import Database
+from common.lib.logger import Logger
+from common.config_manager import ConfigManager
+
+cli = argparse.ArgumentParser()
+cli.add_argument("-n", "--annotations", type=int, default=1000000, help="Number of annotations to save in bulk")
+cli.add_argument("-l", "--legacy", type=int, default=5000, help="Number of annotations to save one by one")
+args = cli.parse_args()
+
+DATASET = "benchmark-annotation-upsert"
+
+config = ConfigManager()
+logger = Logger(log_path=config.get("PATH_LOGS").joinpath("benchmark-annotation-upsert.log"))
+db = Database(logger=logger, dbname=config.get("DB_NAME"), user=config.get("DB_USER"),
+              password=config.get("DB_PASSWORD"), host=config.get("DB_HOST"), port=config.get("DB_PORT"),
+              appname="benchmark-annotation-upsert")
+
+
+def make_annotations(num_annotations, field_id, value):
+    """
+    Generate annotations, as `BasicProcessor.save_annotations()` passes them
+    to the dataset
+    """
+    return [{
+        "dataset": DATASET,
+        "item_id": str(1000000000 + i),
+        "field_id": field_id,
+        "label": "tokenise",
+        "type": "text",
+        "value": f"{value} {i}",
+        "author": "tokenise-posts",
+        "author_original": "tokenise-posts",
+        "by_processor": True,
+        "from_dataset": "benchmark",
+    } for i in range(num_annotations)]
+
+
+def save_per_annotation(annotations):
+    for annotation in annotations:
+        Annotation(data=annotation, db=db)
+
+
+def save_bulk(annotations):
+    Annotation.save_many(db, annotations)
+
+
+def report(approach, action, num_annotations, seconds):
+    print(f"{approach:<16} {action:<10} {num_annotations:>10,} {seconds:>10.2f} {num_annotations / seconds:>12,.0f}")
+
+
+db.delete("annotations", where={"dataset": DATASET})
+print(f"{'approach':<16} {'action':<10} {'annotations':>10} {'seconds':>10} {'per second':>12}")
+try:
+    for approach, save, num_annotations in (("per annotation", save_per_annotation, args.legacy),
+                                            ("bulk", save_bulk, args.annotations)):
+        field_id = approach.replace(" ", "-")
+        for action, value in (("insert", "first"), ("update", "second"), ("unchanged", "second")):
+            annotations = make_annotations(num_annotations, field_id, value)
+            start = time.perf_counter()
+            save(annotations)
+            report(approach, action, num_annotations, time.perf_counter() - start)
+finally:
+    db.delete("annotations", where={"dataset": DATASET})
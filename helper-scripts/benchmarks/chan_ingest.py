@@ -0,0 +1,103 @@
+"""
+Benchmark post ingestion for the chan thread scrapers
+
+Inserts synthetic threads worth of posts into a copy of the 4chan posts
+table, both the way the thread scraper used to (one `INSERT` per post, and a
+separate upsert per deleted post) and the way it does now (one bulk `COPY`
+and merge per thread, see `Database.insert_bulk()`), and reports posts per
+second for each.
+
+The tables are created in a separate, temporary schema which is dropped
+afterwards, so this can be run against a development database with or
+without the 4chan data source enabled.
+
+Usage:
+    python helper-scripts/benchmarks/chan_ingest.py -t 200 -p 150
+"""
+import argparse
+import random
+import time
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/../..")
+from common.lib.database import Database
+from common.lib.logger import Logger
+from common.config_manager import ConfigManager
+
+cli = argparse.ArgumentParser()
+cli.add_argument("-t", "--threads", type=int, default=200, help="Number of threads to ingest per approach")
+cli.add_argument("-p", "--posts", type=int, default=150, help="Number of posts per thread")
+args = cli.parse_args()
+
+SCHEMA = "benchmark_chan_ingest"
+
+config = ConfigManager()
+logger = Logger(log_path=config.get("PATH_LOGS").joinpath("benchmark-chan-ingest.log"))
+db = Database(logger=logger, dbname=config.get("DB_NAME"), user=config.get("DB_USER"),
+              password=config.get("DB_PASSWORD"), host=config.get("DB_HOST"), port=config.get("DB_PORT"),
+              appname="benchmark-chan-ingest")
+
+words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod"]
+
+
+def make_thread(thread_id):
+    """
+    Generate post rows for a thread, as `ThreadScraper4chan.get_post_data()` would
+    """
+    return [{
+        "id": thread_id + i,
+        "board": "bench",
+        "thread_id": thread_id,
+        "timestamp": 1600000000 + i,
+        "subject": "",
+        "body": " ".join(random.choices(words, k=random.randint(5, 80))),
+        "author": "Anonymous",
+        "author_trip": "",
+        "author_type": "",
+        "author_type_id": "",
+        "country_code": "NL",
+        "country_name": "Netherlands",
+        "image_file": "image.jpg" if i % 3 == 0 else "",
+        "image_4chan": "1600000000.jpg" if i % 3 == 0 else "",
+        "image_md5": "",
+        "image_filesize": 0,
+        "image_dimensions": json.dumps({}),
+        "semantic_url": "",
+        "unsorted_data": json.dumps({})
+    } for i in range(args.posts)]
+
+
+def ingest_per_post(posts):
+    ids = [db.insert("posts_4chan", post, return_field="id_seq") for post in posts]
+    # the next scrape of the thread finds some of these deleted
+    for id_seq in ids[::10]:
+        db.upsert("posts_4chan_deleted", data={"id_seq": id_seq, "timestamp_deleted": 1}, constraints=["id_seq"], commit=False)
+    db.commit()
+
+
+def ingest_bulk(posts):
+    ids = db.insert_bulk("posts_4chan", posts, safe=True, return_fields=["id_seq"], commit=False)
+    db.insert_bulk("posts_4chan_deleted", [{"id_seq": row["id_seq"], "timestamp_deleted": 1} for row in ids[::10]],
+                   constraints=["id_seq"], upsert=True, commit=False)
+    db.commit()
+
+
+db.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+db.execute(f"CREATE SCHEMA {SCHEMA}")
+db.execute(f"SET search_path TO {SCHEMA}")
+db.execute(open(os.path.abspath(os.path.dirname(__file__)) + "/../../datasources/fourchan/database.sql").read())
+
+try:
+    print(f"Ingesting {args.threads:,} threads of {args.posts:,} posts per approach...")
+    for offset, (label, ingest) in enumerate((("one INSERT per post", ingest_per_post), ("bulk COPY and merge", ingest_bulk))):
+        threads = [make_thread((offset * args.threads + i) * args.posts * 2) for i in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            ingest(thread)
+        duration = time.perf_counter() - start
+        print(f"{label:<20} {duration:8.2f} s, {args.threads * args.posts / duration:10,.0f} posts/s")
+finally:
+    db.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    db.close()
@@ -0,0 +1,103 @@
+"""
+Benchmark near-duplicate search for bit hashes
+
+Generates random hashes, a tenth of which are near-duplicates of another
+hash, and finds all pairs within a given similarity the way the hash
+similarity network used to (XOR-ing each hash with all later hashes and
+checking each comparison in Python) and with `HammingIndex`, which the hash
+similarity network and hash grouping processors now use. Reports the time
+taken and the number of pairs found for each.
+
+The old approach is only run for small numbers of hashes, since it takes
+minutes for tens of thousands of hashes; its time for larger numbers is
+extrapolated from the number of comparisons per second for a sample.
+
+At similarities for which `HammingIndex` falls back to comparing tiles of
+hashes (e.g. 90% for 64-bit hashes), the time taken grows with the square of
+the number of hashes; for 1,000,000 hashes, this takes well over an hour.
+Run with `-s 95` for a quicker benchmark at that size.
+
+Usage:
+    python helper-scripts/benchmarks/hamming_search.py -n 10000 100000 1000000 -b 64 256 -s 95 90
+"""
+import argparse
+import time
+import math
+import sys
+import os
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/../..")
+from common.lib.hamming import HammingIndex
+
+cli = argparse.ArgumentParser()
+cli.add_argument("-n", "--hashes", type=int, nargs="+", default=[10000, 100000, 1000000], help="Numbers of hashes to search")
+cli.add_argument("-b", "--bits", type=int, nargs="+", default=[64, 256], help="Hash lengths, in bits")
+cli.add_argument("-s", "--similarity", type=int, nargs="+", default=[95, 90], help="Minimum similarity of pairs, in percent")
+cli.add_argument("-l", "--legacy-max", type=int, default=3000, help="Largest number of hashes to run the old approach for")
+args = cli.parse_args()
+
+random = np.random.default_rng(4)
+
+
+def make_hashes(num_hashes, bits):
+    """
+    Generate random hashes, some of which are near-duplicates of others
+    """
+    hashes = random.integers(0, 2, size=(num_hashes, bits), dtype=np.uint8).astype(bool)
+    duplicates = random.choice(num_hashes, size=num_hashes // 10, replace=False)
+    originals = random.integers(0, num_hashes, size=len(duplicates))
+    hashes[duplicates] = hashes[originals]
+
+    # flip a few bits of each near-duplicate
+    flips = random.random((len(duplicates), bits)) < 0.03
+    hashes[duplicates] ^= flips
+    return hashes
+
+
+def search_legacy(hashes, max_distance):
+    """
+    Compare each hash with all later hashes, as the processor used to
+    """
+    pairs = 0
+    remaining = hashes.astype(np.uint8)
+    for current_hash in hashes.astype(np.uint8):
+        remaining = remaining[1:]
+        for xor_comparison in np.bitwise_xor(current_hash, remaining):
+            if xor_comparison.sum() <= max_distance:
+                pairs += 1
+
+    return pairs
+
+
+def search_index(hashes, max_distance):
+    index = HammingIndex.from_bool_arrays(hashes)
+    return sum(len(left) for left, _, _ in index.iterate_pairs(max_distance))
+
+
+print(f"{'hashes':>10} {'bits':>5} {'similar':>8} {'approach':<14} {'seconds':>10} {'pairs':>12}")
+for bits in args.bits:
+    for similarity in args.similarity:
+        max_distance = int((100 - similarity) / 100 * bits)
+
+        # time the old approach on a sample, to extrapolate from
+        sample_size = min(args.legacy_max, max(args.hashes))
+        start = time.perf_counter()
+        pairs = search_legacy(make_hashes(sample_size, bits), max_distance)
+        legacy_rate = math.comb(sample_size, 2) / (time.perf_counter() - start)
+
+        for num_hashes in args.hashes:
+            hashes = make_hashes(num_hashes, bits)
+            if num_hashes <= args.legacy_max:
+                start = time.perf_counter()
+                pairs = search_legacy(hashes, max_distance)
+                print(f"{num_hashes:>10,} {bits:>5} {similarity:>7}% {'per pair':<14} {time.perf_counter() - start:>10.2f} {pairs:>12,}")
+            else:
+                print(f"{num_hashes:>10,} {bits:>5} {similarity:>7}% {'per pair':<14} {math.comb(num_hashes, 2) / legacy_rate:>9.0f}* {'':>12}")
+
+            start = time.perf_counter()
+            pairs = search_index(hashes, max_distance)
+            print(f"{num_hashes:>10,} {bits:>5} {similarity:>7}% {'HammingIndex':<14} {time.perf_counter() - start:>10.2f} {pairs:>12,}")
+
+print(f"* extrapolated from {min(args.legacy_max, max(args.hashes)):,} hashes")
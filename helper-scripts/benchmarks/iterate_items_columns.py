@@ -0,0 +1,129 @@
+"""
+Benchmark column projection in DataSet.iterate_items()
+
+Creates a temporary TikTok dataset (NDJSON, as imported via Zeeschuimer) with
+synthetic items, and measures for a full pass through the dataset:
+
+- the time taken by `iterate_items()` and `iterate_items(columns=[...])`;
+- the memory needed to hold a number of the yielded items, as a processor
+  collecting items would (measured separately with tracemalloc, which slows
+  down iteration considerably).
+
+Items are mapped with the TikTok data source's `map_item()`, so the benchmark
+includes the mapping overhead that processors pay in practice. The dataset is
+deleted afterwards.
+
+Usage:
+    python helper-scripts/benchmarks/iterate_items_columns.py -n 1000000
+"""
+import tracemalloc
+import argparse
+import random
+import json
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/../..")
+from common.lib.module_loader import ModuleCollector
+from common.config_manager import ConfigManager
+from common.lib.database import Database
+from common.lib.dataset import DataSet
+from common.lib.logger import Logger
+
+cli = argparse.ArgumentParser()
+cli.add_argument("-n", "--items", type=int, default=1000000, help="Number of items in the dataset")
+cli.add_argument("-c", "--columns", default="timestamp,body,author", help="Comma-separated columns to project")
+cli.add_argument("-r", "--retain", type=int, default=100000, help="Number of items to hold in memory when "
+                                                                   "measuring memory use")
+args = cli.parse_args()
+
+config = ConfigManager()
+logger = Logger(log_path=config.get("PATH_LOGS").joinpath("benchmark-iterate-items.log"))
+db = Database(logger=logger, dbname=config.get("DB_NAME"), user=config.get("DB_USER"),
+              password=config.get("DB_PASSWORD"), host=config.get("DB_HOST"), port=config.get("DB_PORT"),
+              appname="benchmark-iterate-items")
+config.with_db(db)
+modules = ModuleCollector(config)
+
+words = ["lorem", "ipsum", "dolor", "sit", "amet", "fyp", "viral", "dance", "cooking", "news", "music", "funny"]
+
+
+def make_item(i):
+    """
+    Generate a synthetic TikTok post, structured like those Zeeschuimer
+    captures, and of a similar size
+    """
+    hashtags = random.sample(words, 4)
+    return {
+        "id": str(7000000000000000000 + i),
+        "desc": " ".join(random.choices(words, k=25)) + " " + " ".join("#" + tag for tag in hashtags),
+        "createTime": 1700000000 + i * 7,
+        "author": {"id": str(i % 5000), "uniqueId": f"user{i % 5000}", "nickname": f"User {i % 5000}",
+                   "avatarThumb": f"https://p16-sign.tiktokcdn.com/avatar/{i % 5000}.jpeg?x-expires=1700000000",
+                   "signature": " ".join(random.choices(words, k=12)), "verified": False, "secUid": "MS4wLjABAAAA" * 4},
+        "authorStats": {"followerCount": i % 100000, "diggCount": i % 5000, "videoCount": i % 300, "heart": i},
+        "music": {"id": str(i % 800), "title": f"original sound - user{i % 800}", "authorName": f"user{i % 800}",
+                  "playUrl": f"https://sf16-ies-music.tiktokcdn.com/obj/{i % 800}.mp3",
+                  "coverLarge": f"https://p16-sign.tiktokcdn.com/music/{i % 800}.jpeg", "duration": 30},
+        "video": {"id": str(i), "height": 1024, "width": 576, "duration": 15, "ratio": "540p",
+                  "cover": f"https://p16-sign.tiktokcdn.com/cover/{i}.jpeg?x-expires=1700000000",
+                  "shareCover": ["", f"https://p16-sign.tiktokcdn.com/share/{i}.jpeg?x-expires=1700000000"],
+                  "downloadAddr": f"https://v16-webapp.tiktok.com/video/{i}.mp4?x-expires=1700000000",
+                  "bitrateInfo": [{"Bitrate": 500000 + n, "QualityType": n, "GearName": f"normal_{n}",
+                                   "PlayAddr": {"UrlList": [f"https://v16-webapp.tiktok.com/{i}/{n}.mp4"] * 3}}
+                                  for n in range(3)]},
+        "stats": {"diggCount": i % 9999, "shareCount": i % 99, "commentCount": i % 999, "playCount": i % 99999},
+        "textExtra": [{"hashtagName": tag, "start": 0, "end": len(tag) + 1, "type": 1} for tag in hashtags],
+        "challenges": [{"id": str(n), "title": tag, "desc": "", "coverLarger": ""} for n, tag in enumerate(hashtags)],
+        "duetInfo": {"duetFromId": "0"},
+        "stickersOnItem": [],
+        "effectStickers": [],
+        "diversificationLabels": ["Entertainment", "Dance"],
+        "locationCreated": "NL",
+        "__import_meta": {"source_platform_url": "https://www.tiktok.com/foryou", "timestamp_collected": 1700000000000}
+    }
+
+
+def time_pass(**kwargs):
+    start = time.perf_counter()
+    num_items = sum(1 for _ in dataset.iterate_items(**kwargs))
+    return num_items, time.perf_counter() - start
+
+
+def measure_memory(**kwargs):
+    tracemalloc.start()
+    retained = []
+    for item in dataset.iterate_items(**kwargs):
+        retained.append(item)
+        if len(retained) >= args.retain:
+            break
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+dataset = DataSet(parameters={"datasource": "tiktok"}, type="tiktok-search", db=db, modules=modules,
+                  extension="ndjson")
+try:
+    print(f"Writing {args.items:,} synthetic TikTok items...")
+    with dataset.get_results_path().open("w", encoding="utf-8") as outfile:
+        for i in range(args.items):
+            outfile.write(json.dumps(make_item(i)) + "\n")
+
+    dataset.finish(args.items)
+    size = dataset.get_results_path().stat().st_size
+    print(f"Dataset file: {size / 1024 / 1024:,.1f} MB")
+
+    columns = args.columns.split(",")
+    for label, kwargs in (("all columns", {}), (f"columns={columns}", {"columns": columns})):
+        num_items, duration = time_pass(get_annotations=False, **kwargs)
+        memory = measure_memory(get_annotations=False, **kwargs)
+        print(f"{label}:")
+        print(f"  full pass:  {duration:8.2f} s ({num_items / duration:,.0f} items/s)")
+        print(f"  memory:     {memory / 1024 / 1024:8.1f} MB for {args.retain:,} items "
+              f"({memory / args.retain / 1024:,.1f} kB per item)")
+finally:
+    dataset.delete()
+    db.close()
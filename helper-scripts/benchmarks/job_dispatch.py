@@ -0,0 +1,171 @@
+"""
+Benchmark job dispatch: polling vs. LISTEN/NOTIFY
+
+Queues a number of dummy jobs and then measures:
+
+- how long the query used to find claimable jobs takes, for both the old
+  approach (all claimable jobs, `JobQueue.get_all_jobs()`) and the new one
+  (the first jobs of each queue, `JobQueue.get_claimable_jobs()`);
+- the number of queries per second a dispatcher makes with each approach
+  while no jobs can be started;
+- dispatch latency, i.e. the time between a job being queued and the
+  dispatcher noticing it, for a 1-second polling loop and for a dispatcher
+  waiting for notifications.
+
+Dummy jobs use a job type that no worker handles, and are deleted afterwards.
+Run this against a development database with the backend stopped, since a
+running backend would log the dummy job type as unknown.
+
+Usage:
+    python helper-scripts/benchmarks/job_dispatch.py -j 10000
+"""
+import statistics
+import argparse
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/../..")
+from common.lib.database import Database
+from common.lib.logger import Logger
+from common.lib.queue import JobQueue
+from common.lib.job import Job
+from common.config_manager import ConfigManager
+
+cli = argparse.ArgumentParser()
+cli.add_argument("-j", "--jobs", type=int, default=10000, help="Number of dummy jobs to queue")
+cli.add_argument("-q", "--queues", type=int, default=50, help="Number of queues to divide the jobs over")
+cli.add_argument("-s", "--samples", type=int, default=20, help="Number of latency samples per approach")
+cli.add_argument("-d", "--duration", type=int, default=30, help="Seconds to run each idle dispatcher for")
+args = cli.parse_args()
+
+JOBTYPE = "benchmark-dispatch"
+
+config = ConfigManager()
+logger = Logger(log_path=config.get("PATH_LOGS").joinpath("benchmark-job-dispatch.log"))
+
+
+def connect(appname):
+    return Database(logger=logger, dbname=config.get("DB_NAME"), user=config.get("DB_USER"),
+                    password=config.get("DB_PASSWORD"), host=config.get("DB_HOST"), port=config.get("DB_PORT"),
+                    appname=appname)
+
+
+def time_query(callback, repeats=20):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        callback()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def measure_latency(wait_for_job):
+    """
+    Queue a job and measure how long it takes `wait_for_job` to see it
+
+    `wait_for_job` runs in a thread and should return once it has seen the
+    job with the given remote ID.
+    """
+    latencies = []
+    for sample in range(args.samples):
+        remote_id = f"latency-{time.time()}-{sample}"
+        seen = threading.Event()
+        thread = threading.Thread(target=lambda: wait_for_job(remote_id) and seen.set())
+        thread.start()
+        time.sleep(0.3)  # let the dispatcher settle into its wait
+
+        queued_at = time.perf_counter()
+        queue.add_job(JOBTYPE, remote_id=remote_id, queue_id="latency")
+        thread.join()
+        latencies.append(time.perf_counter() - queued_at)
+        db.delete("jobs", where={"jobtype": JOBTYPE, "remote_id": remote_id})
+
+    return latencies
+
+
+def count_idle_queries(dispatcher):
+    """
+    Run a dispatcher loop for a while and count the queries it makes
+    """
+    idle_db = connect("benchmark-idle")
+    idle_queue = JobQueue(logger=logger, database=idle_db)
+    num_queries = 0
+    execute_query = idle_db._execute_query
+
+    def counting_execute_query(*args, **kwargs):
+        nonlocal num_queries
+        num_queries += 1
+        return execute_query(*args, **kwargs)
+
+    idle_db._execute_query = counting_execute_query
+    dispatcher(idle_db, idle_queue, time.time() + args.duration)
+    idle_db.close()
+
+    return num_queries / args.duration
+
+
+def idle_polling(idle_db, idle_queue, until):
+    # the delegation loop as it was: fetch all jobs, sleep a second
+    while time.time() < until:
+        idle_queue.get_all_jobs()
+        time.sleep(1)
+
+
+def idle_listening(idle_db, idle_queue, until):
+    # the delegation loop as it is now, see WorkerManager.delegate()
+    idle_db.listen(Job.NOTIFY_CHANNEL)
+    while time.time() < until:
+        idle_queue.get_claimable_jobs(per_queue=1)
+        next_claimable = idle_queue.get_next_claimable_time()
+        timeout = min(5, until - time.time(), max(0, next_claimable - time.time()) if next_claimable else 5)
+        idle_db.wait_for_notifications(timeout=max(timeout, 0))
+
+
+def poll_for_job(remote_id):
+    poll_db = connect("benchmark-poller")
+    poll_queue = JobQueue(logger=logger, database=poll_db)
+    while True:
+        if any(job.data["remote_id"] == remote_id for job in poll_queue.get_all_jobs()):
+            poll_db.close()
+            return True
+        time.sleep(1)
+
+
+def listen_for_job(remote_id):
+    listen_db = connect("benchmark-listener")
+    listen_queue = JobQueue(logger=logger, database=listen_db)
+    listen_db.listen(Job.NOTIFY_CHANNEL)
+    while True:
+        if any(job.data["remote_id"] == remote_id for job in listen_queue.get_claimable_jobs()):
+            listen_db.close()
+            return True
+        listen_db.wait_for_notifications(timeout=5)
+
+
+db = connect("benchmark-job-dispatch")
+queue = JobQueue(logger=logger, database=db)
+
+print(f"Queueing {args.jobs:,} dummy jobs over {args.queues} queues...")
+db.execute_many("INSERT INTO jobs (jobtype, remote_id, queue_id, details, timestamp) VALUES %s", replacements=[
+    (JOBTYPE, f"dummy-{i}", f"queue-{i % args.queues}", "null", int(time.time()) + i) for i in range(args.jobs)
+])
+
+try:
+    all_jobs = time_query(queue.get_all_jobs)
+    claimable_jobs = time_query(lambda: queue.get_claimable_jobs(per_queue=1))
+    print(f"Query time, all claimable jobs:         {all_jobs * 1000:8.2f} ms ({len(queue.get_all_jobs()):,} rows)")
+    print(f"Query time, first job per queue:        {claimable_jobs * 1000:8.2f} ms ({len(queue.get_claimable_jobs()):,} rows)")
+    print(f"Measuring queries per second of an idle dispatcher ({args.duration} s each)...")
+    print(f"Idle queries per second, polling:       {count_idle_queries(idle_polling):8.2f}")
+    print(f"Idle queries per second, notifications: {count_idle_queries(idle_listening):8.2f}")
+
+    print(f"Measuring dispatch latency ({args.samples} samples each)...")
+    for label, waiter in (("polling (1 s)", poll_for_job), ("notifications", listen_for_job)):
+        latencies = measure_latency(waiter)
+        print(f"Dispatch latency, {label:<22} median {statistics.median(latencies) * 1000:8.2f} ms, "
+              f"max {max(latencies) * 1000:8.2f} ms")
+finally:
+    db.execute("DELETE FROM jobs WHERE jobtype = %s", replacements=(JOBTYPE,))
+    db.close()
@@ -0,0 +1,104 @@
+"""
+Benchmark sending prompts to an LLM through the concurrent request pool
+
+Sends a number of prompts to a local stub server that mimics an
+OpenAI-compatible API and answers each request after a fixed delay, as the
+LLM prompter does: first one at a time, then with the given number of
+concurrent requests, and finally again with a response cache filled by the
+previous run, as when a processor is run again with the same settings.
+Reports prompts per second for each.
+
+No requests leave the machine. The response cache is created in a temporary
+folder and deleted afterwards.
+
+Usage:
+    python helper-scripts/benchmarks/llm_pool.py -n 200 --latency 250 --concurrency 8
+"""
+import argparse
+import tempfile
+import threading
+import shutil
+import json
+import time
+import sys
+import os
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/../..")
+from common.lib.llm.adapter import LLMAdapter
+from common.lib.llm.pool import LLMRequest, LLMRequestPool, LLMResponseCache
+
+cli = argparse.ArgumentParser()
+cli.add_argument("-n", "--prompts", type=int, default=200, help="Number of prompts to send")
+cli.add_argument("--latency", type=int, default=250, help="Time the stub server takes to respond, in milliseconds")
+cli.add_argument("--concurrency", type=int, default=8, help="Number of concurrent requests")
+args = cli.parse_args()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers every chat completion request with the prompt after a delay
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(args.latency / 1000)
+        body = json.dumps({
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": request["messages"][-1]["content"]},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+llm = LLMAdapter(
+    model={"id": "stub-model", "local_id": "stub", "wrapper": "openai-like", "name": "Stub model"},
+    server={"_id": "stub", "url": f"http://127.0.0.1:{server.server_address[1]}"},
+)
+prompts = [f"Summarise item {i}" for i in range(args.prompts)]
+root = Path(tempfile.mkdtemp())
+cache = LLMResponseCache(root.joinpath("llm-responses.db"))
+
+
+def run(approach, concurrency, cache=None):
+    start = time.perf_counter()
+    with LLMRequestPool(llm, concurrency=concurrency, cache=cache) as pool:
+        for llm_request, response in pool.map([LLMRequest(prompt) for prompt in prompts]):
+            if isinstance(response, Exception):
+                raise response
+            assert response.content == llm_request.prompt
+
+    seconds = time.perf_counter() - start
+    print(f"{approach:<14} {concurrency:>11} {args.prompts:>8,} {seconds:>10.2f} {args.prompts / seconds:>10,.1f}")
+
+
+print(f"{'approach':<14} {'concurrency':>11} {'prompts':>8} {'seconds':>10} {'prompts/s':>10}")
+try:
+    run("sequential", 1)
+    run("concurrent", args.concurrency, cache=cache)
+    run("cached", args.concurrency, cache=cache)
+finally:
+    cache.close()
+    shutil.rmtree(root)
+    server.shutdown()
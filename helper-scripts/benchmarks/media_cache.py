@@ -0,0 +1,105 @@
+"""
+Benchmark taking media files from the shared media cache
+
+Downloads a number of files from a local HTTP stub server, which answers each
+request after a fixed delay, into a staging area, and adds them to a media
+cache, as the image and video downloaders do. It then puts the same files in
+a second staging area from the cache, as a downloader would for another
+dataset with the same URLs. Reports files per second and the number of bytes
+transferred over HTTP for each, and the disk space used by the cache.
+
+No requests leave the machine. The cache and staging areas are created in a
+temporary folder (or the given folder, which should be on the same file
+system as 4CAT's data folder to be representative) and deleted afterwards.
+
+Usage:
+    python helper-scripts/benchmarks/media_cache.py -n 1000 --size 500 --latency 50
+"""
+import argparse
+import tempfile
+import threading
+import shutil
+import time
+import sys
+import os
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/../..")
+from common.lib.media_cache import MediaCache
+
+cli = argparse.ArgumentParser()
+cli.add_argument("-n", "--files", type=int, default=1000, help="Number of files to download")
+cli.add_argument("--size", type=int, default=500, help="Size of each file, in kB")
+cli.add_argument("--latency", type=int, default=50, help="Time the stub server takes to respond, in milliseconds")
+cli.add_argument("--path", default=None, help="Folder to create cache and staging areas in")
+args = cli.parse_args()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request with a file after a delay
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(args.latency / 1000)
+        # vary the content per URL so that files are not deduplicated
+        body = self.path.encode("utf-8").ljust(args.size * 1000, b"x")
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+urls = [f"http://127.0.0.1:{server.server_address[1]}/media/{i}.jpg" for i in range(args.files)]
+
+root = Path(tempfile.mkdtemp(dir=args.path))
+cache = MediaCache(root.joinpath("media-cache"))
+
+
+def report(approach, seconds, transferred):
+    print(f"{approach:<10} {args.files:>8,} {seconds:>10.2f} {args.files / seconds:>10,.0f} {transferred / 1_000_000:>12,.1f}")
+
+
+print(f"{'approach':<10} {'files':>8} {'seconds':>10} {'files/s':>10} {'MB via HTTP':>12}")
+try:
+    staging_area = root.joinpath("staging-download")
+    staging_area.mkdir()
+    session = requests.Session()
+    transferred = 0
+    start = time.perf_counter()
+    for url in urls:
+        response = session.get(url, stream=True)
+        destination = staging_area.joinpath(url.split("/")[-1])
+        with destination.open("wb") as outfile:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                outfile.write(chunk)
+                transferred += len(chunk)
+        cache.add(url, destination)
+    report("download", time.perf_counter() - start, transferred)
+
+    staging_area = root.joinpath("staging-cache")
+    staging_area.mkdir()
+    start = time.perf_counter()
+    for url in urls:
+        cached_file = cache.get(url)
+        cache.place(cached_file, staging_area.joinpath(url.split("/")[-1]))
+    report("cache", time.perf_counter() - start, 0)
+
+    cache_size = sum([path.stat().st_size for path in cache.objects_path.glob("*/*")])
+    links = next(cache.objects_path.glob("*/*")).stat().st_nlink
+    print(f"\ncache holds {cache_size / 1_000_000:,.1f} MB; cached files have {links} link(s) on disk")
+finally:
+    shutil.rmtree(root)
+    server.shutdown()
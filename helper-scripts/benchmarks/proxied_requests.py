@@ -0,0 +1,114 @@
+"""
+Benchmark request throughput of the DelegatedRequestHandler
+
+Starts a number of local HTTP stub servers that act as proxies, each answering
+any request after a fixed delay, and requests URLs through them via
+`BasicProcessor.iterate_proxied_requests()`, as e.g. the image downloader
+does. URLs are spread over a number of made-up host names, so that both the
+per-proxy and per-host concurrency limits apply. Reports requests per second
+and the CPU time used by the process while waiting for responses, with and
+without preserving the order of results.
+
+No requests leave the machine: all URLs are requested via the stub proxies.
+Note that the stub servers run in the same process, so their CPU time is
+included in the reported CPU time.
+
+Usage:
+    python helper-scripts/benchmarks/proxied_requests.py -n 2000 -p 1 4 16 --latency 50
+"""
+import argparse
+import logging
+import threading
+import time
+import sys
+import os
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/../..")
+from backend.lib.proxied_requests import DelegatedRequestHandler, FailedProxiedRequest
+from backend.lib.processor import BasicProcessor
+
+cli = argparse.ArgumentParser()
+cli.add_argument("-n", "--requests", type=int, default=2000, help="Number of URLs to request per run")
+cli.add_argument("-p", "--proxies", type=int, nargs="+", default=[1, 4, 16], help="Numbers of proxies to use")
+cli.add_argument("--hosts", type=int, default=20, help="Number of distinct host names to request from")
+cli.add_argument("--latency", type=int, default=50, help="Time the stub servers take to respond, in milliseconds")
+cli.add_argument("--cooloff", type=float, default=0.1, help="Proxy cooloff, in seconds (proxies.cooloff)")
+cli.add_argument("--concurrent-overall", type=int, default=5, help="Requests per proxy (proxies.concurrent-overall)")
+cli.add_argument("--concurrent-host", type=int, default=2, help="Requests per proxy per host (proxies.concurrent-host)")
+args = cli.parse_args()
+
+logging.getLogger("urllib3").setLevel(logging.ERROR)
+log = logging.getLogger("benchmark-proxied-requests")
+log.setLevel(logging.WARNING)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request after a delay, whatever the requested URL
+    """
+    protocol_version = "HTTP/1.1"
+    body = b"x" * 1024
+
+    def do_GET(self):
+        time.sleep(args.latency / 1000)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubConfig:
+    """
+    Stand-in for the configuration reader, with proxy settings only
+    """
+    def __init__(self, proxy_urls):
+        self.settings = {
+            "proxies.urls": proxy_urls,
+            "proxies.cooloff": args.cooloff,
+            "proxies.concurrent-overall": args.concurrent_overall,
+            "proxies.concurrent-host": args.concurrent_host,
+            "proxies.allow-localhost-fallback": False,
+            "proxies.healthcheck-url": "",
+            "proxies.healthcheck-timeout": 5,
+        }
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+
+servers = []
+for i in range(max(args.proxies)):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    servers.append(server)
+
+urls = [f"http://host{i % args.hosts}.example/item/{i}" for i in range(args.requests)]
+
+print(f"{'proxies':>8} {'ordered':>8} {'seconds':>8} {'requests/s':>11} {'cpu seconds':>12} {'failed':>7}")
+for num_proxies in args.proxies:
+    config = StubConfig([f"http://127.0.0.1:{server.server_address[1]}" for server in servers[:num_proxies]])
+    delegator = DelegatedRequestHandler(log, config)
+    processor = SimpleNamespace(manager=SimpleNamespace(proxy_delegator=delegator), config=config,
+                                _proxy_queue_name=lambda: "benchmark")
+
+    for preserve_order in (False, True):
+        failed = 0
+        start = time.perf_counter()
+        start_cpu = time.process_time()
+        for url, response in BasicProcessor.iterate_proxied_requests(processor, urls, preserve_order=preserve_order, timeout=10):
+            if isinstance(response, FailedProxiedRequest):
+                failed += 1
+
+        seconds = time.perf_counter() - start
+        cpu_seconds = time.process_time() - start_cpu
+        print(f"{num_proxies:>8} {str(preserve_order):>8} {seconds:>8.2f} {len(urls) / seconds:>11,.0f} {cpu_seconds:>12.2f} {failed:>7,}")
+
+    delegator.halt_and_wait()
@@ -195,7 +195,7 @@ class ImageHasher(BasicProcessor):
         if group_by:
             # Use HashGrouper to compute groups
             hashes = [it["hash_obj"] for it in items]
-            group_labels = HashGrouper.compute_groups(hashes, hash_type, hash_size, similarity_pct)
+            group_labels = HashGrouper.compute_groups(hashes, hash_type, hash_size, similarity_pct, processor=self)
             next_group_id = max(group_labels) + 1 if group_labels else 0
             for i, gid in enumerate(group_labels):
                 items[i]["group"] = gid
@@ -163,6 +163,10 @@ class AuthorInfoRemover(BasicProcessor):
 
         # replace original dataset with updated one
         shutil.move(self.dataset.get_results_path(), self.source_dataset.get_results_path())
+        if self.source_dataset.is_view():
+            # which now has a file of its own
+            self.source_dataset.get_row_selection().delete()
+            self.source_dataset.delete_parameter("view_of")
 
         self.dataset.update_status(f"Data {mode}d, original dataset updated.", is_final=True)
         self.dataset.finish(processed_items)
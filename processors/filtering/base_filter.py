@@ -35,6 +35,9 @@ class BaseFilter(BasicProcessor):
         """
         Reads a file, filtering items that match in the required way, and
         creates a new dataset containing the matching values
+
+        If enabled, CSV and NDJSON datasets are not copied; the new dataset is
+        then a view that only stores which rows matched (see `write_view()`).
         """
         # Get parent extension
         parent_extension = self.source_dataset.get_extension()
@@ -49,39 +52,47 @@ class BaseFilter(BasicProcessor):
         # Check if we need to copy over annotations
         copy_annotations = True if self.source_dataset.num_annotations() > 0 else False
 
-        zip_file = False
-        with self.dataset.get_results_path().open("w", encoding="utf-8", **kwargs) as outfile:
-
-            writer = None
-            # Loop through all filtered posts. These ought to be the `original` object in case of a MappedItem; we're
-            # filtering, not changing the data (at least in principle).
-            for item in matching_items:
+        view_of = None
+        if parent_extension in ("csv", "ndjson") and self.config.get("4cat.filter_views", False):
+            view_of = self.get_view_source()
 
-                # We're only storing the original items here.
-                # We still need the mapped data for annotations.
-                item_original = item.original
-
-                # Save the actual item
-                if parent_extension == "csv":
-                    if not writer:
-                        writer = csv.DictWriter(outfile, fieldnames=item_original.keys())
-                        writer.writeheader()
-                    writer.writerow(item_original)
-                elif parent_extension == "ndjson":
-                    outfile.write(json.dumps(item_original) + "\n")
-                elif parent_extension == "zip":
-                    if not zip_file:
-                        staging_area = self.dataset.get_staging_area()
-                        zip_file = True
-                    # copy the file from the source dataset to the new dataset
-                    shutil.copy2(item.file, staging_area)
-                else:
-                    raise NotImplementedError("Parent datasource of type %s cannot be filtered" % parent_extension)
-
-                if copy_annotations:
-                    self.item_ids.append(item.get("id", ""))
+        zip_file = False
+        if view_of:
+            num_posts = self.write_view(view_of, matching_items, copy_annotations)
 
-                num_posts += 1
+        else:
+            with self.dataset.get_results_path().open("w", encoding="utf-8", **kwargs) as outfile:
+
+                writer = None
+                # Loop through all filtered posts. These ought to be the `original` object in case of a MappedItem; we're
+                # filtering, not changing the data (at least in principle).
+                for item in matching_items:
+
+                    # We're only storing the original items here.
+                    # We still need the mapped data for annotations.
+                    item_original = item.original
+
+                    # Save the actual item
+                    if parent_extension == "csv":
+                        if not writer:
+                            writer = csv.DictWriter(outfile, fieldnames=item_original.keys())
+                            writer.writeheader()
+                        writer.writerow(item_original)
+                    elif parent_extension == "ndjson":
+                        outfile.write(json.dumps(item_original) + "\n")
+                    elif parent_extension == "zip":
+                        if not zip_file:
+                            staging_area = self.dataset.get_staging_area()
+                            zip_file = True
+                        # copy the file from the source dataset to the new dataset
+                        shutil.copy2(item.file, staging_area)
+                    else:
+                        raise NotImplementedError("Parent datasource of type %s cannot be filtered" % parent_extension)
+
+                    if copy_annotations:
+                        self.item_ids.append(item.get("id", ""))
+
+                    num_posts += 1
 
         if num_posts == 0:
             self.dataset.update_status("No items matched your criteria", is_final=True)
@@ -102,6 +113,59 @@ class BaseFilter(BasicProcessor):
         else:
             self.dataset.finish(num_posts)
 
+    def get_view_source(self):
+        """
+        Get the dataset a view of the filtered items would read from
+
+        That is the source dataset, or, if that is a view itself, the dataset
+        it reads from, so views never depend on other views.
+
+        :return DataSet|None:  Dataset, or `None` if its file is not indexed
+        and cannot be, in which case the items need to be copied instead
+        """
+        source = self.source_dataset.get_view_parent() if self.source_dataset.is_view() else self.source_dataset
+        if not source.is_finished():
+            return None
+
+        if not source.get_row_index().is_current() and not source.build_row_index(processor=self):
+            return None
+
+        return source
+
+    def write_view(self, view_of, matching_items, copy_annotations=False):
+        """
+        Store the filtered items as a view
+
+        Instead of copying the items, only the rows of the source file they
+        were read from are stored (see `DataSet.get_row_selection()`).
+        Items are read from the source file when iterating through the
+        dataset, and it is only written to a file of its own when downloaded
+        or when the source dataset is deleted.
+
+        :param DataSet view_of:  Dataset to read items from; the source
+        dataset, or the dataset it reads from if it is a view
+        :param matching_items:  Generator of matching items, as returned by
+        `filter_items()`
+        :param bool copy_annotations:  Keep track of the IDs of matching
+        items, so annotations can be copied for them
+        :return int:  Number of matching items
+        """
+        def matching_rows():
+            for item in matching_items:
+                if copy_annotations:
+                    self.item_ids.append(item.get("id", ""))
+
+                yield item.row
+
+        rows = matching_rows()
+        if self.source_dataset.is_view():
+            rows = self.source_dataset.get_row_selection().get_parent_rows(rows)
+
+        num_rows = self.dataset.get_row_selection().write(rows, view_of.key, view_of.get_row_index().get_num_rows())
+        self.dataset.view_of = view_of.key
+
+        return num_rows
+
     def after_process(self):
         super().after_process()
 
@@ -19,6 +19,7 @@ from common.lib.item_mapping import MappedItem
 from common.lib.exceptions import ProcessorInterruptedException, QueryParametersException, QueryNeedsExplicitConfirmationException
 from common.lib.helpers import UserInput, nthify, andify, remove_nuls, flatten_dict
 from common.lib.llm.adapter import LLMAdapter
+from common.lib.llm.pool import LLMRequest, LLMRequestPool, LLMResponseCache
 from backend.lib.processor import BasicProcessor
 from common.lib.compatibility import Compatibility
 
@@ -317,6 +318,16 @@ class LLMPrompter(BasicProcessor):
             }
         })
 
+        if config.get("llm.response_cache"):
+            options["use_cache"] = {
+                "type": UserInput.OPTION_TOGGLE,
+                "help": "Reuse earlier responses",
+                "default": True,
+                "tooltip": "If the same prompt was sent to the same model with the same settings before, use the "
+                           "response from then instead of sending the prompt again. Disable to always get a fresh "
+                           "response.",
+            }
+
         # Get the media columns for the select media columns option
         if not is_media_parent and parent_dataset and parent_dataset.get_columns():
             columns = parent_dataset.get_columns()
@@ -467,11 +478,6 @@ class LLMPrompter(BasicProcessor):
         outputs = 0  # How many items we've written
         skipped = 0  # We'll skip empty values
 
-        # Save items if we're batching prompts
-        batched_data = {}
-        batched_ids = []
-        n_batched = 0
-
         # Set structured outputs through a JSON schema.
         # We're always using this when batching items.
         if use_batches:
@@ -505,14 +511,26 @@ class LLMPrompter(BasicProcessor):
         if system_prompt_base:
             self.dataset.update_status(f'System prompt: "{system_prompt_base}"')
 
+        # Send prompts concurrently if the server allows it, and reuse earlier
+        # responses to the same prompts if so desired
+        response_cache = None
+        if self.config.get("llm.response_cache") and self.parameters.get("use_cache", True):
+            response_cache = LLMResponseCache(self.config.get("PATH_DATA").joinpath("llm-responses.db"))
+
+        pool = LLMRequestPool(
+            llm,
+            concurrency=server.get("concurrency") or 1,
+            min_interval=1 if model["server"] == "mistral" else 0,  # rate limits for different servers
+            cache=response_cache
+        )
+
         time_start = time.time()
-        with self.dataset.get_results_path().open("w", encoding="utf-8", newline="") as outfile:
+        with self.dataset.get_results_path().open("w", encoding="utf-8", newline="") as outfile, pool:
 
             if is_media_archive:
                 # Media archive processing: iterate over files in the zip
                 self.dataset.update_status(f"Processing {media_archive_type} files from archive")
                 staging_area = self.dataset.get_staging_area()
-                row = 0
                 max_processed = min(limit, self.source_dataset.num_rows) if limit else self.source_dataset.num_rows
 
                 # Load metadata to map filenames back to original post IDs for annotations.
@@ -544,49 +562,69 @@ class LLMPrompter(BasicProcessor):
                         self.dataset.log(f"Could not load .metadata.json for annotation mapping: {e}. "
                                          f"Annotations will use filenames as item IDs.")
 
-                for item in self.source_dataset.iterate_items(staging_area=staging_area, immediately_delete=True, get_annotations=False):
+                def get_media_requests():
+                    """
+                    Yield a request for each media file in the archive
 
-                    if self.interrupted:
-                        raise ProcessorInterruptedException("Interrupted while generating text through LLMs")
+                    Files are kept until their response has been processed,
+                    since requests are sent while later files are extracted.
+                    """
+                    nonlocal skipped
+                    row = 0
+                    queued = 0
+                    for item in self.source_dataset.iterate_items(staging_area=staging_area, immediately_delete=False, get_annotations=False):
 
-                    # Skip metadata and non-media files
-                    filename = item["id"] if "id" in item else str(item.get("filename", ""))
-                    if not filename or filename.startswith(".") or filename.rsplit(".", 1)[-1].lower() in ("json", "log", "txt"):
-                        continue
-                    row += 1
+                        if self.interrupted:
+                            raise ProcessorInterruptedException("Interrupted while generating text through LLMs")
 
-                    item_id = filename
-                    media_file_path = item.file if hasattr(item, "file") else Path(item.get("path", ""))
+                        # Skip metadata and non-media files
+                        filename = item["id"] if "id" in item else str(item.get("filename", ""))
+                        if not filename or filename.startswith(".") or filename.rsplit(".", 1)[-1].lower() in ("json", "log", "txt"):
+                            continue
+                        row += 1
 
-                    if not media_file_path or not media_file_path.exists():
-                        self.dataset.log(f"Skipping {filename}: file not found")
-                        skipped += 1
-                        continue
+                        media_file_path = item.file if hasattr(item, "file") else Path(item.get("path", ""))
+                        if not media_file_path or not media_file_path.exists():
+                            self.dataset.log(f"Skipping {filename}: file not found")
+                            skipped += 1
+                            continue
 
-                    prompt = base_prompt if base_prompt else f"Analyze this {media_archive_type} file."
-                    system_prompt = system_prompt_base
+                        yield LLMRequest(
+                            base_prompt if base_prompt else f"Analyze this {media_archive_type} file.",
+                            system_prompt=system_prompt_base,
+                            temperature=temperature,
+                            media_files=[media_file_path],
+                            json_schema=json_schema,
+                            context={"row": row, "filename": filename, "path": media_file_path}
+                        )
+
+                        queued += 1
+                        if limit and queued >= max_processed:
+                            break
+
+                for llm_request, response in pool.map(get_media_requests()):
+                    row = llm_request.context["row"]
+                    filename = llm_request.context["filename"]
+                    llm_request.context["path"].unlink(missing_ok=True)
+
+                    item_id = filename
+                    prompt = llm_request.prompt
+                    system_prompt = llm_request.system_prompt
                     model_id = model['local_id']
 
                     self.dataset.update_status(f"Processing {media_archive_type} file {row:,}/{max_processed:,} "
                                                f"with {model['local_id']}")
-                    try:
-                        response = llm.generate_text(
-                            prompt,
-                            system_prompt=system_prompt,
-                            temperature=temperature,
-                            media_files=[media_file_path],
-                        )
-                    except Exception as e:
+                    if isinstance(response, Exception):
                         # Best-effort heuristic to detect model incompatibility with media type.
                         # Error messages vary by server; this catches common patterns.
-                        error_str = str(e).lower()
+                        error_str = str(response).lower()
                         if "vision" in error_str or "image" in error_str or "multimodal" in error_str or "media" in error_str:
                             self.dataset.finish_with_error(
                                 f"The model '{model_id}' does not appear to support {media_archive_type} input. "
-                                f"Please use a model with {media_archive_type} support (e.g. a vision model for images): {e}"
+                                f"Please use a model with {media_archive_type} support (e.g. a vision model for images): {response}"
                             )
                             return
-                        self.dataset.finish_with_warning(outputs, f"Not all items processed: {e}")
+                        self.dataset.finish_with_warning(outputs, f"Not all items processed: {response}")
                         return
 
                     # Set model name from the response for more details
@@ -710,300 +748,325 @@ class LLMPrompter(BasicProcessor):
 
                     self.dataset.update_progress(row / max_processed)
 
-                    # Rate limits for different servers
-                    if model["server"] == "mistral":
-                        time.sleep(1)
-
                     if limit_reached:
                         break
 
             else:
                 # Text-based dataset processing (CSV or NDJSON)
-                row = 0
                 max_processed = min(limit, self.source_dataset.num_rows) if limit else self.source_dataset.num_rows
-                for item in self.source_dataset.iterate_items():
-                    row += 1
+                missing_column = None
+
+                def get_text_requests():
+                    """
+                    Yield a request for each item, or each batch of items
+
+                    Dataset values are inserted in the prompt, batching them
+                    if so desired.
+                    """
+                    nonlocal i, skipped, limit_reached, missing_column
+                    batch_llm = None
+                    batch_schema = json_schema
+                    batched_data = {}
+                    batched_ids = []
+                    n_batched = 0
+                    row = 0
+                    for item in self.source_dataset.iterate_items():
+                        row += 1
+
+                        if self.interrupted:
+                            raise ProcessorInterruptedException("Interrupted while generating text through LLMs")
+
+                        # Replace with dataset values
+                        prompt = base_prompt
+
+                        # Make sure we can match outputs with input IDs
+                        if "id" in item:
+                            item_id = item["id"]
+                        elif "item_id" in item:
+                            item_id = item["item_id"]
+                        else:
+                            item_id = str(i + 1)
 
-                    if self.interrupted:
-                        raise ProcessorInterruptedException("Interrupted while generating text through LLMs")
+                        # Store dataset values in batches. Store just one item when we're not batching.
+                        item_values = {}
+                        for column_to_use in columns_to_use:
+                            if column_to_use not in batched_data:
+                                batched_data[column_to_use] = []
 
-                    # Replace with dataset values
-                    prompt = base_prompt
+                            try:
+                                # Columns can be comma-separated within the bracket
+                                if "," in column_to_use:
+                                    item_value = []
+                                    bracket_cols = [c.strip() for c in column_to_use.split(",")]
+                                    for bracket_col in bracket_cols:
+                                        col_value = str(item[bracket_col]).strip()
+                                        if col_value:
+                                            item_value.append(col_value)
+                                    item_value = ", ".join(item_value)
+
+                                # Else just get the single item
+                                else:
+                                    item_value = str(item[column_to_use]).strip()
 
-                    # Make sure we can match outputs with input IDs
-                    if "id" in item:
-                        item_id = item["id"]
-                    elif "item_id" in item:
-                        item_id = item["item_id"]
-                    else:
-                        item_id = str(i + 1)
+                            except KeyError:
+                                missing_column = column_to_use
+                                return
 
-                    # Store dataset values in batches. Store just one item when we're not batching.
-                    item_values = {}
-                    for column_to_use in columns_to_use:
-                        if column_to_use not in batched_data:
-                            batched_data[column_to_use] = []
+                            # Skip row if we encounter *any* empty value in *different* brackets in the
+                            # prompt *when batching*. This is because lists with different length in the prompt cause asymmetry
+                            # in the input values, and it's though to then output the correct number of values.
+                            if not item_value and use_batches:
+                                item_values = {}
+                                self.dataset.update_status(f"Skipping row {row} because of empty value(s) in {column_to_use}")
+                                break
+                            else:
+                                item_values[column_to_use] = item_value
+
+                        # Get media URL values; split links on comma.
+                        media_urls = []
+                        for media_column in media_columns:
+                            media_url = item.get(media_column, [])
+                            if media_url:
+                                if isinstance(media_url, list):
+                                    media_urls += media_url
+                                else:
+                                    media_urls += [url.strip() for url in media_url.split(",")]
+
+                        # Skip with empty items
+                        empty_items = True if not any(v for v in item_values.values()) and columns_to_use else False
+                        if (empty_items and not media_urls) or (media_columns and not media_urls):
+                            if item_values.keys():
+                                missing_columns = andify(columns_to_use) if len(columns_to_use) > 1 else columns_to_use[0]
+                                self.dataset.update_status(f"Skipping row {row} because of empty value(s) in {missing_columns}")
+                            if media_columns and not media_urls:
+                                missing_media_columns = andify(media_columns) if len(media_columns) > 1 else media_columns[0]
+                                self.dataset.update_status(f"Skipping row {row} because of empty value(s) in {missing_media_columns}")
+                            skipped += 1
+                            # (but not if we've reached the end of the dataset; we want to process the last batch)
+                            if row != self.source_dataset.num_rows:
+                                continue
+                        # Else add the values to the batch
+                        else:
+                            for item_column, item_value in item_values.items():
+                                if max_input_len > 0:
+                                    item_value = item_value[:max_input_len]
+                                batched_data[item_column].append(item_value)
+                            n_batched += 1
+                            batched_ids.append(item_id)  # Also store IDs, so we can match them to the output
+
+                        i += 1
+                        if limit and i >= max_processed:
+                            limit_reached = True
+
+                        # Generate text when there's something to process and when we've reached 1) the batch length (which can
+                        # be 1) or 2) the end of the dataset or 3) the custom limit.
+                        if n_batched and (n_batched % batches == 0 or row == self.source_dataset.num_rows or limit_reached):
+
+                            # Insert dataset values into prompt. Insert as list for batched data, else just insert the value.
+                            for column_to_use in columns_to_use:
+                                prompt_values = batched_data[column_to_use]
+                                prompt_values = prompt_values[0] if len(prompt_values) == 1 else f"```{json.dumps(prompt_values)}```"
+                                prompt = prompt.replace(f"[{column_to_use}]", prompt_values)
+
+                            # Possibly use a different batch size when we've reached the end of the dataset.
+                            if row == self.source_dataset.num_rows and use_batches:
+                                # Get a new JSON schema for a batch of different length at the end of the iteration
+                                if n_batched != batches and json_schema:
+                                    batch_schema = self.get_json_schema_for_batch(n_batched, custom_schema=json_schema_original)
+                                    # `llm` becomes a RunnableSequence when used, so use a new adapter for this batch
+                                    batch_llm = LLMAdapter(
+                                        model=model,
+                                        server=server,
+                                        api_key=api_key,
+                                        temperature=temperature,
+                                        max_tokens=max_tokens,
+                                        client_kwargs=client_kwargs
+                                    )
+                                    batch_llm.set_structure(batch_schema)
 
-                        try:
-                            # Columns can be comma-separated within the bracket
-                            if "," in column_to_use:
-                                item_value = []
-                                bracket_cols = [c.strip() for c in column_to_use.split(",")]
-                                for bracket_col in bracket_cols:
-                                    col_value = str(item[bracket_col]).strip()
-                                    if col_value:
-                                        item_value.append(col_value)
-                                item_value = ", ".join(item_value)
-
-                            # Else just get the single item
+                            # For batched_output, make sure the exact length of outputs is mentioned in the system prompt
+                            if use_batches:
+                                system_prompt = system_prompt_base.replace("{batch_size}", str(n_batched))
                             else:
-                                item_value = str(item[column_to_use]).strip()
+                                system_prompt = system_prompt_base
 
-                        except KeyError:
-                            self.dataset.finish_with_error(f"Column(s) '{column_to_use}' not in the parent dataset")
-                            return
+                            batch_str = f" and {n_batched} items batched into the prompt" if use_batches else ""
+                            self.dataset.update_status(f"Generating text at row {row:,}/"
+                                                       f"{max_processed:,} with {model['name']}{batch_str}")
+
+                            yield LLMRequest(
+                                prompt,
+                                system_prompt=system_prompt,
+                                temperature=temperature,
+                                files=media_urls,
+                                json_schema=batch_schema,
+                                adapter=batch_llm,
+                                context={"row": row, "ids": batched_ids, "data": batched_data, "n_batched": n_batched}
+                            )
 
-                        # Skip row if we encounter *any* empty value in *different* brackets in the
-                        # prompt *when batching*. This is because lists with different length in the prompt cause asymmetry
-                        # in the input values, and it's though to then output the correct number of values.
-                        if not item_value and use_batches:
-                            item_values = {}
-                            self.dataset.update_status(f"Skipping row {row} because of empty value(s) in {column_to_use}")
+                            # Remove batched data and store what row we've left off
+                            batched_ids = []
+                            batched_data = {}
+                            n_batched = 0
+
+                        if limit_reached:
                             break
-                        else:
-                            item_values[column_to_use] = item_value
-
-                    # Get media URL values; split links on comma.
-                    media_urls = []
-                    for media_column in media_columns:
-                        media_url = item.get(media_column, [])
-                        if media_url:
-                            if isinstance(media_url, list):
-                                media_urls += media_url
-                            else:
-                                media_urls += [url.strip() for url in media_url.split(",")]
-
-                    # Skip with empty items
-                    empty_items = True if not any(v for v in item_values.values()) and columns_to_use else False
-                    if (empty_items and not media_urls) or (media_columns and not media_urls):
-                        if item_values.keys():
-                            missing_columns = andify(columns_to_use) if len(columns_to_use) > 1 else columns_to_use[0]
-                            self.dataset.update_status(f"Skipping row {row} because of empty value(s) in {missing_columns}")
-                        if media_columns and not media_urls:
-                            missing_media_columns = andify(media_columns) if len(media_columns) > 1 else media_columns[0]
-                            self.dataset.update_status(f"Skipping row {row} because of empty value(s) in {missing_media_columns}")
-                        skipped += 1
-                        # (but not if we've reached the end of the dataset; we want to process the last batch)
-                        if row != self.source_dataset.num_rows:
+
+                # Now finally generate some text!
+                for llm_request, response in pool.map(get_text_requests()):
+                    row = llm_request.context["row"]
+                    batched_ids = llm_request.context["ids"]
+                    batched_data = llm_request.context["data"]
+                    n_batched = llm_request.context["n_batched"]
+                    prompt = llm_request.prompt
+                    system_prompt = llm_request.system_prompt
+
+                    # Catch 404 errors with media URLs, we simply skip these
+                    if isinstance(response, requests.exceptions.HTTPError):
+                        if response.response.status_code == 404 and llm_request.files:
+                            self.dataset.log(f"Skipping row {row} because of media URL is not reachable, ({response})")
+                            skipped += 1
                             continue
-                    # Else add the values to the batch
-                    else:
-                        for item_column, item_value in item_values.items():
-                            if max_input_len > 0:
-                                item_value = item_value[:max_input_len]
-                            batched_data[item_column].append(item_value)
-                        n_batched += 1
-                        batched_ids.append(item_id)  # Also store IDs, so we can match them to the output
+                        else:
+                            self.dataset.finish_with_warning(outputs, f"{response}")
+                            return
+                    # Broad exception, but necessary with all the different LLM servers and options...
+                    elif isinstance(response, Exception):
+                        self.dataset.finish_with_warning(outputs, f"Not all items processed: {response}")
+                        return
 
-                    i += 1
-                    if limit and i >= max_processed:
-                        limit_reached = True
-                    
-                    # Generate text when there's something to process and when we've reached 1) the batch length (which can
-                    # be 1) or 2) the end of the dataset or 3) the custom limit.
-                    if n_batched and (n_batched % batches == 0 or row == self.source_dataset.num_rows or limit_reached):
+                    if not response:
+                        structured_warning = " with your specified JSON schema" if structured_output else ""
+                        warning = f"{model['name']} could not return text{structured_warning}. Consider editing your prompt or changing settings."
+                        self.dataset.finish_with_warning(outputs, warning)
+                        return
 
-                        # Insert dataset values into prompt. Insert as list for batched data, else just insert the value.
-                        for column_to_use in columns_to_use:
-                            prompt_values = batched_data[column_to_use]
-                            prompt_values = prompt_values[0] if len(prompt_values) == 1 else f"```{json.dumps(prompt_values)}```"
-                            prompt = prompt.replace(f"[{column_to_use}]", prompt_values)
-
-                        # Possibly use a different batch size when we've reached the end of the dataset.
-                        if row == self.source_dataset.num_rows and use_batches:
-                            # Get a new JSON schema for a batch of different length at the end of the iteration
-                            if n_batched != batches and json_schema:
-                                json_schema = self.get_json_schema_for_batch(n_batched, custom_schema=json_schema_original)
-                                # `llm` becomes a RunnableSequence when used, so we'll need to reset it here
-                                llm = LLMAdapter(
-                                    model=model,
-                                    server=server,
-                                    api_key=api_key,
-                                    temperature=temperature,
-                                    max_tokens=max_tokens,
-                                    client_kwargs=client_kwargs
-                                )
-                                llm.set_structure(json_schema)
-
-                        # For batched_output, make sure the exact length of outputs is mentioned in the system prompt
+                    # Always parse JSON outputs in the case of batches.
+                    if use_batches or structured_output:
+                        if isinstance(response, str):
+                            response = json.loads(response)
+
+                        # Check whether input/output value lengths match
                         if use_batches:
-                            system_prompt = system_prompt_base.replace("{batch_size}", str(n_batched))
+                            output = self.parse_batched_response(response)
+
+                            if len(output) != n_batched:
+                                self.dataset.update_status(f"Output did not result in {n_batched} item(s).\nInput:\n"
+                                                           f"{prompt}\nOutput:\n{response}")
+                                self.dataset.finish_with_warning(outputs, "Model could not output as many values as the batch. See log "
+                                                               "for incorrect output. Try lowering the batch size, "
+                                                               "editing the prompt, or using a different model.")
+                                return
                         else:
-                            system_prompt = system_prompt_base
+                            output = [response]
 
-                        batch_str = f" and {n_batched} items batched into the prompt" if use_batches else ""
-                        self.dataset.update_status(f"Generating text at row {row:,}/"
-                                                   f"{max_processed:,} with {model['name']}{batch_str}")
-                        # Now finally generate some text!
+                        # Also validate whether the JSON schema and the output match
                         try:
-                            response = llm.generate_text(
-                                prompt,
-                                system_prompt=system_prompt,
-                                temperature=temperature,
-                                files=media_urls
-                            )
-
-                        # Catch 404 errors with media URLs, we simply skip these
-                        except requests.exceptions.HTTPError as e:
-                            if e.response.status_code == 404 and media_urls:
-                                self.dataset.log(f"Skipping row {row} because of media URL is not reachable, ({e})")
-                                skipped += 1
-                                continue
-                            else:
-                                self.dataset.finish_with_warning(outputs, f"{e}")
-                                return
-                        # Broad exception, but necessary with all the different LLM servers and options...
-                        except Exception as e:
-                            self.dataset.finish_with_warning(outputs, f"Not all items processed: {e}")
+                            jsonschema.validate(instance=response, schema=llm_request.json_schema)
+                        except (ValidationError, SchemaError) as e:
+                            self.dataset.finish_with_error(f"Invalid JSON schema and/or LLM output: `{e}`")
                             return
 
-                        if not response:
-                            structured_warning = " with your specified JSON schema" if structured_output else ""
-                            warning = f"{model['name']} could not return text{structured_warning}. Consider editing your prompt or changing settings."
-                            self.dataset.finish_with_warning(outputs, warning)
-                            return
+                    # Else we'll just store the output in a list
+                    else:
 
-                        # Always parse JSON outputs in the case of batches.
-                        if use_batches or structured_output:
-                            if isinstance(response, str):
-                                response = json.loads(response)
-                        
-                            # Check whether input/output value lengths match
-                            if use_batches:
-                                output = self.parse_batched_response(response)
-
-                                if len(output) != n_batched:
-                                    self.dataset.update_status(f"Output did not result in {n_batched} item(s).\nInput:\n"
-                                                               f"{prompt}\nOutput:\n{response}")
-                                    self.dataset.finish_with_warning(outputs, "Model could not output as many values as the batch. See log "
-                                                                   "for incorrect output. Try lowering the batch size, "
-                                                                   "editing the prompt, or using a different model.")
-                                    return
-                            else:
-                                output = [response]
+                        output = response.content
 
-                            # Also validate whether the JSON schema and the output match
-                            try:
-                                jsonschema.validate(instance=response, schema=json_schema)
-                            except (ValidationError, SchemaError) as e:
-                                self.dataset.finish_with_error(f"Invalid JSON schema and/or LLM output: `{e}`")
-                                return
+                        if not isinstance(output, list):
+                            output = [output]
 
-                        # Else we'll just store the output in a list
-                        else:
+                        # More cleaning
+                        # Newer OpenAI models and Magistral return annoying nested dict with 'thinking'/'reasoning and
+                        # 'text', flatten it
+                        if len(output) > 0 and isinstance(output[0], dict) and output[0].get("type") in ["thinking",
+                                                                                                         "reasoning"]:
+                            reasoning_string = output[0].get("type")  # "thinking" or "reasoning"
+                            output_flat = {reasoning_string: "", "text": []}
 
-                            output = response.content
-
-                            if not isinstance(output, list):
-                                output = [output]
-
-                            # More cleaning
-                            # Newer OpenAI models and Magistral return annoying nested dict with 'thinking'/'reasoning and
-                            # 'text', flatten it
-                            if len(output) > 0 and isinstance(output[0], dict) and output[0].get("type") in ["thinking",
-                                                                                                             "reasoning"]:
-                                reasoning_string = output[0].get("type")  # "thinking" or "reasoning"
-                                output_flat = {reasoning_string: "", "text": []}
-
-                                for output_part in output:
-                                    if output_part.get("type") == reasoning_string:
-                                        if reasoning_string in output_part and isinstance(output_part[reasoning_string], list):
-                                            output_flat[reasoning_string] += "\n".join(
-                                                [think.get("text", "") for think in output_part.get(reasoning_string, [])])
-                                        else:
-                                            output_flat[reasoning_string] += output_part.get("text", "")
+                            for output_part in output:
+                                if output_part.get("type") == reasoning_string:
+                                    if reasoning_string in output_part and isinstance(output_part[reasoning_string], list):
+                                        output_flat[reasoning_string] += "\n".join(
+                                            [think.get("text", "") for think in output_part.get(reasoning_string, [])])
                                     else:
-                                        output_flat["text"].append(output_part.get("text", ""))
+                                        output_flat[reasoning_string] += output_part.get("text", "")
+                                else:
+                                    output_flat["text"].append(output_part.get("text", ""))
+
+                            output_flat["text"] = "\n".join(output_flat["text"])
+                            output = [output_flat]
 
-                                output_flat["text"] = "\n".join(output_flat["text"])
-                                output = [output_flat]
+                            output = [output_flat]
 
-                        for n, output_item in enumerate(output):
+                    for n, output_item in enumerate(output):
 
-                            # Retrieve the input values used
-                            if use_batches:
-                                input_value = [v[n] for v in batched_data.values()]
-                            else:
-                                input_value = [v[0] for v in batched_data.values()]
-
-                            time_created = int(time.time())
-
-                            # remove reasoning if so desired
-                            if hide_think:
-                                if isinstance(output_item, str):
-                                    output_item = re.sub(r"<think>.*</think>", "", output_item, flags=re.DOTALL).strip()
-                                elif isinstance(output_item, dict):
-                                    if "thinking" in output_item:
-                                        del output_item["thinking"]
-
-                            result = {
-                                "id": batched_ids[n],
-                                "output": output_item,
-                                "input_value": input_value,
-                                "prompt": prompt if not use_batches else base_prompt,  # Insert dataset values if not batching
-                                "temperature": temperature,
-                                "max_tokens": max_tokens,
-                                "model": model["local_id"],
-                                "time_created": datetime.fromtimestamp(time_created).strftime("%Y-%m-%d %H:%M:%S"),
-                                "time_created_utc": time_created,
-                                "batch_number": n + 1 if use_batches else "",
-                                "system_prompt": system_prompt,
-                            }
-                            outfile.write(json.dumps(result) + "\n")
-                            outputs += 1
-
-                            if save_annotations:
-                                # Save annotations for every value produced by the LLM, in case of structured output.
-                                # Else this will just save one string.
-                                if isinstance(output_item, dict):
-                                    annotation_output = flatten_dict({model['name']: output_item})
-                                elif self.parameters.get("annotation_label"):
-                                    annotation_output = {self.parameters.get("annotation_label"): output_item}
-                                else:
-                                    annotation_output = {model['name'] + "_output": output_item}
+                        # Retrieve the input values used
+                        if use_batches:
+                            input_value = [v[n] for v in batched_data.values()]
+                        else:
+                            input_value = [v[0] for v in batched_data.values()]
+
+                        time_created = int(time.time())
+
+                        # remove reasoning if so desired
+                        if hide_think:
+                            if isinstance(output_item, str):
+                                output_item = re.sub(r"<think>.*</think>", "", output_item, flags=re.DOTALL).strip()
+                            elif isinstance(output_item, dict):
+                                if "thinking" in output_item:
+                                    del output_item["thinking"]
 
-                                for output_key, output_value in annotation_output.items():
+                        result = {
+                            "id": batched_ids[n],
+                            "output": output_item,
+                            "input_value": input_value,
+                            "prompt": prompt if not use_batches else base_prompt,  # Insert dataset values if not batching
+                            "temperature": temperature,
+                            "max_tokens": max_tokens,
+                            "model": model["local_id"],
+                            "time_created": datetime.fromtimestamp(time_created).strftime("%Y-%m-%d %H:%M:%S"),
+                            "time_created_utc": time_created,
+                            "batch_number": n + 1 if use_batches else "",
+                            "system_prompt": system_prompt,
+                        }
+                        outfile.write(json.dumps(result) + "\n")
+                        outputs += 1
 
-                                    # Skip 'signature' and 'type' annotations for Google
-                                    if model["server"] == "google" and output_key in ("extras.signature", ".type"):
-                                        continue
+                        if save_annotations:
+                            # Save annotations for every value produced by the LLM, in case of structured output.
+                            # Else this will just save one string.
+                            if isinstance(output_item, dict):
+                                annotation_output = flatten_dict({model['name']: output_item})
+                            elif self.parameters.get("annotation_label"):
+                                annotation_output = {self.parameters.get("annotation_label"): output_item}
+                            else:
+                                annotation_output = {model['name'] + "_output": output_item}
 
-                                    annotation = {
-                                        "label": output_key,
-                                        "item_id": batched_ids[n],
-                                        "value": remove_nuls(output_value),
-                                        "type": "text",
-                                    }
+                            for output_key, output_value in annotation_output.items():
 
-                                    annotations.append(annotation)
+                                # Skip 'signature' and 'type' annotations for Google
+                                if model["server"] == "google" and output_key in ("extras.signature", ".type"):
+                                    continue
 
-                        # Remove batched data and store what row we've left off
-                        batched_ids = []
-                        batched_data = {}
-                        n_batched = 0
+                                annotation = {
+                                    "label": output_key,
+                                    "item_id": batched_ids[n],
+                                    "value": remove_nuls(output_value),
+                                    "type": "text",
+                                }
 
-                        # Rate limits for different servers
-                        if model["server"] == "mistral":
-                            time.sleep(1)
+                                annotations.append(annotation)
 
                     # Write annotations in batches
-                    if (i % 1000 == 0 and annotations) or limit_reached:
+                    if len(annotations) >= 1000:
                         self.save_annotations(annotations)
                         annotations = []
 
                     self.dataset.update_progress(row / max_processed)
-                    if limit_reached:
-                        break
+
+                if missing_column:
+                    self.dataset.finish_with_error(f"Column(s) '{missing_column}' not in the parent dataset")
+                    return
 
         outfile.close()
 
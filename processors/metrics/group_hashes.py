@@ -1,10 +1,12 @@
 import csv
 import json
 import imagehash
+import numpy as np
 
 from backend.lib.processor import BasicProcessor
 from common.lib.compatibility import Compatibility
 from common.lib.exceptions import ProcessorInterruptedException
+from common.lib.hamming import HammingIndex, connected_components
 from common.lib.helpers import UserInput, normalize_crhash_components
 
 __author__ = "Dale Wahl"
@@ -49,7 +51,7 @@ class HashGrouper(BasicProcessor):
         }
 
     @staticmethod
-    def compute_groups(hashes, hash_type: str, hash_size: int | None, similarity_pct: float) -> list[int]:
+    def compute_groups(hashes, hash_type: str, hash_size: int | None, similarity_pct: float, processor=None) -> list[int]:
         """
         Group a list of hash objects into connected components using a percent-based
         threshold. Returns a list of group labels (0..k-1) aligned with `hashes`.
@@ -58,82 +60,54 @@ class HashGrouper(BasicProcessor):
           computed once from hash_size^2 and similarity_pct.
         - For crhash: Each item may be either an object with `.hashes` or a list of
           component ImageHash objects. Distance is the minimum pairwise Hamming distance
-          between components. Allowed bits per pair uses the smaller component bit-length.
+          between components. Allowed bits per pair uses the component bit-length;
+          components of different lengths cannot be compared.
+
+        Similar pairs are found with `HammingIndex`, rather than by comparing
+        every two hashes.
         """
         n = len(hashes)
         if n == 0:
             return []
 
-        # Prebind distance and allowed bits based on type
         if hash_type in ("phash", "whash-haar", "whash-db4"):
             if hash_size is None:
                 raise ValueError("hash_size required for fixed-length hashes")
             total_bits = int(hash_size) * int(hash_size)
             allowed_const = int((similarity_pct / 100.0) * total_bits)
 
-            def distance_fn(i: int, j: int) -> int:
-                return hashes[i] - hashes[j]
-
-            def allowed_bits(i: int, j: int) -> int:
-                return allowed_const
+            index = HammingIndex.from_bool_arrays([h.hash for h in hashes])
+            return index.get_groups(allowed_const, processor=processor).tolist()
 
         elif hash_type == "crhash":
-            # Normalize to lists of components and precompute component bit lengths
-            comps = []  # list[list[ImageHash]]
-            comp_bits = []
+            # Normalize to lists of components, and index components of the
+            # same length together, remembering which item they belong to
+            components_by_bits = {}
             for idx, h in enumerate(hashes):
                 try:
                     c = normalize_crhash_components(h)
                 except Exception as e:
                     raise ValueError(f"Malformed crop-resistant hash at index {idx}: {e}")
                 try:
-                    bits0 = c[0].hash.size
+                    for component in c:
+                        components_by_bits.setdefault(component.hash.size, []).append((idx, component.hash))
                 except Exception as e:
                     raise ValueError(f"Invalid crop-resistant component at index {idx}: {e}")
-                comps.append(c)
-                comp_bits.append(bits0)
-
-            def distance_fn(i: int, j: int) -> int:
-                best = None
-                for a in comps[i]:
-                    for b in comps[j]:
-                        d = a - b
-                        if best is None or d < best:
-                            best = d
-                            if best == 0:
-                                return 0
-                return best  # type: ignore[return-value]
-
-            def allowed_bits(i: int, j: int) -> int:
-                bits = comp_bits[i] if comp_bits[i] <= comp_bits[j] else comp_bits[j]
-                return int((similarity_pct / 100.0) * bits)
+
+            def similar_items():
+                # items are similar if any of their components are
+                for bits, components in components_by_bits.items():
+                    owners = np.array([owner for owner, _ in components])
+                    index = HammingIndex.from_bool_arrays([component for _, component in components])
+                    allowed_bits = int((similarity_pct / 100.0) * bits)
+                    for left, right, _ in index.iterate_pairs(allowed_bits, processor=processor):
+                        yield owners[left], owners[right]
+
+            return connected_components(n, similar_items()).tolist()
 
         else:
             raise ValueError(f"Unknown hash type for grouping: {hash_type}")
 
-        # Connected-components labeling
-        visited = [False] * n
-        labels = [-1] * n
-        gid = 0
-        for seed in range(n):
-            if visited[seed]:
-                continue
-            stack = [seed]
-            visited[seed] = True
-            labels[seed] = gid
-            while stack:
-                u = stack.pop()
-                for v in range(n):
-                    if visited[v]:
-                        continue
-                    d = distance_fn(u, v)
-                    if d <= allowed_bits(u, v):
-                        visited[v] = True
-                        labels[v] = gid
-                        stack.append(v)
-            gid += 1
-        return labels
-
     def process(self):
         """
         Read image hashes from a CSV (output of ImageHasher) and recompute groups
@@ -195,7 +169,7 @@ class HashGrouper(BasicProcessor):
         fieldnames = ["group"] + base_fields
 
         # Compute groups using shared helper
-        labels = HashGrouper.compute_groups(hashes, hash_type, hash_size, similarity_pct)
+        labels = HashGrouper.compute_groups(hashes, hash_type, hash_size, similarity_pct, processor=self)
         group_count = max(labels) + 1 if labels else 0
 
         # Write output CSV with new groups
@@ -190,6 +190,13 @@ class AttributeRanker(BasicProcessor):
             """
             return "missing_data"
 
+        # items are read in batches, with only the columns we need
+        iterate_kwargs = {
+            "processor": self,
+            "columns": [*columns, "timestamp", *([weighby] if weighby else [])],
+            "map_missing": missing_value_placeholder if self.include_missing_data else "default"
+        }
+
         # if we're interested in overall top-ranking items rather than a
         # per-period ranking, we need to do a first pass in which all posts are
         # inspected to determine those overall top-scoring items
@@ -199,15 +206,16 @@ class AttributeRanker(BasicProcessor):
                 self.dataset.update_status(f"Determining overall top-{cutoff} items")
             else:
                 self.dataset.update_status("Determining overall top items")
-            for post in self.source_dataset.iterate_items(self, map_missing=missing_value_placeholder if self.include_missing_data else "default"):
-                values = self.get_values(post, columns, filter, negate_filter, split_comma, extract)
-                for value in values:
-                    if to_lowercase:
-                        value = str(value).lower()
-                    if value not in overall_top:
-                        overall_top[value] = 0
+            for batch in self.source_dataset.iterate_batches(**iterate_kwargs):
+                for post in batch:
+                    values = self.get_values(post, columns, filter, negate_filter, split_comma, extract)
+                    for value in values:
+                        if to_lowercase:
+                            value = str(value).lower()
+                        if value not in overall_top:
+                            overall_top[value] = 0
 
-                    overall_top[value] += convert_to_int(post.get(weighby, 1), 1)
+                        overall_top[value] += convert_to_int(post.get(weighby, 1), 1)
 
             overall_top = sorted(overall_top, key=lambda item: overall_top[item], reverse=True)
             if cutoff:
@@ -216,36 +224,37 @@ class AttributeRanker(BasicProcessor):
         # now for the real deal
         self.dataset.update_status("Reading source file")
         progress = 0
-        for post in self.source_dataset.iterate_items(self, map_missing=missing_value_placeholder if self.include_missing_data else "default"):
-            # determine where to put this data
-            try:
-                time_unit = get_interval_descriptor(post, timeframe)
-            except ValueError as e:
-                self.dataset.update_status("%s, cannot count items per %s" % (str(e), timeframe), is_final=True)
-                self.dataset.update_status(0)
-                return
-
-            if time_unit not in items:
-                items[time_unit] = OrderedDict()
-
-            # get values from post
-            values = self.get_values(post, columns, filter, negate_filter, split_comma, extract)
+        for batch in self.source_dataset.iterate_batches(**iterate_kwargs):
+            for post in batch:
+                # determine where to put this data
+                try:
+                    time_unit = get_interval_descriptor(post, timeframe)
+                except ValueError as e:
+                    self.dataset.update_status("%s, cannot count items per %s" % (str(e), timeframe), is_final=True)
+                    self.dataset.update_status(0)
+                    return
+
+                if time_unit not in items:
+                    items[time_unit] = OrderedDict()
+
+                # get values from post
+                values = self.get_values(post, columns, filter, negate_filter, split_comma, extract)
 
-            # keep track of occurrences of found items per relevant time period
-            for value in values:
-                if to_lowercase:
-                        value = str(value).lower()
+                # keep track of occurrences of found items per relevant time period
+                for value in values:
+                    if to_lowercase:
+                            value = str(value).lower()
 
-                if rank_style == "overall" and value not in overall_top:
-                    continue
+                    if rank_style == "overall" and value not in overall_top:
+                        continue
 
-                if value not in items[time_unit]:
-                    items[time_unit][value] = 0
+                    if value not in items[time_unit]:
+                        items[time_unit][value] = 0
 
-                items[time_unit][value] += convert_to_int(post.get(weighby, 1))
+                    items[time_unit][value] += convert_to_int(post.get(weighby, 1))
 
-            progress += 1
-            if progress % 500 == 0:
+            progress += len(batch)
+            if self.source_dataset.num_rows:
                 self.dataset.update_status(f"Iterated through {progress:,} of {self.source_dataset.num_rows:,} items")
                 self.dataset.update_progress(progress / self.source_dataset.num_rows)
 
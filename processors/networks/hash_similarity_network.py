@@ -8,7 +8,7 @@ import numpy as np
 
 from backend.lib.processor import BasicProcessor
 from common.lib.compatibility import Compatibility
-from common.lib.exceptions import ProcessorException
+from common.lib.hamming import HammingIndex
 from common.lib.helpers import UserInput
 
 
@@ -27,6 +27,7 @@ class HashSimilarityNetworker(BasicProcessor):
     title = "Hash similarity network"
     description = "Calculate similarity of hashes and create a GEXF network file. Can identify near duplicate hashes."
     extension = "gexf"
+    run_in_process = True
 
     # Currently only allowed on video-hashes, though any row of bit hashes would work.
     compatibility = Compatibility(types={"video-hashes"})
@@ -86,6 +87,7 @@ class HashSimilarityNetworker(BasicProcessor):
         self.dataset.update_status("Collecting identifiers and hashes from dataset")
         collected = 0
         identifiers = []
+        known_identifiers = set()
         hashes = []
         hash_metadata = {}
         bit_length = None
@@ -120,7 +122,7 @@ class HashSimilarityNetworker(BasicProcessor):
 
             item_id = item.pop(id_column)
 
-            if item_id is None or item_id in identifiers:
+            if item_id is None or item_id in known_identifiers:
                 self.dataset.finish_with_error("ID Column is not unique for each hash")
                 return
 
@@ -132,7 +134,8 @@ class HashSimilarityNetworker(BasicProcessor):
             if item_hash:
                 if len(item_hash) == bit_length:
                     identifiers.append(item_id)
-                    hashes.append(np.array(item_hash))
+                    known_identifiers.add(item_id)
+                    hashes.append(np.array(item_hash, dtype=bool))
 
                     # Append any metadata associated with hash for Gephi
                     for key, value in item.items():
@@ -166,41 +169,25 @@ class HashSimilarityNetworker(BasicProcessor):
         for node in identifiers:
             network.add_node(node, **hash_metadata[node])
 
-        hashes = np.array(hashes)
+        hashes = HammingIndex.from_bool_arrays(hashes)
         self.dataset.update_status("Comparing %i hashes with each other" % len(hashes))
-        comparisons = 0
-        expected_comparisons = np.math.comb(len(hashes), 2)
-        for i, current_hash in enumerate(hashes):
-            # Remove this hash from hashes (as previous calculations have already occured and it is unnecessary to
-            # compare a hash to itself)
-            hashes = hashes[1:]
-
-            # Compare current hash
-            xor_result = np.bitwise_xor(current_hash, hashes)
-
-            # Add comparisons to network
-            for j, xor_comparison in enumerate(xor_result):
-                id1 = identifiers[i]
-                # Node 2 is this iteration plus comparison number PLUS one as the first hash of this set has been
-                # removed (e.g., very first ID2 is 0+0+1)
-                id2 = identifiers[i+j+1]
-
-                # Check if edge exists (it shouldn't!)
-                edge = (id1, id2)
-                if edge in network.edges():
-                    raise ProcessorException('Error in processing hash similarities')
-
-                # Check if xor_comparison is less than requested similarity
-                # xor compares each bit and returns 0 if a bit is the same and 1 if different
-                edge_percent_similar = 1 - (xor_comparison.sum() / bit_length)
-                if edge_percent_similar > percent_similar:
-                    network.add_edge(id1, id2, weight=edge_percent_similar)
-
-                comparisons += 1
-                if comparisons % 500 == 0:
-                    self.dataset.update_status(
-                        "Calculated %i of %i hash similarities" % (comparisons, expected_comparisons))
-                    self.dataset.update_progress(comparisons / expected_comparisons)
+
+        # an edge requires 1 - (distance / bit_length) > percent_similar;
+        # find the largest distance for which that holds
+        max_distance = bit_length - 1 if bit_length else -1
+        while max_distance >= 0 and 1 - (max_distance / bit_length) <= percent_similar:
+            max_distance -= 1
+
+        # only pairs within that distance are returned, so there is no need
+        # to look at every comparison here
+        for batch, (left, right, distances) in enumerate(hashes.iterate_pairs(max_distance, processor=self)):
+            network.add_edges_from(
+                (identifiers[i], identifiers[j], {"weight": 1 - (distance / bit_length)})
+                for i, j, distance in zip(left.tolist(), right.tolist(), distances.tolist())
+            )
+
+            if batch % 50 == 0:
+                self.dataset.update_status("Found %i hash similarities" % network.number_of_edges())
 
         if not network.edges():
             self.dataset.finish_as_empty("No edges could be created for the given parameters")
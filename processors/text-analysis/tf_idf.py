@@ -31,6 +31,7 @@ class TfIdf(BasicProcessor):
 	title = "Tf-idf"  # title displayed in UI
 	description = "Get the tf-idf values of tokenised text. Works better with more documents (e.g. time-separated)."  # description displayed in UI
 	extension = "csv"  # extension of result file, used internally and in UI
+	run_in_process = True  # CPU-bound, so run on its own core
 
 	# Allow processor on token sets
 	compatibility = Compatibility(
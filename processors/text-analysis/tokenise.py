@@ -36,6 +36,7 @@ class Tokenise(BasicProcessor):
                   "The output is a list of lists, each list representing all item tokens or " \
                   "tokens per sentence."  # description displayed in UI
     extension = "zip"  # extension of result file, used internally and in UI
+    run_in_process = True  # CPU-bound, so run on its own core
 
     compatibility = Compatibility(extensions={"csv", "ndjson"}, preferred_followups=["collocations", "vectorise-tokens", "generate-embeddings", "tfidf", "topic-modeller", ])
 
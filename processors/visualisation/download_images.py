@@ -13,6 +13,7 @@ from requests.structures import CaseInsensitiveDict
 from common.lib.helpers import UserInput, url_to_filename
 from backend.lib.processor import BasicProcessor
 from backend.lib.proxied_requests import FailedProxiedRequest
+from common.lib.media_cache import MediaCache
 from common.lib.exceptions import ProcessorInterruptedException, FourcatException
 from common.lib.compatibility import Compatibility
 
@@ -269,9 +270,55 @@ class ImageDownloader(BasicProcessor):
                 self.dataset.log(f"Filename progress {i+1}/{len(urls)} filenames done")
 
         max_images = min(len(urls), amount) if amount > 0 else len(urls)
-        self.dataset.log(f"Starting download of up to {max_images:,} image(s).")
+
+        # files downloaded earlier, for this or another dataset, are taken
+        # from the media cache instead of requested again
+        media_cache = MediaCache.from_config(self.config)
+        if media_cache:
+            for url in list(urls):
+                cached_file = media_cache.get(url)
+                if not cached_file:
+                    continue
+
+                filename = self.filenames[url]
+                if not filename.lower().endswith(cached_file["extension"]):
+                    # the cached file may have a different extension than
+                    # the URL, so the name may clash with that of another file
+                    filename = url_to_filename(
+                        filename.rsplit(".", 1)[0] + cached_file["extension"],
+                        staging_area=self.staging_area,
+                        default_name="file",
+                        default_ext=cached_file["extension"],
+                        existing_filenames=url_filenames_seen,
+                    )
+                    url_filenames_seen.add(filename)
+
+                if not media_cache.place(cached_file, self.staging_area.joinpath(filename)):
+                    continue
+
+                self.filenames[url] = filename
+                urls.remove(url)
+                downloaded_files.add(url)
+                metadata[url] = {
+                    "filename": filename,
+                    "url": cached_file.get("resolved_url", url),
+                    "success": True,
+                    "from_dataset": self.source_dataset.key,
+                    "post_ids": item_map[url],
+                }
+
+                if len(downloaded_files) >= amount and amount != 0:
+                    # enough files already, no need to request the others
+                    self.complete = True
+                    break
+
+            if downloaded_files:
+                self.dataset.log(f"Took {len(downloaded_files):,} image(s) from the media cache.")
+                self.dataset.update_progress(len(downloaded_files) / max_images)
+
+        self.dataset.log(f"Starting download of up to {max_images - len(downloaded_files):,} image(s).")
         for url, response in self.iterate_proxied_requests(
-                urls,
+                urls if not self.complete else [],
                 preserve_order=False,
                 headers={"User-Agent": ua},
                 hooks={
@@ -392,6 +439,10 @@ class ImageDownloader(BasicProcessor):
                         failure = True
 
                 if not failure:
+                    if media_cache:
+                        media_cache.add(url, self.staging_area.joinpath(self.filenames[url]),
+                                        resolved_url=self.resolve_url(url))
+
                     if len(downloaded_files) < amount or amount == 0:
                         downloaded_files.add(url)
                         self.dataset.update_status(
@@ -432,6 +483,9 @@ class ImageDownloader(BasicProcessor):
             if url_file.exists() and url not in downloaded_files:
                 url_file.unlink()
                 
+        if media_cache:
+            media_cache.prune()
+
         # finish up
         self.dataset.update_progress(1.0)
         self.write_archive_and_finish(
@@ -21,6 +21,7 @@ from common.lib.exceptions import ProcessorInterruptedException
 from datasources.telegram.search_telegram import SearchTelegram
 from processors.visualisation.download_videos import VideoDownloaderPlus
 from common.lib.helpers import UserInput, timify
+from common.lib.media_cache import MediaCache
 from common.lib.dataset import DataSet
 from common.lib.compatibility import Compatibility
 
@@ -100,6 +101,15 @@ class TelegramVideoDownloader(BasicProcessor):
         """Perform the actual file fetch; subclasses can switch on media variant."""
         await message.download_media(str(path))
 
+    def _get_cache_key(self, message, entity):
+        """Key for the downloaded file in the media cache.
+
+        Telegram media have no stable URL, so files are cached per message
+        instead; the job type is included since e.g. the image downloader
+        saves a thumbnail where the video downloader saves the video itself.
+        """
+        return f"telegram://{self.type}/{entity}/{message.id}"
+
     # ---- standard processor surface ----
     @classmethod
     def get_queue_id(cls, remote_id, details, dataset) -> str:
@@ -158,8 +168,11 @@ class TelegramVideoDownloader(BasicProcessor):
         self.eventloop = None
         self.metadata = {}
         self.reason_counts = Counter()
+        self.media_cache = MediaCache.from_config(self.config)
 
         asyncio.run(self.get_media())
+        if self.media_cache:
+            self.media_cache.prune()
 
         # finish up
         with self.staging_area.joinpath(".metadata.json").open("w", encoding="utf-8") as outfile:
@@ -313,7 +326,12 @@ class TelegramVideoDownloader(BasicProcessor):
                                        "dataset, this is expected.")
                     else:
                         try:
-                            await self._download_to_path(client, message, path)
+                            cache_key = self._get_cache_key(message, entity)
+                            cached_file = self.media_cache.get(cache_key) if self.media_cache else None
+                            if not cached_file or not self.media_cache.place(cached_file, path):
+                                await self._download_to_path(client, message, path)
+                                if self.media_cache and path.exists():
+                                    self.media_cache.add(cache_key, path)
                             success = True
                             reason_code = "ok"
                             reason_text = "downloaded"
@@ -12,6 +12,7 @@ import requests
 
 from common.lib.exceptions import ProcessorInterruptedException
 from common.lib.user_input import UserInput
+from common.lib.media_cache import MediaCache
 from datasources.tiktok_urls.search_tiktok_urls import TikTokScraper
 from datasources.tiktok.search_tiktok import SearchTikTok as SearchTikTokByImport
 from processors.visualisation.download_images import ImageDownloader
@@ -115,6 +116,7 @@ class TikTokImageDownloader(BasicProcessor):
         url_to_item_id = {}
         max_fails_exceeded = 0
         metadata = {}
+        media_cache = MediaCache.from_config(self.config)
 
         # Loop through items and collect URLs
         for mapped_item in self.source_dataset.iterate_items(self):
@@ -127,6 +129,19 @@ class TikTokImageDownloader(BasicProcessor):
             url = mapped_item.get(url_column)
             post_id = mapped_item.get("id")
 
+            # images downloaded before are taken from the cache, even if their
+            # URL has expired since
+            filename = self.copy_from_cache(media_cache, url, post_id, results_path)
+            if filename:
+                downloaded_media += 1
+                metadata[url] = {
+                        "filename": filename,
+                        "success": True,
+                        "from_dataset": self.source_dataset.key,
+                        "post_ids": [post_id]
+                }
+                continue
+
             if max_fails_exceeded > 4:
                 # Let's just refresh remaining URLs if it is clear the dataset is old
                 refresh_tiktok_urls = True
@@ -155,6 +170,7 @@ class TikTokImageDownloader(BasicProcessor):
                     else:
                         downloaded_media += 1
                         self.dataset.update_status(f"Downloaded image {downloaded_media}/{max_amount}")
+                        self.add_to_cache(media_cache, url, results_path.joinpath(filename))
 
                         metadata[url] = {
                                 "filename": filename,
@@ -206,11 +222,16 @@ class TikTokImageDownloader(BasicProcessor):
                         # Unable to request and save image
                         success = False
                         filename = ''
+                    elif cached_filename := self.copy_from_cache(media_cache, url, post_id, results_path):
+                        success = True
+                        filename = cached_filename
                     else:
                         # Collect image
                         try:
                             image, extension = self.collect_image(url)
                             success, filename = self.save_image(image, post_id + "." + extension, results_path)
+                            if success:
+                                self.add_to_cache(media_cache, url, results_path.joinpath(filename))
                         except FileNotFoundError as e:
                             self.dataset.log(f"Error with {url}: {e}")
                             success = False
@@ -245,8 +266,50 @@ class TikTokImageDownloader(BasicProcessor):
         if downloaded_media < max_amount:
             warning = "Could not download all images."
 
+        if media_cache:
+            media_cache.prune()
+
         self.write_archive_and_finish(results_path, downloaded_media, warning=warning)
 
+    @staticmethod
+    def copy_from_cache(media_cache, url, post_id, directory_path):
+        """
+        Copy image downloaded earlier from the media cache, if available
+
+        TikTok image URLs are signed and expire, but the signature is in the
+        query string, so images are cached by URL without query string.
+
+        :param MediaCache|None media_cache:  Media cache, if enabled
+        :param str url:             Image URL
+        :param str post_id:         ID of the post the image belongs to
+        :param Path directory_path: Path where image should be saved
+        :return str|None:           Filename of copied image, or None if not cached
+        """
+        if not media_cache or not url:
+            return None
+
+        cached_image = media_cache.get(MediaCache.normalise_url(url, keep_query=False))
+        if not cached_image:
+            return None
+
+        image_name = post_id + cached_image["extension"]
+        if directory_path.joinpath(image_name).exists() or not media_cache.place(cached_image, directory_path.joinpath(image_name)):
+            return None
+
+        return image_name
+
+    @staticmethod
+    def add_to_cache(media_cache, url, path):
+        """
+        Add downloaded image to the media cache, if enabled
+
+        :param MediaCache|None media_cache:  Media cache, if enabled
+        :param str url:   Image URL
+        :param Path path: Path of saved image
+        """
+        if media_cache:
+            media_cache.add(MediaCache.normalise_url(url, keep_query=False), path)
+
     @staticmethod
     def save_image(image, image_name, directory_path):
         """
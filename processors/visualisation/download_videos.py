@@ -24,6 +24,7 @@ from common.lib.compatibility import Compatibility
 from common.lib.dataset import DataSet
 from common.lib.exceptions import ProcessorInterruptedException, ProcessorException, DataSetException
 from common.lib.helpers import UserInput, sets_to_lists, url_to_filename
+from common.lib.media_cache import MediaCache
 
 __author__ = "Dale Wahl"
 __credits__ = ["Dale Wahl"]
@@ -178,6 +179,7 @@ class VideoDownloaderPlus(BasicProcessor):
         self.last_dl_status = None
         self.last_post_process_status = None
         self.warning_message = None
+        self.media_cache = None
 
     @classmethod
     def get_options(cls, parent_dataset=None, config=None):
@@ -328,6 +330,7 @@ class VideoDownloaderPlus(BasicProcessor):
         self.dataset.update_status('Collected %i urls.' % len(urls))
 
         vid_lib = DatasetVideoLibrary(self.dataset, modules=self.modules)
+        self.media_cache = MediaCache.from_config(self.config)
 
         # Prepare staging area for videos and video tracking
         results_path = self.dataset.get_staging_area()
@@ -457,6 +460,8 @@ class VideoDownloaderPlus(BasicProcessor):
             # Save metadata and finish
             self._save_metadata(urls, results_path)
             self._log_statistics(total_urls)
+            if self.media_cache:
+                self.media_cache.prune()
             self._finish_processing(results_path, total_urls)
 
     def _setup_ytdlp_options(self, results_path, max_video_size, max_video_res, allow_unknown_sizes):
@@ -540,6 +545,12 @@ class VideoDownloaderPlus(BasicProcessor):
                     self.total_not_a_video += 1
                     continue
 
+                # Try to copy from media cache (shared by all datasets)
+                if self._try_copy_from_cache(url, url_dict, copy_output_path):
+                    self.copied_videos += 1
+                    self.processed_urls += 1
+                    continue
+
             # Initialize URL metadata
             url_dict[url]["success"] = False
             url_dict[url]["retry"] = True
@@ -602,6 +613,45 @@ class VideoDownloaderPlus(BasicProcessor):
             
         return result
 
+    def _try_copy_from_cache(self, url, urls_dict, results_path):
+        """
+        Try to copy video downloaded earlier from the media cache
+
+        Only videos downloaded directly (i.e. not via yt-dlp) are cached.
+
+        :param str url: URL to check
+        :param dict urls_dict: URLs dictionary to update
+        :param Path results_path: Path to staging area
+        :return bool: Whether the video was copied
+        """
+        if not self.media_cache:
+            return False
+
+        cached_video = self.media_cache.get(self._normalize_direct_url(url))
+        if not cached_video:
+            return False
+
+        try:
+            max_video_size = int(self.parameters.get("max_video_size", 100))
+        except (TypeError, ValueError):
+            max_video_size = 0
+        if max_video_size and cached_video["size"] > max_video_size * 1000000:
+            return False
+
+        filename = url_to_filename(url, staging_area=results_path, default_ext=cached_video["extension"])
+        if not self.media_cache.place(cached_video, results_path.joinpath(filename)):
+            return False
+
+        self.dataset.log(f"Copying video for url from media cache: {url}")
+        urls_dict[url]["downloader"] = "direct_link"
+        urls_dict[url]["files"] = [{
+            "filename": filename,
+            "metadata": {"media_cache": True},
+            "success": True
+        }]
+        urls_dict[url]["success"] = True
+        return True
+
     def _process_direct_downloads(self, url_list, urls_dict, results_path, max_video_size,
                                    also_indirect, amount, last_domains, ignore_not_video):
         """
@@ -760,6 +810,8 @@ class VideoDownloaderPlus(BasicProcessor):
                 return result
 
             filename, proxy_used = self._write_direct_response(url, response, results_path, max_video_size)
+            if self.media_cache:
+                self.media_cache.add(self._normalize_direct_url(url), results_path.joinpath(filename))
             urls_dict[url]["downloader"] = "direct_link"
             urls_dict[url]["files"] = [{
                 "filename": filename,
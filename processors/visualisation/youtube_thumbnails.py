@@ -10,6 +10,7 @@ from backend.lib.processor import BasicProcessor
 from common.lib.compatibility import Compatibility
 from common.lib.exceptions import ProcessorInterruptedException
 from common.lib.helpers import get_yt_compatible_ids, UserInput
+from common.lib.media_cache import MediaCache
 
 __author__ = "Sal Hagen"
 __credits__ = ["Sal Hagen"]
@@ -93,6 +94,7 @@ class YouTubeThumbnails(BasicProcessor):
 
 		ids_list = get_yt_compatible_ids(video_ids)
 		retries = 0
+		media_cache = MediaCache.from_config(self.config)
 
 		for i, ids_string in enumerate(ids_list):
 			if self.interrupted:
@@ -122,12 +124,19 @@ class YouTubeThumbnails(BasicProcessor):
 					thumb_url = metadata["snippet"]["thumbnails"]["high"]["url"]
 					# Format the path to save the thumbnail to
 					save_path = results_path.joinpath(metadata["id"] + "." + str(thumb_url.split('.')[-1]))
-					# Download the image
-					urllib.request.urlretrieve(thumb_url, save_path)
+					# Download the image, unless it was downloaded before
+					cached_thumbnail = media_cache.get(thumb_url) if media_cache else None
+					if not cached_thumbnail or not media_cache.place(cached_thumbnail, save_path):
+						urllib.request.urlretrieve(thumb_url, save_path)
+						if media_cache:
+							media_cache.add(thumb_url, save_path)
 
 			self.dataset.update_status("Downloaded thumbnails for " + str(i * 50) + "/" + str(len(video_ids)))
 			self.dataset.update_progress(i / len(ids_list))
 
+		if media_cache:
+			media_cache.prune()
+
 		# create zip of archive and delete temporary files and folder
 		self.dataset.update_status("Compressing results into archive")
 		self.write_archive_and_finish(results_path)
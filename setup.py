@@ -31,6 +31,7 @@ core_packages = {
 	"packaging",
 	"psutil~=5.0",
 	"Pillow>=10.3",
+	"pyarrow>=14.0.1",
 	"pydantic",
 	"pymemcache",
 	"PyMySQL~=1.0",
@@ -0,0 +1,149 @@
+"""
+Tests for transferring data files between 4CAT servers when importing datasets
+
+Files are requested from a stub of the export API on localhost, so no
+requests leave the machine.
+"""
+import threading
+import hashlib
+import gzip
+import json
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from datasources.fourcat_import.import_4cat import SearchImportFromFourcat, FourcatImportException
+
+DATA = b"".join([json.dumps({"id": i, "body": f"post {i}"}).encode("utf-8") + b"\n" for i in range(100000)])
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Serves the export API for one dataset, `dataset`, the data file of which
+    is `DATA`
+
+    How the data file is sent depends on `mode`: "truncate" breaks off the
+    first transfer halfway, "corrupt" sends the wrong file the first time.
+    "old" acts like a server running an older version of 4CAT, which does not
+    know the checksum component.
+    """
+    protocol_version = "HTTP/1.1"
+    mode = None
+    requests_seen = []
+
+    def do_GET(self):
+        key, component = self.path.strip("/").split("/")[-2:]
+        if key != "dataset":
+            return self.respond(404, b"Dataset not found.")
+
+        if component == "checksum" and self.mode == "old":
+            return self.respond(406, b"Dataset component unknown")
+
+        if component == "checksum":
+            return self.respond(200, json.dumps({"size": len(DATA), "sha256": hashlib.sha256(DATA).hexdigest()}).encode("utf-8"))
+
+        self.requests_seen.append(dict(self.headers))
+        first_request = len(self.requests_seen) == 1
+
+        if self.headers.get("Range"):
+            offset = int(self.headers["Range"].split("=")[1].split("-")[0])
+            return self.respond(206, DATA[offset:], {"Content-Range": f"bytes {offset}-{len(DATA) - 1}/{len(DATA)}"})
+
+        if self.mode == "corrupt" and first_request:
+            return self.respond(200, DATA[::-1])
+
+        if self.mode == "truncate" and first_request:
+            # promise the whole file but close the connection halfway
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(DATA)))
+            self.end_headers()
+            self.wfile.write(DATA[:len(DATA) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            return self.respond(200, gzip.compress(DATA), {"Content-Encoding": "gzip"})
+
+        self.respond(200, DATA)
+
+    def respond(self, status_code, body, headers=None):
+        self.send_response(status_code)
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    StubHandler.mode = None
+    StubHandler.requests_seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_transfer_is_compressed(stub_server, tmp_path):
+    datapath = tmp_path.joinpath("dataset.ndjson")
+    SearchImportFromFourcat.fetch_data_from_4cat(stub_server, "dataset", "key", datapath)
+
+    assert datapath.read_bytes() == DATA
+    assert StubHandler.requests_seen[0]["Accept-Encoding"] == "gzip"
+
+
+def test_interrupted_transfer_is_resumed(stub_server, tmp_path):
+    StubHandler.mode = "truncate"
+    datapath = tmp_path.joinpath("dataset.ndjson")
+    SearchImportFromFourcat.fetch_data_from_4cat(stub_server, "dataset", "key", datapath)
+
+    assert datapath.read_bytes() == DATA
+    assert len(StubHandler.requests_seen) == 2
+
+    # what was received before the connection dropped is not transferred again
+    offset = int(StubHandler.requests_seen[1]["Range"].split("=")[1].rstrip("-"))
+    assert 0 < offset <= len(DATA) // 2
+
+
+def test_partial_file_is_completed(stub_server, tmp_path):
+    datapath = tmp_path.joinpath("dataset.ndjson")
+    datapath.write_bytes(DATA[:1000])
+    SearchImportFromFourcat.fetch_data_from_4cat(stub_server, "dataset", "key", datapath)
+
+    assert datapath.read_bytes() == DATA
+    assert StubHandler.requests_seen[0]["Range"] == "bytes=1000-"
+
+
+def test_corrupted_transfer_is_repeated(stub_server, tmp_path):
+    StubHandler.mode = "corrupt"
+    datapath = tmp_path.joinpath("dataset.ndjson")
+    SearchImportFromFourcat.fetch_data_from_4cat(stub_server, "dataset", "key", datapath)
+
+    assert datapath.read_bytes() == DATA
+    assert len(StubHandler.requests_seen) == 2
+    assert "Range" not in StubHandler.requests_seen[1]
+
+
+def test_transfer_from_old_server(stub_server, tmp_path):
+    StubHandler.mode = "old"
+    datapath = tmp_path.joinpath("dataset.ndjson")
+
+    # a partial file cannot be completed without knowing the full size
+    datapath.write_bytes(DATA[:1000])
+    SearchImportFromFourcat.fetch_data_from_4cat(stub_server, "dataset", "key", datapath)
+
+    assert datapath.read_bytes() == DATA
+    assert len(StubHandler.requests_seen) == 1
+    assert "Range" not in StubHandler.requests_seen[0]
+
+
+def test_missing_dataset(stub_server, tmp_path):
+    with pytest.raises(FourcatImportException):
+        SearchImportFromFourcat.fetch_data_from_4cat(stub_server, "other", "key", tmp_path.joinpath("dataset.ndjson"))
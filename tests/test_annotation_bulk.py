@@ -0,0 +1,103 @@
+"""
+Tests for `Annotation.save_many()`, which saves annotations in bulk rather
+than one record at a time.
+
+The database is replaced with a stand-in that records the rows passed to
+`Database.insert_bulk()`, so these tests check which rows and columns would be
+upserted.
+"""
+import json
+
+import pytest
+
+from common.lib.annotation import Annotation
+from common.lib.exceptions import AnnotationException
+
+
+class FakeDatabase:
+    def __init__(self, existing=None):
+        self.calls = []
+        self.commits = 0
+        self.existing = existing or []
+
+    def fetchall(self, query, replacements=None):
+        keys = set(zip(*replacements))
+        return [row for row in self.existing if (row["dataset"], row["item_id"], row["field_id"]) in keys]
+
+    def insert_bulk(self, table, rows, **kwargs):
+        self.calls.append({"table": table, "rows": rows, **kwargs})
+        return len(rows)
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_save_many_merges_and_fills_defaults():
+    db = FakeDatabase()
+    saved = Annotation.save_many(db, [
+        {"dataset": "key", "item_id": 1, "field_id": "f", "label": "Label", "value": "a", "author": "me"},
+        {"dataset": "key", "item_id": 2, "field_id": "f", "label": "Label", "type": "checkbox",
+         "value": ["x", "y"], "author": "me", "confidence": 0.5},
+        {"dataset": "key", "item_id": "1", "field_id": "f", "label": "Label", "value": "b", "author": "me"},
+    ])
+
+    assert saved == 2
+    assert db.commits == 1
+    rows = {row["item_id"]: row for call in db.calls for row in call["rows"]}
+    assert rows["1"]["value"] == "b"
+    assert rows["1"]["type"] == "text"
+    assert rows["1"]["author_original"] == "me"
+    assert rows["2"]["value"] == "x,y"
+    assert json.loads(rows["2"]["metadata"]) == {"confidence": 0.5}
+
+
+def test_save_many_only_updates_given_fields():
+    db = FakeDatabase()
+    Annotation.save_many(db, [
+        {"dataset": "key", "item_id": 1, "field_id": "f", "label": "Label", "value": "a"},
+        {"dataset": "key", "item_id": 2, "field_id": "f", "label": "Label", "value": "a", "author": "me"},
+    ])
+
+    # different fields are given, so these are upserted separately
+    assert len(db.calls) == 2
+    for call in db.calls:
+        assert call["upsert"]
+        assert "timestamp_created" not in call["update_columns"]
+        assert "timestamp" not in call["changed_columns"]
+        assert ("author" in call["update_columns"]) == (call["rows"][0]["item_id"] == "2")
+
+
+def test_save_many_requires_key_fields():
+    with pytest.raises(AnnotationException):
+        Annotation.save_many(FakeDatabase(), [{"dataset": "key", "field_id": "f", "label": "Label"}])
+
+
+@pytest.mark.parametrize("annotation", [
+    {"dataset": "key", "item_id": 1, "field_id": "f"},
+    {"dataset": "key", "item_id": 1, "field_id": "f", "label": ["Label"]},
+    "not an annotation",
+])
+def test_save_many_rejects_invalid_annotations(annotation):
+    db = FakeDatabase()
+    with pytest.raises(AnnotationException):
+        Annotation.save_many(db, [{"dataset": "key", "item_id": 2, "field_id": "f", "label": "Label"}, annotation])
+
+    assert not db.calls
+
+
+def test_save_many_merges_metadata():
+    db = FakeDatabase(existing=[
+        {"dataset": "key", "item_id": "1", "field_id": "f", "metadata": json.dumps({"model": "a", "confidence": 0.1})}
+    ])
+    Annotation.save_many(db, [
+        {"dataset": "key", "item_id": 1, "field_id": "f", "label": "Label", "confidence": 0.5},
+        {"dataset": "key", "item_id": 2, "field_id": "f", "label": "Label", "metadata": json.dumps({"model": "b"})},
+        {"dataset": "key", "item_id": 3, "field_id": "f", "label": "Label"},
+    ])
+
+    rows = {row["item_id"]: row for call in db.calls for row in call["rows"]}
+    assert json.loads(rows["1"]["metadata"]) == {"model": "a", "confidence": 0.5}
+    assert json.loads(rows["2"]["metadata"]) == {"model": "b"}
+
+    # metadata of annotations without any is left alone
+    assert "metadata" not in next(call for call in db.calls if call["rows"][0]["item_id"] == "3")["update_columns"]
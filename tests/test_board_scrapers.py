@@ -0,0 +1,48 @@
+"""
+Tests for saving scraped thread indexes in the chan board scrapers
+
+Scrapers are created without calling their constructor, and queries are
+recorded by a stub database rather than run.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from datasources.fourchan.scrapers.scrape_boards import BoardScraper4chan
+from datasources.eightkun.scrapers.scrape_boards import BoardScraper8kun
+from datasources.eightchan.scrapers.scrape_boards import BoardScraper8chan
+
+
+class StubDatabase:
+    def __init__(self):
+        self.queries = []
+
+    def insert_bulk(self, table, data, **kwargs):
+        return len(data)
+
+    def execute_many(self, query, replacements=None, **kwargs):
+        self.queries.append((query, replacements))
+
+
+@pytest.mark.parametrize("scraper_class,prefix,id_type", [
+    (BoardScraper4chan, "4chan", "bigint"),
+    (BoardScraper8kun, "8kun", "text"),
+    (BoardScraper8chan, "8chan", "text"),
+])
+def test_thread_ids_are_compared_as_column_type(scraper_class, prefix, id_type):
+    # the id column is bigint for 4chan, but text for 8kun and 8chan (see
+    # their database.sql), and postgres does not compare text to bigint
+    scraper = scraper_class.__new__(scraper_class)
+    scraper.db = StubDatabase()
+    scraper.queue = SimpleNamespace(add_job=lambda **kwargs: None)
+    scraper.job = SimpleNamespace(data={"remote_id": "b"})
+    scraper.prefix = prefix
+    scraper.init_time = 1000
+
+    new_threads = scraper.save_threads([{"id": "123", "no": 123, "last_modified": 900, "position": 1}])
+
+    query, replacements = scraper.db.queries[0]
+    assert new_threads == 1
+    assert "UPDATE threads_" + prefix + " " in query
+    assert "thread.id = scraped.id::" + id_type + " " in query
+    assert replacements[0][0] == "123"
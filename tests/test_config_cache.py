@@ -0,0 +1,110 @@
+"""
+Tests for the in-process settings cache in `ConfigManager`.
+
+Values for all settings with a given set of tags are cached per process, and
+invalidated through a version number in memcache, so that a setting changed
+by one process is picked up by the others.
+"""
+import json
+import threading
+
+import pytest
+
+from common.config_manager import ConfigManager
+
+
+class FakeMemcache:
+    def __init__(self):
+        self.values = {}
+        self.init_thread_id = threading.get_ident()
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+    def add(self, key, value):
+        self.values.setdefault(key, value)
+
+    def incr(self, key, value):
+        if key not in self.values:
+            return None
+        self.values[key] += value
+        return self.values[key]
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.settings = {}
+        self.queries = 0
+
+    def fetchall(self, query, replacements):
+        self.queries += 1
+        if "name = %s" in query:
+            name, tags = replacements
+            return [row for row in self.get_rows() if row["name"] == name and row["tag"] in tags]
+
+        tags, = replacements
+        return [row for row in self.get_rows() if row["tag"] in tags]
+
+    def get_rows(self):
+        return [{"name": name, "tag": tag, "value": value} for (name, tag), value in self.settings.items()]
+
+
+def get_config(db, memcache):
+    config = ConfigManager.__new__(ConfigManager)
+    config.resolved_cache = {}
+    config.user_tags_cache = {}
+    config.db = db
+    config.get_memcache = lambda: memcache
+    return config
+
+
+@pytest.fixture
+def db():
+    db = FakeDatabase()
+    db.settings[("test.a", "")] = json.dumps("global")
+    db.settings[("test.a", "admin")] = json.dumps("admin")
+    db.settings[("test.b", "")] = json.dumps(2)
+    return db
+
+
+def test_values_follow_tag_precedence(db):
+    config = get_config(db, FakeMemcache())
+    assert config.get("test.a") == "global"
+    assert config.get("test.a", tags=["admin"]) == "admin"
+    assert config.get("test.a", tags=["other", "admin"]) == "admin"
+    assert config.get("test.b", tags=["admin"]) == 2
+    assert config.get("test.missing", default=3, tags=["admin"]) == 3
+
+
+def test_one_query_per_tag_set(db):
+    config = get_config(db, FakeMemcache())
+    for _ in range(10):
+        config.get("test.a", tags=["admin"])
+        config.get("test.b", tags=["admin"])
+        config.get("test.missing", tags=["admin"])
+
+    assert db.queries == 1
+
+
+def test_changes_in_other_processes_invalidate_cache(db):
+    memcache = FakeMemcache()
+    config = get_config(db, memcache)
+    other_config = get_config(db, memcache)
+    config.cache_version_interval = 0
+
+    assert config.get("test.a", tags=["admin"]) == "admin"
+
+    db.settings[("test.a", "admin")] = json.dumps("changed")
+    other_config._bump_cache_version()
+    assert config.get("test.a", tags=["admin"]) == "changed"
+
+
+def test_no_caching_without_memcache(db):
+    config = get_config(db, None)
+    assert config.get("test.a", tags=["admin"]) == "admin"
+
+    db.settings[("test.a", "admin")] = json.dumps("changed")
+    assert config.get("test.a", tags=["admin"]) == "changed"
@@ -0,0 +1,24 @@
+"""
+Tests for the value formatting used by `Database.insert_bulk()`.
+
+Rows are sent to PostgreSQL in COPY's text format, in which tabs, newlines
+and backslashes are significant, so these need to be escaped for values to
+arrive unchanged.
+"""
+import pytest
+
+from common.lib.database import Database
+
+
+@pytest.mark.parametrize("value,expected", [
+    (None, "\\N"),
+    (True, "t"),
+    (False, "f"),
+    (12, "12"),
+    ("", ""),
+    ("\\N", "\\\\N"),
+    ("tab\tnew\nline\r", "tab\\tnew\\nline\\r"),
+    ("C:\\path", "C:\\\\path"),
+])
+def test_copy_values_are_escaped(value, expected):
+    assert Database._get_copy_value(value) == expected
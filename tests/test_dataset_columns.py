@@ -0,0 +1,95 @@
+"""
+Tests for the Parquet column store in `common/lib/dataset_columns.py`.
+
+The column store is read instead of the CSV result file when only a few
+columns are needed, so its values must be identical to what `csv.DictReader`
+returns for the same file.
+"""
+import subprocess
+import csv
+import sys
+import io
+
+from pathlib import Path
+
+import pytest
+
+from common.lib.dataset_columns import DatasetColumnStore
+from common.lib.exceptions import DataSetIndexException
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "csv-abc.csv"
+    path.write_text(
+        "id,body,timestamp\r\n"
+        "1,plain,100\r\n"
+        '2,"multi\nline",200\r\n'
+        "\r\n"
+        "3,short\r\n"
+        "4,long,400,extra\r\n"
+        '5,"ünïcödé, with comma",\r\n',
+        encoding="utf-8", newline=""
+    )
+    return path
+
+
+def read_sequentially(path):
+    with path.open("rb") as infile:
+        return list(csv.DictReader(io.TextIOWrapper(infile, encoding="utf-8")))
+
+
+def test_values_match_dictreader(csv_file):
+    store = DatasetColumnStore(csv_file)
+    assert not store.is_current()
+
+    assert store.build() == 5
+    assert store.is_current()
+    assert store.get_columns() == ["id", "body", "timestamp"]
+    assert store.get_num_rows() == 5
+
+    expected = read_sequentially(csv_file)
+    batches = list(store.iterate_batches(batch_size=2))
+    assert [len(batch["id"]) for batch in batches] == [2, 2, 1]
+    for column in ("id", "body", "timestamp"):
+        assert [value for batch in batches for value in batch[column]] == [row.get(column) for row in expected]
+
+
+def test_projection_and_missing_columns(csv_file):
+    store = DatasetColumnStore(csv_file)
+    store.build()
+
+    batches = list(store.iterate_batches(["timestamp", "nonexistent"]))
+    assert list(batches[0].keys()) == ["timestamp", "nonexistent"]
+    assert batches[0]["timestamp"] == ["100", "200", None, "400", ""]
+    assert batches[0]["nonexistent"] == [None] * 5
+
+    batches = list(store.iterate_batches(["nonexistent"], batch_size=4))
+    assert [len(batch["nonexistent"]) for batch in batches] == [4, 1]
+
+
+def test_store_goes_stale_when_file_changes(csv_file):
+    store = DatasetColumnStore(csv_file)
+    store.build()
+
+    with csv_file.open("a", encoding="utf-8") as outfile:
+        outfile.write("6,appended,600\n")
+
+    assert not store.is_current()
+
+
+def test_only_csv_files(tmp_path):
+    path = tmp_path / "ndjson-abc.ndjson"
+    path.write_text("{}\n", encoding="utf-8")
+
+    with pytest.raises(DataSetIndexException):
+        DatasetColumnStore(path).build()
+
+
+def test_pyarrow_is_loaded_lazily(csv_file):
+    # columnar storage is optional, so importing datasets should not load
+    # pyarrow; checked in a fresh interpreter since other tests load it
+    check = "import sys, common.lib.dataset; assert 'pyarrow' not in sys.modules"
+    subprocess.run([sys.executable, "-c", check], check=True, cwd=Path(__file__).parent.parent)
+
+    assert not DatasetColumnStore(csv_file).is_current()
@@ -0,0 +1,67 @@
+"""
+Tests for listening for dataset status updates in the web interface
+
+The database is replaced by a stub that fails in scripted ways, so no
+database server is needed.
+"""
+from types import SimpleNamespace
+import time
+
+import psycopg2
+
+from webtool.lib import dataset_events
+from webtool.lib.dataset_events import DatasetEventListener
+
+
+class StubDatabase:
+    """
+    Loses the connection after delivering one notification, then fails to
+    reconnect once, and finally stays connected
+    """
+    connections = 0
+
+    def __init__(self, *args, **kwargs):
+        StubDatabase.connections += 1
+        self.connection = StubDatabase.connections
+        if self.connection == 2:
+            raise psycopg2.OperationalError("could not connect to server")
+
+        self.listener = None
+        self.notifications = [[SimpleNamespace(payload="a")]] if self.connection == 1 else []
+
+    def listen(self, channel):
+        self.listener = object()
+
+    def wait_for_notifications(self, timeout=1):
+        if self.notifications:
+            return self.notifications.pop(0)
+
+        if self.connection == 1:
+            self.listener = None
+
+        time.sleep(0.01)
+        return []
+
+    def close(self):
+        pass
+
+
+def test_listener_reconnects(monkeypatch):
+    monkeypatch.setattr(dataset_events, "Database", StubDatabase)
+    StubDatabase.connections = 0
+    listener = DatasetEventListener(SimpleNamespace(info=print, warning=print), SimpleNamespace(get=lambda key: None))
+    listener.reconnect_delay = 0.01
+
+    subscription = listener.subscribe({"a", "b"})
+    assert "a" in subscription.wait(timeout=5)
+
+    # notifications may have been missed while reconnecting, so subscribers
+    # are told to check all of their datasets
+    updated = set()
+    while "b" not in updated and StubDatabase.connections < 4:
+        updated = subscription.wait(timeout=5)
+
+    assert updated == {"a", "b"}
+    assert StubDatabase.connections == 3
+    assert listener.thread.is_alive()
+    assert id(subscription) in listener.subscriptions
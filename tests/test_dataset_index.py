@@ -0,0 +1,230 @@
+"""
+Tests for the byte-offset row index in `common/lib/dataset_index.py`.
+
+The index is used by `DataSet._iterate_items` to seek straight to a row
+instead of parsing every row before it, so the offsets it records must match
+where `csv.DictReader` and the NDJSON reader consider a row to start.
+"""
+import json
+import csv
+import io
+
+import pytest
+
+from common.lib.dataset import DataSet
+from common.lib.dataset_index import DatasetRowIndex, DatasetSortIndex, DatasetRowSelection
+from common.lib.exceptions import DataSetIndexException
+
+
+def read_csv_from(path, index, row):
+    """Read all rows from `row` onwards the way DataSet._iterate_items does"""
+    with path.open("rb") as infile:
+        infile.seek(index.get_offset(row))
+        reader = csv.DictReader(io.TextIOWrapper(infile, encoding="utf-8"), fieldnames=index.get_fieldnames())
+        return list(reader)
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "csv-abc.csv"
+    rows = [
+        {"id": "1", "body": "plain"},
+        {"id": "2", "body": "multi\nline\nvalue"},
+        {"id": "3", "body": 'quoted "value", with comma'},
+        {"id": "4", "body": "ünïcödé\r\nand crlf"},
+        {"id": "5", "body": ""},
+    ]
+    with path.open("w", encoding="utf-8", newline="") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=("id", "body"))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    return path, rows
+
+
+def test_csv_offsets_respect_multiline_fields(csv_file):
+    path, rows = csv_file
+    index = DatasetRowIndex(path)
+    assert not index.is_current()
+
+    assert index.build() == len(rows)
+    assert index.is_current()
+    assert index.get_fieldnames() == ["id", "body"]
+
+    # compare against a sequential read, which is what the index replaces
+    with path.open("rb") as infile:
+        sequential = list(csv.DictReader(io.TextIOWrapper(infile, encoding="utf-8")))
+
+    assert [row["id"] for row in sequential] == [row["id"] for row in rows]
+    for row in range(len(rows)):
+        assert read_csv_from(path, index, row) == sequential[row:]
+
+
+def test_offset_past_end_yields_nothing(csv_file):
+    path, rows = csv_file
+    index = DatasetRowIndex(path)
+    index.build()
+
+    assert index.get_offset(len(rows) + 10) == path.stat().st_size
+    assert read_csv_from(path, index, len(rows) + 10) == []
+
+
+def test_ndjson_offsets(tmp_path):
+    path = tmp_path / "ndjson-abc.ndjson"
+    items = [{"id": i, "text": f"item {i}\nwith newline"} for i in range(25)]
+    path.write_text("".join(json.dumps(item) + "\n" for item in items), encoding="utf-8")
+
+    index = DatasetRowIndex(path)
+    index.build()
+    assert index.get_num_rows() == len(items)
+    assert index.get_fieldnames() is None
+
+    with path.open("rb") as infile:
+        infile.seek(index.get_offset(17))
+        assert json.loads(infile.readline()) == items[17]
+
+
+def test_index_goes_stale_when_file_changes(csv_file):
+    path, rows = csv_file
+    index = DatasetRowIndex(path)
+    index.build()
+
+    with path.open("a", encoding="utf-8") as outfile:
+        outfile.write("6,appended\n")
+
+    assert not index.is_current()
+
+
+def test_find_offset_without_index(csv_file, tmp_path):
+    path, rows = csv_file
+    index = DatasetRowIndex(path)
+    index.build()
+    offsets = [index.get_offset(row) for row in range(len(rows) + 1)]
+
+    # from the start of the file, and from any known row onwards
+    assert [index.find_offset(row) for row in range(len(rows) + 1)] == offsets
+    for start in range(len(rows)):
+        for row in range(start, len(rows) + 1):
+            assert index.find_offset(row - start, start=offsets[start]) == offsets[row]
+
+    ndjson_path = tmp_path / "ndjson-abc.ndjson"
+    ndjson_path.write_text("".join(json.dumps({"id": i}) + "\n" for i in range(10)), encoding="utf-8")
+    ndjson_index = DatasetRowIndex(ndjson_path)
+    assert not ndjson_index.is_current()
+
+    with ndjson_path.open("rb") as infile:
+        infile.seek(ndjson_index.find_offset(4, start=ndjson_index.find_offset(3)))
+        assert json.loads(infile.readline()) == {"id": 7}
+
+
+def test_id_index_lookup(csv_file):
+    path, rows = csv_file
+    index = DatasetRowIndex(path)
+    index.build()
+    index.build_id_index([row["id"] if row["id"] != "5" else None for row in rows])
+
+    assert index.is_id_index_current()
+    assert index.get_rows_for_id("3") == [2]
+    assert index.get_rows_for_id(1) == [0]
+    assert index.get_rows_for_id("5") == []
+    assert index.get_rows_for_id("missing") == []
+
+
+def test_id_index_keeps_duplicates(tmp_path):
+    path = tmp_path / "ndjson-abc.ndjson"
+    path.write_text("{}\n{}\n{}\n", encoding="utf-8")
+
+    index = DatasetRowIndex(path)
+    index.build_id_index(["a", "b", "a"])
+    assert index.get_rows_for_id("a") == [0, 2]
+
+
+def test_sort_index_roundtrip(csv_file):
+    path, rows = csv_file
+    sort_index = DatasetSortIndex(path, "body", reverse=True)
+    assert not sort_index.is_current()
+
+    sort_index.write([4, 2, 0, 1, 3], state={"num_annotations": 3})
+    assert sort_index.is_current({"num_annotations": 3})
+    assert not sort_index.is_current({"num_annotations": 4})
+    assert not DatasetSortIndex(path, "body", reverse=False).is_current({"num_annotations": 3})
+
+    assert sort_index.get_num_rows() == 5
+    assert list(sort_index.get_rows()) == [4, 2, 0, 1, 3]
+    assert list(sort_index.get_rows(1, 2)) == [2, 0]
+    assert list(sort_index.get_rows(4, 10)) == [3]
+    assert list(sort_index.get_rows(10, 10)) == []
+
+
+class StubItem(dict):
+    def __init__(self, row, **values):
+        super().__init__(**values)
+        self.row = row
+
+
+class StubDataSet:
+    def __init__(self, values):
+        self.values = values
+
+    def iterate_items(self, **kwargs):
+        for row, value in enumerate(self.values):
+            yield StubItem(row, value=value)
+
+
+@pytest.mark.parametrize("values,reverse,expected", [
+    (["3", "10", "", "2", "10", "1.5", "7"], False, [2, 5, 3, 0, 6, 1, 4]),
+    (["3", "10", "", "2", "10", "1.5", "7"], True, [1, 4, 6, 0, 3, 5, 2]),
+    # numbers first, then a string that does not parse: all chunks are
+    # sorted as strings
+    (["3", "10", "2", "1", "b", "a", "20"], False, [3, 1, 2, 6, 0, 5, 4]),
+])
+def test_sort_rows_in_chunks(tmp_path, values, reverse, expected):
+    dataset = StubDataSet(values)
+    sorted_rows = DataSet._sort_rows_in_chunks(dataset, "value", reverse, 2, tmp_path)
+    assert list(sorted_rows) == expected
+    assert len(list(tmp_path.glob("sort-*"))) == 4
+
+
+def test_sort_index_from_generator(csv_file):
+    path, rows = csv_file
+    sort_index = DatasetSortIndex(path, "id")
+    sort_index.write(row for row in range(100000))
+
+    assert sort_index.get_num_rows() == 100000
+    assert list(sort_index.get_rows(65535, 3)) == [65535, 65536, 65537]
+
+
+def test_spans_for_arbitrary_rows(csv_file):
+    path, rows = csv_file
+    index = DatasetRowIndex(path)
+    index.build()
+
+    with path.open("rb") as infile:
+        for row, (start, end) in zip((3, 0, 99), index.get_spans((3, 0, 99))):
+            infile.seek(start)
+            raw_row = infile.read(end - start).decode("utf-8")
+            if row == 99:
+                assert raw_row == ""
+            else:
+                assert next(csv.reader(io.StringIO(raw_row)))[0] == rows[row]["id"]
+
+
+def test_row_selection_roundtrip(tmp_path):
+    # spans several 64-bit words, with empty words in between
+    selected = [0, 3, 63, 64, 65, 200, 999]
+    selection = DatasetRowSelection(tmp_path / "view-abc.csv")
+    assert not selection.exists()
+
+    assert selection.write(iter(selected), "parent-key", 1000) == len(selected)
+    assert selection.exists()
+    assert selection.get_parent() == "parent-key"
+    assert selection.get_num_rows() == len(selected)
+
+    selection = DatasetRowSelection(tmp_path / "view-abc.csv")
+    assert list(selection.iterate_rows()) == selected
+    assert list(selection.iterate_rows(offset=4)) == selected[4:]
+    assert list(selection.iterate_rows(offset=len(selected))) == []
+    assert list(selection.get_parent_rows([6, 0, 3, 4, 99])) == [999, 0, 64, 65]
+
+    with pytest.raises(DataSetIndexException):
+        selection.write([1000], "parent-key", 1000)
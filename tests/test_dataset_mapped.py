@@ -0,0 +1,80 @@
+"""
+Tests for the mapped item cache in `common/lib/dataset_mapped.py`.
+
+The cache is read instead of mapping the items of an NDJSON result file
+again, so the items it returns must be indistinguishable from the output of
+`map_item()`, including missing fields and items that could not be mapped.
+"""
+import json
+
+import pytest
+
+from common.lib.dataset_mapped import DatasetMappedCache
+from common.lib.exceptions import DataSetIndexException, MapItemException
+from common.lib.item_mapping import MappedItem, MissingMappedField
+
+
+@pytest.fixture
+def ndjson_file(tmp_path):
+    path = tmp_path / "ndjson-abc.ndjson"
+    path.write_text("".join(json.dumps({"id": i}) + "\n" for i in range(3)), encoding="utf-8")
+    return path
+
+
+def write_cache(cache):
+    writer = cache.get_writer()
+    writer.add(MappedItem({"id": "0", "likes": 5, "body": "ünïcödé\nline"}))
+    writer.add_error(MapItemException("Unable to map item: KeyError-'stats'"))
+    writer.add(MappedItem({"id": "2", "likes": MissingMappedField(0)}, message="no stats"))
+    writer.commit()
+
+
+def test_roundtrip(ndjson_file):
+    cache = DatasetMappedCache(ndjson_file, version="abc:123")
+    assert not cache.is_current()
+
+    write_cache(cache)
+    assert cache.is_current()
+
+    first, error, last = list(cache.iterate())
+    assert first.get_item_data() == {"id": "0", "likes": 5, "body": "ünïcödé\nline"}
+    assert first.get_missing_fields() == []
+
+    assert type(error) is MapItemException
+    assert str(error) == "Unable to map item: KeyError-'stats'"
+
+    assert last.get_missing_fields() == ["likes"]
+    assert type(last.data["likes"]) is MissingMappedField
+    assert last.data["likes"].value == 0
+    assert last.get_message() == "no stats"
+
+
+def test_stale_when_file_or_mapper_changes(ndjson_file):
+    cache = DatasetMappedCache(ndjson_file, version="abc:123")
+    write_cache(cache)
+
+    assert not DatasetMappedCache(ndjson_file, version="abc:456").is_current()
+
+    with ndjson_file.open("a", encoding="utf-8") as outfile:
+        outfile.write(json.dumps({"id": 3}) + "\n")
+
+    assert not cache.is_current()
+
+
+def test_discarded_writes_leave_no_files(ndjson_file):
+    cache = DatasetMappedCache(ndjson_file, version="abc:123")
+    writer = cache.get_writer()
+    writer.add(MappedItem({"id": "0"}))
+    writer.discard()
+
+    assert not cache.is_current()
+    assert sorted(path.name for path in ndjson_file.parent.iterdir()) == [ndjson_file.name]
+
+
+def test_unserialisable_items_are_refused(ndjson_file):
+    cache = DatasetMappedCache(ndjson_file, version="abc:123")
+    writer = cache.get_writer()
+    with pytest.raises(DataSetIndexException):
+        writer.add(MappedItem({"id": "0", "value": object()}))
+
+    writer.discard()
@@ -0,0 +1,31 @@
+"""
+Tests for datasets that are views on the result file of another dataset
+
+Datasets are created without calling their constructor, so no database is
+needed.
+"""
+from pathlib import Path
+
+from common.lib.dataset import DataSet
+
+
+def make_dataset(folder, key, result_file, parameters=None):
+    dataset = DataSet.__new__(DataSet)
+    dataset.folder = Path(folder)
+    dataset.data = {"key": key, "result_file": result_file}
+    dataset.parameters = parameters or {}
+    return dataset
+
+
+def test_view_is_rankable(tmp_path):
+    # views have no result file of their own; the columns are those of the
+    # file they read from
+    tmp_path.joinpath("ranked.csv").write_text("date,item,value\r\nall,word,3\r\n", encoding="utf-8")
+    parent = make_dataset(tmp_path, "ranked", "ranked.csv")
+    view = make_dataset(tmp_path, "view", "view.csv", {"view_of": "ranked"})
+    view.get_view_parent = lambda: parent
+
+    assert parent.is_rankable()
+    assert view.is_view()
+    assert not view.get_results_path().exists()
+    assert view.is_rankable()
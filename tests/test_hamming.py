@@ -0,0 +1,77 @@
+"""
+Tests for the near-duplicate hash search in `common/lib/hamming.py`.
+
+Pairs found via multi-index hashing or by comparing tiles of hashes must be
+exactly the pairs a naive comparison of every two hashes finds.
+"""
+import itertools
+
+import numpy as np
+import pytest
+
+from common.lib.hamming import HammingIndex, connected_components
+
+
+def naive_pairs(bit_hashes, max_distance):
+    pairs = {}
+    for (i, left), (j, right) in itertools.combinations(enumerate(bit_hashes), 2):
+        distance = sum(a != b for a, b in zip(left, right))
+        if distance <= max_distance:
+            pairs[(i, j)] = distance
+
+    return pairs
+
+
+def found_pairs(index, max_distance):
+    pairs = {}
+    for left, right, distances in index.iterate_pairs(max_distance):
+        for i, j, distance in zip(left.tolist(), right.tolist(), distances.tolist()):
+            assert i < j and (i, j) not in pairs
+            pairs[(i, j)] = distance
+
+    return pairs
+
+
+@pytest.fixture
+def bit_hashes():
+    # random hashes with clusters of near-duplicates; 150 bits, so hashes
+    # span multiple words and parts span word boundaries
+    generator = np.random.default_rng(4)
+    bases = generator.integers(0, 2, size=(20, 150), dtype=np.uint8)
+    hashes = []
+    for base in bases:
+        for _ in range(6):
+            variant = base.copy()
+            flips = generator.choice(150, size=generator.integers(0, 8), replace=False)
+            variant[flips] ^= 1
+            hashes.append("".join(map(str, variant)))
+
+    return hashes
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 8, 80])
+def test_pairs_match_naive_comparison(bit_hashes, max_distance):
+    index = HammingIndex.from_bits(bit_hashes)
+    assert found_pairs(index, max_distance) == naive_pairs(bit_hashes, max_distance)
+
+
+def test_tiles_match_parts(bit_hashes):
+    index = HammingIndex.from_bits(bit_hashes)
+    assert index._get_parts(5)
+    by_parts = found_pairs(index, 5)
+
+    index.tile_words = 64 * 3
+    tiled = {}
+    for left, right, distances in index._iterate_pairs_by_tiles(5, None):
+        tiled.update(zip(zip(left.tolist(), right.tolist()), distances.tolist()))
+
+    assert tiled == by_parts
+
+
+def test_groups_are_connected_components():
+    # 0-1 and 1-2 are linked, 3 stands alone, 4-5 are linked
+    labels = connected_components(6, [(np.array([4, 1]), np.array([5, 2])), (np.array([0]), np.array([1]))])
+    assert labels.tolist() == [0, 0, 0, 1, 2, 2]
+
+    index = HammingIndex.from_bits(["0000", "0001", "0011", "1111", "1100"])
+    assert index.get_groups(1).tolist() == [0, 0, 0, 1, 2]
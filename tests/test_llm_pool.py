@@ -0,0 +1,129 @@
+"""
+Tests for the concurrent LLM request pool and its response cache
+
+Requests are made to a stub OpenAI-compatible server on localhost, so no
+requests leave the machine.
+"""
+import collections
+import threading
+import random
+import json
+import time
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from common.lib.llm.adapter import LLMAdapter
+from common.lib.llm.pool import LLMRequest, LLMRequestPool, LLMResponseCache
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers chat completion requests by echoing the prompt
+
+    Prompts starting with "fail" get a 503 the first few times they are sent,
+    and prompts starting with "missing" always get a 404.
+    """
+    protocol_version = "HTTP/1.1"
+    requests_seen = collections.Counter()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][-1]["content"]
+        with self.lock:
+            self.requests_seen[prompt] += 1
+            times_seen = self.requests_seen[prompt]
+
+        # answer out of order when requests are sent concurrently
+        time.sleep(random.uniform(0, 0.05))
+
+        if prompt.startswith("missing"):
+            return self.respond(404, {"error": {"message": "Not found", "type": "not_found"}})
+        elif prompt.startswith("fail") and times_seen <= 4:
+            return self.respond(503, {"error": {"message": "Overloaded", "type": "server_error"}})
+
+        self.respond(200, {
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": f"echo: {prompt}"},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        })
+
+    def respond(self, status_code, response):
+        response = json.dumps(response).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        # keep the retries made by the OpenAI client itself quick
+        self.send_header("retry-after-ms", "1")
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def adapter():
+    StubHandler.requests_seen.clear()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield LLMAdapter(
+        model={"id": "stub-model", "local_id": "stub", "wrapper": "openai-like", "name": "Stub model"},
+        server={"_id": "stub", "url": f"http://127.0.0.1:{server.server_address[1]}"},
+        max_tokens=100
+    )
+    server.shutdown()
+
+
+def test_responses_are_returned_in_order(adapter):
+    llm_requests = [LLMRequest(f"prompt {i}", context=i) for i in range(20)]
+    with LLMRequestPool(adapter, concurrency=5) as pool:
+        results = list(pool.map(llm_requests))
+
+    assert [llm_request.context for llm_request, response in results] == list(range(20))
+    assert [response.content for llm_request, response in results] == [f"echo: prompt {i}" for i in range(20)]
+
+
+def test_temporary_errors_are_retried(adapter):
+    with LLMRequestPool(adapter, concurrency=2, backoff=0.01) as pool:
+        results = list(pool.map([LLMRequest("fail once"), LLMRequest("succeed")]))
+
+    assert [response.content for llm_request, response in results] == ["echo: fail once", "echo: succeed"]
+    assert StubHandler.requests_seen["fail once"] == 5
+
+
+def test_permanent_errors_are_returned(adapter):
+    with LLMRequestPool(adapter, backoff=0.01) as pool:
+        (llm_request, response), = list(pool.map([LLMRequest("missing")]))
+
+    assert isinstance(response, Exception)
+    assert response.status_code == 404
+    assert StubHandler.requests_seen["missing"] == 1
+
+
+def test_cached_responses_are_reused(adapter, tmp_path):
+    cache = LLMResponseCache(tmp_path.joinpath("llm-responses.db"))
+    with LLMRequestPool(adapter, cache=cache) as pool:
+        first = [response for llm_request, response in pool.map([LLMRequest("cache me", system_prompt="Be brief")])]
+
+    with LLMRequestPool(adapter, cache=cache) as pool:
+        second = [response for llm_request, response in pool.map([
+            LLMRequest("cache me", system_prompt="Be brief"),
+            LLMRequest("cache me", system_prompt="Be verbose"),
+        ])]
+
+    assert first[0].content == second[0].content == "echo: cache me"
+    assert second[0].response_metadata["model_name"] == "stub"
+    assert StubHandler.requests_seen["cache me"] == 2
+    cache.close()
@@ -0,0 +1,92 @@
+"""
+Tests for the media cache shared by the image and video downloaders
+"""
+import os
+
+from common.lib.media_cache import MediaCache
+
+
+class StubConfig:
+    def __init__(self, settings):
+        self.settings = settings
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+
+def make_file(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return path
+
+
+def test_normalise_url():
+    assert MediaCache.normalise_url("HTTPS://Example.COM:443/Image.jpg#top") == "https://example.com/Image.jpg"
+    assert MediaCache.normalise_url("http://example.com") == "http://example.com/"
+    assert MediaCache.normalise_url("https://example.com/a.jpg?x-expires=1&sig=2", keep_query=False) == "https://example.com/a.jpg"
+
+
+def test_from_config(tmp_path):
+    assert MediaCache.from_config(StubConfig({"PATH_DATA": tmp_path})) is None
+
+    cache = MediaCache.from_config(StubConfig({"PATH_DATA": tmp_path, "4cat.media_cache": True, "4cat.media_cache_max_size": 0.5}))
+    assert cache.path == tmp_path.joinpath("media-cache")
+    assert cache.max_size == 500_000_000
+
+
+def test_add_and_place(tmp_path):
+    cache = MediaCache(tmp_path.joinpath("cache"))
+    downloaded = make_file(tmp_path.joinpath("staging-1", "image.JPG"), b"image")
+
+    cache.add("https://example.com/image.jpg", downloaded, resolved_url="https://cdn.example.com/image.jpg")
+    assert cache.get("https://example.com/other.jpg") is None
+
+    cached = cache.get("https://EXAMPLE.com/image.jpg#fragment")
+    assert cached["extension"] == ".jpg"
+    assert cached["size"] == 5
+    assert cached["resolved_url"] == "https://cdn.example.com/image.jpg"
+
+    destination = tmp_path.joinpath("staging-2", "image.jpg")
+    destination.parent.mkdir()
+    assert cache.place(cached, destination)
+    assert destination.read_bytes() == b"image"
+
+    # the downloaded file is left in place, and can still be changed
+    assert downloaded.read_bytes() == b"image"
+    assert downloaded.stat().st_mode & 0o200
+    assert not os.path.samefile(downloaded, cached["path"])
+
+
+def test_place_does_not_overwrite(tmp_path):
+    cache = MediaCache(tmp_path.joinpath("cache"))
+    cached = cache.add("https://example.com/image.jpg", make_file(tmp_path.joinpath("staging-1", "image.jpg"), b"image"))
+    destination = make_file(tmp_path.joinpath("staging-2", "image.jpg"), b"other image")
+
+    assert not cache.place(cached, destination)
+    assert destination.read_bytes() == b"other image"
+
+
+def test_same_content_is_stored_once(tmp_path):
+    cache = MediaCache(tmp_path.joinpath("cache"))
+    first = cache.add("https://example.com/a.png", make_file(tmp_path.joinpath("staging", "a.png"), b"same"))
+    second = cache.add("https://example.com/b.png", make_file(tmp_path.joinpath("staging", "b.png"), b"same"))
+
+    assert first["path"] == second["path"]
+    assert len(list(cache.objects_path.glob("*/*"))) == 1
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    cache = MediaCache(tmp_path.joinpath("cache"), max_size=20)
+    for index, name in enumerate(("first", "second", "third")):
+        record = cache.add(f"https://example.com/{name}.png", make_file(tmp_path.joinpath("staging", f"{name}.png"), name.encode() * 2))
+        os.utime(record["path"], (1000 + index, 1000 + index))
+
+    # looking up a file marks it as recently used, so the second file is now
+    # the least recently used one
+    assert cache.get("https://example.com/first.png")
+
+    assert cache.prune() == (1, 12)
+    assert cache.get("https://example.com/second.png") is None
+    assert cache.get("https://example.com/first.png")
+    assert cache.get("https://example.com/third.png")
+    assert len(list(cache.urls_path.glob("*/*.json"))) == 2
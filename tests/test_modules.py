@@ -114,6 +114,42 @@ def test_module_collector(logger, fourcat_modules):
     assert len(fourcat_modules.missing_modules) == 0
 
 
+def test_lazy_module_manifest(mock_basic_config, tmp_path):
+    """
+    Workers loaded from the module manifest match the imported classes
+    """
+    from common.lib.module_loader import ModuleCollector, LazyWorker
+
+    get_setting = mock_basic_config.get.side_effect
+    mock_basic_config.get = MagicMock(side_effect=lambda key, default=None, **kwargs:
+                                      tmp_path if key == "PATH_CONFIG" else get_setting(key, default))
+
+    imported = ModuleCollector(config=mock_basic_config, write_cache=True)
+    assert tmp_path.joinpath("module_manifest.bin").exists()
+
+    lazy = ModuleCollector(config=mock_basic_config, lazy=True)
+    assert lazy.manifest
+    assert list(lazy.processors) == list(imported.processors)
+    assert lazy.datasources.keys() == imported.datasources.keys()
+
+    for worker_type, worker in imported.workers.items():
+        lazy_worker = lazy.workers[worker_type]
+        assert isinstance(lazy_worker, LazyWorker)
+        assert getattr(lazy_worker, "title", None) == getattr(worker, "title", None)
+        assert lazy_worker.filepath == worker.filepath
+        assert lazy_worker.get_queue_id(remote_id="", details={}, dataset=None) == worker.get_queue_id(remote_id="", details={}, dataset=None)
+        assert hasattr(lazy_worker, "ensure_job") == hasattr(worker, "ensure_job")
+        assert ModuleCollector.get_worker_class(lazy_worker) is worker
+
+    # workers are not used from the manifest if the code has changed since
+    lazy.manifest["fingerprint"] = ""
+    with tmp_path.joinpath("module_manifest.bin").open("wb") as outfile:
+        import pickle
+        pickle.dump(lazy.manifest, outfile)
+
+    assert not ModuleCollector(config=mock_basic_config, lazy=True).manifest
+
+
 @pytest.fixture
 def mock_job():
     with patch("common.lib.job.Job") as mock_job:
@@ -439,4 +475,35 @@ def get_trace(stack) -> FrameSummary:
     while stack and not bit.filename.startswith(str(PATH_ROOT)):
         bit = stack.pop()
 
-    return bit
\ No newline at end of file
+    return bit
+
+def test_map_item_error_frame_for_lazy_worker():
+    """
+    Errors in map_item point at the worker's own file, also for workers
+    loaded from the module manifest
+    """
+    import os
+    from types import SimpleNamespace
+    from backend.lib.processor import BasicProcessor
+    from common.lib.exceptions import MapItemException
+    from common.lib.module_loader import LazyWorker
+
+    class MappingProcessor(BasicProcessor):
+        @staticmethod
+        def map_item(item):
+            # fails in os.py, which should not be reported as the culprit
+            return os.environ[item["variable"]]
+
+    lazy_worker = LazyWorker(SimpleNamespace(load_worker_class=lambda metadata: MappingProcessor), {
+        "class_name": "MappingProcessor",
+        "module": __name__,
+        "doc": "",
+        "attributes": {},
+        "members": ["map_item", "get_mapped_item"],
+        "inherited": {"get_mapped_item": ("backend.lib.processor", "BasicProcessor")},
+    })
+
+    with pytest.raises(MapItemException) as exception:
+        lazy_worker.get_mapped_item({"variable": "4CAT_DOES_NOT_EXIST"})
+
+    assert exception.value.frame.filename == __file__
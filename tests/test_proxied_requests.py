@@ -0,0 +1,117 @@
+"""
+Tests for the DelegatedRequestHandler and the queues it keeps per requester
+
+Requests are made to a stub HTTP server on localhost, so no requests leave
+the machine.
+"""
+import logging
+import threading
+import heapq
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from backend.lib.proxied_requests import DelegatedRequestHandler, DelegatedRequestQueue, QueuedUrl
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.path.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubConfig:
+    def __init__(self, settings):
+        self.settings = settings
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def finish(queue, index):
+    """
+    Move a URL from a queue's waiting list to its results
+    """
+    queued_url = [queued_url for queued_url in queue.waiting if queued_url.index == index][0]
+    queue.waiting.remove(queued_url)
+    heapq.heappush(queue.ready, (index, queued_url))
+
+
+def make_queue(num_urls):
+    queue = DelegatedRequestQueue()
+    for index in range(num_urls):
+        queue.waiting.append(QueuedUrl(f"https://example.com/{index}", index, {}))
+        queue.next_index += 1
+
+    return queue
+
+
+def test_queue_returns_results_in_order():
+    queue = make_queue(4)
+    finish(queue, 1)
+    finish(queue, 2)
+    assert not queue.has_results(preserve_order=True)
+    assert queue.has_results(preserve_order=False)
+
+    finish(queue, 0)
+    assert [queued_url.index for queued_url in queue.pop_results(preserve_order=True)] == [0, 1, 2]
+    assert len(queue) == 1
+
+
+def test_queue_order_survives_unordered_and_discarded_results():
+    queue = make_queue(6)
+    finish(queue, 2)
+    assert [queued_url.index for queued_url in queue.pop_results(preserve_order=False)] == [2]
+
+    # discarding the remaining waiting URLs should not block later results
+    finish(queue, 0)
+    finish(queue, 1)
+    queue.discard()
+    assert len(queue) == 0
+
+    queue.waiting.append(QueuedUrl("https://example.com/6", 6, {}))
+    finish(queue, 6)
+    assert [queued_url.index for queued_url in queue.pop_results(preserve_order=True)] == [6]
+
+
+@pytest.mark.parametrize("preserve_order", [True, False])
+def test_handler_returns_all_results(stub_server, preserve_order):
+    config = StubConfig({
+        "proxies.urls": [DelegatedRequestHandler.PROXY_LOCALHOST],
+        "proxies.cooloff": 0,
+        "proxies.concurrent-overall": 4,
+        "proxies.concurrent-host": 4,
+        "proxies.allow-localhost-fallback": True,
+    })
+    handler = DelegatedRequestHandler(logging.getLogger(__name__), config)
+    urls = [f"{stub_server}/{i}" for i in range(25)]
+    handler.add_urls(urls, "test")
+
+    results = []
+    while handler.get_queue_length("test") > 0:
+        handler.wait_for_results("test", preserve_order=preserve_order, timeout=5)
+        results.extend(handler.get_results("test", preserve_order=preserve_order))
+
+    assert sorted([url for url, response in results]) == sorted(urls)
+    assert all([response.text == "/" + url.split("/")[-1] for url, response in results])
+    if preserve_order:
+        assert [url for url, response in results] == urls
+
+    handler.halt_and_wait("test")
+    assert handler.get_queue_length() == 0
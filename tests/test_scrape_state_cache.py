@@ -0,0 +1,25 @@
+"""
+Tests for `ScrapeStateCache`, which keeps validators and known post IDs
+between scrapes of the same resource.
+"""
+from backend.lib.scraper import ScrapeStateCache
+
+
+def test_least_recently_used_items_are_dropped():
+    cache = ScrapeStateCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_delete():
+    cache = ScrapeStateCache(max_size=2)
+    cache.set("a", 1)
+    cache.delete("a")
+    cache.delete("missing")
+    assert cache.get("a", "default") == "default"
@@ -0,0 +1,74 @@
+"""
+Tests for claiming batches of scrape jobs in `backend/lib/scraper.py`
+
+Workers are created without calling their constructor, so no database or
+worker manager is needed.
+"""
+from types import SimpleNamespace
+
+from backend.lib.scraper import BasicHTTPScraper
+
+
+class StubConfig:
+    def __init__(self, settings):
+        self.settings = settings
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+
+class StubJob:
+    def __init__(self):
+        self.details = {}
+        self.data = {"queue_id": "board/thread"}
+        self.claimed = False
+
+    def claim(self):
+        self.claimed = True
+
+
+class StubScraper(BasicHTTPScraper):
+    type = "stub-thread"
+    batch_size = 10
+
+    def process(self, data):
+        pass
+
+    def get_url(self):
+        return "https://example.com/thread.json"
+
+
+def make_scraper(settings, queued_jobs):
+    scraper = StubScraper.__new__(StubScraper)
+    scraper.config = StubConfig(settings)
+    scraper.manager = SimpleNamespace(proxy_delegator=object())
+    scraper.queue = SimpleNamespace(get_all_jobs=lambda **kwargs: queued_jobs)
+    scraper.job = StubJob()
+    return scraper
+
+
+def test_batch_is_claimed_without_scrape_proxies():
+    queued_jobs = [StubJob(), StubJob()]
+    scraper = make_scraper({}, queued_jobs)
+
+    assert scraper.claim_batch() == queued_jobs
+    assert all([job.claimed for job in queued_jobs])
+    assert scraper.get_scrape_proxies(scraper.get_url()) is None
+
+
+def test_no_batch_with_scrape_proxies():
+    # batches are requested via the proxy delegator, which would bypass the
+    # configured proxy
+    queued_jobs = [StubJob(), StubJob()]
+    scraper = make_scraper({"SCRAPE_PROXIES": {"https": ["http://proxy.example:3128"]}}, queued_jobs)
+
+    assert scraper.claim_batch() == []
+    assert not any([job.claimed for job in queued_jobs])
+    assert scraper.get_scrape_proxies(scraper.get_url()) == {"https": "http://proxy.example:3128"}
+
+
+def test_batch_with_scrape_proxies_for_other_protocol():
+    queued_jobs = [StubJob()]
+    scraper = make_scraper({"SCRAPE_PROXIES": {"http": ["http://proxy.example:3128"], "https": []}}, queued_jobs)
+
+    assert scraper.claim_batch() == queued_jobs
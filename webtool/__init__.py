@@ -37,6 +37,7 @@ from common.lib.module_loader import ModuleCollector  # noqa: E402
 from common.lib.user import User  # noqa: E402
 from webtool.lib.helpers import generate_css_colours  # noqa: E402
 from webtool.lib.openapi_collector import OpenAPICollector  # noqa: E402
+from webtool.lib.dataset_events import DatasetEventListener  # noqa: E402
 
 # make a web app!
 app = Flask(__name__)
@@ -164,7 +165,8 @@ with app.app_context():
     app.log = log
     app.db = db
     app.fourcat_config = config
-    app.fourcat_modules = ModuleCollector(app.fourcat_config)
+    app.fourcat_modules = ModuleCollector(app.fourcat_config, lazy=True)
+    app.dataset_events = DatasetEventListener(log, config, max_streams=config.get("flask.max_event_streams", 2))
 
     # import all views; these can only be imported here because they rely on
     # current_app for initialisation
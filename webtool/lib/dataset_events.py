@@ -0,0 +1,193 @@
+"""
+Push dataset status updates to the web interface
+"""
+import threading
+import time
+
+import psycopg2
+
+from common.lib.database import Database
+from common.lib.dataset import DataSet
+
+
+class DatasetSubscription:
+	"""
+	Interest in updates for a set of datasets
+
+	Returned by `DatasetEventListener.subscribe()`; the listener marks keys as
+	updated as notifications for them come in, and `wait()` hands them over.
+	"""
+	def __init__(self, keys):
+		"""
+		:param set keys:  Keys of the datasets to receive updates for
+		"""
+		self.keys = set(keys)
+		self.updated = set()
+		self.event = threading.Event()
+		self.lock = threading.Lock()
+
+	def notify(self, key):
+		"""
+		Mark a dataset as updated
+
+		:param str key:  Dataset key
+		"""
+		with self.lock:
+			self.updated.add(key)
+			self.event.set()
+
+	def wait(self, timeout):
+		"""
+		Wait for datasets to be updated
+
+		:param float timeout:  Maximum time to wait, in seconds
+		:return set:  Keys of datasets updated since the previous call; empty
+		if none were updated before the timeout expired
+		"""
+		self.event.wait(timeout)
+		with self.lock:
+			updated = self.updated
+			self.updated = set()
+			self.event.clear()
+
+		return updated
+
+
+class DatasetEventListener:
+	"""
+	Listen for dataset status updates
+
+	Datasets notify `DataSet.NOTIFY_CHANNEL` with their key whenever their
+	status or progress changes. A single thread per web server process listens
+	on that channel and wakes up requests subscribed to the datasets in
+	question, so these need not poll the database for changes.
+
+	If the connection to the database is lost, the listener reconnects,
+	waiting `reconnect_delay` seconds at first and twice as long after each
+	failed attempt, up to `max_reconnect_delay`.
+
+	Requests that wait for updates each occupy a thread of the web server
+	while doing so; `streams` limits how many may do so at the same time.
+	"""
+	reconnect_delay = 1
+	max_reconnect_delay = 60
+
+	def __init__(self, logger, config, max_streams=2):
+		"""
+		:param Logger logger:  Logger
+		:param config:  Configuration reader, for database credentials
+		:param int max_streams:  Number of requests that may wait for updates
+		at the same time
+		"""
+		self.log = logger
+		self.config = config
+		self.streams = threading.BoundedSemaphore(max(1, max_streams))
+		self.subscriptions = {}
+		self.lock = threading.Lock()
+		self.thread = None
+
+	def subscribe(self, keys):
+		"""
+		Subscribe to updates for datasets
+
+		Starts listening for notifications if not done yet. Call
+		`unsubscribe()` once updates are no longer needed.
+
+		:param keys:  Keys of the datasets to receive updates for
+		:return DatasetSubscription:
+		"""
+		subscription = DatasetSubscription(keys)
+		with self.lock:
+			self.subscriptions[id(subscription)] = subscription
+			if not self.thread or not self.thread.is_alive():
+				# started on demand, so each web server worker process gets
+				# its own listener after forking
+				self.thread = threading.Thread(target=self.listen, name="dataset-events", daemon=True)
+				self.thread.start()
+
+		return subscription
+
+	def unsubscribe(self, subscription):
+		"""
+		Stop receiving updates
+
+		:param DatasetSubscription subscription:  Subscription to end
+		"""
+		with self.lock:
+			self.subscriptions.pop(id(subscription), None)
+
+	def dispatch(self, key):
+		"""
+		Pass a dataset update to the subscriptions interested in it
+
+		:param str key:  Key of the updated dataset
+		"""
+		with self.lock:
+			subscriptions = list(self.subscriptions.values())
+
+		for subscription in subscriptions:
+			if key in subscription.keys:
+				subscription.notify(key)
+
+	def dispatch_all(self):
+		"""
+		Wake up all subscriptions for all their datasets
+
+		Used after notifications may have been missed, so that subscribers
+		check for updates themselves.
+		"""
+		with self.lock:
+			subscriptions = list(self.subscriptions.values())
+
+		for subscription in subscriptions:
+			for key in list(subscription.keys):
+				subscription.notify(key)
+
+	def listen(self):
+		"""
+		Listen for notifications until the process ends
+
+		Subscriptions are kept while reconnecting after the connection was
+		lost; as notifications sent in the meantime are missed, all of them
+		are woken up once the connection is back.
+		"""
+		db = None
+		reconnecting = False
+		delay = self.reconnect_delay
+
+		while True:
+			try:
+				if not db:
+					db = Database(logger=self.log, dbname=self.config.get("DB_NAME"), user=self.config.get("DB_USER"),
+								  password=self.config.get("DB_PASSWORD"), host=self.config.get("DB_HOST"),
+								  port=self.config.get("DB_PORT"), appname="frontend-events")
+					db.listen(DataSet.NOTIFY_CHANNEL)
+					if reconnecting:
+						self.log.info("Reconnected to database for dataset updates")
+						self.dispatch_all()
+					reconnecting = False
+					delay = self.reconnect_delay
+
+				# a short timeout, since a lost connection is only noticed
+				# once the wait is over
+				for notification in db.wait_for_notifications(timeout=10):
+					self.dispatch(notification.payload)
+
+				if db.listener:
+					continue
+				error = "listener connection closed"
+
+			except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
+				error = e
+
+			self.log.warning(f"Lost database connection for dataset updates, reconnecting in {delay} seconds: {error}")
+			if db:
+				try:
+					db.close()
+				except (psycopg2.InterfaceError, psycopg2.OperationalError):
+					pass
+
+			db = None
+			reconnecting = True
+			time.sleep(delay)
+			delay = min(delay * 2, self.max_reconnect_delay)
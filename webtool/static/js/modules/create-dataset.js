@@ -16,6 +16,13 @@ export const query = {
     last_queue_empty: false,
     last_processor_poll: 0,
 
+    // State for update_status: child dataset updates are pushed through a
+    // stream of server-sent events while possible, and polled for otherwise
+    event_source: null,
+    event_keys: '',
+    finished_keys: new Set(),
+    poll_status: false,
+
     /**
      * Set up query status checkers and event listeners
      */
@@ -317,27 +324,110 @@ export const query = {
     /**
      * Fancy live-updating child dataset status
      *
-     * Checks if running subqueries have finished, updates their status, and re-enabled further
-     * analyses if all subqueries have finished
+     * Keeps running child datasets up to date. Status and progress changes are
+     * received through a server-sent event stream and applied in place; only
+     * when a dataset finishes is its HTML fetched and re-rendered. If the
+     * stream is not available, the status of running datasets is polled.
      */
     update_status: function () {
-        if (!document.hasFocus()) {
+        // first selector is top-level child datasets (always visible)
+        // second selector is children of children (only visible when expanded)
+        let keys = [];
+        $('.top-level > .child-wrapper.running, div[aria-expanded=true] > ol > li.child-wrapper.running').each(function () {
+            keys.push($(this).attr('data-dataset-key'));
+        });
+
+        // finished datasets may still be marked as running, e.g. filters that
+        // are waiting for their new dataset; no events are sent for these
+        let polled = keys;
+        if (!query.poll_status && window.EventSource) {
+            query.watch_status(keys.filter(key => !query.finished_keys.has(key)));
+            polled = keys.filter(key => query.finished_keys.has(key));
+        }
+
+        if (!document.hasFocus() || polled.length === 0) {
             //don't hammer the server while user is looking at something else
             return;
         }
 
-        // first selector is top-level child datasets (always visible)
-        // second selector is children of children (only visible when expanded)
-        let queued = $('.top-level > .child-wrapper.running, div[aria-expanded=true] > ol > li.child-wrapper.running');
-        if (queued.length === 0) {
+        query.check_processors(polled);
+    },
+
+    /**
+     * Receive status updates for child datasets as they happen
+     *
+     * (Re)opens the event stream if the datasets to watch have changed.
+     *
+     * @param keys  Keys of datasets to watch
+     */
+    watch_status: function (keys) {
+        let key_list = JSON.stringify(keys);
+        if (key_list === query.event_keys) {
             return;
         }
 
-        let keys = [];
-        queued.each(function () {
-            keys.push($(this).attr('data-dataset-key'));
+        if (query.event_source) {
+            query.event_source.close();
+            query.event_source = null;
+        }
+
+        query.event_keys = key_list;
+        if (keys.length === 0) {
+            return;
+        }
+
+        let source = new EventSource(getRelativeURL('api/dataset-events/?keys=' + encodeURIComponent(key_list)));
+        source.onmessage = function (event) {
+            let dataset = JSON.parse(event.data);
+            let target = $('body #child-' + dataset.key);
+
+            if (dataset.finished) {
+                query.finished_keys.add(dataset.key);
+                query.check_processors([dataset.key]);
+                return;
+            }
+
+            applyProgress(target.children('.processor-result-indicator'), dataset.progress);
+
+            let current_status = target.attr('data-status') || '';
+            let new_status = dataset.status || '';
+            if (current_status === new_status) {
+                return;
+            }
+
+            if (current_status.toLowerCase().includes('queued') !== new_status.toLowerCase().includes('queued')) {
+                // started (or re-queued); this changes more than the status
+                query.check_processors([dataset.key]);
+                return;
+            }
+
+            let status = new_status ? new_status + (new_status.slice(-1) === '.' ? '' : '.') : 'Creating dataset';
+            target.attr('data-status', new_status);
+            target.children('.processor-header').find('.processor-status').first().text(status);
+        };
+
+        source.addEventListener('done', function () {
+            source.close();
         });
 
+        source.onerror = function () {
+            if (source.readyState === EventSource.CLOSED) {
+                // the server declined to stream (e.g. too many streams are
+                // open); poll instead
+                query.poll_status = true;
+                query.event_source = null;
+            }
+        };
+
+        query.event_source = source;
+    },
+
+    /**
+     * Fetch and render the status of child datasets
+     *
+     * @param keys  Keys of datasets to check
+     */
+    check_processors: function (keys) {
         $.get({
             url: getRelativeURL('api/check-processors/'),
             data: {subqueries: JSON.stringify(keys)},
@@ -132,7 +132,7 @@ def get_standalone_processors():
 
 	for processor_type, processor in g.modules.processors.items():
 		# Skip datasources as they do not conform to /api/process/<processor>/ API
-		if issubclass(processor, Search) or processor_type.endswith("-search"):
+		if processor_type.endswith("-search") or issubclass(g.modules.get_worker_class(processor), Search):
 			# ALMOST all datasources are subclasses of Search, almost.
 			continue
 
@@ -3,8 +3,10 @@
 """
 import itertools
 import hashlib
+import base64
 import psutil
 import json
+import zlib
 import time
 import csv
 import os
@@ -16,7 +18,7 @@ from flask_login import login_required, current_user
 from webtool.lib.helpers import error, setting_required, parse_markdown
 
 from common.lib.exceptions import QueryParametersException, JobNotFoundException, \
-	QueryNeedsExplicitConfirmationException, QueryNeedsFurtherInputException, DataSetException
+	QueryNeedsExplicitConfirmationException, QueryNeedsFurtherInputException, DataSetException, DataSetIndexException
 from common.lib.queue import JobQueue
 from common.lib.job import Job
 from common.lib.dataset import DataSet
@@ -1381,6 +1383,103 @@ def check_processor():
 	return jsonify(children)
 
 
+@component.route('/api/dataset-events/')
+@login_required
+@current_app.openapi.endpoint("tool")
+def dataset_events():
+	"""
+	Stream dataset status updates
+
+	A stream of server-sent events, one for each dataset whose status or
+	progress has changed. Each dataset is sent once when the stream starts,
+	and after that only when it changes. No further events are sent for
+	finished datasets; once all datasets have finished, a `done` event is sent
+	and the stream ends. Use `/api/check-processors/` to get the details of
+	finished datasets.
+
+	:request-param str keys:  A JSON-encoded list of dataset keys to get
+	                          updates for
+
+	:return: A stream of events, each with a `key`, `status`, `status_type`,
+	         `progress` (0-100), and whether it had `finished`.
+
+	:return-error 406:  If the list of keys could not be parsed.
+	:return-error 503:  If too many streams are open already; poll
+	                    `/api/check-processors/` instead.
+	"""
+	try:
+		requested_keys = json.loads(request.args.get("keys"))
+	except (TypeError, json.decoder.JSONDecodeError):
+		return error(406, error="Unexpected format for dataset key list.")
+
+	keys = set()
+	for key in requested_keys:
+		try:
+			dataset = DataSet(key=key, db=g.db, modules=g.modules)
+		except DataSetException:
+			continue
+
+		if current_user.can_access_dataset(dataset):
+			keys.add(dataset.key)
+
+	events = current_app.dataset_events
+	if not events.streams.acquire(blocking=False):
+		return error(503, error="Too many open streams; poll for updates instead.")
+
+	db = g.db
+	keepalive = 15
+	lifetime = 300
+
+	def event_stream():
+		subscription = events.subscribe(keys)
+		sent = {}
+		updated = set(keys)
+		deadline = time.time() + lifetime
+		try:
+			yield "retry: 2000\n\n"
+			while keys and time.time() < deadline:
+				if updated:
+					datasets = db.fetchall("SELECT key, status, status_type, progress, is_finished FROM datasets WHERE key IN %s",
+										   (tuple(updated),))
+
+					# deleted datasets will not be updated anymore
+					keys.difference_update(updated - {dataset["key"] for dataset in datasets})
+
+					for dataset in datasets:
+						update = {
+							"key": dataset["key"],
+							"status": dataset["status"],
+							"status_type": dataset["status_type"],
+							"progress": round(dataset["progress"] * 100),
+							"finished": dataset["is_finished"]
+						}
+						if dataset["is_finished"]:
+							keys.discard(dataset["key"])
+
+						if sent.get(dataset["key"]) != update:
+							sent[dataset["key"]] = update
+							yield "data: %s\n\n" % json.dumps(update)
+
+					subscription.keys = set(keys)
+					if not keys:
+						break
+
+				updated = subscription.wait(timeout=keepalive) & keys
+				if not updated:
+					# also lets us notice if the client has gone away
+					yield ": keep-alive\n\n"
+
+			if not keys:
+				yield "event: done\ndata: \n\n"
+		finally:
+			events.unsubscribe(subscription)
+
+	response = current_app.response_class(stream_with_context(event_stream()), mimetype="text/event-stream",
+										  headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+	response.call_on_close(events.streams.release)
+	return response
+
+
 @component.route("/api/request-token/")
 @login_required
 @setting_required("privileges.can_create_api_token")
@@ -1436,6 +1535,12 @@ def export_packed_dataset(key=None, component=None):
 	"""
 	Export dataset for importing in another 4CAT instance
 
+	Components are `metadata`, `children`, `log`, `data`, and `checksum`,
+	which returns the size and SHA-256 hash of the data file so the importing
+	server can verify its copy. The data file supports HTTP range requests, so
+	interrupted transfers can be resumed, and is sent gzip-compressed when the
+	client asks for that and requests the whole file.
+
 	:param key:
 	:param component:
 	:return:
@@ -1458,12 +1563,47 @@ def export_packed_dataset(key=None, component=None):
 		children = [d["key"] for d in g.db.fetchall("SELECT key FROM datasets WHERE key_parent = %s AND is_finished = TRUE", (dataset.key,))]
 		return jsonify(children)
 
-	elif component in ("data", "log"):
-		filepath = dataset.get_results_path() if component == "data" else dataset.get_results_path().with_suffix(".log")
-		if not filepath.exists():		# def stream_data_content(datafile):
+	elif component in ("data", "log", "checksum"):
+		if component != "log" and dataset.is_view():
+			# views only get a file of their own once it is needed
+			try:
+				dataset.materialise_view()
+			except (DataSetException, DataSetIndexException, OSError) as e:
+				g.log.error(f"Could not write view {dataset.key} to a file: {e}")
+				return error(500, error="The dataset file could not be created.")
+
+		filepath = dataset.get_results_path() if component != "log" else dataset.get_results_path().with_suffix(".log")
+		if not filepath.exists():
 			return error(404, error=f"File for {component} not found")
-		else:
-			return send_from_directory(directory=filepath.parent, path=filepath.name)
+
+		if component == "checksum":
+			checksum = hashlib.sha256()
+			with filepath.open("rb") as infile:
+				while chunk := infile.read(1024 * 1024):
+					checksum.update(chunk)
+
+			return jsonify({"size": filepath.stat().st_size, "sha256": checksum.hexdigest()})
+
+		# compress text files on the fly if the client can handle it; archives
+		# are compressed already, and partial requests are answered with the
+		# original bytes so they can be appended to what was transferred before
+		if component == "data" and "gzip" in request.headers.get("Accept-Encoding", "") \
+				and not request.headers.get("Range") and filepath.suffix.lower() != ".zip":
+			def gzip_stream():
+				compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+				with filepath.open("rb") as infile:
+					while chunk := infile.read(1024 * 1024):
+						if compressed := compressor.compress(chunk):
+							yield compressed
+				yield compressor.flush()
+
+			return current_app.response_class(
+				stream_with_context(gzip_stream()),
+				mimetype="application/octet-stream",
+				headers={"Content-Encoding": "gzip"}
+			)
+
+		return send_from_directory(directory=filepath.parent, path=filepath.name)
 
 	else:
 		return error(406, error="Dataset component unknown")
@@ -1516,6 +1656,48 @@ def list_datasources():
 		"datasources": sorted(available, key=lambda x: x["id"])
 	}), 200
 
+def _encode_items_cursor(dataset, row, position):
+	"""
+	Get an opaque cursor for a page of dataset items
+
+	:param DataSet dataset:  Dataset the cursor is for
+	:param int row:  Row number at which the page starts
+	:param int position:  Byte position at which that row starts in the
+	result file
+	:return str:  Cursor
+	"""
+	cursor = json.dumps({"key": dataset.key, "row": row, "position": position}, separators=(",", ":"))
+	return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_items_cursor(dataset, cursor):
+	"""
+	Read a cursor made with `_encode_items_cursor()`
+
+	:param DataSet dataset:  Dataset the cursor should be for
+	:param str cursor:  Cursor
+	:return tuple:  Row number and byte position, or `None` if the cursor is
+	not valid for this dataset
+	"""
+	try:
+		cursor = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+		row = cursor["row"]
+		position = cursor["position"]
+		if cursor["key"] != dataset.key or type(row) is not int or type(position) is not int or row < 0 or position < 0:
+			return None
+
+		# a row always starts at the beginning of a line
+		with dataset.get_results_path().open("rb") as infile:
+			infile.seek(max(0, position - 1))
+			if position > 0 and infile.read(1) != b"\n":
+				return None
+
+	except (ValueError, TypeError, KeyError, OSError):
+		return None
+
+	return row, position
+
+
 class MissingMappedFieldEncoder(json.JSONEncoder):
 	"""Custom JSON encoder to serialize MissingMappedField objects."""
 
@@ -1540,23 +1722,29 @@ def dataset_items(key):
 	merged in by default), but as JSON. Two response modes:
 
 	- Default (paginated): a JSON envelope `{key, offset, limit, total,
-	  returned, next_offset, items}`. `next_offset` is `null` on the last
-	  page. Default `limit` is 100, max 1000.
+	  returned, next_offset, next_cursor, items}`. `next_offset` and
+	  `next_cursor` are `null` on the last page. Default `limit` is 100, max
+	  1000.
 	- Stream (`?stream=true`): the entire dataset as NDJSON (one JSON
-	  object per line). `offset` and `limit` are ignored.
+	  object per line). `offset`, `cursor` and `limit` are ignored.
 
-	Paginated mode re-reads the dataset file from the start on every
-	request (it skips `offset` rows before yielding), so use `?stream=true` 
-	to enumerate the full dataset in one pass.
+	To page through a dataset, pass the `next_cursor` of each page as the
+	`cursor` of the next request. A cursor records where in the dataset file
+	the next page starts, so every page takes about as long to serve no
+	matter how far into the dataset it is. This also works for datasets that
+	are still being collected. Pages requested by `offset` are located via
+	the dataset's row index instead, which is only available for finished
+	datasets.
 
 	ZIP archive datasets are not supported and will return 400; download
 	the archive directly instead.
 
 	Responds to HEAD with the same status code and headers as GET but no
-	body — useful as a cheap metadata probe. Every response carries
-	`X-4CAT-Dataset-Type`, `X-4CAT-Dataset-Datasource`,
-	`X-4CAT-Dataset-Num-Rows`, `X-4CAT-Dataset-Is-Finished`,
-	`X-4CAT-Dataset-Extension`, and `X-4CAT-Dataset-Key`.
+	body — useful as a cheap metadata probe, as it does not touch the
+	dataset file. Every response carries `X-4CAT-Dataset-Type`,
+	`X-4CAT-Dataset-Datasource`, `X-4CAT-Dataset-Num-Rows`,
+	`X-4CAT-Dataset-Is-Finished`, `X-4CAT-Dataset-Extension`, and
+	`X-4CAT-Dataset-Key`.
 
 	Authenticate via the `Authentication` header or `?access-token` query
 	parameter using a 4CAT access token.
@@ -1564,6 +1752,12 @@ def dataset_items(key):
 	:param str key: Dataset key.
 	:request-param int ?offset: Skip this many rows before returning items
 	                            (paginated mode only, default 0).
+	:request-param str ?cursor: Return the page starting at this cursor, as
+	                            returned as `next_cursor` for the previous
+	                            page (paginated mode only). Takes precedence
+	                            over `offset`.
+	:request-param str ?fields: Comma-separated list of fields to include in
+	                            each item; all fields if omitted.
 	:request-param int ?limit: Return at most N items, 1-1000
 	                           (paginated mode only, default 100).
 	:request-param bool ?stream: If truthy, stream the full dataset as
@@ -1600,20 +1794,23 @@ def dataset_items(key):
 			or dataset.is_accessible_by(current_user)):
 		return error(403, error="This dataset is private.")
 
-	if dataset.get_extension() == "zip":
-		return error(400, error="ZIP archive datasets cannot be served as JSON items; download the archive directly.")
-
 	# add headers for metadata (useful for HEAD requests and because Stijn hates sharing)
+	# these are all read from the database, not the dataset file
+	extension = dataset.result_file.split(".")[-1] if dataset.result_file else ""
 	headers = {
 		"X-4CAT-Dataset-Key": dataset.key,
 		"X-4CAT-Dataset-Type": dataset.type,
 		"X-4CAT-Dataset-Num-Rows": str(dataset.num_rows),
 		"X-4CAT-Dataset-Is-Finished": "true" if dataset.is_finished() else "false",
+		"X-4CAT-Dataset-Extension": extension,
 	}
 	datasource = dataset.parameters.get("datasource")
 	if datasource:
 		headers["X-4CAT-Dataset-Datasource"] = datasource
 
+	if extension == "zip":
+		return error(400, error="ZIP archive datasets cannot be served as JSON items; download the archive directly.")
+
 	if request.method == "HEAD":
 		return current_app.response_class(status=200, headers=headers)
 
@@ -1626,10 +1823,13 @@ def dataset_items(key):
 	if missing_fields not in ("default", "keep"):
 		return error(400, error="`missing_fields` must be 'default' or 'keep'")
 
+	fields = [field.strip() for field in request.args.get("fields", "").split(",") if field.strip()]
+
 	iter_kwargs = {
 		"warn_unmappable": False,
 		"get_annotations": include_annotations,
 		"map_missing": missing_fields,
+		"columns": fields or None,
 	}
 
 	if stream:
@@ -1644,12 +1844,19 @@ def dataset_items(key):
 		)
 
 	# Paginated mode
-	try:
-		offset = int(request.args.get("offset", 0))
-	except ValueError:
-		return error(400, error="`offset` must be an integer")
-	if offset < 0:
-		return error(400, error="`offset` must be non-negative")
+	position = None
+	if request.args.get("cursor"):
+		cursor = _decode_items_cursor(dataset, request.args.get("cursor"))
+		if not cursor:
+			return error(400, error="`cursor` is not valid for this dataset")
+		offset, position = cursor
+	else:
+		try:
+			offset = int(request.args.get("offset", 0))
+		except ValueError:
+			return error(400, error="`offset` must be an integer")
+		if offset < 0:
+			return error(400, error="`offset` must be non-negative")
 
 	try:
 		limit = int(request.args.get("limit", 100))
@@ -1661,13 +1868,24 @@ def dataset_items(key):
 		return error(400, error=f"`limit` must be between 1 and {MAX_LIMIT}; use ?stream=true for the full dataset")
 
 	items = list(itertools.islice(
-		dataset.iterate_items(offset=offset, **iter_kwargs),
+		dataset.iterate_items(offset=offset, position=position, **iter_kwargs),
 		limit
 	))
 
+	# items are numbered by row, so skipped (unmappable) rows count too
+	# the number of rows is only known once the dataset is finished
 	total = dataset.num_rows
-	end = offset + len(items)
-	next_offset = end if end < total else None
+	end = items[-1].row + 1 if items else offset
+	has_more = end < total if dataset.is_finished() else len(items) == limit
+	next_offset = end if has_more else None
+
+	next_cursor = None
+	if next_offset is not None:
+		# if there is no index to find the next page with, the file is read
+		# from this page's start (or the start of the file) to find it
+		next_position = dataset.get_row_position(end, start=(offset, position) if position is not None else (0, None))
+		if next_position is not None:
+			next_cursor = _encode_items_cursor(dataset, end, next_position)
 
 	return current_app.response_class(
 		json.dumps({
@@ -1678,7 +1896,9 @@ def dataset_items(key):
 			"total": total,
 			"returned": len(items),
 			"next_offset": next_offset,
+			"next_cursor": next_cursor,
 			"items": items,
 		}, cls=MissingMappedFieldEncoder),
-		mimetype="application/json"
+		mimetype="application/json",
+		headers=headers
 	)
\ No newline at end of file
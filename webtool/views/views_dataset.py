@@ -15,7 +15,7 @@ from webtool.lib.helpers import Pagination, error, setting_required
 from webtool.views.api_tool import toggle_favourite, toggle_private, queue_processor
 
 from common.lib.dataset import DataSet
-from common.lib.exceptions import DataSetException
+from common.lib.exceptions import DataSetException, DataSetIndexException
 
 component = Blueprint("dataset", __name__)
 
@@ -230,6 +230,14 @@ def get_result(dataset_key=None, dataset=None, query_file=None, zip_member=None)
     # If no specific file is requested, serve the main results file
     if not query_file:
         query_file = dataset.get_results_path().name
+
+    if query_file == dataset.get_results_path().name and dataset.is_view():
+        # views only get a file of their own once it is needed
+        try:
+            dataset.materialise_view()
+        except (DataSetException, DataSetIndexException, OSError) as e:
+            g.log.error(f"Could not write view {dataset.key} to a file: {e}")
+            return error(500, error="The dataset file could not be created.")
     
     # Security: Build and validate the full path
     data_root = g.config.get('PATH_DATA')
@@ -423,7 +431,7 @@ def preview_items(key):
         with dataset.get_results_path().open() as infile:
             return render_template("preview/html.html", html=infile.read())
 
-    elif dataset.get_extension() not in ("json", "ndjson") or use_mapper:
+    elif dataset.get_extension() not in ("json", "ndjson") or use_mapper or dataset.is_view():
         # iterable data, which we use iterate_items() for, which in turn will
         # use map_item if the underlying data is not CSV but JSON
         rows = []
@@ -117,20 +117,21 @@ def explorer_dataset(dataset_key: str, page=1):
             if count >= (offset + items_per_page) or count > max_items:
                 break
     else:
-        count = 0
+        count = offset
         get_annotations = (
             True if sort in dataset.get_annotation_field_labels() else False
         )
+        # The sort order is stored after the first request, so later pages
+        # only need to read the items they show.
         for row in sort_and_iterate_items(
                 dataset,
                 sort,
                 reverse=reverse,
                 warn_unmappable=False,
                 get_annotations=get_annotations,
+                offset=offset,
         ):
             count += 1
-            if count <= offset:
-                continue
             item_ids.append(row["id"])
             items.append(row)
             if count >= (offset + items_per_page) or count > max_items:
@@ -315,6 +316,6 @@ def sort_and_iterate_items(dataset: DataSet, sort="", reverse=False, **kwargs):
         yield from dataset.iterate_items(**kwargs)
         return
 
-    # Use dataset's sort_and_iterate_items function which can accept chunk_size and
-    # creates a sorted temporary file (thus not using so much memory).
+    # Use dataset's sort_and_iterate_items function, which stores the sort
+    # order so subsequent pages can skip straight to the relevant items.
     yield from dataset.sort_and_iterate_items(sort=sort, reverse=reverse, **kwargs)
\ No newline at end of file